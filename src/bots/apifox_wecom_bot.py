@@ -8,15 +8,21 @@ from typing import Dict, Optional
 from loguru import logger
 import httpx
 
+from utils.fair_scheduler import FairScheduler, FairSchedulerTimeout
+from utils.wecom_sender import WeComSender, get_sender
+
 
 class ApifoxWeComBot:
     """Apifox 定制版企微机器人"""
 
-    def __init__(self, config, kb, classifier, template_mgr):
+    def __init__(self, config, kb, classifier, template_mgr, fair_scheduler: FairScheduler = None,
+                 sender: WeComSender = None):
         self.config = config
         self.kb = kb
         self.classifier = classifier
         self.template_mgr = template_mgr
+        # LLM 调用公平调度（同一进程内的机器人共用）
+        self.fair_scheduler = fair_scheduler or FairScheduler.from_config(config.fairness)
         
         self.wecom_config = config.bots.get("apifox_wecom", {})
         self.access_key = self.wecom_config.get("access_key")
@@ -26,13 +32,31 @@ class ApifoxWeComBot:
         # Token 缓存管理
         self._access_token: Optional[str] = None
         self._token_expire_time: float = 0
+        # 进程内共用的企微发送器（连接复用、合并短消息、失败重试）；Token 也通过发送器的连接获取
+        self.sender = sender or get_sender(config)
         
         # 对话管理器
         from bots.conversation_manager import ConversationManager
         self.conversation_mgr = ConversationManager(config)
 
-    async def _get_access_token(self) -> str:
-        """获取并缓存 Access Token"""
+    def apply_config(self, config):
+        """
+        应用热加载的配置快照
+
+        繁忙提示等在使用时从 self.config 读取；接口地址或凭证变化时丢弃缓存的 Token
+        """
+        old = (self.access_key, self.access_secret, self.api_base_url)
+        self.config = config
+        self.wecom_config = config.bots.get("apifox_wecom", {})
+        self.access_key = self.wecom_config.get("access_key")
+        self.access_secret = self.wecom_config.get("access_secret")
+        self.api_base_url = self.wecom_config.get("api_base_url", "").rstrip("/")
+        if old != (self.access_key, self.access_secret, self.api_base_url):
+            self._access_token = None
+            self._token_expire_time = 0
+
+    async def _get_access_token(self, client: httpx.AsyncClient) -> str:
+        """获取并缓存 Access Token（client 为发送器的共用连接）"""
         current_time = time.time()
         # 预留 5 分钟 (300秒) 的提前刷新窗口
         if self._access_token and current_time < (self._token_expire_time - 300):
@@ -46,22 +70,22 @@ class ApifoxWeComBot:
                 "accessSecret": self.access_secret
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(auth_url, json=data, timeout=10.0)
-                response.raise_for_status()
-                result = response.json()
-                
-                # 假设返回结构 {"token": "xxx", "expireMinutes": 1440}
-                self._access_token = result.get("token")
-                expire_minutes = result.get("expireMinutes", 1440)
-                self._token_expire_time = current_time + (expire_minutes * 60)
-                
-                logger.info(f"成功获取企微 Token，有效期至 {time.ctime(self._token_expire_time)}")
-                return self._access_token
-                
+            response = await client.post(auth_url, json=data, timeout=10.0)
+            response.raise_for_status()
+            result = response.json()
+
+            # 假设返回结构 {"token": "xxx", "expireMinutes": 1440}
+            self._access_token = result.get("token")
+            expire_minutes = result.get("expireMinutes", 1440)
+            self._token_expire_time = current_time + (expire_minutes * 60)
+
+            logger.info(f"成功获取企微 Token，有效期至 {time.ctime(self._token_expire_time)}")
+            return self._access_token
+
         except Exception as e:
+            # 原样抛出，网络错误由发送器重试
             logger.error(f"获取企微 Access Token 失败: {e}")
-            raise Exception("Auth Failed")
+            raise
 
     async def handle_message(self, message_data: Dict):
         """
@@ -114,7 +138,12 @@ class ApifoxWeComBot:
             if result["status"] == "collecting":
                 await self.send_message(result["message"], context_meta)
             elif result["status"] == "completed":
-                await self._analyze_and_classify(user_id, user_name, result["collected_data"], context_meta)
+                chat_id = context_meta.get("chatUser") or "apifox"
+                try:
+                    async with self.fair_scheduler.slot(chat_id, user_id):
+                        await self._analyze_and_classify(user_id, user_name, result["collected_data"], context_meta)
+                except FairSchedulerTimeout:
+                    await self.send_message(self.config.fairness.busy_message, context_meta)
         except Exception as e:
             logger.error(f"处理对话失败: {e}")
 
@@ -203,6 +232,14 @@ class ApifoxWeComBot:
         }
         return type_map.get(ticket_type, "其他")
 
+    async def send_busy_notice(self, message_data: Dict, text: str):
+        """繁忙时的提示（消息因并发已满被拒绝时调用）"""
+        context_meta = {
+            "chatUser": message_data.get("chatUser", ""),
+            "robotKey": message_data.get("robotKey", "")
+        }
+        await self.send_message(text, context_meta)
+
     async def send_message(self, content: str, context_meta: Dict = None):
         """
         调用定制版 API 发送消息
@@ -211,34 +248,26 @@ class ApifoxWeComBot:
             logger.error("[定制版企微] 发送消息失败：缺少 context_meta (chatUser/robotKey)")
             return
 
-        try:
-            token = await self._get_access_token()
-            send_url = f"{self.api_base_url}/wxworkapi/message/exchange"
-            
-            headers = {
-                "token": token
-            }
-            
-            # 构造新的发送 Payload
-            import uuid
+        send_url = f"{self.api_base_url}/wxworkapi/message/exchange"
+        chat_user, robot_key = context_meta["chatUser"], context_meta["robotKey"]
+
+        async def post(client: httpx.AsyncClient, text: str, delivery_id: str) -> httpx.Response:
+            token = await self._get_access_token(client)
+            # 同一次投递的重试使用相同的 messageId
             data = {
                 "type": "robot.msg.send",
-                "messageId": str(uuid.uuid4()).replace("-", ""),
-                "content": content,
-                "friends": [context_meta["chatUser"]],
-                "robotKey": context_meta["robotKey"]
+                "messageId": delivery_id,
+                "content": text,
+                "friends": [chat_user],
+                "robotKey": robot_key
             }
+            return await client.post(send_url, json=data, headers={"token": token})
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    send_url,
-                    json=data,
-                    headers=headers,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-
+        delivered = await self.sender.send(
+            f"{robot_key}:{chat_user}", content, post,
+            rate_per_minute=self.sender.apifox_rate_per_minute, channel="apifox_wecom"
+        )
+        if delivered:
             logger.info(f"[定制版企微] 发送消息成功: {content[:50]}...")
-
-        except Exception as e:
-            logger.error(f"[定制版企微] 发送消息失败: {e}")
+        else:
+            logger.error(f"[定制版企微] 发送消息失败: {content[:50]}...")
@@ -2,142 +2,132 @@
 飞书机器人处理器
 """
 
-from typing import Dict, List, Tuple
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set, Tuple
 from loguru import logger
 from lark_oapi.api.im.v1 import *
 from pathlib import Path
-import re
-from anthropic import Anthropic
+import os
+
+from src.utils.fair_scheduler import FairScheduler, FairSchedulerTimeout
+from src.utils.keyword_table import KeywordTable
+from src.utils.reply_formatter import ReplyFormatter
+from src.utils.metrics import (
+    LLM_TTFT_SECONDS,
+    inc_counter,
+    observe_stage,
+    record_llm_usage,
+    stage_timer,
+)
+
+# 当前这条消息的处理中启动的副作用任务（handle_message 结束时只等待这些任务，不等待其他消息的）
+_message_side_effects: ContextVar[Optional[Set]] = ContextVar("feishu_message_side_effects", default=None)
 
 
 class FeishuBot:
     """飞书机器人"""
 
-    def __init__(self, config, kb, classifier, template_mgr):
+    def __init__(self, config, kb, classifier, template_mgr, load_keywords: bool = True,
+                 fair_scheduler: FairScheduler = None):
+        """
+        Args:
+            load_keywords: 是否在构造时同步加载关键词表；长连接快速启动时传 False，
+                连接建立后在后台调用 load_keyword_replies
+            fair_scheduler: LLM 调用公平调度器，同一进程内的机器人应共用一个；不传时单独创建
+        """
         self.config = config
         self.kb = kb
         self.classifier = classifier
         self.template_mgr = template_mgr
+        self.fair_scheduler = fair_scheduler or FairScheduler.from_config(config.fairness)
         self.app_id = config.bots["feishu"].app_id
         from bots.conversation_manager import ConversationManager
         self.conversation_mgr = ConversationManager(config)
 
+        # 飞书开放平台地址（压测时通过 FEISHU_OPEN_API_BASE 指向本地模拟服务）
+        self.open_api_base = os.environ.get("FEISHU_OPEN_API_BASE", "https://open.feishu.cn").rstrip("/")
+
         # 初始化 SDK 客户端用于发送消息和调用 API
         import lark_oapi as lark
         self.lark_client = lark.Client.builder() \
             .app_id(self.app_id) \
             .app_secret(config.bots["feishu"].app_secret) \
+            .domain(self.open_api_base) \
             .build()
 
-        # 初始化 LLM client（用于知识库回答生成）
-        client_kwargs = {"api_key": config.llm.api_key}
-        if config.llm.base_url:
-            client_kwargs["base_url"] = config.llm.base_url
-        self.llm_client = Anthropic(**client_kwargs)
+        # LLM client（用于知识库回答生成）首次使用时再创建，anthropic 导入约需 1~2 秒
+        self._llm_client = None
+
+        # 回复格式化与消息体缓存
+        self.reply_formatter = ReplyFormatter()
 
-        # 关键词表配置
-        keyword_cfg = config.keyword_table if hasattr(config, 'keyword_table') else {}
-        self.keyword_base_token = keyword_cfg.get('base_token', '') if isinstance(keyword_cfg, dict) else getattr(keyword_cfg, 'base_token', '')
-        self.keyword_table_id = keyword_cfg.get('table_id', '') if isinstance(keyword_cfg, dict) else getattr(keyword_cfg, 'table_id', '')
+        # 关键词表（飞书多维表格，后台定时同步；未配置或首次同步失败时使用本地 Excel）
+        self.keyword_table = KeywordTable(
+            config, self._format_reply_content, self.open_api_base,
+            fallback=self._load_keyword_replies_from_excel,
+        )
+        self.keyword_base_token = self.keyword_table.base_token
+        self.keyword_table_id = self.keyword_table.table_id
 
-        # 加载关键词回复映射
-        self.keyword_replies: List[Tuple[str, str]] = []
-        self._load_keyword_replies()
+        # 优先用本地快照恢复，没有快照时按需同步加载；之后由 start_keyword_refresh 在后台同步
+        if not self.keyword_table.load_snapshot() and load_keywords:
+            self.load_keyword_replies()
 
         # 会话状态存储（用于快捷模板识别）
         self.conversations: Dict = {}
 
-    def _load_keyword_replies(self):
-        """从飞书多维表格加载关键词回复映射"""
-        try:
-            # 如果没有配置关键词表，尝试从本地 Excel 加载（兼容旧配置）
-            if not self.keyword_base_token or not self.keyword_table_id:
-                logger.warning("未配置关键词多维表格，尝试从本地 Excel 加载")
-                self._load_keyword_replies_from_excel()
-                return
-
-            # 使用 httpx 直接调用飞书 API（SDK 版本兼容性问题）
-            import httpx
-            import os
+        # 后台副作用任务（表情回复、思考转发等），持有引用避免被 GC 回收
+        self._background_tasks: Set = set()
 
-            app_id = os.environ.get("FEISHU_APP_ID") or self.config.bots["feishu"].app_id
-            app_secret = os.environ.get("FEISHU_APP_SECRET") or self.config.bots["feishu"].app_secret
+    @property
+    def llm_client(self):
+        if self._llm_client is None:
+            from anthropic import Anthropic
+            client_kwargs = {"api_key": self.config.llm.api_key}
+            if self.config.llm.base_url:
+                client_kwargs["base_url"] = self.config.llm.base_url
+            self._llm_client = Anthropic(**client_kwargs)
+        return self._llm_client
 
-            logger.info(f"开始请求飞书接口获取关键词(table={self.keyword_table_id})，若网络代理有冲突可能在此卡死(最高超时30秒)...")
-
-            # 获取 tenant_access_token
-            token_url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-            token_resp = httpx.post(token_url, json={"app_id": app_id, "app_secret": app_secret}, timeout=30, verify=False)
-            token_data = token_resp.json()
-            token = token_data.get("tenant_access_token")
-
-            if not token:
-                logger.error(f"获取飞书 token 失败: {token_data}")
-                self._load_keyword_replies_from_excel()
-                return
+    @llm_client.setter
+    def llm_client(self, client):
+        self._llm_client = client
 
-            # 获取关键词表数据
-            records_url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.keyword_base_token}/tables/{self.keyword_table_id}/records?page_size=500"
-            records_resp = httpx.get(records_url, headers={"Authorization": f"Bearer {token}"}, timeout=30, verify=False)
-            records_data = records_resp.json()
-
-            if records_data.get("code") != 0:
-                logger.error(f"获取飞书关键词表失败: {records_data.get('msg')}")
-                self._load_keyword_replies_from_excel()
-                return
+    def apply_config(self, config):
+        """
+        应用热加载的配置快照
 
-            items = records_data.get("data", {}).get("items", [])
-            loaded_count = 0
+        触发关键词、LLM 模型与流式参数等在使用时从 self.config 读取，替换快照即生效；
+        API 地址或密钥变化时重建 LLM 客户端
+        """
+        old = self.config
+        self.config = config
+        if (old.llm.api_key, old.llm.base_url) != (config.llm.api_key, config.llm.base_url):
+            self._llm_client = None
 
-            for item in items:
-                fields = item.get("fields", {})
+    @property
+    def keyword_replies(self) -> Tuple[Tuple[str, str], ...]:
+        """当前生效的 (关键词, 回复) 匹配规则"""
+        return self.keyword_table.matcher.rules
 
-                # 字段名：关键词、回复内容、添加状态
-                keywords_str = fields.get("关键词", "")
-                reply_content = fields.get("回复内容", "")
-                status = fields.get("添加状态", "")
+    def load_keyword_replies(self):
+        """立即同步一次关键词表（阻塞）"""
+        self.keyword_table.load()
 
-                # 只加载状态为「已完成」的条目
-                if keywords_str and reply_content and status == "已完成":
-                    formatted_reply = self._format_reply_content(str(reply_content))
-                    keywords_raw = str(keywords_str).strip()
-
-                    # 判断关键词格式：
-                    # 1. 包含顿号「、」 -> 拆分成多个独立关键词
-                    # 2. 不包含顿号 -> 作为整体，同时添加常见子串匹配
-                    if "、" in keywords_raw:
-                        # 顿号分隔格式：拆分成多个关键词
-                        keywords_list = [kw.strip() for kw in keywords_raw.split("、") if kw.strip()]
-                        for kw in keywords_list:
-                            self.keyword_replies.append((kw.lower(), formatted_reply))
-                        loaded_count += 1
-                    else:
-                        # 直接拼接格式：作为整体关键词
-                        self.keyword_replies.append((keywords_raw.lower(), formatted_reply))
-                        loaded_count += 1
-
-                        # 对于较长的关键词，添加常见子串匹配
-                        common_splits = ["帮助文档", "常见问答", "FAQ", "faq", "下载", "官网", "alpha", "Alpha"]
-                        for split in common_splits:
-                            if split.lower() in keywords_raw.lower() and split.lower() != keywords_raw.lower():
-                                self.keyword_replies.append((split.lower(), formatted_reply))
-
-            logger.info(f"从飞书多维表格加载 {loaded_count} 个关键词回复规则（共 {len(self.keyword_replies)} 条匹配规则）")
+    def start_keyword_refresh(self):
+        """启动关键词表后台定时同步（表中修改无需重启即可生效）"""
+        self.keyword_table.start()
 
-        except Exception as e:
-            logger.error(f"加载飞书关键词失败: {e}")
-            # 降级到本地 Excel
-            self._load_keyword_replies_from_excel()
-
-    def _load_keyword_replies_from_excel(self):
+    def _load_keyword_replies_from_excel(self) -> List[Tuple[str, str]]:
         """从本地 Excel 加载关键词回复映射（降级方案）"""
+        replies: List[Tuple[str, str]] = []
         try:
             from openpyxl import load_workbook
 
             excel_path = Path(__file__).parent.parent.parent / "data" / "documents" / "list.xlsx"
             if not excel_path.exists():
                 logger.warning(f"关键词回复文件不存在: {excel_path}")
-                return
+                return replies
 
             wb = load_workbook(excel_path)
             ws = wb.active
@@ -151,72 +141,28 @@ class FeishuBot:
                     keywords = [kw.strip() for kw in str(keywords_str).split("、") if kw.strip()]
                     formatted_reply = self._format_reply_content(str(reply_content))
                     for kw in keywords:
-                        self.keyword_replies.append((kw.lower(), formatted_reply))
+                        replies.append((kw.lower(), formatted_reply))
 
-            logger.info(f"从本地 Excel 加载 {len(self.keyword_replies)} 个关键词回复规则")
+            logger.info(f"从本地 Excel 加载 {len(replies)} 个关键词回复规则")
 
         except Exception as e:
             logger.error(f"加载本地关键词回复映射失败: {e}")
+        return replies
 
     def _format_reply_content(self, content: str) -> str:
         """
-        深度格式化回复内容，优化排版和换行
+        深度格式化回复内容，优化排版和换行（同时预先生成发送用的消息体）
         """
-        import re
-
-        # A. 基础清理
-        content = re.sub(r'[ \t]+', ' ', content)  # 合并空格
-        
-        # B. 修复单词被意外折断（例如 OpenAPI/ \n Swagger -> OpenAPI/Swagger）
-        content = re.sub(r'([a-zA-Z0-9/\-_]+)\s*\n\s*([a-zA-Z0-9/\-_]+)', r'\1\2', content)
-
-        # C. 编号标题处理 (例如 "1.使用场景 问题描述" -> "1.使用场景\n问题描述")
-        # 匹配 1.标题 后面跟着非换行内容的情况
-        content = re.sub(r'(\d+\.[\u4e00-\u9fa5]{2,10})\s+([^\n])', r'\n\1\n\2', content)
-        # 即使没有空格也尝试切分关键标题
-        titles = ["使用场景", "常见问题", "注意事项", "快速开始", "相关链接"]
-        for title in titles:
-            content = re.sub(f'(\\d+\\.{title})', r'\n\1\n', content)
-
-        # D. 特定句子开头前换行
-        content = re.sub(r'([。？?！!])\s*([1-9]\.)', r'\1\n\2', content)
-        content = re.sub(r'\s+(无论|如果|提示|注意)', r'\n\1', content)
-
-        # E. 链接项处理：支持长描述 + 自动识别“立即参与内测”等引导语
-        # 第一步：处理标准的 标题 ：链接
-        link_pattern = r'([\u4e00-\u9fa5\(\)（）\w\s\-\.]{2,100}?)\s*(?:☞|：|:)\s*(https?://[^\s\n\u4e00-\u9fa5]+)'
-        
-        def replace_link(match):
-            name = match.group(1).strip()
-            name = name.replace('\n', '').replace('\r', '')
-            url = match.group(2).strip()
-            # 使用 ☞ 符号显得更美观且专业
-            return f'\n{name} ☞ {url}\n'
-            
-        content = re.sub(link_pattern, replace_link, content)
-
-        # F. 第二步：处理孤立的链接前引导语（如“立即参与内测：http...”）
-        content = re.sub(r'(立即参与\w*|点击\w*|查看\w*)\s*(?:：|:)\s*(https?://[^\s\n]+)', r'\n\1 ☞ \2\n', content)
+        return self.reply_formatter.format_and_render(content)
 
-        # G. 特殊修复：如果 URL 后面直接跟着下一个标题，强制双换行
-        content = re.sub(r'(https?://[^\s\n]+)\s+([\u4e00-\u9fa5\d]{2,})', r'\1\n\n\2', content)
-
-        # H. 收尾工作
-        content = re.sub(r'\n{3,}', '\n\n', content)
-        content = content.strip()
-        
-        # 确保每行开头的 1. 2. 3. 干净
-        content = re.sub(r'\n\s*(\d+\.)', r'\n\1', content)
-
-        return content
-
-    async def _try_answer_from_kb(self, chat_id: str, question: str) -> Tuple[bool, str]:
+    async def _try_answer_from_kb(self, chat_id: str, question: str, docs: List = None) -> Tuple[bool, str]:
         """
         尝试从知识库回答问题
 
         Args:
             chat_id: 所在群聊/对话的ID
             question: 用户问题
+            docs: 已检索到的文档（为 None 时在此检索）
 
         Returns:
             (can_answer, answer_text)
@@ -224,7 +170,8 @@ class FeishuBot:
         has_history = hasattr(self, 'chat_history') and chat_id in self.chat_history and len(self.chat_history[chat_id]) > 0
         try:
             # 检索知识库
-            docs = await self.kb.search(question)
+            if docs is None:
+                docs = await self.kb.search(question)
 
             if not docs and not has_history:
                 logger.info(f"知识库无匹配结果且无历史语境: {question}")
@@ -234,7 +181,7 @@ class FeishuBot:
             context = ""
             if docs:
                 logger.info(f"知识库找到 {len(docs)} 个相关文档")
-                context = await self.kb.search_with_context(question)
+                context = self.kb.format_context(docs)
                 
             answer = await self._generate_answer_from_context(chat_id, question, context)
 
@@ -253,6 +200,36 @@ class FeishuBot:
             question: 用户问题
             context: 知识库检索到的上下文
         """
+        messages = self._build_answer_messages(chat_id, question, context)
+
+        try:
+            import asyncio
+            # 同步 SDK 放到线程执行，避免阻塞事件循环中的其他任务（表情回复等）
+            with stage_timer("llm"):
+                response = await asyncio.to_thread(
+                    self.llm_client.messages.create,
+                    model=self.config.llm.model,
+                    max_tokens=2000,
+                    temperature=0.3,
+                    messages=messages
+                )
+            record_llm_usage(getattr(response, "usage", None))
+
+            # 初始化 thinking 缓存
+            self._last_thinking_parts = []
+
+            # 提取文本内容（处理 ThinkingBlock，thinking 部分存入 self._last_thinking_parts）
+            ai_text = self._extract_text_from_response(response.content, chat_id)
+
+            self._finalize_answer(chat_id, question, ai_text)
+            return ai_text
+
+        except Exception as e:
+            logger.error(f"LLM 生成回答失败: {e}")
+            return "抱歉，生成回答时出现错误，请稍后再试。"
+
+    def _build_answer_messages(self, chat_id: str, question: str, context: str) -> List[Dict]:
+        """构建回答用的 prompt 消息列表（含历史上下文）"""
         if not hasattr(self, 'chat_history'):
             self.chat_history = {}
         if chat_id not in self.chat_history:
@@ -274,41 +251,157 @@ class FeishuBot:
         # 加载历史上下文作为 prompt list
         messages = list(self.chat_history[chat_id])
         messages.append({"role": "user", "content": prompt})
-
-        try:
-            response = self.llm_client.messages.create(
-                model=self.config.llm.model,
-                max_tokens=2000,
-                temperature=0.3,
-                messages=messages
+        return messages
+
+    def _finalize_answer(self, chat_id: str, question: str, ai_text: str):
+        """回答生成后：转发思考过程并更新历史记忆"""
+        # 将思考过程转发到 bot 测试群（无论来自哪个群）
+        if self._last_thinking_parts:
+            self._spawn_side_effect(
+                self._relay_thinking_to_test_group(chat_id, question, self._last_thinking_parts),
+                "relay_thinking"
             )
+        
+        # 更新历史记忆（仅保存问题原意，不存大段 Prompt 节约 token）
+        self.chat_history[chat_id].append({"role": "user", "content": question})
+        self.chat_history[chat_id].append({"role": "assistant", "content": ai_text})
+        
+        # 保留最近的5轮对话（10条消息）
+        if len(self.chat_history[chat_id]) > 10:
+            self.chat_history[chat_id] = self.chat_history[chat_id][-10:]
 
-            # 初始化 thinking 缓存
-            self._last_thinking_parts = []
+    async def _stream_answer_to_card(self, chat_id: str, question: str, docs: List, timings: Dict = None) -> bool:
+        """
+        流式回答：检索后立即发送占位卡片，边生成边 PATCH 更新卡片
 
-            # 提取文本内容（处理 ThinkingBlock，thinking 部分存入 self._last_thinking_parts）
-            ai_text = self._extract_text_from_response(response.content, chat_id)
+        卡片更新按 llm.stream_patch_interval 节流（同时需累积 stream_patch_tokens 个增量），
+        最后一次更新补充参考文档和反馈按钮。
+
+        Args:
+            chat_id: 所在群聊/对话的ID
+            question: 用户问题（已清理 mention）
+            docs: 已检索到的文档
+            timings: 阶段耗时记录（可选，写入 first_token / llm / card 等阶段）
 
-            # 将思考过程转发到 bot 测试群（无论来自哪个群）
-            if self._last_thinking_parts:
-                import asyncio
-                asyncio.ensure_future(
-                    self._relay_thinking_to_test_group(chat_id, question, self._last_thinking_parts)
+        Returns:
+            是否已通过知识库回答（False 表示应继续走分类流程）
+        """
+        import asyncio
+        import time
+        from src.utils.message_card_builder import build_faq_answer_card
+
+        if timings is None:
+            timings = {}
+        has_history = hasattr(self, 'chat_history') and chat_id in self.chat_history and len(self.chat_history[chat_id]) > 0
+        if not docs and not has_history:
+            logger.info(f"知识库无匹配结果且无历史语境: {question}")
+            return False
+
+        context = ""
+        if docs:
+            logger.info(f"知识库找到 {len(docs)} 个相关文档")
+            context = self.kb.format_context(docs)
+
+        # 先发送占位卡片，让用户尽快看到反馈
+        started_at = time.monotonic()
+        card_msg_id = await self._send_card(chat_id, build_faq_answer_card(question, "", state="streaming"))
+        timings["placeholder_card"] = time.monotonic() - started_at
+        if not card_msg_id:
+            # 占位卡片发送失败，退回一次性生成后发送
+            answer = await self._generate_answer_from_context(chat_id, question, context)
+            await self._send_card(chat_id, build_faq_answer_card(question, answer, related_docs=self._build_related_docs(docs)))
+            return True
+
+        messages = self._build_answer_messages(chat_id, question, context)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._last_thinking_parts = []
+
+        def consume_stream():
+            """在线程中消费同步 SDK 的流式响应，增量文本投递回事件循环"""
+            try:
+                with self.llm_client.messages.stream(
+                    model=self.config.llm.model,
+                    max_tokens=2000,
+                    temperature=0.3,
+                    messages=messages
+                ) as stream:
+                    for event in stream:
+                        if getattr(event, 'type', None) == 'text' and event.text:
+                            loop.call_soon_threadsafe(queue.put_nowait, event.text)
+                    final_message = stream.get_final_message()
+                return final_message
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        stream_future = asyncio.ensure_future(asyncio.to_thread(consume_stream))
+
+        interval = self.config.llm.stream_patch_interval
+        min_tokens = max(1, self.config.llm.stream_patch_tokens)
+        answer_parts: List[str] = []
+        pending = 0
+        last_patch = time.monotonic()
+        first_token_logged = False
+        patch_count = 0
+
+        while True:
+            delta = await queue.get()
+            if delta is None:
+                break
+            if not first_token_logged:
+                first_token_logged = True
+                timings["first_token"] = time.monotonic() - started_at
+                LLM_TTFT_SECONDS.observe(timings["first_token"])
+                logger.info(f"流式回答首个片段耗时 {timings['first_token']:.2f}s")
+            answer_parts.append(delta)
+            pending += 1
+            now = time.monotonic()
+            if pending >= min_tokens and now - last_patch >= interval:
+                await self._update_message_card(
+                    card_msg_id,
+                    build_faq_answer_card(question, "".join(answer_parts), state="streaming")
                 )
-            
-            # 更新历史记忆（仅保存问题原意，不存大段 Prompt 节约 token）
-            self.chat_history[chat_id].append({"role": "user", "content": question})
-            self.chat_history[chat_id].append({"role": "assistant", "content": ai_text})
-            
-            # 保留最近的5轮对话（10条消息）
-            if len(self.chat_history[chat_id]) > 10:
-                self.chat_history[chat_id] = self.chat_history[chat_id][-10:]
-                
-            return ai_text
+                patch_count += 1
+                pending = 0
+                last_patch = time.monotonic()
 
+        try:
+            final_message = await stream_future
+            record_llm_usage(getattr(final_message, "usage", None))
+            # 以最终消息为准（处理 ThinkingBlock，thinking 部分存入 self._last_thinking_parts）
+            ai_text = self._extract_text_from_response(final_message.content, chat_id) or "".join(answer_parts)
         except Exception as e:
-            logger.error(f"LLM 生成回答失败: {e}")
-            return "抱歉，生成回答时出现错误，请稍后再试。"
+            logger.error(f"LLM 流式生成回答失败: {e}")
+            ai_text = "".join(answer_parts) or "抱歉，生成回答时出现错误，请稍后再试。"
+
+        timings["llm"] = time.monotonic() - started_at
+        observe_stage("llm", timings["llm"])
+        if ai_text:
+            self._finalize_answer(chat_id, question, ai_text)
+
+        # 最后一次更新：写入完整回答 + 参考文档 + 反馈按钮（保证与上次更新间隔不低于节流间隔）
+        wait = interval - (time.monotonic() - last_patch)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self._update_message_card(
+            card_msg_id,
+            build_faq_answer_card(question, ai_text, related_docs=self._build_related_docs(docs))
+        )
+        timings["card_patches"] = patch_count + 1
+        logger.info(f"流式回答完成，总耗时 {time.monotonic() - started_at:.2f}s，卡片更新 {patch_count + 1} 次")
+        return True
+
+    def _build_related_docs(self, docs) -> List[Dict]:
+        """将 langchain 文档对象转换为卡片展示用的相关文档列表"""
+        related_docs = []
+        if docs:
+            for d in docs[:3]: # 最多取3条
+                title = d.metadata.get('title') or d.metadata.get('source', '文档')
+                # 如果 title 太长则截断
+                if len(title) > 20: title = title[:20] + "..."
+                url = d.metadata.get('url', 'https://help.apifox.com')
+                related_docs.append({"title": title, "url": url})
+        return related_docs
 
     # Bot 测试群 chat_id（显示思考内容）
     BOT_TEST_CHAT_ID = "oc_9181c1f2869b0ec0af937f5c6f9a82aa"
@@ -367,6 +460,8 @@ class FeishuBot:
         """
         处理飞书消息
         """
+        side_effects: Set = set()
+        context_token = _message_side_effects.set(side_effects)
         try:
             chat_id = event.get("chat_id", "")
             user_id = event.get("sender", {}).get("sender_id", {}).get("user_id", "")
@@ -385,21 +480,85 @@ class FeishuBot:
             
             if is_active:
                 self.conversation_mgr.add_to_history(conversation_key, "user", text_content)
-                await self._handle_conversation_step(chat_id, user_id, text_content)
+                await self._with_llm_slot(chat_id, user_id, self._handle_conversation_step, text_content)
                 return
 
             # 如果没有活跃对话，匹配关键词
-            matched_reply = self._match_keyword_reply(text_content)
+            with stage_timer("keyword_match"):
+                matched_reply = self._match_keyword_reply(text_content)
             if matched_reply:
+                inc_counter("keyword_reply")
                 await self.send_message(chat_id, matched_reply)
                 return
 
             # 触发条件：必须被 @
             if self._is_bot_mentioned(event):
-                await self._handle_new_question(chat_id, user_id, text_content, message_id)
+                inc_counter("mention_question")
+                await self._with_llm_slot(chat_id, user_id, self._handle_new_question, text_content, message_id)
 
         except Exception as e:
             logger.error(f"处理飞书消息失败: {e}")
+        finally:
+            _message_side_effects.reset(context_token)
+            # 回答已发出后再等待本条消息的副作用任务收尾（调用方可能使用 asyncio.run，退出时会取消未完成任务）
+            await self._drain_side_effects(side_effects)
+
+    async def _with_llm_slot(self, chat_id: str, user_id: str, handler, *args):
+        """
+        申请 LLM 名额后执行 handler(chat_id, user_id, *args)
+
+        名额按群轮转分配并按群 / 用户限速，排队超时回复繁忙提示
+        """
+        try:
+            async with self.fair_scheduler.slot(chat_id, user_id):
+                await handler(chat_id, user_id, *args)
+        except FairSchedulerTimeout:
+            inc_counter("fair_busy_reply")
+            await self.send_message(chat_id, self.config.fairness.busy_message)
+
+    async def send_busy_notice(self, event: Dict, text: str):
+        """
+        繁忙时的提示（消息因并发已满被拒绝时调用）
+
+        只回复 @机器人 的提问；普通群消息本来就可能不需要回答，不做提示
+        """
+        if self._is_bot_mentioned(event):
+            await self.send_message(event.get("chat_id", ""), text)
+
+    def _spawn_side_effect(self, coro, name: str):
+        """
+        以后台任务执行副作用调用（表情回复、思考转发、通知），不阻塞回答主路径
+
+        任务引用保存在 self._background_tasks 中，异常在回调中记录，不影响主流程；
+        在 handle_message 中启动的任务同时记入该条消息的任务集合
+        """
+        import asyncio
+        task = asyncio.ensure_future(coro)
+        task.set_name(name)
+        self._background_tasks.add(task)
+        side_effects = _message_side_effects.get()
+        if side_effects is not None:
+            side_effects.add(task)
+        task.add_done_callback(self._on_side_effect_done)
+        return task
+
+    def _on_side_effect_done(self, task):
+        """后台任务完成回调：移除引用并记录异常"""
+        self._background_tasks.discard(task)
+        if task.cancelled():
+            logger.warning(f"后台任务被取消: {task.get_name()}")
+            return
+        exc = task.exception()
+        if exc:
+            logger.warning(f"后台任务执行失败（非致命） {task.get_name()}: {exc}")
+
+    async def _drain_side_effects(self, tasks: Set, timeout: float = 15.0):
+        """等待指定的副作用任务完成（超时则放弃等待）"""
+        import asyncio
+        pending = [t for t in tasks if not t.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
     def _is_bot_mentioned(self, event: Dict) -> bool:
         """检查机器人是否被 @"""
         mentions = event.get("message", {}).get("mentions", [])
@@ -412,11 +571,7 @@ class FeishuBot:
 
     def _match_keyword_reply(self, text: str) -> str:
         """匹配关键词并返回回复"""
-        text_lower = text.lower()
-        for keyword, reply in self.keyword_replies:
-            if keyword in text_lower:
-                return reply
-        return ""
+        return self.keyword_table.matcher.match(text)
 
     def _contains_trigger_keywords(self, text: str) -> bool:
         """检查是否包含触发关键字"""
@@ -430,12 +585,15 @@ class FeishuBot:
         return any(keyword in text for keyword in keywords) if keywords else False
 
     async def _handle_new_question(self, chat_id: str, user_id: str, question: str, message_id: str = ""):
-        """处理新问题：三段式反馈流程"""
+        """处理新问题：三段式反馈流程（表情回复等副作用在后台执行，仅等待回答主路径）"""
+        import time
+        started_at = time.monotonic()
+        timings: Dict = {}
         try:
-            # 阶段1：收到 (GET)
+            # 阶段1：收到 (GET)，表情回复与知识库检索并行
             if message_id:
                 logger.info(f"收到新问题 {message_id}，回复 OK...")
-                await self._send_reaction(message_id, "OK")
+                self._spawn_side_effect(self._send_reaction(message_id, "OK"), "reaction:OK")
 
             import re
             # 清理飞书 mention 标签，只删除 @_xxx 格式的 mention，保留消息内容
@@ -454,34 +612,43 @@ class FeishuBot:
                     clean_question = question.strip()
                     logger.warning(f"问题清理失败，使用原始内容: {clean_question[:50]}")
 
-            # 优先从知识库回答
-            can_answer, answer, docs = await self._try_answer_from_kb(chat_id, clean_question)
+            # 检索知识库（只检索一次，回答与分类共用结果）
+            stage_start = time.monotonic()
+            try:
+                docs = await self.kb.search(clean_question)
+            except Exception as e:
+                logger.error(f"知识库检索失败: {e}")
+                docs = []
+            timings["retrieval"] = time.monotonic() - stage_start
+
+            # 优先从知识库回答（流式模式下边生成边更新卡片）
+            stage_start = time.monotonic()
+            if self.config.llm.stream_answer:
+                can_answer = await self._stream_answer_to_card(chat_id, clean_question, docs, timings)
+            else:
+                can_answer, answer, docs = await self._try_answer_from_kb(chat_id, clean_question, docs)
+                timings["llm"] = time.monotonic() - stage_start
+                if can_answer:
+                    from src.utils.message_card_builder import build_faq_answer_card
+                    card_start = time.monotonic()
+                    card_json = build_faq_answer_card(clean_question, answer, related_docs=self._build_related_docs(docs))
+                    await self._send_card(chat_id, card_json)
+                    timings["card"] = time.monotonic() - card_start
             if can_answer:
-                from src.utils.message_card_builder import build_faq_answer_card
-                # 将 langchain 文档对象转换为展示用的列表
-                related_docs = []
-                if docs:
-                    for d in docs[:3]: # 最多取3条
-                        title = d.metadata.get('title') or d.metadata.get('source', '文档')
-                        # 如果 title 太长则截断
-                        if len(title) > 20: title = title[:20] + "..."
-                        url = d.metadata.get('url', 'https://help.apifox.com')
-                        related_docs.append({"title": title, "url": url})
-                
-                card_json = build_faq_answer_card(clean_question, answer, related_docs=related_docs)
-                await self._send_card(chat_id, card_json)
                 # 阶段3：处理完毕
                 if message_id:
-                    await self._send_reaction(message_id, "DONE")
+                    self._spawn_side_effect(self._send_reaction(message_id, "DONE"), "reaction:DONE")
                 return
 
             # 知识库没找到，进入深度分析阶段，发送“在做了”
             if message_id:
-                await self._send_reaction(message_id, "OK")
+                self._spawn_side_effect(self._send_reaction(message_id, "OK"), "reaction:OK")
 
             # 知识库没找到，先分类问题类型
-            context = await self.kb.search_with_context(clean_question) if self.kb.vectorstore else "知识库未初始化"
+            stage_start = time.monotonic()
+            context = self.kb.format_context(docs) if self.kb.ready else "知识库未初始化"
             classification = await self.classifier.classify(clean_question, context, {})
+            timings["classify"] = time.monotonic() - stage_start
             question_type = classification.get("type", "unknown")
             suggested_answer = classification.get("suggested_answer", "")
 
@@ -518,7 +685,7 @@ class FeishuBot:
                     )
                 # 处理完毕
                 if message_id:
-                    await self._send_reaction(message_id, "DONE")
+                    self._spawn_side_effect(self._send_reaction(message_id, "DONE"), "reaction:DONE")
                 return
 
             # Bug 或 Feature：启动智能信息收集流程
@@ -562,10 +729,17 @@ class FeishuBot:
                 self.conversation_mgr.set_progress_message_id(conversation_key, new_msg_id)
             # 阶段3：处理完毕
             if message_id:
-                await self._send_reaction(message_id, "DONE")
+                self._spawn_side_effect(self._send_reaction(message_id, "DONE"), "reaction:DONE")
 
         except Exception as e:
             logger.error(f"处理新问题失败: {e}")
+        finally:
+            timings["total"] = time.monotonic() - started_at
+            observe_stage("question_total", timings["total"])
+            stage_text = ", ".join(
+                f"{k}={v:.2f}s" if isinstance(v, float) else f"{k}={v}" for k, v in timings.items()
+            )
+            logger.info(f"问题处理阶段耗时: {stage_text}")
 
     async def _handle_conversation_step(self, chat_id: str, user_id: str, text: str):
         """处理信息收集步进"""
@@ -712,6 +886,7 @@ class FeishuBot:
 
     async def _send_card(self, chat_id: str, card_json: str) -> Optional[str]:
         """发送交互式卡片"""
+        import asyncio
         import json
         request = CreateMessageRequest.builder() \
             .receive_id_type("chat_id") \
@@ -721,15 +896,40 @@ class FeishuBot:
                 .content(card_json) \
                 .build()) \
             .build()
-        response = self.lark_client.im.v1.message.create(request)
+        with stage_timer("card_send"):
+            # 同步 SDK 放到线程执行，避免阻塞事件循环
+            response = await asyncio.to_thread(self.lark_client.im.v1.message.create, request)
         if response.success():
             logger.info(f"✅ 成功发送交互式卡片到 {chat_id}")
             return response.data.message_id
         logger.error(f"发送卡片失败: {response.msg}")
         return None
 
+    async def _get_tenant_access_token(self, client) -> str:
+        """获取 tenant_access_token（带缓存，提前 5 分钟刷新）"""
+        import time
+        if getattr(self, '_tenant_token', None) and time.time() < self._tenant_token_expire - 300:
+            return self._tenant_token
+
+        token_url = f"{self.open_api_base}/open-apis/auth/v3/tenant_access_token/internal"
+        token_resp = await client.post(
+            token_url,
+            json={"app_id": self.app_id, "app_secret": self.config.bots["feishu"].app_secret}
+        )
+        token_data = token_resp.json()
+        token = token_data.get("tenant_access_token")
+        if token:
+            self._tenant_token = token
+            self._tenant_token_expire = time.time() + token_data.get("expire", 7200)
+        return token
+
     async def _send_reaction(self, message_id: str, emoji_type: str = "OK"):
         """对消息发送表情回复，表示正在处理"""
+        with stage_timer("reaction"):
+            await self._do_send_reaction(message_id, emoji_type)
+
+    async def _do_send_reaction(self, message_id: str, emoji_type: str):
+        """发送表情回复（实际请求）"""
         try:
             import httpx
             import ssl
@@ -739,18 +939,13 @@ class FeishuBot:
             ssl_ctx.verify_mode = ssl.CERT_NONE
             async with httpx.AsyncClient(verify=False, timeout=10.0) as client:
                 # 获取 token
-                token_url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-                token_resp = await client.post(
-                    token_url,
-                    json={"app_id": self.app_id, "app_secret": self.config.bots["feishu"].app_secret}
-                )
-                token = token_resp.json().get("tenant_access_token")
+                token = await self._get_tenant_access_token(client)
                 if not token:
                     logger.warning(f"获取 token 失败，无法发送 reaction: {emoji_type}")
                     return
 
                 # 发送表情
-                reaction_url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/reactions"
+                reaction_url = f"{self.open_api_base}/open-apis/im/v1/messages/{message_id}/reactions"
                 resp = await client.post(
                     reaction_url,
                     headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
@@ -764,25 +959,34 @@ class FeishuBot:
         except Exception as e:
             logger.warning(f"发送表情回复失败（非致命）: {e}")
 
-    async def _update_message_card(self, message_id: str, card_json: str):
+    async def _update_message_card(self, message_id: str, card_json: str) -> bool:
         """更新交互式卡片 (PATCH)"""
-        import httpx
         try:
-            async with httpx.AsyncClient() as client:
-                # 获取 token
-                token_url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-                token_resp = await client.post(token_url, json={"app_id": self.app_id, "app_secret": self.config.bots["feishu"].app_secret})
-                token = token_resp.json().get("tenant_access_token")
-
-                # PATCH 消息
-                patch_url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}"
-                await client.patch(
-                    patch_url,
-                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                    json={"content": card_json}
-                )
+            with stage_timer("card_patch"):
+                return await self._patch_message_card(message_id, card_json)
         except Exception as e:
             logger.error(f"更新卡片失败: {e}")
+            return False
+
+    async def _patch_message_card(self, message_id: str, card_json: str) -> bool:
+        """PATCH 卡片内容（实际请求）"""
+        import httpx
+        async with httpx.AsyncClient() as client:
+            # 获取 token
+            token = await self._get_tenant_access_token(client)
+
+            # PATCH 消息
+            patch_url = f"{self.open_api_base}/open-apis/im/v1/messages/{message_id}"
+            resp = await client.patch(
+                patch_url,
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                json={"content": card_json}
+            )
+            result = resp.json()
+            if result.get("code") != 0:
+                logger.warning(f"更新卡片响应异常: {result}")
+                return False
+            return True
 
     def _translate_type(self, ticket_type: str) -> str:
         """翻译问题类型为中文"""
@@ -822,21 +1026,11 @@ class FeishuBot:
         发送飞书消息（自动检测链接并转为富文本格式）
         """
         try:
-            import json
-            import re
+            import asyncio
             from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
 
-            # 检测是否包含链接
-            url_pattern = r'https?://[^\s<>\[\]]+'
-            urls = re.findall(url_pattern, content)
-
-            if urls:
-                rich_content = self._convert_to_rich_text(content)
-                content_raw = json.dumps(rich_content, ensure_ascii=False)
-                msg_type = "post"
-            else:
-                content_raw = json.dumps({"text": content}, ensure_ascii=False)
-                msg_type = "text"
+            # 消息体按内容缓存，关键词回复在加载时已生成
+            msg_type, content_raw = self.reply_formatter.render(content)
 
             request = CreateMessageRequest.builder() \
                 .receive_id_type("chat_id") \
@@ -847,7 +1041,8 @@ class FeishuBot:
                     .build()) \
                 .build()
 
-            response = self.lark_client.im.v1.message.create(request)
+            # 同步 SDK 放到线程执行，避免阻塞事件循环
+            response = await asyncio.to_thread(self.lark_client.im.v1.message.create, request)
 
             if not response.success():
                 logger.error(f"发送飞书消息失败: {response.code} - {response.msg}")
@@ -861,27 +1056,7 @@ class FeishuBot:
         """
         将文本转换为飞书富文本格式
         """
-        import re
-        url_pattern = r'(https?://[^\s<>\[\]]+)'
-        lines = content.split('\n')
-        content_blocks = []
-        for line in lines:
-            line = line.rstrip()
-            if not line:
-                content_blocks.append([{"tag": "text", "text": ""}])
-                continue
-            parts = re.split(url_pattern, line)
-            line_elements = []
-            for part in parts:
-                if not part:
-                    continue
-                if re.match(url_pattern, part):
-                    line_elements.append({"tag": "a", "text": part, "href": part})
-                else:
-                    line_elements.append({"tag": "text", "text": part})
-            if line_elements:
-                content_blocks.append(line_elements)
-        return {"zh_cn": {"content": content_blocks}}
+        return self.reply_formatter.to_rich_text(content)
 
     async def handle_bot_added_to_chat(self, chat_id: str, operator_id: str = ""):
         """处理机器人被添加到群聊"""
@@ -25,7 +25,7 @@ sys.path.insert(0, src_dir)       # 支持 bots. rag. 等直接导入
 
 import uvicorn
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from loguru import logger
 
 # 加载配置
@@ -33,6 +33,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from utils.config_loader import load_config
+from utils.metrics import inc_counter, render_metrics, stage_timer
 from pathlib import Path
 config_path = Path(project_root) / "config" / "config.yaml"
 config = load_config(str(config_path))
@@ -40,8 +41,9 @@ config = load_config(str(config_path))
 logger.info("正在初始化组件...")
 
 # 初始化依赖组件（不带 src. 前缀，因为 sys.path 已指向 src/）
-from rag.knowledge_base import KnowledgeBase
-kb = KnowledgeBase(config)
+from rag.retrieval_client import create_knowledge_base
+# 配置了 rag.service.url 时使用本机检索服务，否则进程内加载模型与向量库
+kb = create_knowledge_base(config)
 
 from classifiers.question_classifier import QuestionClassifier
 classifier = QuestionClassifier(config)
@@ -127,7 +129,9 @@ async def handle_card_callback(request: Request):
         }
 
         # 处理卡片动作
-        result = await feishu_bot_logic.handle_card_action(processed_event)
+        inc_counter("card_callback")
+        with stage_timer("card_action"):
+            result = await feishu_bot_logic.handle_card_action(processed_event)
 
         logger.info(f"[卡片回调] 处理结果: {result}")
 
@@ -148,6 +152,12 @@ async def health_check():
     return {"status": "ok", "service": "feishu-card-server"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -155,7 +165,8 @@ async def root():
         "service": "Feishu Card Callback Server",
         "endpoints": {
             "callback": "/feishu/card/callback",
-            "health": "/health"
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
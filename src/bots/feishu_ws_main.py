@@ -3,6 +3,19 @@ import time
 import threading
 import io
 import ssl
+from pathlib import Path
+
+# 添加项目根目录和 src 目录到路径
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+sys.path.insert(0, str(root_dir / "src"))
+
+# 启动耗时分析：--profile-startup 时统计之后全部模块的导入耗时（需在导入重量级模块前开启）
+from utils.startup_profiler import elapsed, enable_import_timing, format_startup_report, mark, startup_phase
+
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+if PROFILE_STARTUP:
+    enable_import_timing()
 
 # 跳过 SSL 证书验证（解决代理/安全软件导致的证书链问题）
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -42,7 +55,8 @@ def _patch_websockets_ssl():
     if hasattr(websockets, 'client'):
         websockets.client.connect = patched_connect
 
-_patch_websockets_ssl()
+with startup_phase("SSL 补丁 (websockets)"):
+    _patch_websockets_ssl()
 
 # Patch requests 默认 session 跳过 SSL 验证
 def _patch_requests_ssl():
@@ -61,7 +75,8 @@ def _patch_requests_ssl():
     requests.post = patched_post
     requests.get = patched_get
 
-_patch_requests_ssl()
+with startup_phase("SSL 补丁 (requests)"):
+    _patch_requests_ssl()
 
 def log_startup(msg):
     print(f"[{time.strftime('%H:%M:%S')}] {msg}")
@@ -71,53 +86,56 @@ log_startup("========================================")
 log_startup("🚀 飞书长连接机器人启动序列开始...")
 log_startup("========================================")
 
-log_startup("正在加载基础模块 (os, pathlib, loguru)...")
+log_startup("正在加载基础模块 (os, loguru)...")
 import os
-from pathlib import Path
 from loguru import logger
 
 # 确保日志目录存在
-log_dir = Path(__file__).parent.parent.parent / "logs"
+log_dir = root_dir / "logs"
 log_dir.mkdir(exist_ok=True)
 logger.add(log_dir / "bot.log", rotation="10 MB", retention="30 days", level="DEBUG")
 
-log_startup("正在加载飞书 SDK (lark-oapi)... 这可能需要 10-20 秒...")
-import lark_oapi as lark
-from lark_oapi.api.im.v1 import *
+# 飞书 SDK 的包初始化会导入全部 API 模块，无法按需加载；长连接客户端依赖它，只能在连接前导入
+log_startup("正在加载飞书 SDK (lark-oapi)...")
+with startup_phase("导入飞书 SDK"):
+    import lark_oapi as lark
+    from lark_oapi.api.im.v1 import P2ImMessageReceiveV1
 log_startup("飞书 SDK 加载完成 ✅")
 
-# 添加项目根目录和 src 目录到路径
-root_dir = Path(__file__).parent.parent.parent
-sys.path.insert(0, str(root_dir))
-sys.path.insert(0, str(root_dir / "src"))
-
 # 加载 .env 文件（在 import 项目模块前）
 from dotenv import load_dotenv
 load_dotenv(root_dir / ".env")
 log_startup(".env 环境变量加载完成 ✅")
 
-from bots.feishu_bot import FeishuBot
-from rag.knowledge_base import KnowledgeBase
-from classifiers.question_classifier import QuestionClassifier
-from utils.config_loader import load_config
-from utils.template_manager import TemplateManager
+# 项目模块只做轻量初始化：anthropic 客户端首次调用时创建，
+# 嵌入模型与向量库、关键词表在 WebSocket 连接建立后于后台加载
+with startup_phase("导入项目模块"):
+    from bots.feishu_bot import FeishuBot
+    from rag.retrieval_client import create_knowledge_base
+    from classifiers.question_classifier import QuestionClassifier
+    from utils.config_loader import get_registry
+    from utils.template_manager import TemplateManager
+    from utils.metrics import inc_counter, observe_stage, stage_timer, start_metrics_server
 
 # 加载配置（使用项目根目录的配置文件）
-config = load_config(str(root_dir / "config" / "config.yaml"))
+with startup_phase("加载配置"):
+    config_registry = get_registry(str(root_dir / "config" / "config.yaml"))
+    config = config_registry.get()
 
 # 初始化组件
-log_startup("正在初始化知识库实例...")
-kb = KnowledgeBase(config)
-
-log_startup("正在初始化问题分类器...")
-classifier = QuestionClassifier(config)
-
-log_startup("正在初始化模板管理器...")
-template_mgr = TemplateManager(config)
-
-# 初始化机器人逻辑处理器
-log_startup("正在初始化 FeishuBot 核心逻辑 (会在此处请求飞书 API 获取关键词)...")
-feishu_bot_logic = FeishuBot(config, kb, classifier, template_mgr)
+with startup_phase("创建组件"):
+    # 配置了 rag.service.url 时使用本机检索服务，否则进程内加载模型与向量库
+    kb = create_knowledge_base(config)
+    classifier = QuestionClassifier(config)
+    template_mgr = TemplateManager(config)
+    # 关键词表先用本地快照恢复，连接建立后在后台同步；没有快照时同步完成前的消息直接走知识库问答
+    feishu_bot_logic = FeishuBot(config, kb, classifier, template_mgr, load_keywords=False)
+
+# 触发关键词、检索参数与 LLM 设置热加载，无需重启
+config_registry.subscribe(feishu_bot_logic.apply_config, sections=("bots", "llm"))
+config_registry.subscribe(classifier.apply_config, sections=("llm", "classifier"))
+config_registry.subscribe(kb.apply_config, sections=("rag",))
+config_registry.subscribe(lambda c: feishu_bot_logic.fair_scheduler.apply_config(c.fairness), sections=("fairness",))
 log_startup("FeishuBot 核心逻辑初始化完成 ✅")
 
 # ============================================================
@@ -165,9 +183,18 @@ def handle_message(data: P2ImMessageReceiveV1):
         log_startup(f"【消息】收到消息 message_id={message_id}, chat_id={chat_id}")
         log_startup(f"【消息】内容: {content_raw[:100] if content_raw else 'empty'}")
         logger.info(f"【事件】im.message.receive_v1, message_id: {message_id}")
+        inc_counter("im.message.receive_v1")
+
+        # 事件投递延迟：消息创建时间（毫秒时间戳）到收到事件的耗时
+        create_time = getattr(data.event.message, "create_time", None)
+        if create_time and str(create_time).isdigit():
+            observe_stage("event_receive", max(0.0, time.time() - int(create_time) / 1000))
 
         # 去重检查
-        if is_duplicate_message(message_id):
+        with stage_timer("dedup"):
+            duplicate = is_duplicate_message(message_id)
+        if duplicate:
+            inc_counter("duplicate_message")
             logger.warning(f"【去重】跳过重复消息 message_id: {message_id}")
             return
 
@@ -243,7 +270,8 @@ def handle_bot_added(data):
 
         logger.info(f"【事件】机器人被添加到群 chat_id: {chat_id}, 操作人: {operator}")
 
-        # 发送欢迎消息
+        # 发送欢迎消息（使用最新的配置快照）
+        config = config_registry.get()
         welcome = getattr(config.bots.get("feishu", {}), "welcome_message", None)
         if not welcome:
             # 尝试从 dict 形式获取
@@ -356,20 +384,40 @@ def handle_card_action(data):
 # 主入口
 # ============================================================
 
-def main():
-    """同步启动入口 - ws.Client.start() 使用自己的事件循环"""
+def _wait_connected(client, timeout: float = 30.0) -> bool:
+    """等待长连接建立（SDK 未提供连接回调，轮询连接对象）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if getattr(client, "_conn", None) is not None:
+            return True
+        time.sleep(0.05)
+    return False
 
-    log_startup("========================================")
-    log_startup("🚀 飞书长连接机器人启动中 (SDK + WebSocket)...")
-    log_startup("========================================")
 
-    # 打印关键词加载状态
+def load_after_connect(client, profile: bool = False):
+    """
+    连接建立后的后台加载：关键词表同步、知识库（嵌入模型与向量库）
+
+    放在连接之后进行，避免拉取关键词表与加载模型拖慢连接建立
+    """
+    import asyncio
+
+    if _wait_connected(client):
+        mark("WebSocket 已连接")
+        log_startup(f"WebSocket 已连接，启动耗时 {elapsed():.2f}s，开始后台加载")
+    else:
+        logger.warning("等待 WebSocket 连接超时，继续后台加载")
+    if profile:
+        print(format_startup_report())
+        sys.stdout.flush()
+
+    # 关键词表在独立线程中立即同步一次，之后定时同步
     log_startup(f"关键词表配置: base_token={feishu_bot_logic.keyword_base_token}, table_id={feishu_bot_logic.keyword_table_id}")
-    log_startup(f"已加载关键词数量: {len(feishu_bot_logic.keyword_replies)}")
+    log_startup(f"快照中的关键词数量: {len(feishu_bot_logic.keyword_replies)}")
+    feishu_bot_logic.start_keyword_refresh()
+    config_registry.start_watching()
 
-    # 后台线程初始化知识库
-    def init_kb_background():
-        import asyncio
+    with startup_phase("初始化知识库"):
         try:
             logger.info("后台开始初始化知识库...")
             asyncio.run(kb.initialize())
@@ -377,9 +425,31 @@ def main():
         except Exception as e:
             logger.error(f"后台知识库初始化失败: {e}")
 
-    kb_thread = threading.Thread(target=init_kb_background, daemon=True)
-    kb_thread.start()
-    log_startup("知识库后台初始化线程已启动")
+    if profile:
+        print(format_startup_report())
+        sys.stdout.flush()
+
+
+def main():
+    """同步启动入口 - ws.Client.start() 使用自己的事件循环"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="飞书长连接机器人")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="输出启动各阶段与模块导入耗时（连接建立时与后台加载完成时各输出一次）")
+    args = parser.parse_args()
+
+    log_startup("========================================")
+    log_startup("🚀 飞书长连接机器人启动中 (SDK + WebSocket)...")
+    log_startup("========================================")
+
+    # 长连接进程没有 HTTP 服务，单独启动 /metrics 端点
+    metrics_port = config.server.metrics_port
+    try:
+        if start_metrics_server(metrics_port):
+            log_startup(f"指标服务已启动: http://0.0.0.0:{metrics_port}/metrics")
+    except OSError as e:
+        logger.warning(f"指标服务启动失败（端口 {metrics_port}）: {e}")
 
     # 获取凭证
     app_id = os.environ.get("FEISHU_APP_ID") or config.bots["feishu"].app_id
@@ -414,6 +484,11 @@ def main():
     log_startup("WebSocket 客户端创建完成 ✅")
 
     log_startup("已注册事件: im.message.receive_v1, im.chat.member_bot.added_v1, im.chat.member_bot.deleted_v1, card.action.trigger")
+
+    threading.Thread(
+        target=load_after_connect, args=(client, args.profile_startup), daemon=True, name="load-after-connect"
+    ).start()
+
     log_startup("🚀 启动 WebSocket 连接，等待消息...")
     client.start()
 
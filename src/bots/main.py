@@ -3,10 +3,9 @@
 支持企微和飞书机器人
 """
 
-import asyncio
 import uvicorn
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from loguru import logger
 
 import sys
@@ -20,26 +19,66 @@ sys.path.insert(0, str(root_dir / "src"))
 from bots.wecom_bot import WeComBot
 from bots.apifox_wecom_bot import ApifoxWeComBot
 from bots.feishu_bot import FeishuBot
-from rag.knowledge_base import KnowledgeBase
+from rag.retrieval_client import create_knowledge_base
 from classifiers.question_classifier import QuestionClassifier
-from utils.config_loader import load_config
+from utils.config_loader import get_registry
 from utils.template_manager import TemplateManager
+from utils.metrics import inc_counter, render_metrics
+from utils.task_supervisor import TaskSupervisor
+from utils.fair_scheduler import FairScheduler
+from utils.wecom_sender import get_sender
 
 # 初始化应用
 app = FastAPI(title="技术支持知识库机器人")
 
-# 加载配置
-config = load_config()
+# 加载配置（进程内缓存，配置文件修改后热加载）
+# config 只用于启动时构造组件；运行期读取配置一律调用 config_registry.get() 取当前快照
+config_registry = get_registry()
+config = config_registry.get()
 
 # 初始化组件
-kb = KnowledgeBase(config)
+# 配置了 rag.service.url 时使用本机检索服务，否则进程内加载模型与向量库
+kb = create_knowledge_base(config)
 classifier = QuestionClassifier(config)
 template_mgr = TemplateManager(config)
 
-# 初始化机器人
-wecom_bot = WeComBot(config, kb, classifier, template_mgr)
-apifox_wecom_bot = ApifoxWeComBot(config, kb, classifier, template_mgr)
-feishu_bot = FeishuBot(config, kb, classifier, template_mgr)
+# 初始化机器人（三个平台共用同一组 LLM 名额，按群轮转、按群 / 用户限速）
+fair_scheduler = FairScheduler.from_config(config.fairness)
+# 两个企微机器人共用发送器（连接池、按目标限速、合并短消息）
+wecom_sender = get_sender(config)
+wecom_bot = WeComBot(config, kb, classifier, template_mgr, fair_scheduler=fair_scheduler, sender=wecom_sender)
+apifox_wecom_bot = ApifoxWeComBot(config, kb, classifier, template_mgr, fair_scheduler=fair_scheduler,
+                                  sender=wecom_sender)
+feishu_bot = FeishuBot(config, kb, classifier, template_mgr, fair_scheduler=fair_scheduler)
+
+# 触发关键词、检索参数与 LLM 设置热加载，无需重启
+config_registry.subscribe(feishu_bot.apply_config, sections=("bots", "llm"))
+config_registry.subscribe(wecom_bot.apply_config, sections=("bots", "fairness"))
+config_registry.subscribe(apifox_wecom_bot.apply_config, sections=("bots", "fairness"))
+config_registry.subscribe(classifier.apply_config, sections=("llm", "classifier"))
+config_registry.subscribe(kb.apply_config, sections=("rag",))
+config_registry.subscribe(lambda c: fair_scheduler.apply_config(c.fairness), sections=("fairness",))
+
+# 后台定时任务（jobs.host_in_bot 开启时与机器人共用事件循环）
+job_scheduler = None
+
+# Webhook 消息处理：按平台限制并发，排队已满时回复繁忙提示
+task_supervisor = TaskSupervisor(
+    limits=config.task_supervisor.limits,
+    backlogs=config.task_supervisor.backlogs,
+)
+# 繁忙提示单独一个通道，不占用消息处理名额；提示通道也满时直接丢弃
+BUSY_NOTICE_LANE = "busy_notice"
+
+
+def dispatch(platform: str, bot, payload) -> bool:
+    """提交消息处理任务，被拒绝时给用户发送繁忙提示"""
+    if task_supervisor.submit(platform, bot.handle_message, payload):
+        return True
+    inc_counter(f"{platform}_rejected")
+    busy_message = config_registry.get().task_supervisor.busy_message
+    task_supervisor.submit(BUSY_NOTICE_LANE, bot.send_busy_notice, payload, busy_message)
+    return False
 
 
 @app.get("/")
@@ -48,6 +87,18 @@ async def root():
     return {"status": "ok", "message": "技术支持机器人运行中"}
 
 
+@app.get("/tasks")
+async def tasks():
+    """各平台运行中 / 排队中 / 已拒绝的消息处理任务数"""
+    return task_supervisor.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/webhook/wecom")
 async def wecom_webhook(request: Request):
     """企微机器人 Webhook"""
@@ -59,7 +110,9 @@ async def wecom_webhook(request: Request):
             return JSONResponse(content={"errmsg": "ok"})
 
         # 异步处理消息
-        asyncio.create_task(wecom_bot.handle_message(data))
+        inc_counter("wecom_webhook")
+        if not dispatch("wecom", wecom_bot, data):
+            return JSONResponse(content={"errmsg": "busy"})
 
         return JSONResponse(content={"errmsg": "ok"})
 
@@ -79,7 +132,9 @@ async def apifox_wecom_webhook(request: Request):
             return JSONResponse(content={"errmsg": "ignored event type"})
 
         # 异步处理消息
-        asyncio.create_task(apifox_wecom_bot.handle_message(data))
+        inc_counter("apifox_wecom_webhook")
+        if not dispatch("apifox_wecom", apifox_wecom_bot, data):
+            return JSONResponse(content={"errmsg": "busy"})
 
         return JSONResponse(content={"errmsg": "ok"})
 
@@ -108,7 +163,9 @@ async def feishu_webhook(request: Request):
         if data.get("type") == "event":
             event = data.get("event", {})
             if event.get("type") == "message":
-                asyncio.create_task(feishu_bot.handle_message(event))
+                inc_counter("feishu_webhook")
+                if not dispatch("feishu", feishu_bot, event):
+                    return JSONResponse(content={"code": 0, "msg": "busy"})
 
         return JSONResponse(content={"code": 0, "msg": "ok"})
 
@@ -120,6 +177,7 @@ async def feishu_webhook(request: Request):
 @app.on_event("startup")
 async def startup_event():
     """启动事件"""
+    global job_scheduler
     logger.info("技术支持知识库机器人启动中...")
 
     # 初始化知识库（失败不阻塞启动）
@@ -128,13 +186,32 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"知识库初始化失败，将使用空知识库: {e}")
 
-    logger.info("机器人启动完成，监听端口: {}", config.server.port)
+    # 关键词表后台定时同步
+    feishu_bot.start_keyword_refresh()
+    config_registry.start_watching()
+
+    current = config_registry.get()
+    if current.jobs.host_in_bot:
+        from jobs_main import build_scheduler
+        # 关键词生成与机器人共用 LLM 名额（后台通道），提问优先
+        job_scheduler = build_scheduler(current, fair_scheduler=fair_scheduler)
+        job_scheduler.start()
+
+    logger.info("机器人启动完成，监听端口: {}", current.server.port)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """关闭事件"""
     logger.info("机器人正在关闭...")
+    # 先等待处理中的消息回答完成，再关闭依赖的组件
+    await task_supervisor.shutdown(config_registry.get().task_supervisor.shutdown_timeout)
+    # 回答发出后再关闭发送器（排队中的消息发送完成）
+    await wecom_sender.aclose()
+    feishu_bot.keyword_table.stop()
+    config_registry.stop_watching()
+    if job_scheduler is not None:
+        await job_scheduler.stop()
     await kb.close()
 
 
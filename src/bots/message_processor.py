@@ -11,10 +11,9 @@ from src.classifiers.question_classifier import QuestionClassifier
 from src.bots.conversation_manager import ConversationManager
 from src.utils.template_manager import TemplateManager
 from src.integrations.feishu_client import FeishuClient
+from src.integrations.lark_cli_wrapper import LarkCliWrapper
+from src.integrations.ticket_sink import get_ticket_sink
 from src.utils.config_loader import load_config
-from pathlib import Path
-import json
-from datetime import datetime
 
 
 class MessageProcessor:
@@ -277,7 +276,7 @@ class MessageProcessor:
                 logger.error(f"[用户 {user_id}] {type_name}工单创建失败: {result}")
 
                 # 降级：保存到本地文件
-                save_ticket_to_local(problem_type, collected_data)
+                save_ticket_to_local(problem_type, collected_data, chat_id)
 
                 return {
                     "success": True,  # 返回成功，因为已经记录
@@ -326,32 +325,37 @@ class MessageProcessor:
                 "reply": f"处理失败：{str(e)}"
             }
 
-def save_ticket_to_local(problem_type: str, data: dict):
-    """保存工单到本地文件（降级方案）"""
-    try:
-        # 创建目录
-        ticket_dir = Path("data/local_tickets")
-        ticket_dir.mkdir(parents=True, exist_ok=True)
-
-        # 生成文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = ticket_dir / f"{problem_type}_{timestamp}.json"
-
-        # 构建工单数据
-        ticket = {
-            "type": problem_type,
-            "created_at": datetime.now().isoformat(),
-            "data": data
-        }
+def save_ticket_to_local(problem_type: str, data: dict, chat_id: str = "") -> Optional[str]:
+    """
+    保存工单到本地工单库（降级方案），接口恢复后由补写线程写入多维表格
 
-        # 保存到文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(ticket, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"工单已保存到本地: {filename}")
+    Returns:
+        本地工单 ID，保存失败时返回 None
+    """
+    try:
+        config = load_config()
+        lark_cli = LarkCliWrapper(config)
+        if problem_type == "bug":
+            table_id, fields = lark_cli.bug_table_id, lark_cli.build_bug_fields(data)
+        else:
+            table_id, fields = lark_cli.feature_table_id, lark_cli.build_feature_fields(data)
+
+        # 经共用的工单写入器保存，补写线程随之启动
+        ticket_id = get_ticket_sink(config).store.add(
+            problem_type,
+            fields,
+            table_id=table_id,
+            base_token=lark_cli.app_token,
+            chat_id=chat_id,
+            user_id=data.get("submitter", "")
+        )
+
+        logger.info(f"工单已保存到本地工单库: {ticket_id}")
+        return ticket_id
 
     except Exception as e:
         logger.error(f"保存工单到本地失败: {e}")
+        return None
 
     def cancel_conversation(self, user_id: str) -> str:
         """
@@ -6,22 +6,34 @@ import asyncio
 import json
 from typing import Dict
 from loguru import logger
-import httpx
+
+from utils.fair_scheduler import FairScheduler, FairSchedulerTimeout
+from utils.wecom_sender import WeComSender, get_sender
 
 
 class WeComBot:
     """企微机器人"""
 
-    def __init__(self, config, kb, classifier, template_mgr):
+    def __init__(self, config, kb, classifier, template_mgr, fair_scheduler: FairScheduler = None,
+                 sender: WeComSender = None):
         self.config = config
         self.kb = kb
         self.classifier = classifier
         self.template_mgr = template_mgr
+        # LLM 调用公平调度（同一进程内的机器人共用）
+        self.fair_scheduler = fair_scheduler or FairScheduler.from_config(config.fairness)
         self.webhook_url = config.bots["wecom"].webhook_url
+        # 进程内共用的企微发送器（连接复用、按 Webhook 限速、合并短消息）
+        self.sender = sender or get_sender(config)
         # 对话管理器
         from bots.conversation_manager import ConversationManager
         self.conversation_mgr = ConversationManager(config)
 
+    def apply_config(self, config):
+        """应用热加载的配置快照（繁忙提示等在使用时从 self.config 读取，Webhook 地址随之更新）"""
+        self.config = config
+        self.webhook_url = config.bots["wecom"].webhook_url
+
     async def handle_message(self, message_data: Dict):
         """
         处理企微消息
@@ -101,12 +113,16 @@ class WeComBot:
                 # 继续收集
                 await self.send_message(result["message"])
             elif result["status"] == "completed":
-                # 收集完成，开始分析
-                await self._analyze_and_classify(
-                    user_id,
-                    user_name,
-                    result["collected_data"]
-                )
+                # 收集完成，开始分析（企微 webhook 机器人只有一个群，按用户限速）
+                try:
+                    async with self.fair_scheduler.slot("wecom", user_id):
+                        await self._analyze_and_classify(
+                            user_id,
+                            user_name,
+                            result["collected_data"]
+                        )
+                except FairSchedulerTimeout:
+                    await self.send_message(self.config.fairness.busy_message)
 
         except Exception as e:
             logger.error(f"处理对话失败: {e}")
@@ -238,6 +254,10 @@ class WeComBot:
         }
         return type_map.get(ticket_type, "其他")
 
+    async def send_busy_notice(self, message_data: Dict, text: str):
+        """繁忙时的提示（消息因并发已满被拒绝时调用）"""
+        await self.send_message(text)
+
     async def send_message(self, content: str):
         """
         发送企微消息
@@ -245,24 +265,7 @@ class WeComBot:
         Args:
             content: 消息内容
         """
-        try:
-            # 发送文本消息
-            data = {
-                "msgtype": "text",
-                "text": {
-                    "content": content
-                }
-            }
-
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.webhook_url,
-                    json=data,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-
+        if await self.sender.send_webhook(self.webhook_url, content):
             logger.info(f"发送企微消息成功: {content[:50]}...")
-
-        except Exception as e:
-            logger.error(f"发送企微消息失败: {e}")
+        else:
+            logger.error(f"发送企微消息失败: {content[:50]}...")
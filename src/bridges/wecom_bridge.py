@@ -5,7 +5,9 @@
 
 import asyncio
 import json
-from typing import Dict, Optional
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from loguru import logger
 from pathlib import Path
@@ -16,12 +18,18 @@ load_dotenv(Path(__file__).parent.parent.parent / '.env')
 
 try:
     from src.integrations.lark_cli_wrapper import LarkCliWrapper
+    from src.integrations.ticket_dedup import get_ticket_dedup
+    from src.integrations.ticket_sink import get_ticket_sink
     from src.utils.config_loader import load_config
+    from src.utils.wecom_sender import get_sender
 except ImportError:
     import sys
     sys.path.insert(0, str(Path(__file__).parent.parent.parent))
     from src.integrations.lark_cli_wrapper import LarkCliWrapper
+    from src.integrations.ticket_dedup import get_ticket_dedup
+    from src.integrations.ticket_sink import get_ticket_sink
     from src.utils.config_loader import load_config
+    from src.utils.wecom_sender import get_sender
 
 
 class WeComBridge:
@@ -41,12 +49,18 @@ class WeComBridge:
         self.lark_cli = LarkCliWrapper(self.config)
 
         # 企微配置
-        wecom_config = getattr(self.config.bots, 'wecom', {})
+        wecom_config = self.config.bots.get('wecom')
         self.webhook_url = getattr(wecom_config, 'webhook_url', '')
         self.enabled = getattr(wecom_config, 'enabled', False)
+        # 与企微机器人共用发送器（同一 Webhook 共用限速窗口）
+        self.sender = get_sender(self.config)
+        # 工单经共用的写入器批量写入多维表格，写入前与近期工单比较，重复反馈合并到已有工单
+        self.sink = get_ticket_sink(self.config)
+        self.dedup = get_ticket_dedup(self.config)
 
-        # 记录已处理的消息
+        # 记录已处理的消息（持久化队列的多个 worker 线程并发读写，统一经 _processed_lock 访问）
         self.processed_messages: set = set()
+        self._processed_lock = threading.Lock()
         self.processed_file = Path("data/.wecom_processed.json")
 
         self._load_processed()
@@ -68,9 +82,12 @@ class WeComBridge:
         """保存已处理记录"""
         try:
             self.processed_file.parent.mkdir(parents=True, exist_ok=True)
-            data = {msg_id: datetime.now().isoformat() for msg_id in self.processed_messages}
-            with open(self.processed_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f)
+            # 持锁写入：避免遍历时集合被修改，也避免两个线程交错写同一个文件
+            with self._processed_lock:
+                now = datetime.now().isoformat()
+                data = {msg_id: now for msg_id in self.processed_messages}
+                with open(self.processed_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
         except Exception as e:
             logger.warning(f"保存企微已处理记录失败: {e}")
 
@@ -164,22 +181,79 @@ class WeComBridge:
                 "reason": "未匹配关键词"
             }
 
-    def process_message(self, raw_message: Dict) -> Optional[Dict]:
+    def process_message(self, raw_message: Dict, save: bool = True, strict: bool = False) -> Optional[Dict]:
         """
         处理企微消息（统一入口）
 
         Args:
             raw_message: 原始企微消息
+            save: 是否立即保存已处理记录（批量处理时由调用方统一保存）
+            strict: 工单创建失败时撤销已处理标记并抛出异常，由队列重试
 
         Returns:
             处理结果
         """
+        found = self._analyze_new(raw_message, save)
+        if found is None:
+            return None
+        message, analysis = found
+
+        # 创建工单
+        result = self._create_ticket(message, analysis)
+        return self._ticket_result(message["message_id"], result, strict)
+
+    def process_batch(self, raw_messages: List[Dict]) -> List[Optional[str]]:
+        """
+        批量处理企微消息（持久化队列的消费入口）
+
+        整批工单先全部提交给工单写入器，再统一等待结果，同一批的工单合并为一次批量写入；
+        已处理记录在整批处理完后只保存一次；单条失败不影响同批其他消息
+
+        Args:
+            raw_messages: 原始企微消息列表
+
+        Returns:
+            与输入等长的错误列表，None 表示处理成功（含已处理、未匹配关键词）
+        """
+        errors: List[Optional[str]] = [None] * len(raw_messages)
+        submitted = []
+        for index, raw_message in enumerate(raw_messages):
+            try:
+                found = self._analyze_new(raw_message, save=False)
+                if found is not None:
+                    message, analysis = found
+                    submitted.append((index, message["message_id"], self._submit_ticket(message, analysis)))
+            except Exception as e:
+                errors[index] = str(e)
+
+        for index, msg_id, future in submitted:
+            try:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                self._ticket_result(msg_id, result, strict=True)
+            except Exception as e:
+                errors[index] = str(e)
+
+        self._save_processed()
+        return errors
+
+    def _analyze_new(self, raw_message: Dict, save: bool) -> Optional[Tuple[Dict, Dict]]:
+        """
+        标准化并分析消息，未处理过且匹配关键词时标记为已处理
+
+        Returns:
+            (标准化消息, 分析结果)，无需创建工单时返回 None
+        """
         # 标准化消息
         message = self.normalize_message(raw_message)
         msg_id = message["message_id"]
 
         # 检查是否已处理
-        if msg_id in self.processed_messages:
+        with self._processed_lock:
+            seen = msg_id in self.processed_messages
+        if seen:
             logger.debug(f"企微消息已处理: {msg_id}")
             return None
 
@@ -191,34 +265,47 @@ class WeComBridge:
             logger.debug(f"企微消息未匹配关键词: {msg_id}")
             return None
 
-        # 记录已处理
-        self.processed_messages.add(msg_id)
-        self._save_processed()
-
-        # 创建工单
-        result = self._create_ticket(message, analysis)
-
+        # 记录已处理（检查与标记在同一次加锁内完成，同一条消息被两个 worker 同时处理时只创建一次工单）
+        with self._processed_lock:
+            if msg_id in self.processed_messages:
+                logger.debug(f"企微消息已处理: {msg_id}")
+                return None
+            self.processed_messages.add(msg_id)
+        if save:
+            self._save_processed()
+        return message, analysis
+
+    def _ticket_result(self, msg_id: str, result: Dict, strict: bool) -> Optional[Dict]:
+        """记录工单创建结果，strict 模式下失败时撤销已处理标记并抛出异常"""
         if result.get("success"):
-            logger.info(f"企微工单创建成功: {result['record_id']}")
+            if result.get("pending_sync"):
+                logger.warning(f"企微工单已保存到本地工单库，等待补写: {result.get('ticket_id')}")
+            elif result.get("duplicate_of"):
+                logger.info(f"企微反馈与已有工单重复，已合并: {result['duplicate_of']} (相似度 {result['score']:.2f})")
+            else:
+                logger.info(f"企微工单创建成功: {result['record_id']}")
             return result
-        else:
-            logger.error(f"企微工单创建失败: {result}")
-            return None
 
-    def _create_ticket(self, message: Dict, analysis: Dict) -> Dict:
+        logger.error(f"企微工单创建失败: {result}")
+        if strict:
+            with self._processed_lock:
+                self.processed_messages.discard(msg_id)
+            raise RuntimeError(f"工单创建失败: {result.get('error', result)}")
+        return None
+
+    def _build_ticket(self, message: Dict, analysis: Dict) -> Dict:
         """
-        创建飞书工单
+        构建工单字段
 
         Args:
             message: 标准化消息
             analysis: 分析结果
 
         Returns:
-            创建结果
+            多维表格字段
         """
         content = message.get("content", "")
         sender_name = message.get("sender", {}).get("name", "未知用户")
-        create_time = message.get("create_time", "")
         platform = message.get("platform", self.PLATFORM_NAME)
 
         # 构建工单数据（来源平台写入补充信息）
@@ -243,13 +330,37 @@ class WeComBridge:
             context_markdown = self._format_wecom_context(message["raw"]["context"])
             ticket_data["场景还原"] = context_markdown
 
-        # 创建记录
-        result = self.lark_cli.create_record(
-            table_id=self.lark_cli.bug_table_id,
-            fields=ticket_data
-        )
+        return ticket_data
+
+    def _dedup_args(self, message: Dict, analysis: Dict) -> Dict:
+        """重复工单检测的参数：比较原始消息内容，重复时追加一行来源与内容"""
+        content = message.get("content", "")
+        sender_name = message.get("sender", {}).get("name", "未知用户")
+        platform = message.get("platform", self.PLATFORM_NAME)
+        return {
+            "table_id": self.lark_cli.bug_table_id,
+            "fields": self._build_ticket(message, analysis),
+            "text": content,
+            "report": f"[{datetime.now().strftime('%m-%d %H:%M')}] {platform} {sender_name}: {content[:200]}",
+            "chat_id": message.get("chat_id", ""),
+        }
+
+    def _submit_ticket(self, message: Dict, analysis: Dict) -> Future:
+        """提交工单到写入器（不阻塞，重复反馈合并到已有工单）"""
+        return self.dedup.submit(**self._dedup_args(message, analysis))
+
+    def _create_ticket(self, message: Dict, analysis: Dict) -> Dict:
+        """
+        创建飞书工单（经工单写入器批量写入，阻塞到写入完成；重复反馈合并到已有工单）
+
+        Args:
+            message: 标准化消息
+            analysis: 分析结果
 
-        return result
+        Returns:
+            创建结果，合并时另含 duplicate_of 与 score
+        """
+        return self.dedup.create_record(**self._dedup_args(message, analysis))
 
     def _format_wecom_context(self, context: list) -> str:
         """
@@ -286,28 +397,11 @@ class WeComBridge:
         Returns:
             是否成功
         """
-        if not self.webhook_url:
-            logger.warning("企微 Webhook URL 未配置")
-            return False
-
-        try:
-            import httpx
-
-            data = {
-                "msgtype": "text",
-                "text": {"content": content}
-            }
-
-            with httpx.Client() as client:
-                response = client.post(self.webhook_url, json=data, timeout=10.0)
-                response.raise_for_status()
-
+        if self.sender.send_webhook_sync(self.webhook_url, content):
             logger.info(f"企微消息发送成功")
             return True
-
-        except Exception as e:
-            logger.error(f"企微消息发送失败: {e}")
-            return False
+        logger.error(f"企微消息发送失败: {content[:50]}...")
+        return False
 
 
 def main():
@@ -5,7 +5,6 @@
 
 from typing import Dict, List, Optional
 from loguru import logger
-from anthropic import Anthropic
 
 from src.utils.config_loader import Config
 
@@ -15,11 +14,30 @@ class QuestionClassifier:
 
     def __init__(self, config: Config):
         self.config = config
-        # 支持自定义 API 端点
-        client_kwargs = {"api_key": config.llm.api_key}
-        if config.llm.base_url:
-            client_kwargs["base_url"] = config.llm.base_url
-        self.client = Anthropic(**client_kwargs)
+        # LLM 客户端首次分类时再创建，避免启动时导入 anthropic
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from anthropic import Anthropic
+            # 支持自定义 API 端点
+            client_kwargs = {"api_key": self.config.llm.api_key}
+            if self.config.llm.base_url:
+                client_kwargs["base_url"] = self.config.llm.base_url
+            self._client = Anthropic(**client_kwargs)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def apply_config(self, config: Config):
+        """应用热加载的配置快照（API 地址或密钥变化时重建客户端）"""
+        old = self.config
+        self.config = config
+        if (old.llm.api_key, old.llm.base_url) != (config.llm.api_key, config.llm.base_url):
+            self._client = None
 
     async def classify(
         self,
@@ -3,5 +3,11 @@
 """
 
 from .lark_cli_wrapper import LarkCliWrapper
+from .ticket_store import TicketStore, TicketSyncWorker, get_ticket_store
+from .ticket_sink import TicketSink, get_ticket_sink
+from .ticket_dedup import TicketDeduplicator, get_ticket_dedup
 
-__all__ = ['LarkCliWrapper']
\ No newline at end of file
+__all__ = [
+    'LarkCliWrapper', 'TicketStore', 'TicketSyncWorker', 'get_ticket_store', 'TicketSink', 'get_ticket_sink',
+    'TicketDeduplicator', 'get_ticket_dedup'
+]
\ No newline at end of file
@@ -11,6 +11,52 @@ from loguru import logger
 from pathlib import Path
 import platform
 import os
+import time
+import uuid
+
+try:
+    from src.utils.metrics import SUBPROCESS_SECONDS
+except ImportError:
+    from utils.metrics import SUBPROCESS_SECONDS
+
+
+def _command_label(args) -> str:
+    """
+    提取 lark-cli 子命令作为指标标签，例如 "im +messages-send"
+
+    兼容列表形式、shell 字符串以及 [bash, "-c", cmd_str] 形式
+    """
+    if isinstance(args, (list, tuple)):
+        parts = [str(a) for a in args]
+        if len(parts) >= 3 and parts[1] == "-c":
+            return _command_label(parts[2])
+    else:
+        try:
+            parts = shlex.split(str(args))
+        except ValueError:
+            parts = str(args).split()
+
+    for i, part in enumerate(parts):
+        name = part.replace("\\", "/").rsplit("/", 1)[-1].lower()
+        if name in ("lark-cli", "lark-cli.cmd"):
+            return " ".join(parts[i + 1:i + 3]) or "lark-cli"
+    return parts[0] if parts else "unknown"
+
+
+def _timed_run(args, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run 的计时包装，按子命令与结果状态记录耗时"""
+    label = _command_label(args)
+    start = time.perf_counter()
+    status = "error"
+    try:
+        result = subprocess.run(args, **kwargs)
+        status = "ok" if result.returncode == 0 else "error"
+        return result
+    except subprocess.TimeoutExpired:
+        status = "timeout"
+        raise
+    finally:
+        SUBPROCESS_SECONDS.observe(time.perf_counter() - start, command=label, status=status)
 
 
 class LarkCliWrapper:
@@ -67,7 +113,7 @@ class LarkCliWrapper:
                     else:
                         full_cmd.append(part)
 
-                result = subprocess.run(
+                result = _timed_run(
                     full_cmd,
                     capture_output=True,
                     text=True,
@@ -76,7 +122,7 @@ class LarkCliWrapper:
                     errors='replace'
                 )
             else:
-                result = subprocess.run(
+                result = _timed_run(
                     cmd,
                     capture_output=True,
                     text=True,
@@ -155,7 +201,7 @@ class LarkCliWrapper:
                     # 尝试通过 PATH 找 bash
                     bash_exe = "bash"
 
-                result = subprocess.run(
+                result = _timed_run(
                     [bash_exe, "-c", cmd_str],
                     capture_output=True,
                     text=True,
@@ -166,7 +212,7 @@ class LarkCliWrapper:
                     env=env
                 )
             else:
-                result = subprocess.run(
+                result = _timed_run(
                     cmd_str,
                     shell=True,
                     capture_output=True,
@@ -231,7 +277,7 @@ class LarkCliWrapper:
                     else:
                         full_cmd.append(part)
 
-                result = subprocess.run(
+                result = _timed_run(
                     full_cmd,
                     input=file_content,
                     capture_output=True,
@@ -241,7 +287,7 @@ class LarkCliWrapper:
                     errors='ignore'
                 )
             else:
-                result = subprocess.run(
+                result = _timed_run(
                     cmd,
                     input=file_content,
                     capture_output=True,
@@ -302,7 +348,7 @@ class LarkCliWrapper:
                         full_cmd.append(part)
 
                 # 使用 stdin 传递 JSON 内容
-                result = subprocess.run(
+                result = _timed_run(
                     full_cmd,
                     input=json_content,
                     capture_output=True,
@@ -312,7 +358,7 @@ class LarkCliWrapper:
                     errors='ignore'
                 )
             else:
-                result = subprocess.run(
+                result = _timed_run(
                     cmd,
                     input=json_content,
                     capture_output=True,
@@ -398,7 +444,7 @@ class LarkCliWrapper:
 
                     logger.debug(f"Interactive card command: {cmd_str[:100]}...")
 
-                    result = subprocess.run(
+                    result = _timed_run(
                         [git_bash, "-c", cmd_str],
                         capture_output=True,
                         text=True,
@@ -519,6 +565,75 @@ class LarkCliWrapper:
             # 清理临时文件
             json_file.unlink(missing_ok=True)
 
+    def batch_create_records(
+        self,
+        table_id: str,
+        records: List[Dict],
+        base_token: Optional[str] = None,
+        client_token: Optional[str] = None
+    ) -> Dict:
+        """
+        批量创建多维表格记录（records/batch_create，一次调用写入多条）
+
+        Args:
+            table_id: 表 ID
+            records: 字段数据列表
+            base_token: Base Token（可选，默认使用配置）
+            client_token: 幂等标识（uuid），相同标识的重复请求不会重复创建
+
+        Returns:
+            创建结果，成功时 record_ids 与 records 顺序一致
+        """
+        token = base_token or self.app_token
+
+        # 记录较多时命令行参数过长，通过临时文件传递（文件名唯一，允许多线程同时调用）
+        json_file = Path(f".lark_cli_batch_{uuid.uuid4().hex}.json")
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump({"records": [{"fields": fields} for fields in records]}, f, ensure_ascii=False)
+
+        try:
+            cmd = [
+                "lark-cli", "api", "POST",
+                f"/open-apis/bitable/v1/apps/{token}/tables/{table_id}/records/batch_create",
+                "--as", "user",  # 与 create_record 相同的用户身份
+                "--data", f"@{json_file.name}"
+            ]
+            if client_token:
+                cmd.extend(["--params", json.dumps({"client_token": client_token})])
+
+            result = self._run_command(cmd, timeout=120)
+        finally:
+            json_file.unlink(missing_ok=True)
+
+        # 兼容原始接口响应 {"code": 0, "data": {...}} 与 {"ok": true, "data": {...}}
+        data = result.get("data") or {}
+        if isinstance(data.get("data"), dict):
+            data = data["data"]
+        ok = result.get("code") == 0 if "code" in result else bool(result.get("ok"))
+        created = data.get("records") or []
+
+        if result.get("returncode") == 0 and ok and len(created) == len(records):
+            record_ids = [record.get("record_id") for record in created]
+            logger.info(f"批量创建记录成功: {len(record_ids)} 条")
+            return {
+                "success": True,
+                "record_ids": record_ids,
+                "urls": [f"https://feishu.cn/base/{token}/{table_id}?record={rid}" for rid in record_ids]
+            }
+
+        error = result.get("error") or result.get("msg") or {}
+        if isinstance(error, dict):
+            error_msg = error.get("message", result.get("stderr", "未知错误"))
+        else:
+            error_msg = str(error) if error else result.get("stderr", "未知错误")
+        if ok and len(created) != len(records):
+            error_msg = f"返回 {len(created)} 条记录，期望 {len(records)} 条"
+        logger.error(f"批量创建记录失败: {error_msg}")
+        return {
+            "success": False,
+            "error": error_msg
+        }
+
     def update_record(
         self,
         table_id: str,
@@ -719,7 +834,23 @@ class LarkCliWrapper:
         Returns:
             创建结果
         """
-        # 构建字段数据
+        return self.create_record(self.bug_table_id, self.build_bug_fields(data, submitter))
+
+    def build_bug_fields(
+        self,
+        data: Dict,
+        submitter: Optional[str] = None
+    ) -> Dict:
+        """
+        按字段映射把 Bug 数据转换为多维表格字段
+
+        Args:
+            data: Bug 数据
+            submitter: 提交人（可选）
+
+        Returns:
+            字段数据
+        """
         fields = {}
 
         # 使用字段映射
@@ -737,7 +868,7 @@ class LarkCliWrapper:
         if "状态" not in fields:
             fields["状态"] = "待处理"
 
-        return self.create_record(self.bug_table_id, fields)
+        return fields
 
     def create_feature_record(
         self,
@@ -754,7 +885,23 @@ class LarkCliWrapper:
         Returns:
             创建结果
         """
-        # 构建字段数据
+        return self.create_record(self.feature_table_id, self.build_feature_fields(data, submitter))
+
+    def build_feature_fields(
+        self,
+        data: Dict,
+        submitter: Optional[str] = None
+    ) -> Dict:
+        """
+        按字段映射把 Feature 数据转换为多维表格字段
+
+        Args:
+            data: Feature 数据
+            submitter: 提交人（可选）
+
+        Returns:
+            字段数据
+        """
         fields = {}
 
         # 使用字段映射
@@ -772,4 +919,4 @@ class LarkCliWrapper:
         if "状态" not in fields:
             fields["状态"] = "待评估"
 
-        return self.create_record(self.feature_table_id, fields)
\ No newline at end of file
+        return fields
@@ -0,0 +1,531 @@
+"""
+重复工单检测
+同一个故障常被多人反复反馈，关键词扫描与企微桥接原本每条消息都新建一条工单。
+创建工单前先用 text2vec-base-chinese 向量化反馈内容，与近期工单比较：
+
+    - 相似度不低于 threshold 时不再新建，反馈追加到已有工单的 attach_field 字段
+      （同一工单在 attach_delay 内的多条反馈合并为一次更新）
+    - 否则经工单写入器（TicketSink）创建，并立即加入索引：
+      写入完成前到达的重复反馈等待该工单的记录 ID，不会在批量写入的窗口内重复创建
+
+索引按表分开，只保留 window_hours 内的工单；启动时在后台加载嵌入模型，
+并用 KeywordGenerator.fetch_recent_tickets 拉取时间窗口内的已有工单建立索引，加载完成前直接创建工单
+
+    dedup = get_ticket_dedup(config)
+    future = dedup.submit(table_id, fields, text=content, report="[10-19 08:00] 张三: 导入报错")
+    future.result()   # 新建: {"success": True, "record_id": ...}；合并: 另含 duplicate_of 与 score
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+    from src.utils.module_aliases import register_aliases
+    from src.utils.ticket_clustering import load_ticket_embeddings
+except ImportError:
+    from utils.metrics import REGISTRY
+    from utils.module_aliases import register_aliases
+    from utils.ticket_clustering import load_ticket_embeddings
+
+# 启动时建立索引每批向量化的条数
+HYDRATE_BATCH_SIZE = 64
+# 追加反馈失败的最多重试次数
+MAX_ATTACH_ATTEMPTS = 3
+
+TICKET_DEDUP_TOTAL = REGISTRY.counter(
+    "ticket_dedup_total",
+    "重复工单检测结果（result: created/attached/passthrough）",
+    ["result"]
+)
+TICKET_DEDUP_SCORE = REGISTRY.histogram(
+    "ticket_dedup_score",
+    "与最相似近期工单的余弦相似度（用于调整阈值）",
+    [],
+    (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99, 1.0)
+)
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def field_text(value: Any) -> str:
+    """多维表格文本字段可能是字符串或富文本片段列表，统一转为字符串"""
+    if isinstance(value, list):
+        return "".join(item.get("text", "") if isinstance(item, dict) else str(item) for item in value)
+    return "" if value is None else str(value)
+
+
+class RollingVectorIndex:
+    """
+    带过期时间的向量索引（余弦相似度，暴力检索）
+
+    向量归一化后写入预分配的矩阵，容量不足时翻倍，插入均摊 O(1)；
+    检索时屏蔽过期条目，过期条目超过一半时才压缩矩阵，过期清理同样均摊到插入上
+    """
+
+    def __init__(self, ttl: float, initial_capacity: int = 256):
+        self.ttl = ttl
+        self._capacity = max(1, initial_capacity)
+        self._vectors: Optional[np.ndarray] = None
+        self._times = np.empty(self._capacity, dtype=np.float64)
+        self._keys: List[Any] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._times[:self._size] >= time.time() - self.ttl))
+
+    def add(self, key: Any, vector, timestamp: Optional[float] = None):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector = vector / norm
+        if self._vectors is None:
+            self._vectors = np.empty((self._capacity, vector.shape[0]), dtype=np.float32)
+        if self._size == self._capacity:
+            self._grow()
+        self._vectors[self._size] = vector
+        self._times[self._size] = time.time() if timestamp is None else timestamp
+        self._keys.append(key)
+        self._size += 1
+
+    def _grow(self):
+        self._capacity *= 2
+        vectors = np.empty((self._capacity, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        times = np.empty(self._capacity, dtype=np.float64)
+        times[:self._size] = self._times[:self._size]
+        self._vectors, self._times = vectors, times
+
+    def search(self, vector, now: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Returns:
+            (最相似的未过期条目, 余弦相似度)，索引为空时返回 None
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+        if not self._size:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector = vector / norm
+        scores = self._vectors[:self._size] @ vector
+        scores[self._times[:self._size] < now - self.ttl] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            return None
+        return self._keys[best], float(scores[best])
+
+    def discard(self, key: Any):
+        """移除条目（标记为过期，压缩时删除）"""
+        for i in range(self._size):
+            if self._keys[i] is key:
+                self._times[i] = -np.inf
+
+    def expire(self, now: Optional[float] = None, force: bool = False) -> int:
+        """压缩过期条目；过期条目不足一半时跳过（检索已屏蔽），force 时总是压缩"""
+        cutoff = (time.time() if now is None else now) - self.ttl
+        alive = np.flatnonzero(self._times[:self._size] >= cutoff)
+        expired = self._size - len(alive)
+        if not expired or (not force and expired * 2 < self._size):
+            return 0
+        count = len(alive)
+        self._vectors[:count] = self._vectors[alive]
+        self._times[:count] = self._times[alive]
+        self._keys = [self._keys[i] for i in alive]
+        self._size = count
+        return expired
+
+
+@dataclass(eq=False)
+class _Ticket:
+    """索引中的一条工单"""
+    table_id: str
+    base_token: str
+    record_id: Optional[str] = None
+    resolved: bool = False
+    notes: str = ""  # attach_field 字段的当前内容
+    reports: List[str] = field(default_factory=list)  # 待追加的重复反馈
+    attach_failures: int = 0
+    # 工单写入完成前到达的重复反馈：(调用方 Future, 相似度, 字段, 向量, 反馈, 群 ID)
+    waiters: List[Tuple] = field(default_factory=list)
+
+
+class TicketDeduplicator:
+    """重复工单检测（线程安全）"""
+
+    def __init__(
+        self,
+        sink,
+        embed: Optional[EmbedFn] = None,
+        threshold: float = 0.9,
+        window_hours: float = 72.0,
+        attach_field: str = "补充信息",
+        attach_delay: float = 30.0,
+        max_text_chars: int = 256
+    ):
+        """
+        Args:
+            sink: 工单写入器（TicketSink），sink.writer 用于更新已有工单
+            embed: 批量向量化函数（如 HuggingFaceEmbeddings.embed_documents），为 None 时直接创建工单
+            threshold: 余弦相似度阈值
+            window_hours: 只与该时长内的工单比较
+            attach_field: 重复反馈追加到的字段
+            attach_delay: 同一工单的重复反馈攒该时长（秒）后一次更新
+            max_text_chars: 参与向量化的最大字符数
+        """
+        self.sink = sink
+        self.embed = embed
+        self.threshold = threshold
+        self.window = window_hours * 3600
+        self.attach_field = attach_field
+        self.attach_delay = attach_delay
+        self.max_text_chars = max_text_chars
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, RollingVectorIndex] = {}
+        self._attach_pending: List[_Ticket] = []
+        self._timer: Optional[threading.Timer] = None
+        self._counts = {"created": 0, "attached": 0, "passthrough": 0, "hydrated": 0}
+
+    @classmethod
+    def from_config(cls, sink, dedup_config, embed: Optional[EmbedFn] = None) -> "TicketDeduplicator":
+        """按 config.ticket_dedup 创建"""
+        return cls(
+            sink,
+            embed=embed,
+            threshold=dedup_config.threshold,
+            window_hours=dedup_config.window_hours,
+            attach_field=dedup_config.attach_field,
+            attach_delay=dedup_config.attach_delay,
+            max_text_chars=dedup_config.max_text_chars,
+        )
+
+    # ------------------------------------------------------------
+    # 提交
+    # ------------------------------------------------------------
+
+    def submit(
+        self,
+        table_id: str,
+        fields: Dict,
+        text: str,
+        report: str,
+        chat_id: str = "",
+        base_token: Optional[str] = None
+    ) -> Future:
+        """
+        提交一条工单（不阻塞）
+
+        Args:
+            table_id: 表 ID
+            fields: 新建工单时的字段
+            text: 用于比较的反馈内容（原始消息，不含来源前缀）
+            report: 判定为重复时追加到已有工单的一行反馈
+            chat_id: 来源群 ID
+            base_token: Base Token（可选，默认使用配置）
+
+        Returns:
+            Future，结果与 TicketSink.create_record 相同；合并到已有工单时另含 duplicate_of 与 score
+        """
+        base_token = base_token or self.sink.writer.app_token
+        vector = self._embed_one(text)
+        if vector is None:
+            TICKET_DEDUP_TOTAL.inc(result="passthrough")
+            with self._lock:
+                self._counts["passthrough"] += 1
+            return self.sink.submit(table_id, fields, base_token, chat_id)
+        return self._submit_vector(table_id, base_token, fields, vector, report, chat_id)
+
+    def create_record(
+        self,
+        table_id: str,
+        fields: Dict,
+        text: str,
+        report: str,
+        chat_id: str = "",
+        base_token: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """提交一条工单并等待结果"""
+        try:
+            return self.submit(table_id, fields, text, report, chat_id, base_token).result(timeout)
+        except Exception as e:
+            logger.error(f"工单写入异常: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _submit_vector(
+        self,
+        table_id: str,
+        base_token: str,
+        fields: Dict,
+        vector: np.ndarray,
+        report: str,
+        chat_id: str
+    ) -> Future:
+        with self._lock:
+            index = self._indexes.get(table_id)
+            if index is None:
+                index = self._indexes[table_id] = RollingVectorIndex(self.window)
+            match = index.search(vector)
+            TICKET_DEDUP_SCORE.observe(match[1] if match else 0.0)
+
+            if match and match[1] >= self.threshold:
+                ticket, score = match
+                TICKET_DEDUP_TOTAL.inc(result="attached")
+                self._counts["attached"] += 1
+                future: Future = Future()
+                if ticket.resolved:
+                    self._attach_locked(ticket, report)
+                    future.set_result(self._duplicate_result(ticket, score))
+                else:
+                    ticket.waiters.append((future, score, fields, vector, report, chat_id))
+                return future
+
+            ticket = _Ticket(table_id, base_token, notes=field_text(fields.get(self.attach_field, "")))
+            index.add(ticket, vector)
+            TICKET_DEDUP_TOTAL.inc(result="created")
+            self._counts["created"] += 1
+
+        # 在锁外注册回调：写入已完成时回调会在当前线程立即执行
+        future = self.sink.submit(table_id, fields, base_token, chat_id)
+        future.add_done_callback(lambda f: self._on_created(ticket, f))
+        return future
+
+    def _on_created(self, ticket: _Ticket, future: Future):
+        """新工单写入完成：处理等待中的重复反馈"""
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        with self._lock:
+            ticket.record_id = result.get("record_id")
+            ticket.resolved = True
+            waiters, ticket.waiters = ticket.waiters, []
+            if ticket.record_id:
+                for waiter in waiters:
+                    self._attach_locked(ticket, waiter[4])
+            else:
+                # 写入失败或暂存到本地工单库，记录 ID 未知，无法追加反馈：移出索引
+                index = self._indexes.get(ticket.table_id)
+                if index is not None:
+                    index.discard(ticket)
+
+        for waiter_future, score, fields, vector, report, chat_id in waiters:
+            if ticket.record_id:
+                waiter_future.set_result(self._duplicate_result(ticket, score))
+            else:
+                # 重新检测（第一条成为新工单，其余合并到它）
+                self._chain(
+                    self._submit_vector(ticket.table_id, ticket.base_token, fields, vector, report, chat_id),
+                    waiter_future,
+                )
+
+    @staticmethod
+    def _chain(source: Future, target: Future):
+        def done(f: Future):
+            try:
+                target.set_result(f.result())
+            except Exception as e:
+                target.set_exception(e)
+        source.add_done_callback(done)
+
+    @staticmethod
+    def _duplicate_result(ticket: _Ticket, score: float) -> Dict:
+        return {
+            "success": True,
+            "record_id": ticket.record_id,
+            "duplicate_of": ticket.record_id,
+            "score": round(score, 4),
+            "url": f"https://feishu.cn/base/{ticket.base_token}/{ticket.table_id}?record={ticket.record_id}"
+        }
+
+    def _embed_one(self, text: str) -> Optional[np.ndarray]:
+        if self.embed is None or not text.strip():
+            return None
+        try:
+            return np.asarray(self.embed([text[:self.max_text_chars]])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"反馈向量化失败，直接创建工单: {e}")
+            return None
+
+    # ------------------------------------------------------------
+    # 追加反馈
+    # ------------------------------------------------------------
+
+    def _attach_locked(self, ticket: _Ticket, report: str):
+        """记录一条待追加的反馈（需持有 self._lock），attach_delay 后统一更新"""
+        if not ticket.reports:
+            self._attach_pending.append(ticket)
+        ticket.reports.append(report)
+        if self._timer is None:
+            self._timer = threading.Timer(self.attach_delay, self.flush_attachments)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush_attachments(self) -> int:
+        """把待追加的反馈写入已有工单（每条工单一次更新）"""
+        with self._lock:
+            self._timer = None
+            pending, self._attach_pending = self._attach_pending, []
+            batches = []
+            for ticket in pending:
+                batches.append((ticket, ticket.reports))
+                ticket.reports = []
+
+        updated = 0
+        for ticket, reports in batches:
+            text = "\n".join(line for line in [ticket.notes.rstrip(), *reports] if line)
+            try:
+                result = self.sink.writer.update_record(
+                    ticket.table_id, ticket.record_id, {self.attach_field: text}, base_token=ticket.base_token
+                )
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+
+            with self._lock:
+                if result.get("success"):
+                    ticket.notes = text
+                    ticket.attach_failures = 0
+                    updated += 1
+                    logger.info(f"重复反馈已追加到工单 {ticket.record_id}: {len(reports)} 条")
+                    continue
+                ticket.attach_failures += 1
+                if ticket.attach_failures >= MAX_ATTACH_ATTEMPTS:
+                    logger.error(f"追加重复反馈到工单 {ticket.record_id} 失败，放弃 {len(reports)} 条: "
+                                 f"{result.get('error')}")
+                    continue
+                logger.warning(f"追加重复反馈到工单 {ticket.record_id} 失败，稍后重试: {result.get('error')}")
+                if ticket.reports:
+                    # 更新期间又有新反馈，工单已在待追加队列中：失败的反馈并入原条目
+                    ticket.reports[:0] = reports
+                else:
+                    for report in reports:
+                        self._attach_locked(ticket, report)
+        return updated
+
+    # ------------------------------------------------------------
+    # 建立索引
+    # ------------------------------------------------------------
+
+    def hydrate(self, tickets: List[Dict]) -> int:
+        """
+        用已有工单建立索引
+
+        Args:
+            tickets: KeywordGenerator.fetch_recent_tickets 的返回值（含 id、table_id、created_at）
+
+        Returns:
+            加入索引的工单数
+        """
+        if self.embed is None:
+            return 0
+        cutoff = time.time() - self.window
+        items = []
+        for t in tickets:
+            text = "\n".join(filter(None, (field_text(t.get("title")), field_text(t.get("description")))))
+            if t.get("id") and t.get("table_id") and text and t.get("created_at", 0) >= cutoff:
+                items.append((t, text[:self.max_text_chars]))
+        items.sort(key=lambda item: item[0]["created_at"])
+
+        vectors = []
+        for start in range(0, len(items), HYDRATE_BATCH_SIZE):
+            vectors.extend(self.embed([text for _, text in items[start:start + HYDRATE_BATCH_SIZE]]))
+
+        base_token = self.sink.writer.app_token
+        with self._lock:
+            for (t, _), vector in zip(items, vectors):
+                index = self._indexes.get(t["table_id"])
+                if index is None:
+                    index = self._indexes[t["table_id"]] = RollingVectorIndex(self.window)
+                ticket = _Ticket(t["table_id"], base_token, record_id=t["id"], resolved=True,
+                                 notes=field_text(t.get("supplement")))
+                index.add(ticket, vector, timestamp=t["created_at"])
+            self._counts["hydrated"] += len(items)
+        logger.info(f"重复工单检测索引已加载 {len(items)} 条近期工单")
+        return len(items)
+
+    def start_background(self, load_embed: Optional[Callable[[], EmbedFn]] = None,
+                         fetch_tickets: Optional[Callable[[], List[Dict]]] = None):
+        """在后台线程加载嵌入模型并建立索引（加载完成前提交的工单直接创建）"""
+        def run():
+            try:
+                if load_embed is not None:
+                    self.embed = load_embed()
+                if fetch_tickets is not None and self.embed is not None:
+                    self.hydrate(fetch_tickets())
+            except Exception as e:
+                logger.warning(f"重复工单检测初始化失败: {e}")
+
+        threading.Thread(target=run, name="ticket-dedup-init", daemon=True).start()
+
+    # ------------------------------------------------------------
+    # 状态与关闭
+    # ------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.embed is not None,
+                "indexed": sum(len(index) for index in self._indexes.values()),
+                "pending_attach": sum(len(t.reports) for t in self._attach_pending),
+                **self._counts
+            }
+
+    def close(self):
+        """立即写入待追加的反馈"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush_attachments()
+
+
+_dedup: Optional[TicketDeduplicator] = None
+_dedup_lock = threading.Lock()
+
+
+def get_ticket_dedup(config=None) -> TicketDeduplicator:
+    """
+    进程内共用的重复工单检测（首次调用时按 config.ticket_dedup 创建，并在后台加载模型、建立索引）
+
+    ticket_dedup.enabled 为 false 或嵌入模型不可用时，所有工单直接交给工单写入器
+    """
+    global _dedup
+    with _dedup_lock:
+        if _dedup is None:
+            try:
+                from src.integrations.ticket_sink import get_ticket_sink
+                from src.utils.config_loader import load_config
+            except ImportError:
+                from integrations.ticket_sink import get_ticket_sink
+                from utils.config_loader import load_config
+            if config is None:
+                config = load_config()
+            dedup_config = config.ticket_dedup
+            _dedup = TicketDeduplicator.from_config(get_ticket_sink(config), dedup_config)
+            if dedup_config.enabled:
+                def fetch_tickets() -> List[Dict]:
+                    try:
+                        from src.utils.keyword_generator import KeywordGenerator
+                    except ImportError:
+                        from utils.keyword_generator import KeywordGenerator
+                    generator = KeywordGenerator(config)
+                    # 合并反馈会改写补充信息，需要已有工单的最新内容，不使用增量缓存
+                    return asyncio.run(generator.fetch_recent_tickets(
+                        days=dedup_config.window_hours / 24, incremental=False
+                    ))
+
+                _dedup.start_background(load_ticket_embeddings, fetch_tickets if dedup_config.hydrate else None)
+        return _dedup
+
+
+register_aliases(__name__)
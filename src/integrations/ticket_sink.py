@@ -0,0 +1,323 @@
+"""
+工单批量写入（write-behind）
+企微桥接、关键词扫描等入口创建的工单先进入缓冲区，由后台线程通过多维表格批量接口写入：
+
+    - 缓冲区达到 max_batch 条，或第一条工单等待超过 flush_interval 秒时写入
+    - 同一个表的工单合并为一次 records/batch_create 调用（一次 lark-cli 子进程），
+      写入结果按顺序回填给各个调用方
+    - 写入失败时工单保存到本地工单库（TicketStore，保留本批的 client_token），
+      由补写线程在接口恢复后自动补写；补写使用同一个 client_token，上次实际已写入的批次不会重复创建
+
+    sink = get_ticket_sink(config)
+    future = sink.submit(table_id, fields)      # 不阻塞，返回 concurrent.futures.Future
+    result = sink.create_record(table_id, fields)  # 阻塞到写入完成，返回值与 LarkCliWrapper.create_record 相同
+
+保存到本地的工单返回 {"success": True, "record_id": None, "pending_sync": True, "ticket_id": ...}：
+工单已落盘且会自动补写，调用方（如持久化队列）不应再重试，否则补写后会出现重复工单
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    from src.integrations.ticket_store import (
+        MAX_BATCH_RECORDS, TicketStore, TicketSyncWorker, get_ticket_store, ticket_type_of,
+    )
+    from src.utils.metrics import REGISTRY
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from integrations.ticket_store import (
+        MAX_BATCH_RECORDS, TicketStore, TicketSyncWorker, get_ticket_store, ticket_type_of,
+    )
+    from utils.metrics import REGISTRY
+    from utils.module_aliases import register_aliases
+
+TICKET_SINK_FLUSH_TOTAL = REGISTRY.counter(
+    "ticket_sink_flush_total",
+    "工单批量写入调用次数（result: ok/failed）",
+    ["result"]
+)
+TICKET_SINK_RECORDS_TOTAL = REGISTRY.counter(
+    "ticket_sink_records_total",
+    "工单写入条数（result: created/local）",
+    ["result"]
+)
+TICKET_SINK_PENDING = REGISTRY.gauge(
+    "ticket_sink_pending",
+    "缓冲区中等待写入的工单数"
+)
+
+
+@dataclass
+class _Pending:
+    """缓冲区中的一条工单"""
+    base_token: str
+    table_id: str
+    fields: Dict
+    chat_id: str
+    future: Future
+    created: float = field(default_factory=time.monotonic)
+
+
+class TicketSink:
+    """工单批量写入器（线程安全）"""
+
+    def __init__(
+        self,
+        writer,
+        store: TicketStore,
+        flush_interval: float = 1.0,
+        max_batch: int = 50,
+        sync_interval: float = 60.0,
+        sync_batch_size: int = 50,
+        sync_max_attempts: int = 10
+    ):
+        """
+        Args:
+            writer: 提供 batch_create_records(table_id, records, base_token, client_token) 与 app_token 的对象，
+                    通常为 LarkCliWrapper
+            store: 写入失败时保存工单的本地工单库
+            flush_interval: 第一条工单进入缓冲区后最多等待的时长（秒）
+            max_batch: 缓冲区达到该条数时立即写入
+            sync_interval: 补写本地工单的间隔（秒），0 表示只在写入成功后补写
+            sync_batch_size: 每批补写的最多条数
+            sync_max_attempts: 同一批次最多补写次数，达到后标记为 failed
+        """
+        self.writer = writer
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_RECORDS))
+
+        self._cond = threading.Condition()
+        self._buffer: List[_Pending] = []
+        self._closed = False
+        self._counts = {"submitted": 0, "created": 0, "local": 0, "batches": 0}
+
+        # 启动时即补写上次运行期间保存到本地的工单
+        self.sync_worker = TicketSyncWorker(store, writer, interval=sync_interval, batch_size=sync_batch_size,
+                                            max_attempts=sync_max_attempts)
+        self.sync_worker.start()
+
+        self._thread = threading.Thread(target=self._run, name="ticket-sink", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, writer, config, store: Optional[TicketStore] = None) -> "TicketSink":
+        """按 config.ticket_sink 与 config.ticket_store 创建"""
+        return cls(
+            writer,
+            store if store is not None else get_ticket_store(config),
+            flush_interval=config.ticket_sink.flush_interval,
+            max_batch=config.ticket_sink.max_batch,
+            sync_interval=config.ticket_store.sync_interval,
+            sync_batch_size=config.ticket_store.sync_batch_size,
+            sync_max_attempts=config.ticket_store.sync_max_attempts,
+        )
+
+    # ------------------------------------------------------------
+    # 提交
+    # ------------------------------------------------------------
+
+    def submit(
+        self,
+        table_id: str,
+        fields: Dict,
+        base_token: Optional[str] = None,
+        chat_id: str = ""
+    ) -> Future:
+        """
+        提交一条工单（不阻塞）
+
+        Args:
+            table_id: 表 ID
+            fields: 字段数据
+            base_token: Base Token（可选，默认使用配置）
+            chat_id: 来源群 ID（写入失败保存到本地时用于检索）
+
+        Returns:
+            Future，结果与 create_record 相同
+        """
+        future: Future = Future()
+        pending = _Pending(base_token or self.writer.app_token, table_id, fields, chat_id, future)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("工单写入器已关闭")
+            self._buffer.append(pending)
+            self._counts["submitted"] += 1
+            TICKET_SINK_PENDING.inc()
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch:
+                self._cond.notify_all()
+        return future
+
+    def create_record(
+        self,
+        table_id: str,
+        fields: Dict,
+        base_token: Optional[str] = None,
+        chat_id: str = "",
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """
+        提交一条工单并等待写入结果
+
+        Returns:
+            {"success": True, "record_id": ..., "url": ...}；
+            保存到本地时 record_id 为 None，pending_sync 为 True
+        """
+        try:
+            return self.submit(table_id, fields, base_token, chat_id).result(timeout)
+        except Exception as e:
+            logger.error(f"工单写入异常: {e}")
+            return {"success": False, "error": str(e)}
+
+    def flush(self):
+        """立即写入缓冲区中的全部工单（阻塞到写入完成）"""
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    # ------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    batch = self._take_batch(time.monotonic())
+                    if batch:
+                        break
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._buffer:
+                        timeout = max(0.0, self._buffer[0].created + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+            self._write(batch)
+
+    def _take_batch(self, now: float) -> List[_Pending]:
+        """取出到期的一批工单（需持有 self._cond）"""
+        if not self._buffer:
+            return []
+        if not (self._closed or len(self._buffer) >= self.max_batch
+                or now - self._buffer[0].created >= self.flush_interval):
+            return []
+        batch = self._buffer[:self.max_batch]
+        del self._buffer[:self.max_batch]
+        return batch
+
+    # ------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------
+
+    def _write(self, batch: List[_Pending]):
+        """按表分组写入，每组一次批量调用"""
+        if not batch:
+            return
+        TICKET_SINK_PENDING.dec(len(batch))
+        groups: Dict[Tuple[str, str], List[_Pending]] = {}
+        for pending in batch:
+            groups.setdefault((pending.base_token, pending.table_id), []).append(pending)
+
+        for (base_token, table_id), items in groups.items():
+            for start in range(0, len(items), MAX_BATCH_RECORDS):
+                self._write_group(base_token, table_id, items[start:start + MAX_BATCH_RECORDS])
+
+    def _write_group(self, base_token: str, table_id: str, items: List[_Pending]):
+        client_token = str(uuid.uuid4())
+        try:
+            result = self.writer.batch_create_records(
+                table_id, [item.fields for item in items], base_token=base_token, client_token=client_token
+            )
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        with self._cond:
+            self._counts["batches"] += 1
+
+        if result.get("success"):
+            TICKET_SINK_FLUSH_TOTAL.inc(result="ok")
+            TICKET_SINK_RECORDS_TOTAL.inc(len(items), result="created")
+            with self._cond:
+                self._counts["created"] += len(items)
+            for item, record_id in zip(items, result["record_ids"]):
+                item.future.set_result({
+                    "success": True,
+                    "record_id": record_id,
+                    "url": f"https://feishu.cn/base/{base_token}/{table_id}?record={record_id}"
+                })
+            logger.info(f"工单批量写入成功: {len(items)} 条 -> {table_id}")
+            # 接口可用，补写之前保存到本地的工单（没有待补写工单时只是一次索引查询）
+            self.sync_worker.notify()
+            return
+
+        error = str(result.get("error", "未知错误"))
+        TICKET_SINK_FLUSH_TOTAL.inc(result="failed")
+        logger.warning(f"工单批量写入失败，保存到本地工单库: {len(items)} 条, {error}")
+        for item in items:
+            try:
+                ticket_id = self.store.add(
+                    ticket_type_of(item.fields), item.fields, table_id=table_id, base_token=base_token,
+                    chat_id=item.chat_id, client_token=client_token, error=error
+                )
+            except Exception as e:
+                logger.error(f"工单保存到本地失败: {e}")
+                item.future.set_result({"success": False, "error": f"{error}; 本地保存失败: {e}"})
+                continue
+            TICKET_SINK_RECORDS_TOTAL.inc(result="local")
+            with self._cond:
+                self._counts["local"] += 1
+            item.future.set_result({
+                "success": True,
+                "record_id": None,
+                "pending_sync": True,
+                "ticket_id": ticket_id,
+                "error": error
+            })
+
+    # ------------------------------------------------------------
+    # 状态与关闭
+    # ------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = {"pending": len(self._buffer), **self._counts}
+        stats["local_backlog"] = self.store.stats()["pending"]
+        return stats
+
+    def close(self, timeout: float = 30.0):
+        """写入缓冲区中剩余的工单后停止后台线程与补写线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.sync_worker.stop(timeout)
+
+
+_sink: Optional[TicketSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_ticket_sink(config=None) -> TicketSink:
+    """进程内共用的工单写入器（首次调用时按 config.ticket_sink / config.ticket_store 创建）"""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            try:
+                from src.integrations.lark_cli_wrapper import LarkCliWrapper
+                from src.utils.config_loader import load_config
+            except ImportError:
+                from integrations.lark_cli_wrapper import LarkCliWrapper
+                from utils.config_loader import load_config
+            if config is None:
+                config = load_config()
+            _sink = TicketSink.from_config(LarkCliWrapper(config), config)
+        return _sink
+
+
+register_aliases(__name__)
@@ -0,0 +1,547 @@
+"""
+本地工单库（SQLite）
+多维表格写入失败的工单保存在本地，由后台同步线程在接口恢复后批量补写：
+
+    store = TicketStore("data/local_tickets/tickets.db")
+    ticket_id = store.add("bug", fields, table_id=bug_table_id, base_token=app_token, chat_id=chat_id)
+    store.list(ticket_type="bug", status="pending", since=time.time() - 86400)
+
+    worker = TicketSyncWorker(store, LarkCliWrapper(config), interval=60, batch_size=50)
+    worker.start()    # 启动时及每 interval 秒补写一次，notify() 立即补写
+    worker.stop()
+
+补写按批调用 records/batch_create，每批带一个 client_token（幂等标识），保存在工单行上：
+失败的批次下次仍以相同的成员和 client_token 重试，上次请求实际已写入时不会重复创建记录；
+连续失败 max_attempts 次的批次标记为 failed，不再自动补写（字段值被拒绝、表已删除等），
+用 tickets_main resync --failed 放回待补写。一个表补写失败时本轮跳过该表，不影响其他表。
+按类型、状态、群与时间建索引；每条工单一个 JSON 文件的旧格式保留为导出 / 导入格式
+
+查看、补写、导出与导入见 src/tickets_main.py
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from utils.metrics import REGISTRY
+    from utils.module_aliases import register_aliases
+
+# 飞书批量创建接口单次最多 500 条
+MAX_BATCH_RECORDS = 500
+STATUSES = ("pending", "syncing", "synced", "failed")
+# 多维表格「类型」字段与工单类型的对应关系
+TYPE_BY_LABEL = {"缺陷": "bug", "需求": "feature"}
+
+TICKET_STORE_TICKETS = REGISTRY.gauge(
+    "ticket_store_tickets",
+    "本地工单库中的工单数（status: pending/syncing/synced/failed）",
+    ["status"]
+)
+TICKET_STORE_SYNC_TOTAL = REGISTRY.counter(
+    "ticket_store_sync_total",
+    "本地工单补写条数（result: synced/failed/abandoned）",
+    ["result"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    chat_id TEXT NOT NULL DEFAULT '',
+    user_id TEXT NOT NULL DEFAULT '',
+    base_token TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    client_token TEXT,
+    record_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_type ON tickets (type, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_chat ON tickets (chat_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets (created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_client_token ON tickets (client_token);
+"""
+
+COLUMNS = ("ticket_id", "type", "status", "chat_id", "user_id", "base_token", "table_id", "fields",
+           "client_token", "record_id", "attempts", "last_error", "created_at", "updated_at")
+
+
+def ticket_type_of(fields: Dict) -> str:
+    """按「类型」字段推断工单类型"""
+    return TYPE_BY_LABEL.get(fields.get("类型", ""), "other")
+
+
+@dataclass
+class SyncBatch:
+    """一批待补写的工单（同一个表、同一个 client_token）"""
+    client_token: str
+    base_token: str
+    table_id: str
+    ids: List[int]
+    fields: List[Dict]
+
+
+class TicketStore:
+    """
+    SQLite 本地工单库
+
+    与 DurableQueue 相同：WAL 模式 + synchronous=NORMAL，单进程内多线程共享一个连接，由锁串行化
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------
+    # 写入与查询
+    # ------------------------------------------------------------
+
+    def add(
+        self,
+        ticket_type: str,
+        fields: Dict,
+        table_id: str,
+        base_token: str,
+        chat_id: str = "",
+        user_id: str = "",
+        client_token: Optional[str] = None,
+        error: Optional[str] = None,
+        created_at: Optional[float] = None
+    ) -> str:
+        """
+        保存一条待补写的工单
+
+        Args:
+            ticket_type: 工单类型（bug / feature）
+            fields: 多维表格字段
+            table_id: 目标表 ID
+            base_token: 目标 Base Token
+            chat_id: 来源群 ID
+            user_id: 提交人 ID
+            client_token: 已用于写入请求的幂等标识（写入失败的批次），补写时沿用
+            error: 写入失败的原因
+            created_at: 创建时间戳，默认当前时间（导入旧文件时使用文件中的时间）
+
+        Returns:
+            工单 ID
+        """
+        ticket_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tickets (ticket_id, type, chat_id, user_id, base_token, table_id, fields, "
+                "client_token, last_error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ticket_id, ticket_type, chat_id or "", user_id or "", base_token, table_id,
+                 json.dumps(fields, ensure_ascii=False), client_token, error, created_at or now, now),
+            )
+        TICKET_STORE_TICKETS.inc(status="pending")
+        return ticket_id
+
+    def get(self, ticket_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(
+        self,
+        ticket_type: Optional[str] = None,
+        status: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        """按类型、状态、群与创建时间筛选，最新的在前"""
+        conditions, params = [], []
+        for column, value in (("type", ticket_type), ("status", status), ("chat_id", chat_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM tickets {where}ORDER BY created_at DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        ticket = dict(zip(COLUMNS, row))
+        ticket["fields"] = json.loads(ticket["fields"])
+        return ticket
+
+    # ------------------------------------------------------------
+    # 补写
+    # ------------------------------------------------------------
+
+    def recover(self) -> int:
+        """把上次进程退出时补写中的工单放回待补写（保留 client_token，启动时调用）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tickets SET status = 'pending' WHERE status = 'syncing'"
+            )
+        if cursor.rowcount:
+            logger.info(f"本地工单库恢复 {cursor.rowcount} 条补写中的工单")
+        return cursor.rowcount
+
+    def claim(self, limit: int, skip_tables: Iterable[Tuple[str, str]] = ()) -> Optional[SyncBatch]:
+        """
+        取出最早的一批待补写工单并标记为补写中
+
+        最早的工单已有 client_token 时取出同一 client_token 的全部工单（原批次），
+        否则取同一个表中尚未分配 client_token 的最多 limit 条，并分配新的 client_token
+
+        Args:
+            limit: 新批次的最多条数
+            skip_tables: 跳过的 (base_token, table_id)（本轮已补写失败的表）
+        """
+        limit = max(1, min(limit, MAX_BATCH_RECORDS))
+        now = time.time()
+        skip_tables = list(skip_tables)
+        skip_sql = "".join(" AND NOT (base_token = ? AND table_id = ?)" for _ in skip_tables)
+        skip_params = [value for table in skip_tables for value in table]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                first = self._conn.execute(
+                    "SELECT client_token, base_token, table_id FROM tickets "
+                    f"WHERE status = 'pending'{skip_sql} ORDER BY id LIMIT 1",
+                    skip_params,
+                ).fetchone()
+                if first is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                client_token, base_token, table_id = first
+                if client_token:
+                    rows = self._conn.execute(
+                        "SELECT id, fields FROM tickets WHERE status = 'pending' AND client_token = ? "
+                        "ORDER BY id LIMIT ?",
+                        (client_token, MAX_BATCH_RECORDS),
+                    ).fetchall()
+                else:
+                    client_token = str(uuid.uuid4())
+                    rows = self._conn.execute(
+                        "SELECT id, fields FROM tickets WHERE status = 'pending' AND client_token IS NULL "
+                        "AND base_token = ? AND table_id = ? ORDER BY id LIMIT ?",
+                        (base_token, table_id, limit),
+                    ).fetchall()
+                self._conn.executemany(
+                    "UPDATE tickets SET status = 'syncing', client_token = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    [(client_token, now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return SyncBatch(client_token, base_token, table_id,
+                         [row[0] for row in rows], [json.loads(row[1]) for row in rows])
+
+    def mark_synced(self, batch: SyncBatch, record_ids: List[str]):
+        """补写成功：记录多维表格中的记录 ID"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tickets SET status = 'synced', record_id = ?, last_error = NULL, updated_at = ? "
+                "WHERE id = ?",
+                [(record_id, now, row_id) for row_id, record_id in zip(batch.ids, record_ids)],
+            )
+        TICKET_STORE_SYNC_TOTAL.inc(len(batch.ids), result="synced")
+
+    def release(self, batch: SyncBatch, error: str, max_attempts: int = 0) -> int:
+        """
+        补写失败：放回待补写，保留 client_token 以便原批次重试
+
+        Args:
+            max_attempts: 补写次数达到该值的工单标记为 failed，不再自动补写；0 表示不限
+
+        Returns:
+            标记为 failed 的条数
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tickets SET status = CASE WHEN ? > 0 AND attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                [(max_attempts, max_attempts, error[:1000], now, row_id) for row_id in batch.ids],
+            )
+            abandoned = self._conn.execute(
+                f"SELECT COUNT(*) FROM tickets WHERE status = 'failed' AND id IN ({', '.join('?' * len(batch.ids))})",
+                batch.ids,
+            ).fetchone()[0]
+        TICKET_STORE_SYNC_TOTAL.inc(len(batch.ids) - abandoned, result="failed")
+        if abandoned:
+            TICKET_STORE_SYNC_TOTAL.inc(abandoned, result="abandoned")
+        return abandoned
+
+    def reset(self, ticket_ids: List[str]) -> int:
+        """
+        重新补写指定工单（如多维表格中的记录被误删）
+
+        清除 record_id 与 client_token，下次补写时作为新记录创建
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "UPDATE tickets SET status = 'pending', client_token = NULL, record_id = NULL, attempts = 0, "
+                "updated_at = ? WHERE ticket_id = ? AND status != 'syncing'",
+                [(now, ticket_id) for ticket_id in ticket_ids],
+            )
+        return cursor.rowcount
+
+    def retry_failed(self) -> int:
+        """把放弃补写的工单放回待补写（保留 client_token，按原批次重试），重新计算补写次数"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tickets SET status = 'pending', attempts = 0, updated_at = ? WHERE status = 'failed'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """各状态工单数，同时更新指标"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM tickets GROUP BY status"
+            ).fetchall())
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        for status in STATUSES:
+            TICKET_STORE_TICKETS.set(stats[status], status=status)
+        return stats
+
+    # ------------------------------------------------------------
+    # 导出与导入（每条工单一个 JSON 文件）
+    # ------------------------------------------------------------
+
+    def export(self, directory: str, **filters) -> List[Path]:
+        """
+        导出为每条工单一个 JSON 文件（{type}_{创建时间}_{工单 ID 前 8 位}.json）
+
+        Args:
+            directory: 导出目录
+            **filters: 传给 list() 的筛选条件
+        """
+        out_dir = Path(directory)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        filters.setdefault("limit", -1)
+        paths = []
+        for ticket in self.list(**filters):
+            created = datetime.fromtimestamp(ticket["created_at"])
+            path = out_dir / f"{ticket['type']}_{created.strftime('%Y%m%d_%H%M%S')}_{ticket['ticket_id'][:8]}.json"
+            data = {
+                "type": ticket["type"],
+                "created_at": created.isoformat(),
+                "data": ticket["fields"],
+                **{key: ticket[key] for key in ("ticket_id", "status", "chat_id", "user_id",
+                                                "base_token", "table_id", "client_token", "record_id")}
+            }
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            paths.append(path)
+        return paths
+
+    def import_files(self, directory: str, field_builder=None) -> int:
+        """
+        导入目录中每条工单一个的 JSON 文件（导出文件、旧版降级保存的 bug_/feature_ 文件）
+
+        导入成功的文件改名为 *.imported，不会重复导入
+
+        Args:
+            directory: 文件目录
+            field_builder: 旧版文件只有收集到的原始数据，field_builder(type, data) 返回
+                           (table_id, base_token, fields)；为 None 时跳过这类文件
+        """
+        imported = 0
+        for path in sorted(Path(directory).glob("*.json")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    ticket = json.load(f)
+                ticket_type = ticket.get("type", "other")
+                if ticket.get("table_id"):
+                    table_id, base_token, fields = ticket["table_id"], ticket["base_token"], ticket["data"]
+                elif field_builder is not None:
+                    table_id, base_token, fields = field_builder(ticket_type, ticket["data"])
+                else:
+                    logger.warning(f"跳过缺少目标表的工单文件: {path}")
+                    continue
+                created_at = datetime.fromisoformat(ticket["created_at"]).timestamp() \
+                    if ticket.get("created_at") else None
+                # 已补写的导出文件无需再写入
+                if ticket.get("status") == "synced":
+                    continue
+                self.add(
+                    ticket_type if ticket_type in TYPE_BY_LABEL.values() else ticket_type_of(fields),
+                    fields,
+                    table_id=table_id,
+                    base_token=base_token,
+                    chat_id=ticket.get("chat_id", ""),
+                    user_id=ticket.get("user_id", ""),
+                    client_token=ticket.get("client_token"),
+                    created_at=created_at,
+                )
+            except Exception as e:
+                logger.warning(f"导入工单文件失败 {path}: {e}")
+                continue
+            path.rename(path.with_suffix(".json.imported"))
+            imported += 1
+        return imported
+
+
+class TicketSyncWorker:
+    """
+    本地工单补写线程
+
+    启动时及每 interval 秒把待补写工单按批写入多维表格，notify() 立即补写；
+    一批失败时本轮跳过该表（接口或该表仍不可用），其他表继续补写，等待下一轮重试
+    """
+
+    def __init__(
+        self,
+        store: TicketStore,
+        writer,
+        interval: float = 60.0,
+        batch_size: int = 50,
+        max_attempts: int = 10
+    ):
+        """
+        Args:
+            store: 本地工单库
+            writer: 提供 batch_create_records(table_id, records, base_token, client_token) 的对象
+            interval: 补写间隔（秒），0 表示只在 notify() 时补写
+            batch_size: 每批最多条数
+            max_attempts: 同一批次最多补写次数，达到后标记为 failed；0 表示不限
+        """
+        self.store = store
+        self.writer = writer
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._sync_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.store.recover()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ticket-sync", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """立即补写（如刚有一次写入成功，接口已恢复）"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 30.0):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.exception(f"本地工单补写异常: {e}")
+            self._wakeup.wait(self.interval if self.interval > 0 else None)
+            self._wakeup.clear()
+
+    def sync_once(self) -> Dict[str, int]:
+        """
+        补写全部待补写工单（补写失败的表本轮跳过）
+
+        Returns:
+            {"synced": 成功条数, "failed": 失败条数}
+        """
+        result = {"synced": 0, "failed": 0}
+        failed_tables = set()
+        with self._sync_lock:
+            while not self._stopping:
+                batch = self.store.claim(self.batch_size, skip_tables=failed_tables)
+                if batch is None:
+                    break
+                try:
+                    response = self.writer.batch_create_records(
+                        batch.table_id, batch.fields, base_token=batch.base_token, client_token=batch.client_token
+                    )
+                except Exception as e:
+                    response = {"success": False, "error": str(e)}
+
+                if not response.get("success"):
+                    error = str(response.get("error", "未知错误"))
+                    abandoned = self.store.release(batch, error, self.max_attempts)
+                    result["failed"] += len(batch.ids)
+                    failed_tables.add((batch.base_token, batch.table_id))
+                    if abandoned:
+                        logger.error(f"本地工单补写失败 {self.max_attempts} 次，{abandoned} 条标记为 failed "
+                                     f"（resync --failed 重试）-> {batch.table_id}: {error}")
+                    else:
+                        logger.warning(f"本地工单补写失败，本轮跳过该表稍后重试 -> {batch.table_id}: {error}")
+                    continue
+                self.store.mark_synced(batch, response["record_ids"])
+                result["synced"] += len(batch.ids)
+                logger.info(f"本地工单补写成功: {len(batch.ids)} 条 -> {batch.table_id}")
+        self.store.stats()
+        return result
+
+
+_store: Optional[TicketStore] = None
+_store_lock = threading.Lock()
+
+
+def get_ticket_store(config=None) -> TicketStore:
+    """进程内共用的本地工单库（首次调用时按 config.ticket_store 创建）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if config is None:
+                try:
+                    from src.utils.config_loader import load_config
+                except ImportError:
+                    from utils.config_loader import load_config
+                config = load_config()
+            _store = TicketStore(config.ticket_store.path)
+        return _store
+
+
+register_aliases(__name__)
@@ -0,0 +1,82 @@
+"""
+后台定时任务入口
+在同一个事件循环中运行文档更新（cron）、BUG 关键词扫描（固定间隔）与关键词自动生成（cron），
+配置见 config.yaml 的 jobs 段
+
+运行:
+    python src/jobs_main.py
+    python src/jobs_main.py --status
+
+设置 jobs.host_in_bot 后由 src/bots/main.py 在机器人进程内启动，无需单独运行；
+此时关键词生成与机器人共用 LLM 公平调度器，在后台通道排队，@ 机器人的提问优先
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+from pathlib import Path
+
+# 添加项目根目录、src 与 src/rag 目录到路径（文档更新模块使用 src/rag 下的相对导入）
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+sys.path.insert(0, str(root_dir / "src"))
+sys.path.insert(0, str(root_dir / "src" / "rag"))
+
+from loguru import logger
+
+from utils.config_loader import Config, get_registry
+from utils.job_scheduler import AsyncScheduler
+
+
+def build_scheduler(config: Config, fair_scheduler=None) -> AsyncScheduler:
+    """
+    创建任务调度器并注册文档更新、BUG 关键词扫描与关键词自动生成任务
+
+    Args:
+        fair_scheduler: 机器人进程的 LLM 公平调度器（在机器人进程内运行时传入），
+                        单独运行时关键词生成使用自己的调度器
+    """
+    from rag.update_scheduler import DocsUpdateScheduler
+    from utils.keyword_generator import KeywordGenerator
+    from watchers.bug_keyword_watcher import BugKeywordWatcher
+
+    scheduler = AsyncScheduler(config.jobs.state_path)
+    DocsUpdateScheduler().register(scheduler)
+    BugKeywordWatcher().register(scheduler)
+    KeywordGenerator(config, fair_scheduler=fair_scheduler).register(scheduler)
+    return scheduler
+
+
+async def run(config: Config):
+    """运行全部定时任务，收到 SIGINT/SIGTERM 后等待运行中的任务结束再退出"""
+    scheduler = build_scheduler(config)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(scheduler.stop()))
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，Ctrl+C 直接中断
+            pass
+    await scheduler.run_forever()
+    logger.info("定时任务已停止")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台定时任务")
+    parser.add_argument("--status", action="store_true", help="打印各任务上次运行状态后退出")
+    args = parser.parse_args()
+
+    config = get_registry(str(root_dir / "config" / "config.yaml")).get()
+
+    if args.status:
+        scheduler = AsyncScheduler(config.jobs.state_path)
+        print(json.dumps(scheduler.state, ensure_ascii=False, indent=2))
+        return
+
+    asyncio.run(run(config))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from pathlib import Path
 from loguru import logger
 
 from crawl_apifox_docs import ApifoxDocsCrawler
-from knowledge_base import KnowledgeBase
+from knowledge_base import build_vector_index
 from utils.config_loader import load_config
 from utils.notifier import FeishuNotifier
 
@@ -59,7 +59,7 @@ class AutoDocsUpdater:
         """
         logger.info("检查文档更新...")
 
-        crawler = ApifoxDocsCrawler(str(self.output_dir))
+        crawler = ApifoxDocsCrawler.from_config(str(self.output_dir))
         await crawler.init_client()
 
         try:
@@ -92,8 +92,7 @@ class AutoDocsUpdater:
                     stats["total"] += 1
 
                     # 获取最新内容
-                    response = await crawler.client.get(url)
-                    response.raise_for_status()
+                    response = await crawler.fetch(url)
 
                     # 计算新内容的哈希
                     soup = crawler.extract_content(response.text)
@@ -201,7 +200,7 @@ class AutoDocsUpdater:
             logger.info(f"已备份到: {backup_dir}")
 
         # 爬取最新文档
-        crawler = ApifoxDocsCrawler(str(self.output_dir))
+        crawler = ApifoxDocsCrawler.from_config(str(self.output_dir))
         await crawler.crawl(max_pages=max_pages)
 
         # 更新元数据
@@ -257,20 +256,14 @@ async def rebuild_knowledge_base():
     logger.info("开始重建知识库...")
 
     config = load_config()
-    kb = KnowledgeBase(config)
 
-    # 删除旧的向量数据库
-    import shutil
-    vectordb_path = Path("data/vectordb")
-    if vectordb_path.exists():
-        shutil.rmtree(vectordb_path)
-        logger.info("已删除旧的向量数据库")
+    # 构建新版本并原子切换，运行中的机器人会自动热加载，无需删除旧库或重启
+    version_path = await asyncio.to_thread(build_vector_index, config)
+    if version_path is None:
+        logger.error("知识库重建失败，继续使用当前版本")
+        return
 
-    # 初始化并重建
-    await kb.initialize()
-    await kb.close()
-
-    logger.info("知识库重建完成")
+    logger.info(f"知识库重建完成，版本: {version_path.name}")
     config = load_config()
     feishu_cfg = config.bots.get("feishu", {})
     webhook_url = feishu_cfg.get("webhook_url") if isinstance(feishu_cfg, dict) else getattr(feishu_cfg, "webhook_url", None)
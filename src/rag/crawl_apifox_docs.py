@@ -6,6 +6,7 @@ Apifox 帮助文档爬虫
 import asyncio
 import time
 from pathlib import Path
+from typing import Optional
 from urllib.parse import urljoin, urlparse
 from loguru import logger
 
@@ -13,15 +14,31 @@ import httpx
 from bs4 import BeautifulSoup
 from markdownify import markdownify as md
 
+try:
+    from src.utils.config_loader import load_config
+    from src.utils.metrics import CRAWLER_FETCH_SECONDS
+    from src.rag.text_normalizer import TextNormalizer
+except ImportError:
+    from utils.config_loader import load_config
+    from utils.metrics import CRAWLER_FETCH_SECONDS
+    from rag.text_normalizer import TextNormalizer
+
 
 class ApifoxDocsCrawler:
     """Apifox 文档爬虫"""
 
-    def __init__(self, output_dir: str = "data/documents/apifox"):
+    def __init__(self, output_dir: str = "data/documents/apifox", normalizer: Optional[TextNormalizer] = None):
+        """
+        Args:
+            output_dir: Markdown 保存目录
+            normalizer: 保存前的文本归一化器，None 时保存原始内容
+        """
         self.base_url = "https://docs.apifox.com/"
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        self.normalizer = normalizer
+
         # 已爬取的 URL
         self.visited_urls = set()
 
@@ -31,6 +48,15 @@ class ApifoxDocsCrawler:
         # HTTP 客户端
         self.client = None
 
+    @classmethod
+    def from_config(cls, output_dir: str = "data/documents/apifox", config=None) -> "ApifoxDocsCrawler":
+        """
+        按 RAG 配置创建：保存前去掉非正文标记，与知识库构建使用同一归一化配置
+        （rag.normalize 为 false 时保存原始内容，之后开启归一化仍可从原文重新构建）
+        """
+        config = config or load_config()
+        return cls(output_dir, normalizer=TextNormalizer.from_config(config.rag))
+
     async def init_client(self):
         """初始化 HTTP 客户端"""
         self.client = httpx.AsyncClient(
@@ -84,6 +110,26 @@ class ApifoxDocsCrawler:
         finally:
             await self.close_client()
 
+    async def fetch(self, url: str) -> httpx.Response:
+        """
+        抓取页面（记录抓取耗时，非 2xx 抛出异常）
+
+        Args:
+            url: 页面 URL
+
+        Returns:
+            响应对象
+        """
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+            status = "ok"
+            return response
+        finally:
+            CRAWLER_FETCH_SECONDS.observe(time.perf_counter() - start, status=status)
+
     async def crawl_page(self, url: str):
         """
         爬取单个页面
@@ -93,8 +139,7 @@ class ApifoxDocsCrawler:
         """
         try:
             # 获取页面内容
-            response = await self.client.get(url)
-            response.raise_for_status()
+            response = await self.fetch(url)
 
             html = response.text
             soup = BeautifulSoup(html, "html.parser")
@@ -217,7 +262,7 @@ class ApifoxDocsCrawler:
                 f.write(f"# {title}\n\n")
                 f.write(f"**来源**: {url}\n\n")
                 f.write("---\n\n")
-                f.write(content)
+                f.write(self.normalizer.normalize(content) if self.normalizer else content)
 
             logger.info(f"保存文件: {filepath}")
 
@@ -229,7 +274,7 @@ async def main():
     """主函数"""
     logger.info("开始爬取 Apifox 帮助文档...")
 
-    crawler = ApifoxDocsCrawler()
+    crawler = ApifoxDocsCrawler.from_config()
     await crawler.crawl(max_pages=100)
 
     logger.info("爬取完成！")
@@ -0,0 +1,298 @@
+"""
+知识库片段近似去重
+在向量化之前用 MinHash + LSH 找出近似重复的片段（如 help-docs 镜像副本、品牌替换后的相同内容），
+每组只保留一个规范片段，其余片段的来源记录在规范片段的 aliases 元数据中；
+向量化之后可选按嵌入相似度再聚类一次
+"""
+
+import hashlib
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from loguru import logger
+
+# MinHash 使用的梅森素数（2^31 - 1），保证 a * x 在 uint64 内不溢出
+_MERSENNE_PRIME = (1 << 31) - 1
+
+# 镜像目录（内容与主目录重复，优先保留主目录中的片段）
+DEFAULT_MIRROR_MARKERS = ("download-apifoxapidog-docs",)
+
+# aliases 元数据最多记录的来源数（Chroma 元数据只支持标量，以 | 拼接）
+MAX_ALIASES = 20
+
+
+@dataclass
+class DedupReport:
+    """去重统计"""
+    before: int = 0
+    after: int = 0
+    clusters: int = 0
+    seconds: float = 0.0
+    stage: str = "minhash"
+    largest_cluster: int = 0
+    examples: List[Tuple[str, List[str]]] = field(default_factory=list)
+
+    @property
+    def removed(self) -> int:
+        return self.before - self.after
+
+    @property
+    def ratio(self) -> float:
+        return self.removed / self.before if self.before else 0.0
+
+    def summary(self) -> str:
+        return (f"[{self.stage}] 片段 {self.before} -> {self.after}，移除 {self.removed} 个（{self.ratio:.1%}），"
+                f"重复组 {self.clusters} 个，最大组 {self.largest_cluster}，耗时 {self.seconds:.2f}s")
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self) -> Dict[int, List[int]]:
+        result: Dict[int, List[int]] = {}
+        for i in range(len(self.parent)):
+            result.setdefault(self.find(i), []).append(i)
+        return result
+
+
+def normalize_for_dedup(text: str) -> str:
+    """
+    去重用的文本归一化：去掉链接、Markdown 标记与空白，统一品牌名
+
+    只用于计算签名，不修改片段内容
+    """
+    text = text.lower()
+    text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"https?://\S+", "", text)
+    text = text.replace("apidog", "apifox")
+    text = re.sub(r"[#>*_`|\-=~<>/\\\[\](){}:：，。、；;,.!?！？\"'“”‘’\s]+", "", text)
+    return text
+
+
+class MinHasher:
+    """MinHash 签名（字符 n-gram shingle，numpy 向量化计算）"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        k = self.shingle_size
+        if len(text) <= k:
+            shingles = {text}
+        else:
+            shingles = {text[i:i + k] for i in range(len(text) - k + 1)}
+        values = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") % _MERSENNE_PRIME
+            for s in shingles
+        ]
+        return np.asarray(values, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self._shingle_hashes(text)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        # (a * x + b) mod p，对每个排列取最小值
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """选择 LSH 分带参数，使 S 曲线拐点 (1/b)^(1/r) 接近阈值"""
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def _is_mirror(doc: Document, mirror_markers: Sequence[str]) -> bool:
+    source = str(doc.metadata.get("source", "")).replace("\\", "/")
+    return any(marker in source for marker in mirror_markers)
+
+
+def _alias_of(doc: Document, canonical: Optional[Document] = None) -> str:
+    """别名优先用 URL；与规范片段 URL 相同（镜像副本）时用文件路径"""
+    url = str(doc.metadata.get("url") or "")
+    if url and (canonical is None or url != canonical.metadata.get("url")):
+        return url
+    return str(doc.metadata.get("source", ""))
+
+
+def _merge_groups(
+    chunks: List[Document],
+    groups: List[List[int]],
+    mirror_markers: Sequence[str],
+) -> Tuple[List[Document], List[int], List[Tuple[str, List[str]]]]:
+    """每组选出规范片段（主目录优先、内容较长优先），其余记为别名；返回片段、其原始下标与示例"""
+    keep: Dict[int, Document] = {}
+    examples = []
+    for members in groups:
+        if len(members) == 1:
+            keep[members[0]] = chunks[members[0]]
+            continue
+        ordered = sorted(
+            members,
+            key=lambda i: (_is_mirror(chunks[i], mirror_markers), -len(chunks[i].page_content), i)
+        )
+        canonical = chunks[ordered[0]]
+        # 嵌入去重时成员可能已带有 MinHash 阶段的别名，一并合并
+        aliases = [a for a in str(canonical.metadata.get("aliases", "")).split("|") if a]
+        alias_count = int(canonical.metadata.get("alias_count", 0))
+        for i in ordered[1:]:
+            aliases.append(_alias_of(chunks[i], canonical))
+            aliases.extend(a for a in str(chunks[i].metadata.get("aliases", "")).split("|") if a)
+            alias_count += 1 + int(chunks[i].metadata.get("alias_count", 0))
+        own = (canonical.metadata.get("url"), canonical.metadata.get("source"))
+        aliases = [a for a in dict.fromkeys(aliases) if a not in own]
+        metadata = dict(canonical.metadata)
+        metadata["aliases"] = "|".join(aliases[:MAX_ALIASES])
+        metadata["alias_count"] = alias_count
+        keep[ordered[0]] = Document(page_content=canonical.page_content, metadata=metadata)
+        if len(examples) < 5:
+            examples.append((_alias_of(canonical), aliases[:3]))
+    # 保持原始顺序，保证结果确定
+    kept = sorted(keep)
+    return [keep[i] for i in kept], kept, examples
+
+
+def deduplicate_chunks(
+    chunks: List[Document],
+    threshold: float = 0.85,
+    num_perm: int = 128,
+    shingle_size: int = 5,
+    mirror_markers: Sequence[str] = DEFAULT_MIRROR_MARKERS,
+) -> Tuple[List[Document], DedupReport]:
+    """
+    MinHash + LSH 近似去重
+
+    Args:
+        chunks: 切分后的片段
+        threshold: Jaccard 相似度阈值（估计值不低于该值视为重复）
+        num_perm: MinHash 排列数
+        shingle_size: 字符 n-gram 长度
+        mirror_markers: 镜像目录标识（这些目录中的片段不作为规范片段）
+
+    Returns:
+        (去重后的片段, 统计)
+    """
+    started = time.perf_counter()
+    report = DedupReport(before=len(chunks))
+    if len(chunks) < 2:
+        report.after = len(chunks)
+        return list(chunks), report
+
+    hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+    normalized = [normalize_for_dedup(c.page_content) for c in chunks]
+    signatures = np.vstack([hasher.signature(t) for t in normalized])
+
+    bands, rows = _choose_bands(num_perm, threshold)
+    uf = _UnionFind(len(chunks))
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for i in range(len(chunks)):
+            if normalized[i]:
+                buckets.setdefault(band_values[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            head = members[0]
+            for other in members[1:]:
+                if uf.find(head) == uf.find(other):
+                    continue
+                # 用完整签名估计 Jaccard 相似度，过滤 LSH 误报
+                similarity = float(np.mean(signatures[head] == signatures[other]))
+                if similarity >= threshold:
+                    uf.union(head, other)
+
+    groups = list(uf.groups().values())
+    result, _, examples = _merge_groups(chunks, groups, mirror_markers)
+
+    report.after = len(result)
+    report.clusters = sum(1 for g in groups if len(g) > 1)
+    report.largest_cluster = max((len(g) for g in groups), default=0)
+    report.examples = examples
+    report.seconds = time.perf_counter() - started
+    return result, report
+
+
+def deduplicate_by_embedding(
+    chunks: List[Document],
+    vectors: np.ndarray,
+    threshold: float = 0.97,
+    block_size: int = 1024,
+    mirror_markers: Sequence[str] = DEFAULT_MIRROR_MARKERS,
+) -> Tuple[List[Document], np.ndarray, DedupReport]:
+    """
+    按嵌入余弦相似度聚类去重（向量需已归一化）
+
+    用于捕获文字不同但语义几乎一致的片段；分块计算相似度矩阵，内存占用为 block_size × N
+
+    Args:
+        chunks: 片段
+        vectors: 与 chunks 一一对应的嵌入向量
+        threshold: 余弦相似度阈值
+        block_size: 分块大小
+        mirror_markers: 镜像目录标识
+
+    Returns:
+        (去重后的片段, 对应向量, 统计)
+    """
+    started = time.perf_counter()
+    report = DedupReport(before=len(chunks), stage="embedding")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    uf = _UnionFind(len(chunks))
+    for start in range(0, len(chunks), block_size):
+        block = vectors[start:start + block_size]
+        # 只比较上三角，避免重复计算
+        sims = block @ vectors[start:].T
+        rows, cols = np.nonzero(sims >= threshold)
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            i, j = start + r, start + c
+            if i < j:
+                uf.union(i, j)
+
+    groups = list(uf.groups().values())
+    result, kept_rows, examples = _merge_groups(chunks, groups, mirror_markers)
+
+    report.after = len(result)
+    report.clusters = sum(1 for g in groups if len(g) > 1)
+    report.largest_cluster = max((len(g) for g in groups), default=0)
+    report.examples = examples
+    report.seconds = time.perf_counter() - started
+    return result, vectors[kept_rows], report
+
+
+def log_report(report: DedupReport, embed_seconds_per_chunk: Optional[float] = None):
+    """输出去重统计（可附带节省的向量化耗时估计）"""
+    message = report.summary()
+    if embed_seconds_per_chunk:
+        message += f"，预计节省向量化 {report.removed * embed_seconds_per_chunk:.1f}s"
+    logger.info(message)
+    for canonical, aliases in report.examples:
+        logger.debug(f"  保留 {canonical}，合并 {aliases}")
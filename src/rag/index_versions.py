@@ -0,0 +1,166 @@
+"""
+向量索引版本管理（蓝绿构建）
+每次构建写入新的版本目录，校验通过后原子切换 CURRENT 指针；
+运行中的 KnowledgeBase 检测到指针变化后热切换，旧版本在宽限期后清理
+
+目录结构：
+    data/vectordb/
+        CURRENT                      当前版本名（os.replace 原子替换）
+        versions/<版本名>/           Chroma 持久化目录
+        versions/<版本名>/manifest.json
+"""
+
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "manifest.json"
+
+# 旧版单目录布局的标志文件（data/vectordb 本身就是 Chroma 目录）
+LEGACY_MARKER = "chroma.sqlite3"
+
+
+class IndexVersions:
+    """向量索引版本目录管理"""
+
+    def __init__(self, root: str = "data/vectordb"):
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIR
+        self.pointer = self.root / POINTER_FILE
+
+    # ------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------
+
+    def current_name(self) -> Optional[str]:
+        """当前版本名（没有指针时返回 None）"""
+        try:
+            name = self.pointer.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
+        return name or None
+
+    def current_path(self) -> Optional[Path]:
+        """
+        当前生效的 Chroma 目录
+
+        没有 CURRENT 指针但根目录是旧版单目录布局时，返回根目录本身
+        """
+        name = self.current_name()
+        if name:
+            path = self.versions_dir / name
+            if path.exists():
+                return path
+            logger.error(f"CURRENT 指向的索引版本不存在: {path}")
+            return None
+        if (self.root / LEGACY_MARKER).exists():
+            return self.root
+        return None
+
+    def list_versions(self) -> List[Dict]:
+        """列出全部版本（按名称即创建时间排序）"""
+        if not self.versions_dir.exists():
+            return []
+        current = self.current_name()
+        versions = []
+        for path in sorted(p for p in self.versions_dir.iterdir() if p.is_dir()):
+            manifest = self.read_manifest(path.name)
+            versions.append({"name": path.name, "current": path.name == current, **manifest})
+        return versions
+
+    def read_manifest(self, name: str) -> Dict:
+        try:
+            return json.loads((self.versions_dir / name / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_manifest(self, name: str, **fields):
+        """合并写入版本清单"""
+        manifest = {**self.read_manifest(name), **fields}
+        path = self.versions_dir / name / MANIFEST_FILE
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------
+    # 构建与切换
+    # ------------------------------------------------------------
+
+    def new_version(self) -> Path:
+        """创建新的版本目录（名称按时间排序）"""
+        name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self.versions_dir / name
+        path.mkdir(parents=True)
+        self.write_manifest(name, created_at=time.time(), status="building")
+        return path
+
+    def activate(self, name: str):
+        """
+        原子切换 CURRENT 指针到指定版本
+
+        先写临时文件再 os.replace，读取方任何时刻都只会看到完整的旧值或新值
+        """
+        path = self.versions_dir / name
+        if not path.exists():
+            raise FileNotFoundError(f"索引版本不存在: {path}")
+        previous = self.current_name()
+        if previous == name:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{POINTER_FILE}.{os.getpid()}.tmp"
+        tmp.write_text(name, encoding="utf-8")
+        os.replace(tmp, self.pointer)
+        self.write_manifest(name, status="active", activated_at=time.time())
+        if previous and (self.versions_dir / previous).exists():
+            # 记录下线时间，宽限期从这里开始计算
+            self.write_manifest(previous, status="retired", retired_at=time.time())
+        logger.info(f"索引版本已切换: {previous or '-'} -> {name}")
+
+    def gc(self, keep: int = 2, grace_seconds: float = 3600) -> List[str]:
+        """
+        清理旧版本
+
+        当前版本与最近 keep 个下线版本（用于回滚）始终保留；
+        其余版本下线（或构建失败）超过 grace_seconds 后删除，保证仍在使用旧句柄的进程完成检索
+
+        Returns:
+            已删除的版本名（删除失败的版本记录错误，下次清理时重试）
+        """
+        now = time.time()
+        current = self.current_name()
+        standby = []
+        removed = []
+        for version in self.list_versions():
+            if version["name"] == current:
+                continue
+            if version.get("status") in ("retired", "ready"):
+                # 已下线或构建完成未启用的版本，可用于回滚
+                version["since"] = version.get("retired_at") or version.get("created_at", 0)
+                standby.append(version)
+            elif now - version.get("created_at", 0) > grace_seconds:
+                # 构建中断或校验失败的版本
+                removed.append(version["name"])
+        standby.sort(key=lambda v: v["since"], reverse=True)
+        for version in standby[keep:]:
+            if now - version["since"] > grace_seconds:
+                removed.append(version["name"])
+
+        deleted = []
+        for name in removed:
+            try:
+                shutil.rmtree(self.versions_dir / name)
+            except OSError as e:
+                # 部分删除的目录缺少版本清单，下次清理时按构建失败的版本再次删除
+                logger.error(f"清理索引版本失败: {name}, {e}")
+                continue
+            logger.info(f"已清理索引版本: {name}")
+            deleted.append(name)
+        return deleted
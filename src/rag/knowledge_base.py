@@ -4,23 +4,122 @@
 """
 
 import os
+import math
+import threading
+import time
+import uuid
 # 设置 HuggingFace 镜像
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Optional
 from pathlib import Path
+import numpy as np
 from loguru import logger
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import (
-    DirectoryLoader,
-    TextLoader,
-    BSHTMLLoader
-)
 from langchain_core.documents import Document
 
+# langchain_community（连带 chromadb、sentence-transformers）导入需数秒，推迟到首次使用时
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+try:
+    from src.utils.metrics import stage_timer, inc_counter
+    from src.rag.index_versions import IndexVersions
+    from src.rag.markdown_chunker import create_text_splitter
+    from src.rag.dedup import deduplicate_chunks, deduplicate_by_embedding, log_report
+    from src.rag.text_normalizer import TextNormalizer, normalize_and_split
+except ImportError:
+    from utils.metrics import stage_timer, inc_counter
+    from rag.index_versions import IndexVersions
+    from rag.markdown_chunker import create_text_splitter
+    from rag.dedup import deduplicate_chunks, deduplicate_by_embedding, log_report
+    from rag.text_normalizer import TextNormalizer, normalize_and_split
+
+
+# 热切换后旧向量库延迟关闭的时间（秒），切换前已开始的检索仍持有旧句柄
+RETIRED_STORE_CLOSE_DELAY = 60.0
+
+
+def close_store(store: "Chroma"):
+    """释放向量库持有的 Chroma 客户端（SQLite 连接与索引文件句柄）"""
+    client = getattr(store, "_client", None)
+    if client is None:
+        return
+    try:
+        if hasattr(client, "close"):
+            client.close()
+        else:
+            # 较早版本的 chromadb 没有 close()：停止客户端的组件，并清空按路径共享的实例缓存
+            # （否则回滚到同一版本时会拿到已停止的实例）
+            client._system.stop()
+            client.clear_system_cache()
+    except Exception as e:
+        logger.warning(f"关闭向量库失败: {e}")
+
+
+def create_embeddings() -> "HuggingFaceEmbeddings":
+    """
+    创建嵌入模型（优先使用本地下载的 text2vec-base-chinese）
+
+    构建、检索与评测需使用同一模型，统一从这里创建
+    """
+    os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
+    local_model_path = Path(__file__).parent.parent.parent / "models" / "text2vec-base-chinese"
+    if local_model_path.exists():
+        model_name = str(local_model_path)
+        logger.info(f"使用本地模型: {model_name}")
+    else:
+        model_name = "shibing624/text2vec-base-chinese"
+        logger.info(f"使用远程模型: {model_name}")
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+def unique_chunks(splits: List[Document]):
+    """
+    按 chunk_id 去除重复片段，返回 (片段列表, 向量 ID 列表)
+
+    recursive 切分没有 chunk_id 时返回的 ID 为 None，由向量库自动生成
+    """
+    if not splits or not all(d.metadata.get("chunk_id") for d in splits):
+        return splits, None
+    seen = set()
+    unique = []
+    for doc in splits:
+        chunk_id = doc.metadata["chunk_id"]
+        if chunk_id not in seen:
+            seen.add(chunk_id)
+            unique.append(doc)
+    return unique, [d.metadata["chunk_id"] for d in unique]
+
+
+def write_vectors(vectorstore: "Chroma", splits: List[Document], vectors, ids=None, batch_size: int = 1000):
+    """
+    将已计算好的向量批量写入 Chroma（避免 from_documents 重复向量化）
+
+    Args:
+        vectorstore: Chroma 向量库
+        splits: 片段
+        vectors: 与片段一一对应的向量
+        ids: 向量 ID（None 时自动生成）
+        batch_size: 每批写入数量（Chroma 单批上限约 5000）
+    """
+    ids = ids or [str(uuid.uuid4()) for _ in splits]
+    for start in range(0, len(splits), batch_size):
+        batch = splits[start:start + batch_size]
+        vectorstore._collection.upsert(
+            ids=ids[start:start + batch_size],
+            embeddings=[list(map(float, v)) for v in vectors[start:start + batch_size]],
+            metadatas=[d.metadata for d in batch],
+            documents=[d.page_content for d in batch],
+        )
+
 
 class KnowledgeBase:
     """知识库管理器"""
@@ -29,11 +128,27 @@ class KnowledgeBase:
         self.config = config
         self.embeddings = None
         self.vectorstore = None
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.rag.chunk_size,
-            chunk_overlap=config.rag.chunk_overlap,
-            length_function=len,
+        self.text_splitter = create_text_splitter(
+            config.rag.chunker,
+            config.rag.chunk_size,
+            config.rag.chunk_overlap,
         )
+        # 向量化前的文本归一化（未启用时为 None）
+        self.normalizer = TextNormalizer.from_config(config.rag)
+
+        # 索引版本（蓝绿构建），检测到 CURRENT 指针变化时热切换向量库
+        self.versions = IndexVersions(config.rag.vector_db.path)
+        self.index_path: Optional[Path] = None
+        self._next_reload_check = 0.0
+        # 已被热切换替换的向量库 [(句柄, 下线时间)]，延迟 RETIRED_STORE_CLOSE_DELAY 后关闭
+        self._retired_stores: List[tuple] = []
+        # 飞书长连接模式下每条消息在独立线程的事件循环中处理，使用线程锁保证只加载一次
+        self._reload_lock = threading.Lock()
+
+    def apply_config(self, config):
+        """应用热加载的配置快照（top_k、相关度阈值等检索参数在检索时读取，立即生效）"""
+        self.config = config
+        self.normalizer = TextNormalizer.from_config(config.rag)
 
     async def initialize(self):
         """初始化知识库"""
@@ -41,31 +156,15 @@ class KnowledgeBase:
             logger.info("初始化知识库...")
 
             # 初始化嵌入模型 (使用本地下载的模型)
-            import os
-            os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
-            local_model_path = Path(__file__).parent.parent.parent / "models" / "text2vec-base-chinese"
-            if local_model_path.exists():
-                model_name = str(local_model_path)
-                logger.info(f"使用本地模型: {model_name}")
-            else:
-                model_name = "shibing624/text2vec-base-chinese"
-                logger.info(f"使用远程模型: {model_name}")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=model_name,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-
-            # 检查向量数据库是否存在
-            vectordb_path = Path("data/vectordb")
-            if vectordb_path.exists():
-                # 加载现有数据库
-                logger.info("加载现有向量数据库...")
-                self.vectorstore = Chroma(
-                    persist_directory=str(vectordb_path),
-                    embedding_function=self.embeddings
-                )
-                logger.info(f"向量数据库加载成功，文档数: {len(self.vectorstore.get())}")
+            self.embeddings = create_embeddings()
+
+            # 加载当前版本的向量数据库
+            vectordb_path = self.versions.current_path()
+            if vectordb_path:
+                logger.info(f"加载现有向量数据库: {vectordb_path}")
+                self.vectorstore = self._open_store(vectordb_path)
+                self.index_path = vectordb_path
+                logger.info(f"向量数据库加载成功，片段数: {self.vectorstore._collection.count()}")
             else:
                 logger.warning("向量数据库不存在，请先运行 build_knowledge_base.py")
 
@@ -73,35 +172,117 @@ class KnowledgeBase:
             logger.error(f"知识库初始化失败: {e}")
             raise
 
-    async def search(self, query: str, top_k: int = None) -> List[Document]:
+    def _open_store(self, path: Path) -> "Chroma":
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(persist_directory=str(path), embedding_function=self.embeddings)
+
+    def _reload_due(self) -> bool:
+        interval = self.config.rag.vector_db.reload_interval
+        return interval > 0 and self.embeddings is not None and time.monotonic() >= self._next_reload_check
+
+    def reload_if_changed(self) -> bool:
+        """
+        检查 CURRENT 指针，指向新版本时打开新向量库并替换句柄
+
+        正在进行的检索持有旧句柄继续完成，旧句柄在 RETIRED_STORE_CLOSE_DELAY 后的检查中关闭；
+        旧版本目录在清理宽限期内不会被删除
+
+        Returns:
+            是否切换了版本
+        """
+        with self._reload_lock:
+            self._next_reload_check = time.monotonic() + self.config.rag.vector_db.reload_interval
+            self._close_retired_stores()
+            path = self.versions.current_path()
+            if not path or path == self.index_path:
+                return False
+            store = None
+            try:
+                store = self._open_store(path)
+                count = store._collection.count()
+            except Exception as e:
+                # 下次检查时重试
+                logger.error(f"加载索引版本失败，继续使用旧版本: {path}, {e}")
+                if store is not None:
+                    close_store(store)
+                return False
+            previous = self.index_path
+            if self.vectorstore is not None:
+                self._retired_stores.append((self.vectorstore, time.monotonic()))
+            self.vectorstore, self.index_path = store, path
+            inc_counter("index_reload")
+            logger.info(f"向量数据库已热切换: {previous} -> {path}（片段数: {count}）")
+            return True
+
+    def _close_retired_stores(self, force: bool = False):
+        """关闭下线超过 RETIRED_STORE_CLOSE_DELAY 的旧向量库（需持有 self._reload_lock）"""
+        now = time.monotonic()
+        keep = []
+        for store, retired_at in self._retired_stores:
+            if force or now - retired_at >= RETIRED_STORE_CLOSE_DELAY:
+                close_store(store)
+            else:
+                keep.append((store, retired_at))
+        self._retired_stores = keep
+
+    @property
+    def ready(self) -> bool:
+        """向量库是否已加载"""
+        return self.vectorstore is not None
+
+    async def search(self, query: str, top_k: int = None, embedding: List[float] = None) -> List[Document]:
         """
         搜索相关文档
 
         Args:
             query: 查询文本
             top_k: 返回前K个结果，默认使用配置值
+            embedding: 已计算好的查询向量（检索服务批量向量化时传入，省去单独向量化）
 
         Returns:
             相关文档列表
         """
-        if not self.vectorstore:
+        import asyncio
+        if self._reload_due():
+            await asyncio.to_thread(self.reload_if_changed)
+
+        # 本次检索固定使用同一个句柄，期间发生热切换也不受影响
+        vectorstore = self.vectorstore
+        if not vectorstore:
             logger.warning("向量数据库未初始化")
             return []
 
         try:
             k = top_k or self.config.rag.top_k
 
-            # 相似度搜索
-            results = self.vectorstore.similarity_search_with_score(
-                query,
-                k=k
-            )
-
-            # 过滤低分结果
-            filtered_results = [
-                (doc, score) for doc, score in results
-                if score >= self.config.rag.score_threshold
-            ]
+            # 相似度搜索（向量计算为同步调用，放到线程执行避免阻塞事件循环）
+            # 分为「向量化」与「向量检索」两段分别计时，便于定位瓶颈
+            with stage_timer("retrieval"):
+                if self.embeddings is not None or embedding is not None:
+                    if embedding is None:
+                        with stage_timer("retrieval_embed"):
+                            embedding = await asyncio.to_thread(self.embeddings.embed_query, query)
+                    with stage_timer("retrieval_search"):
+                        results = await asyncio.to_thread(
+                            vectorstore.similarity_search_by_vector_with_relevance_scores,
+                            embedding,
+                            k=k
+                        )
+                else:
+                    results = await asyncio.to_thread(
+                        vectorstore.similarity_search_with_score,
+                        query,
+                        k=k
+                    )
+
+            # 过滤低分结果（向量库返回的是距离，越小越相似，需先换算为相关度）
+            filtered_results = []
+            for doc, distance in results:
+                relevance = self._relevance_score(distance, vectorstore)
+                if relevance >= self.config.rag.score_threshold:
+                    doc.metadata["relevance"] = round(relevance, 4)
+                    filtered_results.append((doc, relevance))
 
             logger.info(f"搜索查询: {query}, 结果数: {len(filtered_results)}")
 
@@ -112,6 +293,23 @@ class KnowledgeBase:
             logger.error(f"搜索失败: {e}")
             return []
 
+    def _relevance_score(self, distance: float, vectorstore: "Chroma" = None) -> float:
+        """
+        将向量库返回的距离换算为相关度（0~1，越大越相关）
+
+        Chroma 默认使用 L2 距离，嵌入向量已归一化，
+        与 langchain 的 similarity_search_with_relevance_scores 换算方式一致
+        """
+        try:
+            return (vectorstore or self.vectorstore)._select_relevance_score_fn()(distance)
+        except (AttributeError, NotImplementedError, ValueError):
+            return 1.0 - distance / math.sqrt(2)
+
+    async def search_batch(self, queries: List[str], top_k: int = None) -> List[List[Document]]:
+        """批量搜索（与 RemoteKnowledgeBase 接口一致）"""
+        import asyncio
+        return list(await asyncio.gather(*(self.search(q, top_k) for q in queries)))
+
     async def search_with_context(
         self,
         query: str,
@@ -128,7 +326,18 @@ class KnowledgeBase:
             格式化的上下文字符串
         """
         docs = await self.search(query, top_k)
+        return self.format_context(docs)
+
+    def format_context(self, docs: List[Document]) -> str:
+        """
+        将检索结果格式化为上下文（已有检索结果时直接使用，避免重复检索）
+
+        Args:
+            docs: 文档列表
 
+        Returns:
+            格式化的上下文字符串
+        """
         if not docs:
             return "未找到相关文档"
 
@@ -150,11 +359,16 @@ class KnowledgeBase:
             return
 
         try:
-            # 分割文档
-            splits = self.text_splitter.split_documents(documents)
+            # 归一化并分割文档
+            splits, _ = normalize_and_split(documents, self.text_splitter, self.normalizer)
 
-            # 添加到向量数据库
-            self.vectorstore.add_documents(splits)
+            # 添加到向量数据库（有稳定 chunk_id 时作为向量 ID，重复添加会覆盖而不是新增）
+            splits, ids = unique_chunks(splits)
+            if ids:
+                # chunk_id 只由文档 ID 与序号决定：先删除这些文档的旧片段，文档修改后片段变少时不留下过期片段
+                for doc_id in sorted({d.metadata["doc_id"] for d in splits}):
+                    self.vectorstore._collection.delete(where={"doc_id": doc_id})
+            self.vectorstore.add_documents(splits, ids=ids)
 
             logger.info(f"成功添加 {len(splits)} 个文档片段")
 
@@ -193,25 +407,171 @@ class KnowledgeBase:
         return {
             "status": "ok",
             "total_documents": len(collection.get('ids', [])),
+            "index_version": self.versions.current_name() or "legacy",
             "embeddings_model": "shibing624/text2vec-base-chinese"
         }
 
     async def close(self):
         """关闭知识库"""
+        with self._reload_lock:
+            self._close_retired_stores(force=True)
         if self.vectorstore:
             # Chroma 会自动持久化
+            close_store(self.vectorstore)
             logger.info("知识库已关闭")
 
 
+# 构建后的校验问题（应检索到相关度不低于阈值的结果）
+VALIDATION_QUERIES = [
+    "如何导入 Postman 数据",
+    "环境变量怎么设置",
+    "Mock 数据",
+    "自动化测试",
+]
+
+# 新版本片段数低于上一版本的该比例时视为构建异常（如爬取失败导致文档大量缺失）
+MIN_CHUNK_RATIO = 0.5
+
+
+def _validate_index(store: "Chroma", kb: "KnowledgeBase", expected: int, previous: int) -> Optional[str]:
+    """校验新索引，返回失败原因（通过时返回 None）"""
+    count = store._collection.count()
+    if count != expected:
+        return f"片段数不一致: 写入 {expected}，索引中 {count}"
+    if previous and count < previous * MIN_CHUNK_RATIO:
+        return f"片段数 {count} 低于上一版本 {previous} 的 {MIN_CHUNK_RATIO:.0%}"
+    hits = 0
+    for query in VALIDATION_QUERIES:
+        results = store.similarity_search_by_vector_with_relevance_scores(kb.embeddings.embed_query(query), k=1)
+        if results and kb._relevance_score(results[0][1], store) >= kb.config.rag.score_threshold:
+            hits += 1
+    # 只构建单个产品的文档时部分问题可能无关，要求至少半数命中
+    if hits < math.ceil(len(VALIDATION_QUERIES) / 2):
+        return f"校验问题命中 {hits}/{len(VALIDATION_QUERIES)}"
+    return None
+
+
+def build_vector_index(
+    config,
+    docs_dir: str = "data/documents",
+    normalize: bool = True,
+    dedup: bool = True,
+    activate: bool = True,
+) -> Optional[Path]:
+    """
+    构建新的索引版本：写入新目录 → 校验 → 原子切换 CURRENT → 清理旧版本
+
+    构建期间运行中的机器人继续使用旧版本，切换后自动热加载新版本
+
+    Args:
+        config: 配置
+        docs_dir: 文档目录
+        normalize: 是否做文本归一化
+        dedup: 是否去除近似重复片段
+        activate: 校验通过后是否切换为当前版本
+
+    Returns:
+        新版本目录（构建或校验失败时返回 None）
+    """
+    from langchain_community.document_loaders import DirectoryLoader, TextLoader
+
+    docs_path = Path(docs_dir)
+    if not docs_path.exists():
+        logger.error(f"文档目录不存在: {docs_path}")
+        return None
+
+    # 加载所有文档
+    loader = DirectoryLoader(
+        str(docs_path),
+        glob="**/*.md",
+        loader_cls=TextLoader,
+        loader_kwargs={"encoding": "utf-8"}
+    )
+    documents = loader.load()
+
+    logger.info(f"加载了 {len(documents)} 个文档")
+
+    kb = KnowledgeBase(config)
+
+    # 初始化嵌入模型 (使用本地下载的模型)
+    kb.embeddings = create_embeddings()
+
+    # 归一化并分割文档（同时统计归一化前的片段数与 token 数）
+    logger.info("分割文档...")
+    build_started = time.perf_counter()
+    splits, normalize_report = normalize_and_split(
+        documents, kb.text_splitter, kb.normalizer if normalize else None, with_baseline=True
+    )
+    logger.info(normalize_report.summary())
+
+    # 近似重复片段去重（镜像目录副本等），在向量化之前进行以节省嵌入时间
+    dedup = dedup and config.rag.dedup
+    dedup_report = None
+    if dedup:
+        splits, dedup_report = deduplicate_chunks(splits, threshold=config.rag.dedup_threshold)
+        log_report(dedup_report)
+    splits, ids = unique_chunks(splits)
+
+    # 向量化
+    logger.info(f"向量化 {len(splits)} 个片段...")
+    started = time.perf_counter()
+    vectors = np.asarray(kb.embeddings.embed_documents([d.page_content for d in splits]), dtype=np.float32)
+    embed_seconds = time.perf_counter() - started
+    per_chunk = embed_seconds / len(splits) if splits else 0.0
+    logger.info(f"向量化耗时 {embed_seconds:.1f}s（{per_chunk * 1000:.1f}ms/片段）")
+    if dedup_report:
+        log_report(dedup_report, embed_seconds_per_chunk=per_chunk)
+
+    # 可选：按嵌入相似度再去重一次（捕获文字不同但语义几乎一致的片段）
+    if dedup and config.rag.dedup_embedding_threshold > 0:
+        splits, vectors, embedding_report = deduplicate_by_embedding(
+            splits, vectors, threshold=config.rag.dedup_embedding_threshold
+        )
+        log_report(embedding_report)
+        splits, ids = unique_chunks(splits)
+
+    # 写入新版本目录（不影响正在使用的当前版本）
+    versions = kb.versions
+    version_path = versions.new_version()
+    logger.info(f"创建向量数据库: {version_path}")
+    store = kb._open_store(version_path)
+    write_vectors(store, splits, vectors, ids)
+
+    # 校验
+    previous = versions.read_manifest(versions.current_name()).get("chunks", 0) if versions.current_name() else 0
+    error = _validate_index(store, kb, len(splits), previous)
+    if error:
+        versions.write_manifest(version_path.name, status="failed", error=error)
+        logger.error(f"索引校验失败，保持当前版本不变: {error}")
+        return None
+
+    removed = normalize_report.chunks_before - len(splits)
+    versions.write_manifest(
+        version_path.name,
+        status="ready",
+        chunks=len(splits),
+        documents=len(documents),
+        build_seconds=round(time.perf_counter() - build_started, 1),
+    )
+    logger.info(
+        f"入库 {len(splits)} 个片段（原始切分 {normalize_report.chunks_before} 个，减少 {removed} 个），"
+        f"构建耗时 {time.perf_counter() - build_started:.1f}s，"
+        f"预计节省向量化 {removed * per_chunk:.1f}s"
+    )
+
+    if activate:
+        versions.activate(version_path.name)
+        versions.gc(config.rag.vector_db.keep_versions, config.rag.vector_db.gc_grace_seconds)
+    return version_path
+
+
 def build_knowledge_base():
     """
     构建知识库
-    从帮助文档构建向量数据库
+    从帮助文档构建向量数据库（新版本目录，校验通过后切换）
     """
     import argparse
     import sys
-    from pathlib import Path
-    from langchain_community.document_loaders import DirectoryLoader
 
     # 添加 src 目录到路径
     sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -223,60 +583,53 @@ def build_knowledge_base():
         default="data/documents",
         help="文档目录路径"
     )
-    args = parser.parse_args()
-
-    logger.info("开始构建知识库...")
-
-    # 加载文档
-    docs_dir = Path(args.docs_dir)
-    if not docs_dir.exists():
-        logger.error(f"文档目录不存在: {docs_dir}")
-        return
-
-    # 加载所有文档
-    loader = DirectoryLoader(
-        str(docs_dir),
-        glob="**/*.md",
-        loader_cls=TextLoader,
-        loader_kwargs={"encoding": "utf-8"}
+    parser.add_argument(
+        "--no-normalize",
+        action="store_true",
+        help="关闭文本归一化（用于对比归一化前后的片段数、token 数与构建耗时）"
     )
-    documents = loader.load()
-
-    logger.info(f"加载了 {len(documents)} 个文档")
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="关闭近似重复片段去重（用于对比去重前后的索引大小与检索效果）"
+    )
+    parser.add_argument(
+        "--no-activate",
+        action="store_true",
+        help="只构建与校验，不切换为当前版本"
+    )
+    parser.add_argument("--list", action="store_true", help="列出索引版本")
+    parser.add_argument("--activate", metavar="VERSION", help="切换到指定版本（回滚）")
+    parser.add_argument("--gc", action="store_true", help="清理超过宽限期的旧版本")
+    args = parser.parse_args()
 
-    # 初始化知识库
     from utils.config_loader import load_config
     config = load_config()
-    kb = KnowledgeBase(config)
+    versions = IndexVersions(config.rag.vector_db.path)
 
-    # 初始化嵌入模型 (使用本地下载的模型)
-    import os
-    os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
-    local_model_path = Path(__file__).parent.parent.parent / "models" / "text2vec-base-chinese"
-    if local_model_path.exists():
-        model_name = str(local_model_path)
-    else:
-        model_name = "shibing624/text2vec-base-chinese"
-    kb.embeddings = HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    if args.list:
+        for version in versions.list_versions():
+            mark = "*" if version["current"] else " "
+            print(f"{mark} {version['name']}  {version.get('status', '-'):<8} 片段 {version.get('chunks', '-')}")
+        return
+    if args.activate:
+        versions.activate(args.activate)
+        return
+    if args.gc:
+        versions.gc(config.rag.vector_db.keep_versions, config.rag.vector_db.gc_grace_seconds)
+        return
 
-    # 分割文档
-    logger.info("分割文档...")
-    splits = kb.text_splitter.split_documents(documents)
-    logger.info(f"分割为 {len(splits)} 个片段")
-
-    # 创建向量数据库
-    logger.info("创建向量数据库...")
-    kb.vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=kb.embeddings,
-        persist_directory="data/vectordb"
+    logger.info("开始构建知识库...")
+    version_path = build_vector_index(
+        config,
+        docs_dir=args.docs_dir,
+        normalize=not args.no_normalize,
+        dedup=not args.no_dedup,
+        activate=not args.no_activate,
     )
-
-    logger.info("知识库构建完成！")
+    if version_path is None:
+        sys.exit(1)
+    logger.info(f"知识库构建完成！版本: {version_path.name}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+"""
+Markdown 结构感知切分
+按 # / ## 标题切分章节，章节按段落依次装入不超过 chunk_size 的片段（可跨章节合并，
+标题路径前缀计入长度），过长段落再细分，并为每个片段附带标题路径、来源 URL、产品等元数据
+"""
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# 参与切分的标题层级（### 及更深层级保留在章节内部）
+SPLIT_HEADING_LEVELS = 2
+
+# 爬虫保存文件时写入的来源行：**来源**: https://...
+SOURCE_LINE_RE = re.compile(r"^\*\*来源\*\*\s*[:：]\s*(\S+)\s*$")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+# 按产品目录推断文档站地址（文件名即页面 ID）
+PRODUCT_BASE_URLS = {
+    "apifox": "https://docs.apifox.com",
+    "apidog": "https://docs.apidog.com",
+}
+
+# 过长段落的细分分隔符（优先在子标题、换行处断开）
+SECTION_SEPARATORS = ["\n### ", "\n#### ", "\n\n", "\n", "。", "；", " ", ""]
+
+
+class MarkdownChunker:
+    """
+    Markdown 结构感知切分器
+
+    与 RecursiveCharacterTextSplitter 一样提供 split_documents 接口，
+    同一输入总是得到相同的片段；chunk_id 只由文档 ID 与片段序号决定，
+    文档修改后重新入库会覆盖原有片段而不是留下旧片段。
+    """
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50, title_prefix: bool = True):
+        """
+        Args:
+            chunk_size: 片段最大字符数
+            chunk_overlap: 过长段落细分时的重叠字符数
+            title_prefix: 是否在片段开头补充标题路径
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.title_prefix = title_prefix
+        # 按可用长度（chunk_size 减去标题路径前缀）缓存的段落细分器
+        self._paragraph_splitters: Dict[int, RecursiveCharacterTextSplitter] = {}
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """切分文档列表"""
+        chunks = []
+        for doc in documents:
+            chunks.extend(self.split_text(doc.page_content, doc.metadata))
+        return chunks
+
+    def split_text(self, text: str, metadata: Optional[Dict] = None) -> List[Document]:
+        """
+        切分单篇 Markdown
+
+        Args:
+            text: 文档内容
+            metadata: 原始元数据（至少包含 source）
+
+        Returns:
+            片段列表
+        """
+        metadata = dict(metadata or {})
+        source = metadata.get("source", "")
+        body, source_url = self._extract_source_url(text)
+        sections = self._split_sections(body)
+        if not sections:
+            return []
+
+        doc_title = self._document_title(sections, source)
+        product = metadata.get("product") or infer_product(source, source_url)
+        url = metadata.get("url") or source_url or infer_url(source, product)
+        # 不同产品目录下可能有同名文件，文件名推断的文档 ID 带上产品前缀
+        doc_id = metadata.get("doc_id") or (
+            f"{product}/{Path(source).stem}" if Path(source).stem else hashlib.sha1(body.encode("utf-8")).hexdigest()[:12]
+        )
+
+        chunks = []
+        for index, (title_path, content) in enumerate(self._pack_sections(sections)):
+            if self.title_prefix:
+                content = self._with_title_path(title_path, content)
+            chunk_metadata = {
+                **metadata,
+                "doc_id": doc_id,
+                "title": doc_title,
+                "title_path": " > ".join(title_path),
+                "url": url,
+                "product": product,
+                "chunk_index": index,
+                "chunk_id": make_chunk_id(doc_id, index),
+            }
+            chunks.append(Document(page_content=content, metadata=chunk_metadata))
+        return chunks
+
+    # ------------------------------------------------------------
+    # 解析
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _extract_source_url(text: str) -> Tuple[str, str]:
+        """提取并移除「**来源**」行及其后的分隔线"""
+        lines = text.splitlines()
+        url = ""
+        kept = []
+        skip_rule = False
+        for line in lines:
+            match = SOURCE_LINE_RE.match(line.strip()) if not url else None
+            if match:
+                url = match.group(1)
+                skip_rule = True
+                continue
+            if skip_rule:
+                if not line.strip():
+                    continue
+                skip_rule = False
+                if line.strip() == "---":
+                    continue
+            kept.append(line)
+        return "\n".join(kept), url
+
+    @staticmethod
+    def _split_sections(text: str) -> List[Tuple[List[str], str]]:
+        """按 # / ## 标题切分为 (标题路径, 章节正文)，忽略代码块中的 #"""
+        sections: List[Tuple[List[str], List[str]]] = []
+        path: List[str] = []
+        current: List[str] = []
+        in_fence = False
+
+        def flush():
+            content = "\n".join(current).strip()
+            # 只有标题没有正文的章节不单独成片（标题已体现在下级章节的标题路径中）
+            if content and not HEADING_RE.fullmatch(content):
+                sections.append((list(path), content))
+
+        for line in text.splitlines():
+            if FENCE_RE.match(line):
+                in_fence = not in_fence
+            heading = HEADING_RE.match(line) if not in_fence else None
+            if heading and len(heading.group(1)) <= SPLIT_HEADING_LEVELS:
+                flush()
+                current = [line]
+                level = len(heading.group(1))
+                path = path[:level - 1] + [heading.group(2).strip()]
+                continue
+            current.append(line)
+        flush()
+        return [(p, re.sub(r"\n{3,}", "\n\n", c)) for p, c in sections]
+
+    @staticmethod
+    def _with_title_path(title_path: List[str], content: str) -> str:
+        """在片段开头补充上级标题路径（片段首行已是当前标题时只补上级）"""
+        first_line = content.split("\n", 1)[0]
+        heading = HEADING_RE.match(first_line)
+        if heading and title_path and heading.group(2).strip() == title_path[-1]:
+            parents = title_path[:-1]
+        else:
+            parents = title_path
+        return f"{' > '.join(parents)}\n\n{content}" if parents else content
+
+    @staticmethod
+    def _document_title(sections: List[Tuple[List[str], str]], source: str) -> str:
+        for path, _ in sections:
+            if path:
+                return path[0]
+        return Path(source).stem if source else ""
+
+    def _prefix_len(self, title_path: List[str], content: str) -> int:
+        """片段开头补充标题路径所占的字符数"""
+        if not self.title_prefix:
+            return 0
+        return len(self._with_title_path(title_path, content)) - len(content)
+
+    def _paragraph_splitter(self, size: int) -> RecursiveCharacterTextSplitter:
+        splitter = self._paragraph_splitters.get(size)
+        if splitter is None:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=size,
+                chunk_overlap=min(self.chunk_overlap, size // 2),
+                length_function=len,
+                separators=SECTION_SEPARATORS,
+            )
+            self._paragraph_splitters[size] = splitter
+        return splitter
+
+    def _paragraphs(self, title_path: List[str], content: str) -> List[str]:
+        """
+        将章节拆成段落（装箱的最小单位）
+
+        只有标题的段落与下一段合并，避免标题落在片段末尾而正文在下一片段；
+        加上完整标题路径前缀后仍超过 chunk_size 的段落再细分
+        """
+        # 至少保留一半长度给正文（标题路径异常长时允许片段略超 chunk_size）
+        size = max(self.chunk_size - self._prefix_len(title_path, ""), self.chunk_size // 2)
+        paragraphs = []
+        heading = ""
+        for paragraph in content.split("\n\n"):
+            paragraph = paragraph.strip("\n")
+            if not paragraph.strip():
+                continue
+            if heading:
+                paragraph = f"{heading}\n\n{paragraph}"
+                heading = ""
+            if HEADING_RE.fullmatch(paragraph):
+                heading = paragraph
+                continue
+            if len(paragraph) <= size:
+                paragraphs.append(paragraph)
+            else:
+                paragraphs.extend(self._paragraph_splitter(size).split_text(paragraph))
+        if heading:
+            paragraphs.append(heading)
+        return paragraphs
+
+    @staticmethod
+    def _split_lines(paragraph: str, size: int) -> Tuple[str, str]:
+        """
+        在换行处把段落拆为不超过 size 字符的开头部分与剩余部分，用于填满当前片段
+
+        不在代码块内部、标题行或空行之后断开；一行都放不下时返回 ("", 原段落)
+        """
+        lines = paragraph.split("\n")
+        used = -1
+        cut = 0
+        in_fence = False
+        for i, line in enumerate(lines):
+            used += len(line) + 1
+            if used > size:
+                break
+            if FENCE_RE.match(line):
+                in_fence = not in_fence
+            if not in_fence and line.strip() and not HEADING_RE.match(line):
+                cut = i + 1
+        return "\n".join(lines[:cut]), "\n".join(lines[cut:]).strip("\n")
+
+    def _pack_sections(self, sections: List[Tuple[List[str], str]]) -> List[Tuple[List[str], str]]:
+        """
+        按顺序把段落装入片段：相邻段落（可跨章节）合并到 chunk_size 为止，
+        放不下的段落先按行填满当前片段，其余部分进入下一片段；
+        片段的标题路径取首个段落所在章节，补充的标题路径前缀计入长度
+        """
+        packed: List[Tuple[List[str], str]] = []
+        buffer_path: List[str] = []
+        buffer: List[str] = []
+        buffer_len = 0
+
+        for path, content in sections:
+            for paragraph in self._paragraphs(path, content):
+                if buffer and buffer_len + len(paragraph) + 2 > self.chunk_size:
+                    head, paragraph = self._split_lines(paragraph, self.chunk_size - buffer_len - 2)
+                    if head:
+                        buffer.append(head)
+                    packed.append((buffer_path, "\n\n".join(buffer)))
+                    buffer = []
+                    if not paragraph:
+                        continue
+                if buffer:
+                    buffer_len += len(paragraph) + 2
+                else:
+                    buffer_path = path
+                    buffer_len = self._prefix_len(path, paragraph) + len(paragraph)
+                buffer.append(paragraph)
+        if buffer:
+            packed.append((buffer_path, "\n\n".join(buffer)))
+        return packed
+
+
+def infer_product(source: str, url: str = "") -> str:
+    """根据来源 URL 或文件所在目录推断产品（apifox / apidog）"""
+    for product in PRODUCT_BASE_URLS:
+        if url and product in url:
+            return product
+    parts = [p.lower() for p in Path(source).parts]
+    for product in PRODUCT_BASE_URLS:
+        if product in parts:
+            return product
+    return "apifox"
+
+
+def infer_url(source: str, product: str) -> str:
+    """根据文件名推断文档地址（文件名即文档站页面 ID）"""
+    base = PRODUCT_BASE_URLS.get(product)
+    stem = Path(source).stem
+    if not base or not stem or not re.fullmatch(r"[A-Za-z0-9_-]+", stem):
+        return ""
+    return f"{base}/{stem}"
+
+
+def make_chunk_id(doc_id: str, index: int) -> str:
+    """
+    稳定的片段 ID：文档 ID + 序号
+
+    不包含内容摘要：文档修改后同一位置的片段沿用原 ID，重新入库时覆盖旧片段
+    """
+    return f"{doc_id}-{index:03d}"
+
+
+def create_text_splitter(chunker: str, chunk_size: int, chunk_overlap: int):
+    """
+    按配置创建切分器
+
+    Args:
+        chunker: markdown（按标题结构切分）或 recursive（按字符递归切分）
+        chunk_size: 片段最大字符数
+        chunk_overlap: 重叠字符数
+
+    Returns:
+        提供 split_documents 接口的切分器
+    """
+    if chunker == "markdown":
+        return MarkdownChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if chunker == "recursive":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+    raise ValueError(f"不支持的切分方式: {chunker}")
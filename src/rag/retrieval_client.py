@@ -0,0 +1,176 @@
+"""
+检索服务客户端
+RemoteKnowledgeBase 与 KnowledgeBase 接口一致，通过本机检索服务检索，
+进程内不加载嵌入模型与向量库，启动只需约 1 秒
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from langchain_core.documents import Document
+from loguru import logger
+
+try:
+    from src.utils.metrics import stage_timer
+except ImportError:
+    from utils.metrics import stage_timer
+
+UNIX_PREFIX = "unix://"
+
+
+def parse_service_url(url: str) -> Tuple[Optional[str], str]:
+    """
+    解析服务地址
+
+    Returns:
+        (Unix Socket 路径或 None, HTTP base_url)
+    """
+    if url.startswith(UNIX_PREFIX):
+        # Unix Socket 上的 HTTP 请求仍需要一个主机名，取值无关紧要
+        return url[len(UNIX_PREFIX):], "http://retrieval"
+    return None, url.rstrip("/")
+
+
+def document_to_dict(doc: Document) -> Dict:
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+def document_from_dict(data: Dict) -> Document:
+    return Document(page_content=data.get("page_content", ""), metadata=data.get("metadata") or {})
+
+
+class RemoteKnowledgeBase:
+    """
+    检索服务客户端
+
+    使用同步 httpx.Client 放到线程中调用：飞书长连接模式下每条消息在独立事件循环中处理，
+    同步连接池不绑定事件循环，可在各线程间复用
+    """
+
+    def __init__(self, config, url: str = None):
+        self.config = config
+        self.url = url or config.rag.service.url
+        uds, base_url = parse_service_url(self.url)
+        self._client = httpx.Client(
+            base_url=base_url,
+            transport=httpx.HTTPTransport(uds=uds) if uds else None,
+            timeout=config.rag.service.timeout,
+        )
+        self._ready = False
+
+    def apply_config(self, config):
+        """应用热加载的配置快照（top_k 等检索参数）"""
+        self.config = config
+
+    @property
+    def ready(self) -> bool:
+        """检索服务是否可用（以最近一次请求结果为准）"""
+        return self._ready
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict:
+        response = self._client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _call(self, method: str, path: str, **kwargs) -> Dict:
+        try:
+            data = await asyncio.to_thread(self._request, method, path, **kwargs)
+        except Exception:
+            self._ready = False
+            raise
+        self._ready = True
+        return data
+
+    async def initialize(self):
+        """检查检索服务是否可用"""
+        logger.info(f"连接检索服务: {self.url}")
+        stats = await self._call("GET", "/stats")
+        logger.info(f"检索服务连接成功，索引版本: {stats.get('index_version')}，片段数: {stats.get('total_documents')}")
+
+    async def search(self, query: str, top_k: int = None) -> List[Document]:
+        """
+        搜索相关文档
+
+        Args:
+            query: 查询文本
+            top_k: 返回前K个结果，默认使用配置值
+
+        Returns:
+            相关文档列表
+        """
+        return (await self.search_batch([query], top_k))[0]
+
+    async def search_batch(self, queries: List[str], top_k: int = None) -> List[List[Document]]:
+        """批量搜索（服务端合并向量化）"""
+        try:
+            with stage_timer("retrieval"):
+                data = await self._call("POST", "/search", json={
+                    "queries": queries,
+                    "top_k": top_k or self.config.rag.top_k,
+                })
+            results = [[document_from_dict(d) for d in docs] for docs in data["results"]]
+            for query, docs in zip(queries, results):
+                logger.info(f"搜索查询: {query}, 结果数: {len(docs)}")
+            return results
+        except Exception as e:
+            logger.error(f"搜索失败: {e}")
+            return [[] for _ in queries]
+
+    async def search_with_context(self, query: str, top_k: int = None) -> str:
+        """搜索并返回格式化的上下文"""
+        docs = await self.search(query, top_k)
+        return self.format_context(docs)
+
+    def format_context(self, docs: List[Document]) -> str:
+        """将检索结果格式化为上下文（与 KnowledgeBase.format_context 一致）"""
+        if not docs:
+            return "未找到相关文档"
+
+        context_parts = []
+        for i, doc in enumerate(docs, 1):
+            context_parts.append(f"### 文档 {i}\n{doc.page_content}\n")
+
+        return "\n".join(context_parts)
+
+    async def add_documents(self, documents: List[Document]):
+        """添加文档到知识库"""
+        try:
+            data = await self._call("POST", "/add", json={"documents": [document_to_dict(d) for d in documents]})
+            logger.info(f"成功添加 {data.get('added', 0)} 个文档片段")
+        except Exception as e:
+            logger.error(f"添加文档失败: {e}")
+
+    async def delete_documents(self, ids: List[str]):
+        """删除文档"""
+        try:
+            await self._call("POST", "/delete", json={"ids": ids})
+            logger.info(f"成功删除 {len(ids)} 个文档")
+        except Exception as e:
+            logger.error(f"删除文档失败: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取知识库统计信息"""
+        try:
+            return self._request("GET", "/stats")
+        except Exception as e:
+            return {"status": "unavailable", "error": str(e)}
+
+    async def close(self):
+        """关闭连接"""
+        self._client.close()
+
+
+def create_knowledge_base(config):
+    """
+    按配置创建知识库
+
+    配置了 rag.service.url 时返回检索服务客户端，否则在进程内加载模型与向量库
+    """
+    if config.rag.service.url:
+        return RemoteKnowledgeBase(config)
+    try:
+        from src.rag.knowledge_base import KnowledgeBase
+    except ImportError:
+        from rag.knowledge_base import KnowledgeBase
+    return KnowledgeBase(config)
@@ -0,0 +1,220 @@
+"""
+本机检索服务
+独占嵌入模型与向量库，通过 Unix Socket 或本机 HTTP 为各机器人进程提供批量检索、增删与统计，
+客户端见 retrieval_client.RemoteKnowledgeBase
+
+启动：
+    python src/rag/retrieval_service.py                  # 使用 rag.service.url
+    python src/rag/retrieval_service.py --uds data/retrieval.sock
+    python src/rag/retrieval_service.py --port 8765
+"""
+
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urlparse
+
+# 添加项目根目录与 src 目录到路径
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+sys.path.insert(0, str(root_dir / "src"))
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from rag.knowledge_base import KnowledgeBase
+from rag.retrieval_client import document_from_dict, document_to_dict, parse_service_url
+from utils.config_loader import load_config
+from utils.metrics import observe_stage, render_metrics
+
+
+class EmbeddingBatcher:
+    """
+    合并并发查询的向量化请求
+
+    多个机器人进程同时检索时，在 max_wait 内到达的查询合并为一次 embed_documents 调用，
+    CPU 上批量向量化的吞吐明显高于逐条调用
+    """
+
+    def __init__(self, embeddings, max_batch: int = 32, max_wait: float = 0.005):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def embed(self, text: str) -> List[float]:
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            texts = [text for text, _ in batch]
+            started = loop.time()
+            try:
+                vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            observe_stage("retrieval_embed", loop.time() - started)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+
+
+class SearchRequest(BaseModel):
+    queries: List[str]
+    top_k: Optional[int] = None
+
+
+class AddRequest(BaseModel):
+    documents: List[dict] = Field(default_factory=list)
+
+
+class DeleteRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+
+
+config = load_config()
+kb = KnowledgeBase(config)
+batcher: Optional[EmbeddingBatcher] = None
+
+app = FastAPI(title="Retrieval Service")
+
+
+@app.on_event("startup")
+async def startup_event():
+    global batcher
+    await kb.initialize()
+    batcher = EmbeddingBatcher(
+        kb.embeddings,
+        max_batch=config.rag.service.max_batch,
+        max_wait=config.rag.service.max_wait_ms / 1000,
+    )
+    logger.info("检索服务启动完成")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher:
+        await batcher.close()
+    await kb.close()
+
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """批量检索：并发查询的向量化由 EmbeddingBatcher 合并"""
+    if not request.queries:
+        return {"results": []}
+    vectors = await asyncio.gather(*(batcher.embed(q) for q in request.queries))
+    results = await asyncio.gather(*(
+        kb.search(q, request.top_k, embedding=v) for q, v in zip(request.queries, vectors)
+    ))
+    return {"results": [[document_to_dict(d) for d in docs] for docs in results]}
+
+
+@app.post("/add")
+async def add(request: AddRequest):
+    if not kb.ready:
+        raise HTTPException(status_code=503, detail="向量数据库未初始化")
+    documents = [document_from_dict(d) for d in request.documents]
+    await kb.add_documents(documents)
+    return {"added": len(documents)}
+
+
+@app.post("/delete")
+async def delete(request: DeleteRequest):
+    if not kb.ready:
+        raise HTTPException(status_code=503, detail="向量数据库未初始化")
+    await kb.delete_documents(request.ids)
+    return {"deleted": len(request.ids)}
+
+
+@app.get("/stats")
+async def stats():
+    return kb.get_stats()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok" if kb.ready else "not_ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _socket_in_use(path: str) -> bool:
+    """Unix Socket 是否已有服务在监听（用于清理上次异常退出遗留的文件）"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本机检索服务")
+    parser.add_argument("--uds", help="Unix Socket 路径")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="HTTP 端口")
+    args = parser.parse_args()
+
+    uds, port, host = args.uds, args.port, args.host
+    if not uds and not port:
+        url = config.rag.service.url
+        if not url:
+            parser.error("未配置 rag.service.url，请指定 --uds 或 --port")
+        uds, base_url = parse_service_url(url)
+        if not uds:
+            parsed = urlparse(base_url)
+            host, port = parsed.hostname or host, parsed.port or 80
+
+    if uds:
+        if os.path.exists(uds):
+            if _socket_in_use(uds):
+                logger.error(f"检索服务已在运行: {uds}")
+                sys.exit(1)
+            os.unlink(uds)
+        Path(uds).parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"检索服务监听 Unix Socket: {uds}")
+        uvicorn.run(app, uds=uds, log_level="info")
+    else:
+        logger.info(f"检索服务监听: http://{host}:{port}")
+        uvicorn.run(app, host=host, port=port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
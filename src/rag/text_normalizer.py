@@ -0,0 +1,233 @@
+"""
+文档文本归一化
+去掉爬取文档中的非正文标记（<Background> 等 MDX 组件、图片预览链接、:::tip 提示块标记、HTML 属性），
+折叠成串的导航链接列表，并过滤信息量过低的片段；爬虫保存与知识库构建共用
+"""
+
+import re
+import textwrap
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+FENCE_BLOCK_RE = re.compile(r"(^[ \t]*(```|~~~).*?^[ \t]*\2[^\n]*$)", re.S | re.M)
+HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+HTML_IMG_RE = re.compile(r"<img\b[^>]*>", re.I)
+# 带 title 属性的组件（Step / Tab / Accordion / Card 等），标题保留为加粗行
+TITLED_TAG_RE = re.compile(r"<([A-Z][A-Za-z]*)\b[^>]*?\btitle=\"([^\"]+)\"[^>]*>")
+# MDX 组件标签（首字母大写）与纯排版 HTML 标签，去掉标签保留内部内容
+COMPONENT_TAG_RE = re.compile(r"</?[A-Z][A-Za-z]*\b[^>]*?/?>")
+LAYOUT_TAG_RE = re.compile(r"</?(?:p|div|span|center|br|font)\b[^>]*?/?>", re.I)
+TABLE_ATTR_RE = re.compile(r"<(td|th|tr|table)\b[^>]*>", re.I)
+ADMONITION_RE = re.compile(r"^[ \t]*:::[ \t]*(?:\w+)?(?:\[([^\]]*)\])?[^\n]*$", re.M)
+LINK_ITEM_RE = re.compile(r"^[ \t]*(?:[-*+]|\d+\.)[ \t]+\[([^\]]+)\]\([^)]*\)[ \t]*$")
+URL_RE = re.compile(r"https?://\S+")
+CJK_RE = re.compile(r"[一-鿿]")
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（中文按字计，其余按 4 字符 1 个 token）"""
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def information_chars(text: str) -> int:
+    """片段的有效信息量：去掉链接、标题标记后的中文字符数 + 英文单词字符数"""
+    text = URL_RE.sub("", text)
+    text = re.sub(r"^#+\s.*$", "", text, flags=re.M)
+    return len(CJK_RE.findall(text)) + sum(len(w) for w in WORD_RE.findall(text))
+
+
+@dataclass
+class NormalizeReport:
+    """归一化前后统计"""
+    documents: int = 0
+    chunks_before: int = 0
+    chunks_after: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    dropped_chunks: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        saved = 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+        return (f"[normalize] 文档 {self.documents} 篇，片段 {self.chunks_before} -> {self.chunks_after}"
+                f"（过滤低信息片段 {self.dropped_chunks} 个），token {self.tokens_before} -> {self.tokens_after}"
+                f"（-{saved:.1%}），耗时 {self.seconds:.2f}s")
+
+
+class TextNormalizer:
+    """
+    Markdown 文本归一化器
+
+    代码块内容原样保留；同一输入总是得到相同输出，不影响 chunk_id 的稳定性
+    """
+
+    def __init__(
+        self,
+        strip_images: bool = True,
+        collapse_link_lists: bool = True,
+        link_list_min: int = 5,
+        min_chunk_chars: int = 12,
+        boilerplate_patterns: Sequence[str] = (),
+    ):
+        """
+        Args:
+            strip_images: 是否去掉图片（图片预览链接对检索没有帮助）
+            collapse_link_lists: 是否折叠只有链接的列表
+            link_list_min: 连续多少个链接列表项才折叠
+            min_chunk_chars: 片段最少有效字符数（低于该值的片段丢弃，0 表示不过滤）
+            boilerplate_patterns: 需要整行删除的样板文字正则（页脚等）
+        """
+        self.strip_images = strip_images
+        self.collapse_link_lists = collapse_link_lists
+        self.link_list_min = link_list_min
+        self.min_chunk_chars = min_chunk_chars
+        self.boilerplate_res = [re.compile(p) for p in boilerplate_patterns]
+
+    @classmethod
+    def from_config(cls, rag_config) -> Optional["TextNormalizer"]:
+        """按 RAG 配置创建（未启用时返回 None）"""
+        if not rag_config.normalize:
+            return None
+        return cls(
+            min_chunk_chars=rag_config.min_chunk_chars,
+            boilerplate_patterns=rag_config.boilerplate_patterns,
+        )
+
+    def normalize(self, text: str) -> str:
+        """归一化一篇 Markdown"""
+        parts = FENCE_BLOCK_RE.split(text)
+        result = []
+        # split 结果依次为：正文, 代码块, 围栏符号, 正文, ...
+        i = 0
+        while i < len(parts):
+            result.append(self._normalize_prose(parts[i]))
+            if i + 1 < len(parts):
+                # 组件内部缩进的代码块去掉公共缩进，内容不变
+                result.append(textwrap.dedent(parts[i + 1]))
+            i += 3
+        text = "".join(result)
+        text = re.sub(r"[ \t]+$", "", text, flags=re.M)
+        return re.sub(r"\n{3,}", "\n\n", text).strip() + "\n"
+
+    def _normalize_prose(self, text: str) -> str:
+        text = HTML_COMMENT_RE.sub("", text)
+        if self.strip_images:
+            text = MD_IMAGE_RE.sub("", text)
+            text = HTML_IMG_RE.sub("", text)
+        text = TITLED_TAG_RE.sub(lambda m: f"\n**{m.group(2).strip()}**\n", text)
+        text = COMPONENT_TAG_RE.sub("", text)
+        text = LAYOUT_TAG_RE.sub("", text)
+        text = TABLE_ATTR_RE.sub(lambda m: f"<{m.group(1)}>", text)
+        text = ADMONITION_RE.sub(lambda m: f"**{m.group(1)}**" if m.group(1) else "", text)
+        lines = text.split("\n")
+        if self.boilerplate_res:
+            lines = [l for l in lines if not any(p.search(l) for p in self.boilerplate_res)]
+        if self.collapse_link_lists:
+            lines = self._collapse_link_lists(lines)
+        # 组件标签去掉后留下的缩进会被当作代码块，统一去掉正文行首缩进（列表缩进除外）
+        lines = [l.lstrip() if not re.match(r"^\s*([-*+]|\d+\.)\s", l) else l for l in lines]
+        return "\n".join(lines)
+
+    def _collapse_link_lists(self, lines: List[str]) -> List[str]:
+        """连续的纯链接列表项折叠为一行链接文字（导航目录对检索只有标题有用）"""
+        result = []
+        run: List[str] = []
+
+        def flush():
+            if len(run) >= self.link_list_min:
+                result.append("相关文档：" + "、".join(LINK_ITEM_RE.match(l).group(1).strip() for l in run))
+                result.append("")
+            else:
+                result.extend(run)
+            run.clear()
+
+        for line in lines:
+            if LINK_ITEM_RE.match(line):
+                run.append(line)
+                continue
+            # 列表项之间的空行不打断
+            if run and not line.strip():
+                continue
+            flush()
+            result.append(line)
+        flush()
+        return result
+
+    def normalize_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """归一化文档列表（返回新对象，不修改原文档）"""
+        return [
+            Document(page_content=self.normalize(doc.page_content), metadata=dict(doc.metadata))
+            for doc in documents
+        ]
+
+    def filter_chunks(self, chunks: List[Document]) -> Tuple[List[Document], int]:
+        """
+        丢弃信息量过低的片段（只剩标题、链接或图片等）
+
+        Returns:
+            (保留的片段, 丢弃数量)
+        """
+        if self.min_chunk_chars <= 0:
+            return chunks, 0
+        kept = [c for c in chunks if information_chars(self._body_of(c)) >= self.min_chunk_chars]
+        return kept, len(chunks) - len(kept)
+
+    @staticmethod
+    def _body_of(chunk: Document) -> str:
+        """去掉切分器补充的标题路径前缀，只统计片段正文"""
+        title_path = chunk.metadata.get("title_path", "")
+        content = chunk.page_content
+        parents = title_path.rsplit(" > ", 1)[0] if " > " in title_path else ""
+        if parents and content.startswith(parents):
+            content = content[len(parents):]
+        return content
+
+
+def normalize_and_split(
+    documents: List[Document],
+    splitter,
+    normalizer: Optional[TextNormalizer],
+    with_baseline: bool = False,
+) -> Tuple[List[Document], NormalizeReport]:
+    """
+    归一化并切分文档
+
+    Args:
+        documents: 原始文档
+        splitter: 提供 split_documents 的切分器
+        normalizer: 归一化器（None 时只切分）
+        with_baseline: 是否额外切分一次原始文档，统计归一化前的片段数与 token 数
+
+    Returns:
+        (片段, 统计)
+    """
+    started = time.perf_counter()
+    report = NormalizeReport(documents=len(documents))
+    if normalizer is None:
+        splits = splitter.split_documents(documents)
+        report.chunks_before = report.chunks_after = len(splits)
+        report.tokens_before = report.tokens_after = sum(estimate_tokens(c.page_content) for c in splits)
+        report.seconds = time.perf_counter() - started
+        return splits, report
+
+    if with_baseline:
+        baseline = splitter.split_documents(documents)
+        report.chunks_before = len(baseline)
+        report.tokens_before = sum(estimate_tokens(c.page_content) for c in baseline)
+        started = time.perf_counter()
+
+    splits = splitter.split_documents(normalizer.normalize_documents(documents))
+    splits, report.dropped_chunks = normalizer.filter_chunks(splits)
+    report.chunks_after = len(splits)
+    report.tokens_after = sum(estimate_tokens(c.page_content) for c in splits)
+    if not with_baseline:
+        report.chunks_before = report.chunks_after + report.dropped_chunks
+        report.tokens_before = report.tokens_after
+    report.seconds = time.perf_counter() - started
+    return splits, report
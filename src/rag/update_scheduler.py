@@ -1,16 +1,18 @@
 """
 文档更新调度器
-支持多种调度策略
+由 AsyncScheduler 按 cron 表达式调度（jobs.docs_update_cron），可与其他任务共用同一事件循环
 """
 
 import asyncio
-import schedule
 from datetime import datetime
 from loguru import logger
 
 from auto_update_docs import AutoDocsUpdater
-from knowledge_base import KnowledgeBase
+from knowledge_base import build_vector_index
 from utils.config_loader import load_config
+from utils.job_scheduler import AsyncScheduler, CronTrigger
+
+JOB_NAME = "docs_update"
 
 
 class DocsUpdateScheduler:
@@ -39,45 +41,38 @@ class DocsUpdateScheduler:
 
         except Exception as e:
             logger.error(f"定时更新任务失败: {e}")
+            # 继续抛出，由调度器记录失败状态
+            raise
 
     async def _rebuild_knowledge_base(self):
-        """重建知识库"""
-        import shutil
-        from pathlib import Path
-
-        # 删除旧的向量数据库
-        vectordb_path = Path("data/vectordb")
-        if vectordb_path.exists():
-            shutil.rmtree(vectordb_path)
-            logger.info("已删除旧的向量数据库")
-
-        # 重建
-        kb = KnowledgeBase(self.config)
-        await kb.initialize()
-        await kb.close()
-
-        logger.info("知识库重建完成")
-
-    def run_scheduler(self):
-        """运行调度器"""
-        # 设置定时任务
-        schedule.every().day.at("02:00").do(
-            lambda: asyncio.run(self.scheduled_update())
+        """重建知识库（构建新版本并原子切换，运行中的机器人自动热加载）"""
+        version_path = await asyncio.to_thread(build_vector_index, self.config)
+        if version_path is None:
+            logger.error("知识库重建失败，继续使用当前版本")
+            return
+
+        logger.info(f"知识库重建完成，版本: {version_path.name}")
+
+    def register(self, scheduler: AsyncScheduler):
+        """注册到任务调度器（jobs.docs_update_cron 为空时不注册）"""
+        jobs = self.config.jobs
+        if not jobs.docs_update_cron:
+            return
+        trigger = CronTrigger(jobs.docs_update_cron)
+        scheduler.add_job(
+            JOB_NAME,
+            self.scheduled_update,
+            trigger,
+            timeout=jobs.docs_update_timeout,
+            jitter=jobs.jitter,
         )
+        logger.info(f"下次文档更新时间: {trigger.next_fire(datetime.now()):%Y-%m-%d %H:%M}")
 
-        # 也可以设置为每小时检查一次
-        # schedule.every().hour.do(
-        #     lambda: asyncio.run(self.scheduled_update())
-        # )
-
-        logger.info("调度器已启动，等待下次执行...")
-        logger.info("下次执行时间: 每天 02:00")
-
-        # 持续运行
-        while True:
-            schedule.run_pending()
-            import time
-            time.sleep(60)  # 每分钟检查一次
+    async def run_scheduler(self):
+        """运行调度器（持续运行）"""
+        scheduler = AsyncScheduler(self.config.jobs.state_path)
+        self.register(scheduler)
+        await scheduler.run_forever()
 
 
 async def main():
@@ -99,7 +94,7 @@ async def main():
 
     if args.mode == "scheduler":
         # 持续运行模式
-        scheduler.run_scheduler()
+        await scheduler.run_scheduler()
     else:
         # 执行一次
         await scheduler.scheduled_update()
@@ -1,15 +1,15 @@
 """
 企微消息接收服务
-接收企微后台推送的消息，转发给 WeComBridge 处理
+接收企微后台推送的消息，解密后写入本地持久化队列并立即应答，
+由后台消费者批量转发给 WeComBridge 处理（企微回调超时会重推，处理过程不能阻塞应答）
 """
 
 import hashlib
-import hmac
-import base64
 import json
 import asyncio
+import sqlite3
+import xml.etree.ElementTree as ET
 from typing import Optional
-from Crypto.Cipher import AES
 from fastapi import FastAPI, Request, Query, HTTPException
 from fastapi.responses import PlainTextResponse
 from loguru import logger
@@ -20,82 +20,9 @@ load_dotenv(Path(__file__).parent.parent.parent / '.env')
 
 from src.bridges.wecom_bridge import WeComBridge
 from src.utils.config_loader import load_config
-
-
-class WeComCrypto:
-    """企微消息加解密"""
-
-    def __init__(self, token: str, encoding_aes_key: str, corp_id: str = ""):
-        self.token = token
-        # EncodingAESKey 是 43 位，需要补 '=' 变成 44 位 base64
-        self.aes_key = base64.b64decode(encoding_aes_key + "=")
-        self.corp_id = corp_id
-
-    def verify_signature(self, signature: str, timestamp: str, nonce: str) -> bool:
-        """验证签名"""
-        try:
-            # 签名算法: sha1(token + timestamp + nonce)
-            items = [self.token, timestamp, nonce]
-            items.sort()
-            joined = "".join(items)
-            calculated = hashlib.sha1(joined.encode()).hexdigest()
-
-            return calculated == signature
-        except Exception as e:
-            logger.error(f"签名验证失败: {e}")
-            return False
-
-    def decrypt(self, encrypt_msg: str) -> str:
-        """解密消息"""
-        try:
-            cipher = AES.new(self.aes_key, AES.MODE_CBC, self.aes_key[:16])
-
-            # Base64 解码
-            encrypted = base64.b64decode(encrypt_msg)
-
-            # AES 解密
-            decrypted = cipher.decrypt(encrypted)
-
-            # 去除 PKCS7 padding
-            pad = decrypted[-1]
-            decrypted = decrypted[:-pad]
-
-            # 解析内容格式: random(16) + msg_len(4) + msg + corp_id
-            # 跳过前 16 字节随机数
-            msg_len = int.from_bytes(decrypted[16:20], 'big')
-            msg_content = decrypted[20:20 + msg_len].decode('utf-8')
-
-            return msg_content
-        except Exception as e:
-            logger.error(f"消息解密失败: {e}")
-            return ""
-
-    def encrypt(self, msg: str) -> str:
-        """加密响应消息"""
-        try:
-            # 添加 corp_id
-            msg_bytes = msg.encode('utf-8')
-            corp_bytes = self.corp_id.encode('utf-8')
-
-            # 构造内容: random(16) + msg_len(4) + msg + corp_id
-            import os
-            random_bytes = os.urandom(16)
-            msg_len_bytes = len(msg_bytes).to_bytes(4, 'big')
-            content = random_bytes + msg_len_bytes + msg_bytes + corp_bytes
-
-            # PKCS7 padding
-            pad_len = 32 - (len(content) % 32)
-            content += bytes([pad_len] * pad_len)
-
-            # AES 加密
-            cipher = AES.new(self.aes_key, AES.MODE_CBC, self.aes_key[:16])
-            encrypted = cipher.encrypt(content)
-
-            # Base64 编码
-            return base64.b64encode(encrypted).decode('utf-8')
-        except Exception as e:
-            logger.error(f"消息加密失败: {e}")
-            return ""
+from src.utils.durable_queue import DurableQueue, QueueWorker
+from src.utils.metrics import render_metrics
+from src.utils.wecom_crypto import WeComCrypto
 
 
 app = FastAPI(title="WeCom Message Receiver")
@@ -103,25 +30,71 @@ app = FastAPI(title="WeCom Message Receiver")
 # 全局变量
 wecom_bridge: Optional[WeComBridge] = None
 wecom_crypto: Optional[WeComCrypto] = None
+message_queue: Optional[DurableQueue] = None
+queue_worker: Optional[QueueWorker] = None
+
+
+async def handle_batch(messages: list) -> list:
+    """队列消费：在线程池中批量处理（关键词分析、lark-cli 创建工单均为阻塞调用）"""
+    return await asyncio.to_thread(wecom_bridge.process_batch, messages)
 
 
 @app.on_event("startup")
 async def startup():
     """初始化"""
-    global wecom_bridge, wecom_crypto
+    global wecom_bridge, wecom_crypto, message_queue, queue_worker
 
     config = load_config()
     wecom_bridge = WeComBridge()
 
-    # 从配置读取 Token 和 EncodingAESKey
-    wecom_config = getattr(config.bots, 'wecom', {})
-    token = getattr(wecom_config, 'token', 'YourTokenHere')
-    encoding_aes_key = getattr(wecom_config, 'encoding_aes_key', '')
-    corp_id = getattr(wecom_config, 'corp_id', '')
+    queue_config = config.wecom_queue
+    message_queue = DurableQueue(
+        queue_config.path,
+        name="wecom",
+        max_attempts=queue_config.max_attempts,
+        retry_base=queue_config.retry_base,
+        retry_max=queue_config.retry_max,
+    )
+    queue_worker = QueueWorker(
+        message_queue,
+        handle_batch,
+        concurrency=queue_config.workers,
+        batch_size=queue_config.batch_size,
+    )
+    queue_worker.start()
+
+    # 从配置读取 Token 和 EncodingAESKey（密钥展开只在启动时做一次）
+    wecom_config = config.bots.get("wecom")
+    if wecom_config is None:
+        raise RuntimeError("缺少 bots.wecom 配置（token / encoding_aes_key / corp_id）")
+    wecom_crypto = WeComCrypto(wecom_config.token, wecom_config.encoding_aes_key, wecom_config.corp_id)
+
+    logger.info(f"企微接收服务已启动, token={wecom_config.token[:4]}...")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """处理完手头的批次后退出，未处理的消息保留在队列中"""
+    if queue_worker is not None:
+        await queue_worker.stop()
+    if message_queue is not None:
+        message_queue.close()
+    if wecom_bridge is not None:
+        # 写入待追加的重复反馈与缓冲区中剩余的工单
+        await asyncio.to_thread(wecom_bridge.dedup.close)
+        await asyncio.to_thread(wecom_bridge.sink.close)
+
 
-    wecom_crypto = WeComCrypto(token, encoding_aes_key, corp_id)
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标（含队列深度与处理延迟）"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-    logger.info(f"企微接收服务已启动, token={token[:4]}...")
+
+@app.get("/wecom/queue")
+async def queue_status():
+    """队列状态与死信"""
+    return {"stats": message_queue.stats(), "dead_letters": message_queue.dead_letters(20)}
 
 
 @app.get("/wecom/callback")
@@ -139,8 +112,8 @@ async def verify_url(
     """
     logger.info(f"收到企微 URL 验证请求: timestamp={timestamp}, nonce={nonce}")
 
-    # 验证签名
-    if not wecom_crypto.verify_signature(msg_signature, timestamp, nonce):
+    # 验证签名（签名包含 echostr）
+    if not wecom_crypto.verify_signature(msg_signature, timestamp, nonce, echostr):
         logger.warning(f"签名验证失败: {msg_signature}")
         raise HTTPException(status_code=403, detail="签名验证失败")
 
@@ -155,11 +128,17 @@ async def verify_url(
 
 
 @app.post("/wecom/callback")
-async def receive_message(request: Request):
+async def receive_message(
+    request: Request,
+    msg_signature: str = Query(...),
+    timestamp: str = Query(...),
+    nonce: str = Query(...),
+):
     """
     接收企微消息推送
 
     企微会发送 POST 请求推送群消息
+    缺少签名参数的请求由 FastAPI 拒绝（422），签名不通过的请求返回 403
     """
     try:
         # 解析 XML 或 JSON
@@ -168,14 +147,18 @@ async def receive_message(request: Request):
 
         if "xml" in content_type.lower():
             # XML 格式（旧版）
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(body.decode('utf-8'))
-            encrypt_msg = root.find('Encrypt').text
+            root = ET.fromstring(body)
+            encrypt_msg = root.findtext('Encrypt', '')
         else:
             # JSON 格式（新版）
-            data = json.loads(body.decode('utf-8'))
+            data = json.loads(body)
             encrypt_msg = data.get('encrypt', '')
 
+        # 先验签（签名包含密文），不通过的请求不应答 success
+        if not encrypt_msg or not wecom_crypto.verify_signature(msg_signature, timestamp, nonce, encrypt_msg):
+            logger.warning(f"消息签名验证失败: {msg_signature}")
+            return PlainTextResponse(content="fail", status_code=403)
+
         # 解密消息
         decrypted = wecom_crypto.decrypt(encrypt_msg)
         if not decrypted:
@@ -187,16 +170,19 @@ async def receive_message(request: Request):
         # 解析消息内容
         raw_message = json.loads(decrypted)
 
-        # 调用 WeComBridge 处理
-        result = await asyncio.to_thread(
-            wecom_bridge.process_message,
-            raw_message
-        )
-
-        if result:
-            logger.info(f"企微消息处理成功: {result.get('record_id')}")
+        # 写入持久化队列后立即应答；企微重推的同一消息按 MsgId 去重
+        msg_id = raw_message.get("MsgId") or raw_message.get("msg_id")
+        dedup_key = str(msg_id) if msg_id else hashlib.sha1(encrypt_msg.encode()).hexdigest()
+        try:
+            created = message_queue.enqueue(raw_message, dedup_key=dedup_key)
+        except sqlite3.Error as e:
+            # 未能持久化时不应答 success，让企微稍后重推
+            logger.error(f"企微消息入队失败: {e}")
+            return PlainTextResponse(content="fail", status_code=500)
+        if created:
+            queue_worker.notify()
         else:
-            logger.debug("企微消息未创建工单（已处理或未匹配关键词）")
+            logger.debug(f"企微消息已在队列中: {dedup_key}")
 
         # 返回 success 表示接收成功
         return PlainTextResponse(content="success")
@@ -0,0 +1,126 @@
+"""
+本地工单库命令行
+查看写入失败、保存在本地的工单，立即补写，或导出 / 导入为每条工单一个 JSON 文件
+
+运行:
+    python src/tickets_main.py stats
+    python src/tickets_main.py list --status pending --type bug --since 2026-10-01
+    python src/tickets_main.py show <ticket_id>
+    python src/tickets_main.py resync                  # 立即补写全部待补写工单
+    python src/tickets_main.py resync <ticket_id> ...  # 重新创建指定工单（如记录被误删）
+    python src/tickets_main.py resync --failed         # 多次补写失败（failed）的工单放回待补写并立即补写
+    python src/tickets_main.py export --dir data/local_tickets/export
+    python src/tickets_main.py import --dir data/local_tickets   # 导入旧版降级保存的 bug_/feature_ 文件
+
+机器人进程内的补写线程（ticket_store.sync_interval）会自动补写，通常无需手动运行 resync
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# 添加项目根目录与 src 目录到路径
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+sys.path.insert(0, str(root_dir / "src"))
+
+from integrations.lark_cli_wrapper import LarkCliWrapper
+from integrations.ticket_store import STATUSES, TicketStore, TicketSyncWorker
+from utils.config_loader import load_config
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main(argv=None) -> int:
+    """本地工单库命令行"""
+    parser = argparse.ArgumentParser(description="本地工单库")
+    parser.add_argument("--config", default="config/config.yaml", help="配置文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列出工单")
+    list_parser.add_argument("--type", dest="ticket_type", help="工单类型（bug / feature）")
+    list_parser.add_argument("--status", choices=STATUSES, help="状态")
+    list_parser.add_argument("--chat", dest="chat_id", help="来源群 ID")
+    list_parser.add_argument("--since", help="创建时间起（如 2026-10-01 或 2026-10-01T08:00）")
+    list_parser.add_argument("--until", help="创建时间止")
+    list_parser.add_argument("--limit", type=int, default=50)
+
+    show_parser = subparsers.add_parser("show", help="查看工单详情")
+    show_parser.add_argument("ticket_id")
+
+    resync_parser = subparsers.add_parser("resync", help="立即补写待补写工单；指定工单 ID 时重新创建这些工单")
+    resync_parser.add_argument("ticket_ids", nargs="*")
+    resync_parser.add_argument("--failed", action="store_true", help="先把多次补写失败的工单放回待补写")
+
+    export_parser = subparsers.add_parser("export", help="导出为每条工单一个 JSON 文件")
+    export_parser.add_argument("--dir", help="导出目录，默认 ticket_store.export_dir")
+    export_parser.add_argument("--status", choices=STATUSES)
+
+    import_parser = subparsers.add_parser("import", help="导入每条工单一个的 JSON 文件")
+    import_parser.add_argument("--dir", help="文件目录，默认 ticket_store.export_dir")
+
+    subparsers.add_parser("stats", help="各状态工单数")
+
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    store = TicketStore(config.ticket_store.path)
+
+    if args.command == "list":
+        tickets = store.list(ticket_type=args.ticket_type, status=args.status, chat_id=args.chat_id,
+                             since=_parse_time(args.since), until=_parse_time(args.until), limit=args.limit)
+        for ticket in tickets:
+            created = datetime.fromtimestamp(ticket["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+            title = ticket["fields"].get("标题", "")[:40]
+            print(f"{ticket['ticket_id']}  {created}  {ticket['type']:<8}{ticket['status']:<9}"
+                  f"{ticket['record_id'] or '-':<18}{title}")
+        print(f"共 {len(tickets)} 条")
+
+    elif args.command == "show":
+        ticket = store.get(args.ticket_id)
+        if ticket is None:
+            print(f"工单不存在: {args.ticket_id}")
+            return 1
+        print(json.dumps(ticket, ensure_ascii=False, indent=2))
+
+    elif args.command == "resync":
+        if args.ticket_ids:
+            print(f"重新补写 {store.reset(args.ticket_ids)} 条工单")
+        if args.failed:
+            print(f"放回待补写 {store.retry_failed()} 条失败工单")
+        store.recover()
+        worker = TicketSyncWorker(store, LarkCliWrapper(config), batch_size=config.ticket_store.sync_batch_size,
+                                  max_attempts=config.ticket_store.sync_max_attempts)
+        result = worker.sync_once()
+        stats = store.stats()
+        print(f"补写成功 {result['synced']} 条，失败 {result['failed']} 条，剩余 {stats['pending']} 条待补写，"
+              f"{stats['failed']} 条已放弃（resync --failed 重试）")
+
+    elif args.command == "export":
+        paths = store.export(args.dir or config.ticket_store.export_dir, status=args.status)
+        print(f"已导出 {len(paths)} 个文件")
+
+    elif args.command == "import":
+        lark_cli = LarkCliWrapper(config)
+
+        def build(ticket_type: str, data: Dict):
+            if ticket_type == "bug":
+                return lark_cli.bug_table_id, lark_cli.app_token, lark_cli.build_bug_fields(data, data.get("submitter"))
+            return lark_cli.feature_table_id, lark_cli.app_token, lark_cli.build_feature_fields(data, data.get("submitter"))
+
+        print(f"已导入 {store.import_files(args.dir or config.ticket_store.export_dir, build)} 个文件")
+
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), ensure_ascii=False))
+
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
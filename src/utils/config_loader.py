@@ -1,14 +1,27 @@
 """
 配置加载器
+
+配置文件在进程内只解析一次，由 ConfigRegistry 缓存并按修改时间热加载；
+每次加载生成新的只读 Config 快照，订阅者在配置变化时收到新快照
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import yaml
+from loguru import logger
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic_settings import BaseSettings
 
+try:
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from utils.module_aliases import register_aliases
+
+# 配置快照只读：热加载时整体替换为新对象，持有旧快照的调用方不会看到字段被逐个修改
+FROZEN = ConfigDict(frozen=True)
+
 
 class BotConfig(BaseModel):
     """机器人配置"""
@@ -26,6 +39,8 @@ class BotConfig(BaseModel):
     encoding_aes_key: str = ""
     corp_id: str = ""
 
+    model_config = FROZEN
+
 
 class LLMConfig(BaseModel):
     """LLM 配置"""
@@ -36,14 +51,66 @@ class LLMConfig(BaseModel):
     temperature: float = 0.3
     max_tokens: int = 2000
     timeout: int = 30
+    # 流式回答：先发占位卡片，再按节流频率 PATCH 更新
+    stream_answer: bool = True
+    stream_patch_interval: float = 0.5  # 两次卡片更新的最小间隔（秒），避免触发飞书消息编辑频控
+    stream_patch_tokens: int = 8  # 至少累积多少个增量片段才更新一次卡片
+
+    model_config = FROZEN
+
+
+class VectorDBConfig(BaseModel):
+    """向量数据库配置"""
+    path: str = "./data/vectordb"
+    # 检测索引版本切换的最小间隔（秒），0 表示不热切换
+    reload_interval: float = 5.0
+    # 保留的下线版本数（用于回滚）
+    keep_versions: int = 2
+    # 下线版本的清理宽限期（秒），期间仍在使用旧版本的检索可以正常完成
+    gc_grace_seconds: int = 3600
+
+    model_config = FROZEN
+
+
+class RetrievalServiceConfig(BaseModel):
+    """本机检索服务配置"""
+    # 服务地址：unix:///path/to.sock 或 http://127.0.0.1:8765，为空时各进程自行加载模型与向量库
+    url: str = ""
+    # 客户端请求超时（秒）
+    timeout: float = 10.0
+    # 服务端合并并发查询向量化的最大批量与最长等待（毫秒）
+    max_batch: int = 32
+    max_wait_ms: float = 5.0
+
+    model_config = FROZEN
 
 
 class RAGConfig(BaseModel):
     """RAG 配置"""
+    # 切分方式：markdown（按标题结构切分）/ recursive（按字符递归切分）
+    chunker: str = "markdown"
     chunk_size: int = 500
     chunk_overlap: int = 50
     top_k: int = 5
-    score_threshold: float = 0.7
+    # 相关度阈值（0~1，越大越相关）
+    score_threshold: float = 0.3
+    # 构建时近似重复片段去重（MinHash Jaccard 阈值）
+    dedup: bool = True
+    dedup_threshold: float = 0.85
+    # 嵌入相似度去重阈值（余弦相似度，0 表示关闭）
+    dedup_embedding_threshold: float = 0.0
+    # 向量化前的文本归一化（去掉组件标签、图片、链接列表等非正文内容）
+    normalize: bool = True
+    # 片段最少有效字符数，低于该值的片段不入库（0 表示不过滤）
+    min_chunk_chars: int = 12
+    # 需要整行删除的样板文字正则（页脚等）
+    boilerplate_patterns: list = Field(default_factory=list)
+    # 向量数据库（来自 rag.vector_db）
+    vector_db: VectorDBConfig = Field(default_factory=VectorDBConfig)
+    # 本机检索服务（来自 rag.service）
+    service: RetrievalServiceConfig = Field(default_factory=RetrievalServiceConfig)
+
+    model_config = FROZEN
 
 
 class ServerConfig(BaseModel):
@@ -51,6 +118,10 @@ class ServerConfig(BaseModel):
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = False
+    # 独立 /metrics 服务端口（飞书长连接等无 HTTP 服务的进程使用，0 表示不启动）
+    metrics_port: int = 9100
+
+    model_config = FROZEN
 
 
 class RequiredField(BaseModel):
@@ -61,6 +132,8 @@ class RequiredField(BaseModel):
     example: str = ""
     hint: str = ""
 
+    model_config = FROZEN
+
 
 class InfoCollectionConfig(BaseModel):
     """信息收集配置"""
@@ -68,6 +141,8 @@ class InfoCollectionConfig(BaseModel):
     feature_fields: list = []
     max_rounds: int = 8
 
+    model_config = FROZEN
+
 
 class ClassifierConfig(BaseModel):
     """分类器配置"""
@@ -75,11 +150,37 @@ class ClassifierConfig(BaseModel):
     confidence_threshold: float = 0.6
     prompt_template: str = ""
 
+    model_config = FROZEN
+
+
+class KeywordGeneratorConfig(BaseModel):
+    """关键词自动生成配置"""
+    enabled: bool = True
+    history_days: float = 7  # 分析过去多少天的工单记录
+    min_cluster_size: int = 2  # 最少几次相同问题才生成关键词
+    ticket_table_ids: List[str] = Field(default_factory=list)  # 留空时使用 feishu_ticket 的缺陷表与需求表
+    created_field: str = ""  # 按该字段在服务端过滤创建时间，留空时使用表中类型为「创建时间」的字段
+    cache_path: str = "data/ticket_fetch_cache.json"  # 工单缓存，之后只拉取新创建的工单；留空不缓存
+    similarity_threshold: float = 0.8  # 两条工单余弦相似度不低于该值视为同一问题
+    max_clusters: int = 20  # 每次最多为多少个热点问题生成关键词（按工单数从多到少）
+    samples_per_cluster: int = 8  # 每个热点问题交给 LLM 的代表工单数
+    llm_concurrency: int = 2  # 同时进行的 LLM 调用数（同时受 fairness.background_concurrency 限制）
+
+    model_config = FROZEN
+
 
 class KeywordTableConfig(BaseModel):
     """关键词表配置"""
     base_token: str = ""
     table_id: str = ""
+    refresh_interval: float = 300.0  # 后台同步间隔（秒），0 表示只在启动时同步一次
+    modified_field: str = ""  # 「最后更新时间」字段名，配置后按修改时间增量同步
+    full_sync_every: int = 12  # 每 N 次同步做一次全量（增量同步无法感知删除）
+    page_size: int = 500
+    snapshot_path: str = "data/keyword_table_snapshot.json"  # 本地快照，留空不保存
+    generator: KeywordGeneratorConfig = Field(default_factory=KeywordGeneratorConfig)
+
+    model_config = FROZEN
 
 
 class FeishuTicketConfig(BaseModel):
@@ -90,6 +191,110 @@ class FeishuTicketConfig(BaseModel):
     bug_field_mappings: Dict[str, str] = Field(default_factory=dict)
     feature_field_mappings: Dict[str, str] = Field(default_factory=dict)
 
+    model_config = FROZEN
+
+
+class JobsConfig(BaseModel):
+    """后台定时任务配置"""
+    # 与 FastAPI 机器人（src/bots/main.py）共用事件循环运行定时任务；也可单独运行 src/jobs_main.py
+    host_in_bot: bool = False
+    state_path: str = "data/job_state.json"  # 任务上次运行时间等状态，用于重启后补跑
+    docs_update_cron: str = "0 2 * * *"  # 文档更新（分 时 日 月 周），留空不调度
+    docs_update_timeout: float = 7200.0
+    watcher_interval: float = 300.0  # BUG 关键词扫描间隔（秒），0 表示不调度
+    watcher_timeout: float = 240.0
+    keyword_generator_cron: str = "30 3 * * 1"  # 关键词自动生成（分析 history_days 天内的工单），留空不调度
+    keyword_generator_timeout: float = 1800.0
+    jitter: float = 10.0  # 每次触发的随机延迟上限（秒）
+
+    model_config = FROZEN
+
+
+class WeComQueueConfig(BaseModel):
+    """企微回调消息队列配置"""
+    path: str = "data/wecom_queue.db"  # SQLite 队列文件
+    workers: int = 2  # 消费协程数
+    batch_size: int = 20  # 每批最多取出的消息数
+    max_attempts: int = 5  # 超过后转入死信
+    retry_base: float = 2.0  # 重试退避基数（秒），第 n 次失败后约等待 base * 2^(n-1)
+    retry_max: float = 300.0  # 单次退避上限（秒）
+
+    model_config = FROZEN
+
+
+class TaskSupervisorConfig(BaseModel):
+    """Webhook 后台任务监管配置（src/bots/main.py）"""
+    # 各平台同时处理的消息数，超出的进入等待队列
+    limits: Dict[str, int] = Field(default_factory=lambda: {"wecom": 8, "apifox_wecom": 8, "feishu": 16})
+    # 各平台等待队列长度，队列满时回复繁忙提示
+    backlogs: Dict[str, int] = Field(default_factory=lambda: {"wecom": 50, "apifox_wecom": 50, "feishu": 100})
+    busy_message: str = "当前咨询人数较多，请稍后再试～"
+    shutdown_timeout: float = 30.0  # 关闭时等待任务完成的最长时间（秒）
+
+    model_config = FROZEN
+
+
+class FairnessConfig(BaseModel):
+    """LLM 调用公平调度配置"""
+    enabled: bool = True
+    concurrency: int = 8  # 全局同时进行的 LLM 处理数
+    background_concurrency: int = 2  # 后台任务（关键词生成等）最多占用的名额
+    chat_rate_per_minute: float = 20.0  # 每个群每分钟的提问处理数，0 表示不限
+    chat_burst: int = 5
+    user_rate_per_minute: float = 6.0  # 每个用户每分钟的提问处理数，0 表示不限
+    user_burst: int = 3
+    max_wait: float = 30.0  # 排队超过该时长（秒）回复繁忙提示
+    busy_message: str = "提问的人有点多，请稍后再 @ 我～"
+
+    model_config = FROZEN
+
+
+class WeComSenderConfig(BaseModel):
+    """企微消息发送配置"""
+    webhook_rate_per_minute: int = 20  # 每个群机器人 Webhook 每分钟最多发送的消息数（企微限制 20 条/分钟）
+    apifox_rate_per_minute: int = 0  # 定制版 API 每个会话每分钟最多发送的消息数，0 表示不限
+    merge_window: float = 0.5  # 发往同一目标的消息等待该时长（秒）后合并为一条发送
+    merge_max_bytes: int = 2048  # 合并后单条消息的最大字节数（企微文本消息上限 2048 字节）
+    max_pending: int = 100  # 每个目标最多排队的消息数，超出后直接失败
+    max_retries: int = 3  # 网络错误、5xx、限频时的重试次数
+    retry_base: float = 1.0  # 第 n 次重试前约等待 retry_base * 2^(n-1) 秒（带随机抖动）
+    timeout: float = 10.0
+    max_connections: int = 20
+
+    model_config = FROZEN
+
+
+class TicketSinkConfig(BaseModel):
+    """工单批量写入配置"""
+    flush_interval: float = 1.0  # 第一条工单进入缓冲区后最多等待该时长（秒）再批量写入
+    max_batch: int = 50  # 缓冲区达到该条数时立即写入（飞书单次批量写入上限 500 条）
+
+    model_config = FROZEN
+
+
+class TicketStoreConfig(BaseModel):
+    """本地工单库配置"""
+    path: str = "data/local_tickets/tickets.db"  # 写入失败的工单保存在该 SQLite 文件中
+    sync_interval: float = 60.0  # 补写待补写工单的间隔（秒），0 表示只在写入成功后补写
+    sync_batch_size: int = 50  # 每批补写的最多条数
+    sync_max_attempts: int = 10  # 同一批次最多补写次数，之后标记为 failed，0 表示不限
+    export_dir: str = "data/local_tickets"  # 导出 / 导入每条工单一个 JSON 文件的默认目录
+
+    model_config = FROZEN
+
+
+class TicketDedupConfig(BaseModel):
+    """重复工单检测配置"""
+    enabled: bool = True
+    threshold: float = 0.9  # 与近期工单的余弦相似度不低于该值时合并到已有工单
+    window_hours: float = 72.0  # 只与该时长内创建的工单比较
+    attach_field: str = "补充信息"  # 重复反馈追加到已有工单的该字段
+    attach_delay: float = 30.0  # 同一工单的重复反馈攒该时长（秒）后一次更新
+    hydrate: bool = True  # 启动时从多维表格拉取时间窗口内的工单建立索引
+    max_text_chars: int = 256  # 参与向量化的最大字符数
+
+    model_config = FROZEN
+
 
 class Config(BaseModel):
     """主配置"""
@@ -102,13 +307,21 @@ class Config(BaseModel):
     classifier: ClassifierConfig = Field(default_factory=ClassifierConfig)
     keyword_table: KeywordTableConfig = Field(default_factory=KeywordTableConfig)
     feishu_ticket: FeishuTicketConfig = Field(default_factory=FeishuTicketConfig)
+    jobs: JobsConfig = Field(default_factory=JobsConfig)
+    wecom_queue: WeComQueueConfig = Field(default_factory=WeComQueueConfig)
+    task_supervisor: TaskSupervisorConfig = Field(default_factory=TaskSupervisorConfig)
+    fairness: FairnessConfig = Field(default_factory=FairnessConfig)
+    wecom_sender: WeComSenderConfig = Field(default_factory=WeComSenderConfig)
+    ticket_sink: TicketSinkConfig = Field(default_factory=TicketSinkConfig)
+    ticket_store: TicketStoreConfig = Field(default_factory=TicketStoreConfig)
+    ticket_dedup: TicketDedupConfig = Field(default_factory=TicketDedupConfig)
 
-    model_config = ConfigDict(extra="ignore")
+    model_config = ConfigDict(extra="ignore", frozen=True)
 
 
-def load_config(config_path: str = "config/config.yaml") -> Config:
+def parse_config(config_path: str = "config/config.yaml") -> Config:
     """
-    加载配置文件
+    解析配置文件（每次调用都重新读取，一般使用 load_config 获取缓存的快照）
 
     Args:
         config_path: 配置文件路径
@@ -135,6 +348,149 @@ def load_config(config_path: str = "config/config.yaml") -> Config:
     return _build_config(config_data)
 
 
+def load_config(config_path: str = "config/config.yaml") -> Config:
+    """
+    加载配置文件（进程内缓存，同一文件只解析一次）
+
+    Args:
+        config_path: 配置文件路径
+
+    Returns:
+        当前配置快照
+    """
+    return get_registry(config_path).get()
+
+
+ConfigCallback = Callable[[Config], None]
+
+
+class ConfigRegistry:
+    """
+    配置注册表
+
+    缓存一个配置文件的解析结果；start_watching 后后台按修改时间轮询文件，
+    内容变化时重新解析并通知订阅者。解析失败时保留旧快照
+    """
+
+    def __init__(self, config_path: str, poll_interval: float = 2.0):
+        self.path = Path(config_path).resolve()
+        self.poll_interval = poll_interval
+        self._config: Optional[Config] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[ConfigCallback, Optional[Tuple[str, ...]]]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self) -> Config:
+        """当前配置快照（首次调用时解析）"""
+        config = self._config
+        if config is None:
+            with self._lock:
+                if self._config is None:
+                    self._stamp = self._file_stamp()
+                    self._config = parse_config(str(self.path))
+                config = self._config
+        return config
+
+    def subscribe(self, callback: ConfigCallback, sections: Iterable[str] = None) -> Callable[[], None]:
+        """
+        订阅配置变化
+
+        Args:
+            callback: 回调，参数为新的配置快照
+            sections: 只关心的顶层配置项（如 ("llm", "rag")），为空表示任意变化都通知
+
+        Returns:
+            取消订阅的函数
+        """
+        entry = (callback, tuple(sections) if sections else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+
+        return unsubscribe
+
+    def reload(self, force: bool = False) -> List[str]:
+        """
+        文件有变化（或 force）时重新解析并通知订阅者
+
+        Returns:
+            发生变化的顶层配置项
+        """
+        stamp = self._file_stamp()
+        if not force and (stamp is None or stamp == self._stamp):
+            return []
+        old = self.get()
+        try:
+            new = parse_config(str(self.path))
+        except Exception as e:
+            logger.error(f"配置重新加载失败，继续使用当前配置: {e}")
+            self._stamp = stamp
+            return []
+        with self._lock:
+            self._stamp = stamp
+            changed = [name for name in Config.model_fields if getattr(old, name) != getattr(new, name)]
+            if not changed:
+                return []
+            self._config = new
+            subscribers = list(self._subscribers)
+        logger.info(f"配置已重新加载，变化项: {', '.join(changed)}")
+
+        for callback, sections in subscribers:
+            if sections and not set(sections).intersection(changed):
+                continue
+            try:
+                callback(new)
+            except Exception as e:
+                logger.error(f"配置变更回调失败 {getattr(callback, '__qualname__', callback)}: {e}")
+        return changed
+
+    def start_watching(self):
+        """启动后台线程按修改时间轮询配置文件"""
+        if self._thread is not None:
+            return
+        self.get()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True, name="config-watcher")
+        self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+
+_registries: Dict[Path, ConfigRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(config_path: str = "config/config.yaml") -> ConfigRegistry:
+    """获取配置文件对应的进程内注册表（按绝对路径区分）"""
+    path = Path(config_path).resolve()
+    registry = _registries.get(path)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(path, ConfigRegistry(str(path)))
+    return registry
+
+
 def _replace_env_variables(data: Any) -> Any:
     """
     递归替换配置中的环境变量
@@ -178,7 +534,10 @@ def _build_config(data: Dict) -> Config:
             bots_config["wecom"] = BotConfig(
                 enabled=bot_data.get("enabled", False),
                 webhook_url=bot_data.get("webhook_url", ""),
-                chat_ids=bot_data.get("chat_ids", [])
+                chat_ids=bot_data.get("chat_ids", []),
+                token=bot_data.get("token", ""),
+                encoding_aes_key=bot_data.get("encoding_aes_key", ""),
+                corp_id=bot_data.get("corp_id", "")
             )
         elif bot_name == "feishu":
             bots_config["feishu"] = BotConfig(
@@ -196,7 +555,13 @@ def _build_config(data: Dict) -> Config:
 
     # RAG 配置
     rag_data = data.get("rag", {}).get("retrieval", {})
-    rag_config = RAGConfig(**rag_data)
+    vector_db_data = data.get("rag", {}).get("vector_db", {})
+    service_data = data.get("rag", {}).get("service", {})
+    rag_config = RAGConfig(
+        **rag_data,
+        vector_db=VectorDBConfig(**vector_db_data),
+        service=RetrievalServiceConfig(**service_data),
+    )
 
     # 服务器配置
     server_data = data.get("server", {})
@@ -222,7 +587,13 @@ def _build_config(data: Dict) -> Config:
     keyword_table_data = data.get("keyword_table", {})
     keyword_table_config = KeywordTableConfig(
         base_token=keyword_table_data.get("base_token", ""),
-        table_id=keyword_table_data.get("table_id", "")
+        table_id=keyword_table_data.get("table_id", ""),
+        refresh_interval=keyword_table_data.get("refresh_interval", 300.0),
+        modified_field=keyword_table_data.get("modified_field", ""),
+        full_sync_every=keyword_table_data.get("full_sync_every", 12),
+        page_size=keyword_table_data.get("page_size", 500),
+        snapshot_path=keyword_table_data.get("snapshot_path", "data/keyword_table_snapshot.json"),
+        generator=KeywordGeneratorConfig(**(keyword_table_data.get("generator") or {})),
     )
 
     # 飞书工单配置
@@ -235,6 +606,30 @@ def _build_config(data: Dict) -> Config:
         feature_field_mappings=feishu_ticket_data.get("feature_field_mappings", {})
     )
 
+    # 定时任务配置
+    jobs_config = JobsConfig(**data.get("jobs", {}))
+
+    # 企微回调消息队列配置
+    wecom_queue_config = WeComQueueConfig(**data.get("wecom_queue", {}))
+
+    # Webhook 后台任务监管配置
+    task_supervisor_config = TaskSupervisorConfig(**data.get("task_supervisor", {}))
+
+    # LLM 调用公平调度配置
+    fairness_config = FairnessConfig(**data.get("fairness", {}))
+
+    # 企微消息发送配置
+    wecom_sender_config = WeComSenderConfig(**data.get("wecom_sender", {}))
+
+    # 工单批量写入配置
+    ticket_sink_config = TicketSinkConfig(**data.get("ticket_sink", {}))
+
+    # 本地工单库配置
+    ticket_store_config = TicketStoreConfig(**data.get("ticket_store", {}))
+
+    # 重复工单检测配置
+    ticket_dedup_config = TicketDedupConfig(**data.get("ticket_dedup", {}))
+
     # 构建主配置
     config = Config(
         bots=bots_config,
@@ -244,7 +639,18 @@ def _build_config(data: Dict) -> Config:
         info_collection=info_collection_config,
         classifier=classifier_config,
         keyword_table=keyword_table_config,
-        feishu_ticket=feishu_ticket_config
+        feishu_ticket=feishu_ticket_config,
+        jobs=jobs_config,
+        wecom_queue=wecom_queue_config,
+        task_supervisor=task_supervisor_config,
+        fairness=fairness_config,
+        wecom_sender=wecom_sender_config,
+        ticket_sink=ticket_sink_config,
+        ticket_store=ticket_store_config,
+        ticket_dedup=ticket_dedup_config
     )
 
     return config
+
+
+register_aliases(__name__)
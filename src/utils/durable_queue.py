@@ -0,0 +1,306 @@
+"""
+持久化消息队列（SQLite）
+回调入口只把消息写入本地队列后立即应答，由后台 QueueWorker 批量取出处理；
+处理失败按指数退避重试，超过最大次数转入死信，进程崩溃后未确认的消息在重启时重新投递
+
+    queue = DurableQueue("data/wecom_queue.db", name="wecom")
+    queue.enqueue(message, dedup_key=message["MsgId"])   # 同一 dedup_key 只入队一次（企微超时重推）
+
+    worker = QueueWorker(queue, handler, concurrency=2, batch_size=20)
+    worker.start()        # 在事件循环中启动
+    await worker.stop()   # 处理完手头的批次后退出
+
+handler 为协程函数，接收一批消息体，返回等长的错误列表（None 表示成功）
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+except ImportError:
+    from utils.metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    "queue_depth",
+    "队列中待处理的消息数（status: pending/inflight/dead）",
+    ["queue", "status"]
+)
+QUEUE_LAG_SECONDS = REGISTRY.histogram(
+    "queue_lag_seconds",
+    "消息从入队到开始处理的延迟（秒）",
+    ["queue"]
+)
+QUEUE_OLDEST_SECONDS = REGISTRY.gauge(
+    "queue_oldest_seconds",
+    "最早一条待处理消息的等待时长（秒）",
+    ["queue"]
+)
+QUEUE_MESSAGES_TOTAL = REGISTRY.counter(
+    "queue_messages_total",
+    "队列消息数（event: enqueued/duplicate/done/retry/dead）",
+    ["queue", "event"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedup_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_ready ON messages (status, available_at, id);
+"""
+
+
+@dataclass
+class QueueItem:
+    """取出的一条消息"""
+    id: int
+    payload: Dict
+    attempts: int
+    enqueued_at: float
+
+
+class DurableQueue:
+    """
+    SQLite 持久化队列
+
+    WAL 模式 + synchronous=NORMAL：入队一次约为亚毫秒级的本地写入，进程崩溃不丢已提交的消息。
+    单进程独占使用（多个 worker 协程共享同一连接，由锁串行化）
+    """
+
+    def __init__(self, path: str, name: str = "default", max_attempts: int = 5,
+                 retry_base: float = 2.0, retry_max: float = 300.0):
+        self.path = Path(path)
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, payload: Dict, dedup_key: Optional[str] = None) -> bool:
+        """
+        入队
+
+        Args:
+            payload: 消息体（可 JSON 序列化）
+            dedup_key: 去重键，相同键的消息只保留第一条
+
+        Returns:
+            是否为新消息
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO messages (dedup_key, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+                (dedup_key, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+        created = cursor.rowcount == 1
+        QUEUE_MESSAGES_TOTAL.inc(queue=self.name, event="enqueued" if created else "duplicate")
+        return created
+
+    def recover(self) -> int:
+        """把上次进程退出时未确认的消息放回待处理（启动时调用）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE messages SET status = 'pending' WHERE status = 'inflight'"
+            )
+        if cursor.rowcount:
+            logger.info(f"队列 {self.name} 恢复 {cursor.rowcount} 条未确认的消息")
+        return cursor.rowcount
+
+    def claim(self, limit: int) -> List[QueueItem]:
+        """取出最多 limit 条到期的待处理消息，并标记为处理中"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts, enqueued_at FROM messages "
+                    "WHERE status = 'pending' AND available_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE messages SET status = 'inflight' WHERE id = ?",
+                        [(row[0],) for row in rows],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [QueueItem(id=row[0], payload=json.loads(row[1]), attempts=row[2], enqueued_at=row[3])
+                for row in rows]
+
+    def ack(self, ids: List[int]):
+        """确认处理完成（删除消息，去重键随之释放）"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in ids])
+        QUEUE_MESSAGES_TOTAL.inc(len(ids), queue=self.name, event="done")
+
+    def retry_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的重试延迟（指数退避 + 随机抖动）"""
+        delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    def fail(self, item: QueueItem, error: str):
+        """处理失败：按退避延迟重新投递，超过最大次数转入死信"""
+        attempts = item.attempts + 1
+        if attempts >= self.max_attempts:
+            status, available_at, event = "dead", time.time(), "dead"
+            logger.error(f"队列 {self.name} 消息 {item.id} 失败 {attempts} 次，转入死信: {error}")
+        else:
+            status, available_at, event = "pending", time.time() + self.retry_delay(attempts), "retry"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE messages SET status = ?, attempts = ?, available_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, available_at, error[:1000], item.id),
+            )
+        QUEUE_MESSAGES_TOTAL.inc(queue=self.name, event=event)
+
+    def dead_letters(self, limit: int = 100) -> List[Dict]:
+        """查看死信"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, attempts, last_error, enqueued_at FROM messages "
+                "WHERE status = 'dead' ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [{"id": r[0], "payload": json.loads(r[1]), "attempts": r[2], "last_error": r[3],
+                 "enqueued_at": r[4]} for r in rows]
+
+    def requeue_dead(self) -> int:
+        """把死信重新放回待处理（修复下游问题后手动调用）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE messages SET status = 'pending', attempts = 0, available_at = ? WHERE status = 'dead'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """各状态消息数与最早待处理消息的等待时长，同时更新指标"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM messages GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM messages WHERE status != 'dead'"
+            ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in ("pending", "inflight", "dead")}
+        stats["oldest_seconds"] = round(time.time() - oldest, 3) if oldest else 0.0
+        for status in ("pending", "inflight", "dead"):
+            QUEUE_DEPTH.set(stats[status], queue=self.name, status=status)
+        QUEUE_OLDEST_SECONDS.set(stats["oldest_seconds"], queue=self.name)
+        return stats
+
+
+BatchHandler = Callable[[List[Dict]], Awaitable[List[Optional[str]]]]
+
+
+class QueueWorker:
+    """
+    队列消费者
+
+    concurrency 个消费协程各自按批取出消息交给 handler，成功的一次性确认，失败的逐条退避重试；
+    入队后调用 notify() 可立即唤醒空闲的消费协程，否则每 poll_interval 秒检查一次
+    """
+
+    def __init__(self, queue: DurableQueue, handler: BatchHandler, concurrency: int = 2,
+                 batch_size: int = 20, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self):
+        """在当前事件循环中启动消费协程"""
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self.queue.recover()
+        self.queue.stats()
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._run(), name=f"queue-{self.queue.name}-{i}"))
+        logger.info(f"队列 {self.queue.name} 消费者已启动: 并发 {self.concurrency}，批量 {self.batch_size}")
+
+    def notify(self):
+        """有新消息入队"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = 30.0):
+        """停止消费：等待处理中的批次完成（超时后取消，未确认的消息下次启动时重新投递）"""
+        self._stopping = True
+        self.notify()
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.queue.stats()
+
+    async def _run(self):
+        while not self._stopping:
+            items = self.queue.claim(self.batch_size)
+            if not items:
+                self.queue.stats()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(items)
+
+    async def _process(self, items: List[QueueItem]):
+        now = time.time()
+        for item in items:
+            QUEUE_LAG_SECONDS.observe(now - item.enqueued_at, queue=self.queue.name)
+
+        try:
+            errors = await self.handler([item.payload for item in items])
+            if len(errors) != len(items):
+                raise ValueError(f"handler 返回 {len(errors)} 个结果，期望 {len(items)} 个")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"队列 {self.queue.name} 批次处理异常: {e}")
+            errors = [str(e) or type(e).__name__] * len(items)
+
+        self.queue.ack([item.id for item, error in zip(items, errors) if error is None])
+        for item, error in zip(items, errors):
+            if error is not None:
+                self.queue.fail(item, error)
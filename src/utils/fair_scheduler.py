@@ -0,0 +1,344 @@
+"""
+LLM 调用公平调度
+回答、分类、信息提取等需要调用 LLM 的处理先申请一个执行名额：
+
+    - 全局并发上限（fairness.concurrency），名额按群轮转分配，一个群连续 @ 机器人不会占满所有名额
+    - 每个群、每个用户各有一个令牌桶（每分钟速率 + 突发容量），超出速率的请求排队等待令牌
+    - 两个优先级通道：@ 机器人的提问（interactive）优先于后台任务（background，如关键词生成），
+      后台任务另有并发上限，始终为提问保留名额
+    - 等待超过 max_wait 秒抛出 FairSchedulerTimeout，由调用方回复繁忙提示
+
+    async with fair_scheduler.slot(chat_id, user_id):
+        await self._handle_new_question(...)
+
+飞书长连接入口每条消息在独立线程的事件循环中处理，调度器用线程锁保护状态，
+通过 call_soon_threadsafe 唤醒各自事件循环中的等待者
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from utils.metrics import REGISTRY
+    from utils.module_aliases import register_aliases
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# 等待令牌恢复时的重新检查间隔（秒）；名额释放会立即唤醒等待者，不依赖该间隔
+RECHECK_INTERVAL = 0.25
+
+# 令牌桶数量超过该值时清理已回满（长期空闲）的桶
+MAX_IDLE_BUCKETS = 4096
+
+FAIR_WAIT_SECONDS = REGISTRY.histogram(
+    "fair_wait_seconds",
+    "LLM 调用排队等待时长（秒）",
+    ["lane", "chat"]
+)
+FAIR_WAITING = REGISTRY.gauge(
+    "fair_waiting",
+    "排队等待 LLM 名额的请求数",
+    ["lane"]
+)
+FAIR_ACTIVE = REGISTRY.gauge(
+    "fair_active",
+    "占用 LLM 名额的请求数",
+    ["lane"]
+)
+FAIR_TIMEOUTS_TOTAL = REGISTRY.counter(
+    "fair_timeouts_total",
+    "等待超时被放弃的请求数",
+    ["lane"]
+)
+
+
+class FairSchedulerTimeout(asyncio.TimeoutError):
+    """等待 LLM 名额超时"""
+
+
+class TokenBucket:
+    """令牌桶（rate: 每秒补充的令牌数，capacity: 最大突发）"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Waiter:
+    chat_id: str
+    user_id: str
+    priority: int
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class FairScheduler:
+    """按群轮转、按群 / 用户限速、分优先级的 LLM 名额调度器"""
+
+    def __init__(self, concurrency: int = 8, background_concurrency: int = 2,
+                 chat_rate_per_minute: float = 20.0, chat_burst: int = 5,
+                 user_rate_per_minute: float = 6.0, user_burst: int = 3,
+                 max_wait: float = 30.0, enabled: bool = True):
+        self._lock = threading.Lock()
+        self._active = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        # 每个通道：群 ID -> 该群的等待队列（按入队先后排列）
+        self._queues: Dict[int, Dict[str, Deque[_Waiter]]] = {
+            PRIORITY_INTERACTIVE: {},
+            PRIORITY_BACKGROUND: {},
+        }
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        # 群 ID -> 最近一次分配名额的序号；分配时优先最久未分配的群
+        self._last_served: Dict[str, int] = {}
+        self._serial = 0
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self.concurrency = concurrency
+        self.background_concurrency = background_concurrency
+        self.chat_rate_per_minute = chat_rate_per_minute
+        self.chat_burst = chat_burst
+        self.user_rate_per_minute = user_rate_per_minute
+        self.user_burst = user_burst
+        self.max_wait = max_wait
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls, fairness_config) -> "FairScheduler":
+        scheduler = cls()
+        scheduler.apply_config(fairness_config)
+        return scheduler
+
+    def apply_config(self, fairness_config):
+        """更新限额（配置热加载；已有令牌桶保留当前令牌数）"""
+        with self._lock:
+            self.enabled = fairness_config.enabled
+            self.concurrency = max(1, fairness_config.concurrency)
+            self.background_concurrency = max(1, fairness_config.background_concurrency)
+            self.chat_rate_per_minute = fairness_config.chat_rate_per_minute
+            self.chat_burst = fairness_config.chat_burst
+            self.user_rate_per_minute = fairness_config.user_rate_per_minute
+            self.user_burst = fairness_config.user_burst
+            self.max_wait = fairness_config.max_wait
+            for bucket in self._chat_buckets.values():
+                bucket.rate, bucket.capacity = self.chat_rate_per_minute / 60, max(1.0, self.chat_burst)
+            for bucket in self._user_buckets.values():
+                bucket.rate, bucket.capacity = self.user_rate_per_minute / 60, max(1.0, self.user_burst)
+        self._dispatch()
+
+    # ------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------
+
+    @asynccontextmanager
+    async def slot(self, chat_id: str, user_id: str = "", priority: int = PRIORITY_INTERACTIVE):
+        """
+        申请一个 LLM 名额，退出上下文时释放
+
+        Raises:
+            FairSchedulerTimeout: 等待超过 max_wait 秒
+        """
+        if not self.enabled:
+            yield
+            return
+        waiter = await self._acquire(chat_id or "unknown", user_id or "", priority)
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def stats(self) -> Dict:
+        """各通道占用与排队情况（含每个群的排队数）"""
+        with self._lock:
+            return {
+                LANE_NAMES[priority]: {
+                    "active": self._active[priority],
+                    "waiting": {chat: len(queue) for chat, queue in self._queues[priority].items()},
+                }
+                for priority in self._queues
+            }
+
+    # ------------------------------------------------------------
+    # 排队与分配
+    # ------------------------------------------------------------
+
+    async def _acquire(self, chat_id: str, user_id: str, priority: int) -> _Waiter:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(chat_id, user_id, priority, loop, loop.create_future())
+        lane = LANE_NAMES[priority]
+        with self._lock:
+            self._queues[priority].setdefault(chat_id, deque()).append(waiter)
+            self._update_gauges()
+        self._dispatch()
+
+        deadline = waiter.enqueued_at + self.max_wait
+        try:
+            while not waiter.future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if self._abandon(waiter):
+                        FAIR_TIMEOUTS_TOTAL.inc(lane=lane)
+                        logger.warning(f"[{chat_id}] 等待 LLM 名额超过 {self.max_wait:g} 秒，放弃")
+                        raise FairSchedulerTimeout(f"等待 LLM 名额超时: {chat_id}")
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), min(remaining, RECHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    # 可能在等待令牌恢复
+                    self._dispatch()
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                self._release(waiter)
+            raise
+
+        FAIR_WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued_at, lane=lane, chat=chat_id)
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """从队列中移除尚未分配到名额的等待者；已分配时返回 False"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            queues = self._queues[waiter.priority]
+            queue = queues.get(waiter.chat_id)
+            if queue is not None:
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+                if not queue:
+                    del queues[waiter.chat_id]
+            self._update_gauges()
+            return True
+
+    def _release(self, waiter: _Waiter):
+        with self._lock:
+            self._active[waiter.priority] -= 1
+            self._update_gauges()
+        self._dispatch()
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate_per_minute: float,
+                burst: int, now: float) -> Optional[TokenBucket]:
+        if rate_per_minute <= 0 or not key:
+            return None
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_IDLE_BUCKETS:
+                for idle in [k for k, b in buckets.items() if b.full(now)]:
+                    del buckets[idle]
+            bucket = TokenBucket(rate_per_minute / 60, burst, now)
+            buckets[key] = bucket
+        return bucket
+
+    def _pick(self, queue: Deque[_Waiter], priority: int, now: float) -> Optional[_Waiter]:
+        """取出该群中第一个有令牌的等待者（后台任务不限速）"""
+        if priority != PRIORITY_INTERACTIVE:
+            return queue.popleft()
+        chat_bucket = self._bucket(self._chat_buckets, queue[0].chat_id,
+                                   self.chat_rate_per_minute, self.chat_burst, now)
+        if chat_bucket is not None and not chat_bucket.ready(now):
+            return None
+        for waiter in queue:
+            user_bucket = self._bucket(self._user_buckets, waiter.user_id,
+                                       self.user_rate_per_minute, self.user_burst, now)
+            if user_bucket is None or user_bucket.ready(now):
+                queue.remove(waiter)
+                if chat_bucket is not None:
+                    chat_bucket.take()
+                if user_bucket is not None:
+                    user_bucket.take()
+                return waiter
+        return None
+
+    def _has_capacity(self, priority: int) -> bool:
+        if sum(self._active.values()) >= self.concurrency:
+            return False
+        if priority == PRIORITY_BACKGROUND:
+            return self._active[PRIORITY_BACKGROUND] < self.background_concurrency
+        return True
+
+    def _dispatch(self):
+        """按优先级、按群轮转分配空闲名额"""
+        granted = []
+        with self._lock:
+            now = time.monotonic()
+            for priority in (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND):
+                queues = self._queues[priority]
+                progressed = True
+                while progressed and queues and self._has_capacity(priority):
+                    progressed = False
+                    # 轮转：最久未分配的群优先（排序稳定，同为新群时按入队先后）
+                    for chat_id in sorted(queues, key=lambda c: self._last_served.get(c, 0)):
+                        queue = queues[chat_id]
+                        waiter = self._pick(queue, priority, now)
+                        if waiter is None:
+                            continue
+                        if not queue:
+                            del queues[chat_id]
+                        self._serve(chat_id)
+                        waiter.granted = True
+                        self._active[priority] += 1
+                        granted.append(waiter)
+                        progressed = True
+                        break
+            if granted:
+                self._update_gauges()
+
+        for waiter in granted:
+            try:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+            except RuntimeError:
+                # 等待者所在的事件循环已关闭
+                self._release(waiter)
+
+    def _serve(self, chat_id: str):
+        self._serial += 1
+        self._last_served[chat_id] = self._serial
+        if len(self._last_served) > MAX_IDLE_BUCKETS:
+            # 只保留仍在排队的群；被清理的群按新群处理
+            waiting = {c for queues in self._queues.values() for c in queues}
+            self._last_served = {c: n for c, n in self._last_served.items() if c in waiting or c == chat_id}
+
+    def _update_gauges(self):
+        for priority, lane in LANE_NAMES.items():
+            FAIR_ACTIVE.set(self._active[priority], lane=lane)
+            FAIR_WAITING.set(sum(len(q) for q in self._queues[priority].values()), lane=lane)
+
+
+register_aliases(__name__)
@@ -0,0 +1,369 @@
+"""
+异步任务调度器
+在一个长期运行的事件循环中执行定时任务（文档更新、关键词扫描等），可与机器人共用同一事件循环
+
+    - 触发器：CronTrigger（5 段 cron 表达式）、IntervalTrigger（固定间隔）
+    - 每个任务可设置最大并发实例数（默认 1，上一次未结束时跳过本次）、超时与随机抖动
+    - 上次运行时间持久化到本地状态文件，重启后补跑停机期间错过的运行（多次错过只补一次）
+    - 同步函数在线程池中执行，慢任务不阻塞事件循环
+
+使用方式:
+    scheduler = AsyncScheduler("data/job_state.json")
+    scheduler.add_job("docs_update", updater.scheduled_update, CronTrigger("0 2 * * *"), timeout=7200)
+    scheduler.add_job("bug_watcher", watcher.scan_once, IntervalTrigger(300), jitter=10)
+    await scheduler.run_forever()
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+except ImportError:
+    from utils.metrics import REGISTRY
+
+JOB_SECONDS = REGISTRY.histogram(
+    "job_seconds",
+    "后台任务运行耗时（秒）",
+    ["job", "status"]
+)
+JOB_RUNS_TOTAL = REGISTRY.counter(
+    "job_runs_total",
+    "后台任务运行次数（status: ok/error/timeout/skipped）",
+    ["job", "status"]
+)
+JOBS_RUNNING = REGISTRY.gauge(
+    "jobs_running",
+    "正在运行的任务实例数",
+    ["job"]
+)
+
+# cron 各字段取值范围（分 时 日 月 周，周日可写作 0 或 7）
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+# 查找下次触发时间时最多向后搜索的天数（覆盖 2 月 29 日这类低频表达式）
+CRON_SEARCH_DAYS = 366 * 5
+
+
+def _parse_cron_field(expr: str, low: int, high: int, name: str) -> Set[int]:
+    """解析单个 cron 字段，支持 *、*/n、a-b、a-b/n 与逗号列表"""
+    values: Set[int] = set()
+    for part in expr.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"cron {name} 步长必须为正数: {expr}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if not (low <= start <= high and low <= end <= high and start <= end):
+            raise ValueError(f"cron {name} 超出范围 {low}-{high}: {expr}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """
+    cron 触发器（本地时间，5 段：分 时 日 月 周，周日为 0 或 7）
+
+    与标准 cron 一致：日与周同时受限时，满足任一即触发
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError(f"cron 表达式应为 5 段（分 时 日 月 周）: {expression}")
+        self.expression = expression
+        parsed = [_parse_cron_field(part, low, high, name)
+                  for part, (name, low, high) in zip(parts, CRON_FIELDS)]
+        self.minutes = sorted(parsed[0])
+        self.hours = sorted(parsed[1])
+        self.days, self.months = parsed[2], parsed[3]
+        self.weekdays = {value % 7 for value in parsed[4]}
+        self._day_any = parts[2] == "*"
+        self._weekday_any = parts[4] == "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        # datetime.weekday() 周一为 0，cron 周日为 0
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        day_ok = day.day in self.days
+        if self._day_any and self._weekday_any:
+            return True
+        if self._day_any:
+            return weekday_ok
+        if self._weekday_any:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_fire(self, after: datetime) -> datetime:
+        """返回严格晚于 after 的下一次触发时间"""
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for offset in range(CRON_SEARCH_DAYS):
+            if self._day_matches(day):
+                first_day = offset == 0
+                for hour in self.hours:
+                    if first_day and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"cron 表达式在 {CRON_SEARCH_DAYS} 天内不会触发: {self.expression}")
+
+    def __repr__(self) -> str:
+        return f"cron[{self.expression}]"
+
+
+class IntervalTrigger:
+    """固定间隔触发器"""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError(f"触发间隔必须为正数: {seconds}")
+        self.seconds = seconds
+
+    def next_fire(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+@dataclass
+class Job:
+    """调度任务"""
+    name: str
+    func: Callable
+    trigger: object
+    max_instances: int = 1  # 同时运行的最大实例数，达到上限时跳过本次触发
+    timeout: Optional[float] = None  # 超时（秒），None 表示不限
+    jitter: float = 0.0  # 每次触发额外随机延迟 0~jitter 秒，避免多个进程同时请求上游
+    catch_up: bool = True  # 启动时补跑停机期间错过的运行
+    run_on_start: bool = False  # 启动时立即运行一次
+    running: int = 0
+    tasks: Set[asyncio.Task] = field(default_factory=set)
+
+
+class AsyncScheduler:
+    """
+    异步任务调度器
+
+    每个任务一个调度协程，按触发器计算下次运行时间后 sleep，到点创建运行实例；
+    状态文件记录每个任务的 last_run / last_success / last_status / last_duration
+    """
+
+    def __init__(self, state_path: str = "data/job_state.json"):
+        self.state_path = Path(state_path) if state_path else None
+        self.jobs: Dict[str, Job] = {}
+        self.state: Dict[str, Dict] = self._load_state()
+        self._loops: List[asyncio.Task] = []
+        self._stopped: Optional[asyncio.Event] = None
+
+    # ------------------------------------------------------------
+    # 状态持久化
+    # ------------------------------------------------------------
+
+    def _load_state(self) -> Dict[str, Dict]:
+        if not self.state_path or not self.state_path.exists():
+            return {}
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"任务状态文件读取失败，忽略: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logger.warning(f"任务状态保存失败: {e}")
+
+    def _state_time(self, name: str, key: str) -> Optional[datetime]:
+        value = self.state.get(name, {}).get(key)
+        try:
+            return datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    def last_run(self, name: str) -> Optional[datetime]:
+        """任务上次开始运行的时间"""
+        return self._state_time(name, "last_run")
+
+    def last_success(self, name: str) -> Optional[datetime]:
+        """任务上次成功完成时对应的开始时间"""
+        return self._state_time(name, "last_success")
+
+    # ------------------------------------------------------------
+    # 任务管理
+    # ------------------------------------------------------------
+
+    def add_job(self, name: str, func: Callable, trigger, **options) -> Job:
+        """
+        注册任务
+
+        Args:
+            name: 任务名（状态文件与指标中的标识）
+            func: 协程函数或普通函数（普通函数在线程池中执行），无参数
+            trigger: CronTrigger / IntervalTrigger
+            **options: max_instances / timeout / jitter / catch_up / run_on_start
+        """
+        if name in self.jobs:
+            raise ValueError(f"任务已存在: {name}")
+        job = Job(name=name, func=func, trigger=trigger, **options)
+        self.jobs[name] = job
+        logger.info(f"注册任务 {name}: {trigger}")
+        return job
+
+    def status(self) -> Dict[str, Dict]:
+        """各任务运行状态"""
+        return {
+            name: {**self.state.get(name, {}), "running": job.running, "trigger": repr(job.trigger)}
+            for name, job in self.jobs.items()
+        }
+
+    def start(self):
+        """在当前事件循环中启动全部任务的调度协程"""
+        if self._loops:
+            return
+        self._stopped = asyncio.Event()
+        for job in self.jobs.values():
+            self._loops.append(asyncio.create_task(self._schedule(job), name=f"job-{job.name}"))
+        logger.info(f"任务调度器已启动，共 {len(self.jobs)} 个任务")
+
+    async def stop(self, grace: float = 30.0):
+        """停止调度，并等待运行中的实例结束（超过 grace 秒后取消）"""
+        for loop in self._loops:
+            loop.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops.clear()
+
+        running = [task for job in self.jobs.values() for task in job.tasks]
+        if running:
+            logger.info(f"等待 {len(running)} 个运行中的任务结束...")
+            done, pending = await asyncio.wait(running, timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run_forever(self):
+        """启动并一直运行到 stop() 被调用"""
+        self.start()
+        await self._stopped.wait()
+
+    def run_now(self, name: str) -> Optional[asyncio.Task]:
+        """立即触发一次任务（受最大并发实例数限制）"""
+        return self._spawn(self.jobs[name])
+
+    # ------------------------------------------------------------
+    # 调度与执行
+    # ------------------------------------------------------------
+
+    async def _schedule(self, job: Job):
+        last_run = self.last_run(job.name)
+        now = datetime.now()
+        if job.run_on_start:
+            self._spawn(job)
+        elif job.catch_up and last_run and job.trigger.next_fire(last_run) <= now:
+            logger.info(f"任务 {job.name} 在停机期间错过运行（上次 {last_run:%Y-%m-%d %H:%M}），立即补跑")
+            self._spawn(job)
+
+        while True:
+            fire_at = job.trigger.next_fire(datetime.now())
+            delay = (fire_at - datetime.now()).total_seconds()
+            if job.jitter > 0:
+                delay += random.uniform(0, job.jitter)
+            await asyncio.sleep(max(0.0, delay))
+            self._spawn(job)
+
+    def _spawn(self, job: Job) -> Optional[asyncio.Task]:
+        if job.running >= job.max_instances:
+            JOB_RUNS_TOTAL.inc(job=job.name, status="skipped")
+            logger.warning(f"任务 {job.name} 上一次运行尚未结束，跳过本次触发")
+            return None
+        job.running += 1
+        JOBS_RUNNING.set(job.running, job=job.name)
+        task = asyncio.create_task(self._execute(job), name=f"job-run-{job.name}")
+        job.tasks.add(task)
+        task.add_done_callback(job.tasks.discard)
+        return task
+
+    async def _execute(self, job: Job):
+        started_at = datetime.now()
+        started = time.perf_counter()
+        self.state.setdefault(job.name, {})["last_run"] = started_at.isoformat()
+        self._save_state()
+
+        status = "ok"
+        thread_future = None
+        try:
+            if asyncio.iscoroutinefunction(job.func):
+                await asyncio.wait_for(job.func(), job.timeout)
+            else:
+                # 线程无法被取消：超时后记录状态，但占用的实例名额保留到线程真正结束，避免重叠运行
+                thread_future = asyncio.ensure_future(asyncio.to_thread(job.func))
+                result = await asyncio.wait_for(asyncio.shield(thread_future), job.timeout)
+                # lambda / partial 包装的协程函数返回协程对象，在事件循环中继续执行
+                if inspect.isawaitable(result):
+                    thread_future = None
+                    await asyncio.wait_for(result, job.timeout)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error(f"任务 {job.name} 超时（{job.timeout:g} 秒）")
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = "error"
+            logger.exception(f"任务 {job.name} 执行失败: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            JOB_SECONDS.observe(duration, job=job.name, status=status)
+            JOB_RUNS_TOTAL.inc(job=job.name, status=status)
+            entry = self.state.setdefault(job.name, {})
+            entry.update(last_status=status, last_duration=round(duration, 3))
+            if status == "ok":
+                entry["last_success"] = started_at.isoformat()
+            self._save_state()
+            if status == "timeout" and thread_future is not None:
+                try:
+                    await thread_future
+                except Exception:
+                    pass
+            job.running -= 1
+            JOBS_RUNNING.set(job.running, job=job.name)
+            logger.info(f"任务 {job.name} 结束: {status}，耗时 {duration:.1f} 秒")
@@ -1,18 +1,102 @@
 import asyncio
+import json
+import os
+import re
+import time
 import httpx
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Optional
 from loguru import logger
 
-from utils.config_loader import load_config
-from utils.notifier import FeishuNotifier
+try:
+    from src.utils.config_loader import load_config
+    from src.utils.notifier import FeishuNotifier
+    from src.utils.fair_scheduler import FairScheduler, PRIORITY_BACKGROUND
+    from src.utils.job_scheduler import AsyncScheduler, CronTrigger
+    from src.utils.keyword_table import MAX_PAGE_SIZE, field_text
+    from src.utils.ticket_clustering import (
+        cluster_embeddings, embed_texts, load_ticket_embeddings, representatives, ticket_text,
+    )
+except ImportError:
+    from utils.config_loader import load_config
+    from utils.notifier import FeishuNotifier
+    from utils.fair_scheduler import FairScheduler, PRIORITY_BACKGROUND
+    from utils.job_scheduler import AsyncScheduler, CronTrigger
+    from utils.keyword_table import MAX_PAGE_SIZE, field_text
+    from utils.ticket_clustering import (
+        cluster_embeddings, embed_texts, load_ticket_embeddings, representatives, ticket_text,
+    )
+
+JOB_NAME = "keyword_generator"
+
+DAY_MS = 86400 * 1000
+# 多维表格「创建时间」字段的类型编号
+CREATED_TIME_FIELD_TYPE = 1001
+# 拉取工单时只返回这些字段（表中不存在的字段不请求）
+TICKET_FIELDS = ["标题", "问题描述", "问题现状", "附加信息", "类型", "补充信息"]
+CACHE_VERSION = 1
+
+
+def build_batch_prompt(tickets: List[Dict]) -> str:
+    """全部工单拼成一个提示词，由 LLM 自行找出高频问题（嵌入模型不可用时使用）"""
+    tickets_text = ""
+    for i, t in enumerate(tickets):
+        tickets_text += f"【编号{i}】\n标题：{t['title']}\n描述：{t['description'][:50]}\n类型：{t['type']}\n\n"
+
+    return f"""你是负责知识库建设和用户支持的数据分析专家。
+我为你提供了一批最近提交的技术支持工单记录。请完成以下任务：
+1. 找出这里面重复出现2次及以上的【高度相似/相同的业务咨询或报错现象】。
+2. 为每个具有代表性的高频问题集，提炼出 3-5 个用户可能输入的**短小触发关键词**（例如：“导入报错、导出Excel失败”）。多个关键词需用顿号（、）隔开。
+3. 根据问题集的类型，提供一个简明的回复文本样例（尽量包含问题的原因或大致解决方案，或者提醒查看相关文档）。
+
+近期工单列表：
+{tickets_text}
+
+请严格按如下 JSON 数组格式返回结果（如果没有任何聚集出的高频问题，则返回空数组 []）：
+[
+  {{
+    "keywords": "关键词1、关键词2、关键词3",
+    "reply_content": "关于导入报错的解决方案是：请检查...",
+    "issue_summary": "提取问题摘要",
+    "frequency": 2
+  }}
+]
+"""
+
+
+def build_cluster_prompt(samples: List[Dict], frequency: int) -> str:
+    """一个热点问题的提示词（只含该簇的代表工单）"""
+    tickets_text = ""
+    for i, t in enumerate(samples):
+        tickets_text += f"【编号{i}】\n标题：{t['title']}\n描述：{str(t['description'])[:100]}\n类型：{t['type']}\n\n"
+
+    return f"""你是负责知识库建设和用户支持的数据分析专家。
+以下 {len(samples)} 条工单是最近 {frequency} 条相似工单中的代表，反映的是同一个高频问题。请完成以下任务：
+1. 提炼出 3-5 个用户可能输入的**短小触发关键词**（例如：“导入报错、导出Excel失败”）。多个关键词需用顿号（、）隔开。
+2. 提供一个简明的回复文本样例（尽量包含问题的原因或大致解决方案，或者提醒查看相关文档）。
+
+工单列表：
+{tickets_text}
+
+请严格按如下 JSON 格式返回结果：
+{{
+  "keywords": "关键词1、关键词2、关键词3",
+  "reply_content": "关于导入报错的解决方案是：请检查...",
+  "issue_summary": "提取问题摘要"
+}}
+"""
 
 
 class KeywordGenerator:
     """自动关键词生成器"""
 
-    def __init__(self, config=None):
+    def __init__(self, config=None, fair_scheduler: FairScheduler = None,
+                 embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
         self.config = config or load_config()
+        # 在机器人进程内运行（jobs.host_in_bot）时由 jobs_main.build_scheduler 传入机器人的调度器，
+        # 关键词生成走后台通道，与 @ 机器人的提问争用同一组名额时让提问优先
+        self.fair_scheduler = fair_scheduler or FairScheduler.from_config(self.config.fairness)
         self.app_id = self.config.bots["feishu"].app_id
         self.app_secret = self.config.bots["feishu"].app_secret
         
@@ -22,16 +106,27 @@ class KeywordGenerator:
         self.ticket_app_token = self.config.feishu_ticket.app_token
         
         # Generator configs
-        gen_cfg = getattr(self.config.keyword_table, "generator", {})
-        self.history_days = gen_cfg.get("history_days", 7)
-        self.min_cluster_size = gen_cfg.get("min_cluster_size", 2)
-        self.ticket_table_ids = gen_cfg.get("ticket_table_ids", [])
+        gen_cfg = self.config.keyword_table.generator
+        self.history_days = gen_cfg.history_days
+        self.min_cluster_size = gen_cfg.min_cluster_size
+        self.similarity_threshold = gen_cfg.similarity_threshold
+        self.max_clusters = gen_cfg.max_clusters
+        self.samples_per_cluster = gen_cfg.samples_per_cluster
+        self.llm_concurrency = max(1, gen_cfg.llm_concurrency)
+        # 工单在本地向量化后聚类（默认与知识库使用同一嵌入模型，首次分析时加载）
+        self.embed = embed
+        self.ticket_table_ids = [t for t in gen_cfg.ticket_table_ids if t]
         if not self.ticket_table_ids:
             # Fallback to config values if omitted
             self.ticket_table_ids = [
-                self.config.feishu_ticket.bug_table_id,
-                self.config.feishu_ticket.feature_table_id
+                t for t in (self.config.feishu_ticket.bug_table_id, self.config.feishu_ticket.feature_table_id) if t
             ]
+        self.created_field = gen_cfg.created_field
+        self.cache_path = Path(gen_cfg.cache_path) if gen_cfg.cache_path else None
+        self.last_fetch_stats: Dict = {}
+        self.open_api_base = "https://open.feishu.cn"
+        # 测试时可替换为 httpx.MockTransport
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
 
         # LLM
         from anthropic import Anthropic
@@ -40,134 +135,282 @@ class KeywordGenerator:
             client_kwargs["base_url"] = self.config.llm.base_url
         self.llm_client = Anthropic(**client_kwargs)
 
-    async def _get_tenant_access_token(self) -> str:
+    async def _get_tenant_access_token(self, client: Optional[httpx.AsyncClient] = None) -> str:
         """获取飞书 token"""
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json={
-                "app_id": self.app_id,
-                "app_secret": self.app_secret
-            }, timeout=10.0)
-            data = resp.json()
-            if data.get("code") == 0:
-                return data.get("tenant_access_token")
-            raise Exception(f"获取 Token 失败: {data}")
+        url = f"{self.open_api_base}/open-apis/auth/v3/tenant_access_token/internal"
+        if client is None:
+            async with httpx.AsyncClient(transport=self.transport) as own_client:
+                return await self._get_tenant_access_token(own_client)
+        resp = await client.post(url, json={
+            "app_id": self.app_id,
+            "app_secret": self.app_secret
+        }, timeout=10.0)
+        data = resp.json()
+        if data.get("code") == 0:
+            return data.get("tenant_access_token")
+        raise Exception(f"获取 Token 失败: {data}")
 
-    async def fetch_recent_tickets(self) -> List[Dict]:
-        """获取最近提交的工单"""
-        token = await self._get_tenant_access_token()
-        cutoff_date = datetime.now() - timedelta(days=self.history_days)
-        cutoff_timestamp = int(cutoff_date.timestamp() * 1000)
-        
-        all_tickets = []
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {token}"}
-            for table_id in self.ticket_table_ids:
-                if not table_id:
-                    continue
-                url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.ticket_app_token}/tables/{table_id}/records"
-                
-                # Using search API instead of list to allow dynamic fetching
-                # Simple loop to fetch all and filter by timestamp (since default Bitable filters are complex)
-                page_token = ""
-                has_more = True
-                
-                logger.info(f"正在拉取表格 {table_id} 的历史工单数据...")
-                while has_more:
-                    params = {"page_size": 100}
-                    if page_token:
-                        params["page_token"] = page_token
-                        
-                    resp = await client.get(url, headers=headers, params=params, timeout=30.0)
-                    data = resp.json()
-                    
-                    if data.get("code") != 0:
-                        logger.error(f"拉取表格 {table_id} 错误: {data.get('msg')}")
-                        break
-                        
-                    items = data.get("data", {}).get("items", [])
-                    has_more = data.get("data", {}).get("has_more", False)
-                    page_token = data.get("data", {}).get("page_token", "")
-                    
-                    for item in items:
-                        # Extract timestamps or use internal modified time if actual fields missing
-                        fields = item.get("fields", {})
-                        # fallback logic since created_time might not be perfectly mapped in some tables
-                        created_at = item.get("created_time")
-                        if not created_at:
-                            continue
-                            
-                        # Keep recent ones
-                        if int(created_at) >= cutoff_timestamp:
-                            title = fields.get("标题", "")
-                            description = fields.get("问题描述", "") or fields.get("问题现状", "") or fields.get("附加信息", "")
-                            all_tickets.append({
-                                "id": item.get("record_id"),
-                                "title": title,
-                                "description": description,
-                                "type": fields.get("类型", "未知")
-                            })
-                            
-        logger.info(f"共发现 {len(all_tickets)} 个距今 {self.history_days} 天内的工单记录。")
+    async def fetch_recent_tickets(self, days: float = None, incremental: bool = True) -> List[Dict]:
+        """
+        获取最近提交的工单
+
+        各工单表并发拉取；records/search 按表中的「创建时间」字段在服务端过滤，只返回用到的字段。
+        结果缓存在 cache_path，下次只拉取缓存游标之后创建的工单（表中没有创建时间字段时全量拉取、本地过滤）
+
+        Args:
+            days: 拉取最近多少天的工单，默认 history_days（重复工单检测按自己的时间窗口拉取）
+            incremental: 使用本地缓存只拉取新工单；需要工单的最新内容时传 False（缓存不会感知已有工单的修改）
+
+        Returns:
+            工单列表（按创建时间排序），本次传输与保留的条数记录在 last_fetch_stats
+        """
+        days = days or self.history_days
+        now_ms = int(time.time() * 1000)
+        cutoff_ms = now_ms - int(days * DAY_MS)
+        # 缓存保留 history_days 内的工单，重复工单检测等较短的时间窗口也能命中
+        keep_ms = now_ms - int(max(days, self.history_days) * DAY_MS) if incremental else cutoff_ms
+        cache = self._load_fetch_cache() if incremental else {}
+
+        async with httpx.AsyncClient(timeout=30.0, transport=self.transport) as client:
+            token = await self._get_tenant_access_token(client)
+            results = await asyncio.gather(*(
+                self._fetch_table(client, token, table_id, cutoff_ms, keep_ms, cache.get(table_id))
+                for table_id in self.ticket_table_ids
+            ), return_exceptions=True)
+
+        entries: Dict[str, Dict] = {}
+        stats = {"transferred": 0, "kept": 0, "cached": 0, "tables": {}}
+        for table_id, result in zip(self.ticket_table_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"拉取表格 {table_id} 错误: {result}")
+                # 沿用缓存中的工单
+                if cache.get(table_id):
+                    entries[table_id] = cache[table_id]
+                continue
+            entries[table_id], table_stats = result
+            stats["tables"][table_id] = table_stats
+            for key in ("transferred", "kept", "cached"):
+                stats[key] += table_stats[key]
+        if incremental:
+            self._save_fetch_cache(entries)
+
+        all_tickets = sorted(
+            (t for entry in entries.values() for t in entry["tickets"] if t["created_at"] * 1000 >= cutoff_ms),
+            key=lambda t: t["created_at"]
+        )
+        self.last_fetch_stats = stats
+        logger.info(f"共发现 {len(all_tickets)} 个距今 {days} 天内的工单记录"
+                    f"（传输 {stats['transferred']} 条，保留 {stats['kept']} 条，来自缓存 {stats['cached']} 条）。")
         return all_tickets
 
+    async def _table_schema(self, client: httpx.AsyncClient, token: str, table_id: str):
+        """
+        查询表的字段
+
+        Returns:
+            (表中存在的工单字段, 创建时间字段名)；查询失败时为 (None, "")，不做字段投影与服务端过滤
+        """
+        url = f"{self.open_api_base}/open-apis/bitable/v1/apps/{self.ticket_app_token}/tables/{table_id}/fields"
+        resp = await client.get(url, headers={"Authorization": f"Bearer {token}"}, params={"page_size": 100})
+        data = resp.json()
+        if data.get("code") != 0:
+            logger.warning(f"查询表格 {table_id} 字段失败，全量拉取: {data.get('msg')}")
+            return None, ""
+        items = (data.get("data") or {}).get("items") or []
+        names = [item.get("field_name") for item in items]
+        created_field = self.created_field or next(
+            (item.get("field_name") for item in items if item.get("type") == CREATED_TIME_FIELD_TYPE), ""
+        )
+        return [name for name in TICKET_FIELDS if name in names], created_field
+
+    async def _fetch_table(self, client: httpx.AsyncClient, token: str, table_id: str,
+                           cutoff_ms: int, keep_ms: int, entry: Optional[Dict]):
+        """
+        拉取一个表的工单
+
+        Returns:
+            (缓存条目 {"cursor", "since", "tickets"}, 统计 {"transferred", "kept", "cached", "mode"})
+        """
+        field_names, created_field = await self._table_schema(client, token, table_id)
+        # 缓存覆盖本次时间窗口时只拉取游标之后创建的工单
+        reuse = bool(entry and created_field and entry["since"] <= cutoff_ms)
+        since = max(entry["since"], keep_ms) if reuse else keep_ms
+        fetch_from = entry["cursor"] if reuse else keep_ms
+
+        body: Dict = {"automatic_fields": True}
+        if field_names:
+            body["field_names"] = field_names
+        if created_field:
+            # 日期条件按天比较，多取一天，重叠部分按 record_id 合并
+            body["filter"] = {
+                "conjunction": "and",
+                "conditions": [{
+                    "field_name": created_field,
+                    "operator": "isGreater",
+                    "value": ["ExactDate", str(fetch_from - DAY_MS)],
+                }],
+            }
+
+        url = f"{self.open_api_base}/open-apis/bitable/v1/apps/{self.ticket_app_token}/tables/{table_id}/records/search"
+        tickets = {t["id"]: t for t in entry["tickets"] if t["created_at"] * 1000 >= since} if reuse else {}
+        cached = len(tickets)
+        cursor = entry["cursor"] if reuse else 0
+        transferred = kept = 0
+        page_token = ""
+        while True:
+            params = {"page_size": MAX_PAGE_SIZE}
+            if page_token:
+                params["page_token"] = page_token
+            resp = await client.post(url, params=params, json=body, headers={"Authorization": f"Bearer {token}"})
+            data = resp.json()
+            if data.get("code") != 0:
+                raise RuntimeError(data.get("msg"))
+            page = data.get("data") or {}
+            for item in page.get("items") or []:
+                transferred += 1
+                created_at = int(item.get("created_time") or 0)
+                if created_at < since:
+                    continue
+                kept += 1
+                cursor = max(cursor, created_at)
+                fields = item.get("fields") or {}
+                tickets[item.get("record_id")] = {
+                    "id": item.get("record_id"),
+                    "title": field_text(fields.get("标题")),
+                    "description": field_text(fields.get("问题描述") or fields.get("问题现状") or fields.get("附加信息")),
+                    "type": field_text(fields.get("类型")) or "未知",
+                    "table_id": table_id,
+                    "created_at": created_at / 1000,
+                    "supplement": field_text(fields.get("补充信息"))
+                }
+            page_token = page.get("page_token") or ""
+            if not page.get("has_more") or not page_token:
+                break
+
+        mode = "增量" if reuse else ("全量" if not created_field else "按创建时间过滤")
+        logger.info(f"表格 {table_id}（{mode}）: 传输 {transferred} 条，保留 {kept} 条，来自缓存 {cached} 条")
+        entry = {"cursor": cursor, "since": since, "tickets": list(tickets.values())}
+        return entry, {"transferred": transferred, "kept": kept, "cached": cached, "mode": mode}
+
+    def _load_fetch_cache(self) -> Dict[str, Dict]:
+        """读取工单缓存，不存在或不属于当前 Base 时返回空"""
+        if not self.cache_path:
+            return {}
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"工单缓存读取失败: {e}")
+            return {}
+        if data.get("version") != CACHE_VERSION or data.get("app_token") != self.ticket_app_token:
+            return {}
+        return data.get("tables") or {}
+
+    def _save_fetch_cache(self, entries: Dict[str, Dict]):
+        if not self.cache_path:
+            return
+        data = {"version": CACHE_VERSION, "app_token": self.ticket_app_token, "saved_at": time.time(), "tables": entries}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            logger.warning(f"工单缓存保存失败: {e}")
+
     async def analyze_and_generate(self, tickets: List[Dict]) -> List[Dict]:
-        """使用 LLM 聚合并生成关键词配置"""
+        """
+        聚合近期工单并生成关键词配置
+
+        工单先在本地向量化、聚类，过滤掉不足 min_cluster_size 条的簇，
+        再并发地为每个簇（最多 max_clusters 个）请求 LLM 生成关键词与回复；
+        嵌入模型不可用时退回为全部工单一次交给 LLM
+        """
         if len(tickets) < self.min_cluster_size:
             logger.info("近期工单数量不足以形成热点聚类。")
             return []
-            
-        tickets_text = ""
-        for i, t in enumerate(tickets):
-            tickets_text += f"【编号{i}】\n标题：{t['title']}\n描述：{t['description'][:50]}\n类型：{t['type']}\n\n"
-            
-        prompt = f"""你是负责知识库建设和用户支持的数据分析专家。
-我为你提供了一批最近提交的技术支持工单记录。请完成以下任务：
-1. 找出这里面重复出现2次及以上的【高度相似/相同的业务咨询或报错现象】。
-2. 为每个具有代表性的高频问题集，提炼出 3-5 个用户可能输入的**短小触发关键词**（例如：“导入报错、导出Excel失败”）。多个关键词需用顿号（、）隔开。
-3. 根据问题集的类型，提供一个简明的回复文本样例（尽量包含问题的原因或大致解决方案，或者提醒查看相关文档）。
 
-近期工单列表：
-{tickets_text}
+        embed = self._get_embed()
+        if embed is None:
+            return await self._analyze_in_one_prompt(tickets)
 
-请严格按如下 JSON 数组格式返回结果（如果没有任何聚集出的高频问题，则返回空数组 []）：
-[
-  {{
-    "keywords": "关键词1、关键词2、关键词3",
-    "reply_content": "关于导入报错的解决方案是：请检查...",
-    "issue_summary": "提取问题摘要",
-    "frequency": 2
-  }}
-]
-"""
+        texts = [ticket_text(t) for t in tickets]
+        vectors = await asyncio.to_thread(embed_texts, embed, texts)
+        groups = await asyncio.to_thread(
+            cluster_embeddings, vectors, self.similarity_threshold, self.min_cluster_size
+        )
+        logger.info(f"{len(tickets)} 个工单聚类出 {len(groups)} 个高频问题，"
+                    f"为其中 {min(len(groups), self.max_clusters)} 个生成关键词...")
+
+        # 先限制同时在调度器中排队的请求数，避免后面的簇排队超过 max_wait
+        semaphore = asyncio.Semaphore(self.llm_concurrency)
+        results = await asyncio.gather(*(
+            self._summarize_cluster(tickets, vectors, members, semaphore)
+            for members in groups[:self.max_clusters]
+        ))
+        clusters = [c for c in results if c]
+        logger.info(f"LLM 为 {len(clusters)} 个高频问题生成了关键词。")
+        return clusters
+
+    def _get_embed(self) -> Optional[Callable[[List[str]], List[List[float]]]]:
+        if self.embed is None:
+            try:
+                self.embed = load_ticket_embeddings()
+            except Exception as e:
+                logger.warning(f"嵌入模型不可用，改为全部工单交给 LLM 分析: {e}")
+        return self.embed
+
+    async def _summarize_cluster(self, tickets: List[Dict], vectors: np.ndarray, members: np.ndarray,
+                                 semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        """为一个簇生成关键词与回复，失败时返回 None（不影响其他簇）"""
+        samples = [tickets[i] for i in representatives(vectors, members, self.samples_per_cluster)]
+        prompt = build_cluster_prompt(samples, len(members))
+        try:
+            async with semaphore:
+                res_content = await self._ask_llm(prompt, max_tokens=512)
+            match = re.search(r'\{[\s\S]*\}', res_content)
+            cluster = json.loads(match.group(0) if match else res_content)
+        except Exception as e:
+            logger.error(f"为高频问题生成关键词失败（{samples[0]['title']}）: {e}")
+            return None
+        if not isinstance(cluster, dict) or not cluster.get("keywords"):
+            return None
+        # 频率以本地聚类为准
+        cluster["frequency"] = len(members)
+        return cluster
+
+    async def _ask_llm(self, prompt: str, max_tokens: int) -> str:
+        client_kwargs = {
+            "model": self.config.llm.model,
+            "max_tokens": max_tokens,
+            "temperature": 0.2,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        async with self.fair_scheduler.slot("keyword_generator", priority=PRIORITY_BACKGROUND):
+            response = await asyncio.to_thread(self.llm_client.messages.create, **client_kwargs)
+        return self._extract_text_from_response(response.content)
+
+    async def _analyze_in_one_prompt(self, tickets: List[Dict]) -> List[Dict]:
+        """全部工单一次交给 LLM 聚合（嵌入模型不可用时的退路）"""
+        prompt = build_batch_prompt(tickets)
         logger.info("开始请求 LLM 分析近期高频问题...")
         try:
-            client_kwargs = {
-                "model": self.config.llm.model,
-                "max_tokens": 2048,
-                "temperature": 0.2,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            response = self.llm_client.messages.create(**client_kwargs)
-            res_content = self._extract_text_from_response(response.content)
-            
-            # 解析 JSON 结果
-            import json
-            import re
-            
+            res_content = await self._ask_llm(prompt, max_tokens=2048)
+
             # Extract JSON block
             json_str = res_content
             json_match = re.search(r'\[[\s\S]*\]', res_content)
             if json_match:
                 json_str = json_match.group(0)
-                
+
             clusters = json.loads(json_str)
             logger.info(f"LLM 挖掘出 {len(clusters)} 个潜在高频关键词集。")
-            
+
             # 过滤条数不满足要求的
             valid_clusters = [c for c in clusters if c.get("frequency", 0) >= self.min_cluster_size]
             return valid_clusters
-            
+
         except Exception as e:
             logger.error(f"提取高频关键词失败: {e}")
             return []
@@ -213,8 +456,27 @@ class KeywordGenerator:
                 logger.error(f"写入关键词飞书表失败: {data}")
                 return 0
 
+    def register(self, scheduler: AsyncScheduler):
+        """注册到任务调度器（jobs.keyword_generator_cron 为空时不注册）"""
+        jobs = self.config.jobs
+        if not jobs.keyword_generator_cron:
+            return
+        trigger = CronTrigger(jobs.keyword_generator_cron)
+        scheduler.add_job(
+            JOB_NAME,
+            self.execute,
+            trigger,
+            timeout=jobs.keyword_generator_timeout,
+            jitter=jobs.jitter,
+        )
+
     async def execute(self):
-        """执行完整流程"""
+        """
+        执行完整流程
+
+        Raises:
+            Exception: 拉取、分析或写入失败（记录日志后抛出，任务调度器记为失败）
+        """
         logger.info("=== 启动关键词自动推导与生成 ===")
         try:
             tickets = await self.fetch_recent_tickets()
@@ -244,10 +506,15 @@ class KeywordGenerator:
                 logger.info("本次分析未发现符合阈值的高频共性问题。")
         except Exception as e:
             logger.error(f"关键词自动推导发生异常: {e}")
+            raise
 
 async def main():
     generator = KeywordGenerator()
-    await generator.execute()
+    try:
+        await generator.execute()
+    except Exception:
+        # 已记录日志
+        pass
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,377 @@
+"""
+关键词回复表
+从飞书多维表格分页拉取关键词规则，后台定时刷新；记录有变化时在后台重建匹配器并整体替换，
+同时保存本地快照，重启时先用快照秒级恢复再增量同步
+
+增量同步依赖表中的「最后更新时间」类字段（keyword_table.modified_field），
+未配置时每次全量拉取、按记录对比，只有内容变化才重建匹配器
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+try:
+    from src.utils.metrics import inc_counter, stage_timer
+except ImportError:
+    from utils.metrics import inc_counter, stage_timer
+
+# 多维表格 records/search 单页上限
+MAX_PAGE_SIZE = 500
+
+# 整体关键词较长时，额外按这些常见子串匹配
+COMMON_SPLITS = ["帮助文档", "常见问答", "FAQ", "faq", "下载", "官网", "alpha", "Alpha"]
+
+SNAPSHOT_VERSION = 1
+
+
+def field_text(value) -> str:
+    """
+    多维表格字段值转为文本
+
+    records/search 接口中文本字段返回富文本片段列表 [{"type": "text", "text": ...}]，
+    单选返回字符串，多选返回字符串列表
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "".join(field_text(v) for v in value)
+    if isinstance(value, dict):
+        return str(value.get("text") or value.get("name") or "")
+    return str(value)
+
+
+def rules_from_records(records: Iterable[Dict], format_reply: Callable[[str], str]) -> List[Tuple[str, str]]:
+    """
+    按记录顺序生成 (关键词, 回复) 匹配规则
+
+    字段：关键词、回复内容、添加状态；只使用状态为「已完成」的记录。
+    关键词含顿号「、」时拆分为多个关键词，否则整体作为关键词并追加常见子串
+    """
+    rules = []
+    for fields in records:
+        keywords_raw = field_text(fields.get("关键词")).strip()
+        reply_content = field_text(fields.get("回复内容"))
+        status = field_text(fields.get("添加状态"))
+        if not keywords_raw or not reply_content or status != "已完成":
+            continue
+        formatted_reply = format_reply(reply_content)
+        if "、" in keywords_raw:
+            for kw in keywords_raw.split("、"):
+                if kw.strip():
+                    rules.append((kw.strip().lower(), formatted_reply))
+        else:
+            rules.append((keywords_raw.lower(), formatted_reply))
+            for split in COMMON_SPLITS:
+                if split.lower() in keywords_raw.lower() and split.lower() != keywords_raw.lower():
+                    rules.append((split.lower(), formatted_reply))
+    return rules
+
+
+class KeywordMatcher:
+    """
+    只读的关键词匹配器
+
+    返回规则列表中第一个出现在文本里的关键词对应的回复；
+    按关键词首字符建索引，只检查首字符在文本中出现过的规则
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]] = ()):
+        self.rules: Tuple[Tuple[str, str], ...] = tuple((kw, reply) for kw, reply in rules if kw)
+        self._by_first: Dict[str, List[int]] = {}
+        for i, (keyword, _) in enumerate(self.rules):
+            self._by_first.setdefault(keyword[0], []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, text: str) -> str:
+        text = text.lower()
+        candidates = sorted(
+            i for char in set(text).intersection(self._by_first) for i in self._by_first[char]
+        )
+        for i in candidates:
+            keyword, reply = self.rules[i]
+            if keyword in text:
+                return reply
+        return ""
+
+
+class KeywordTable:
+    """飞书多维表格关键词表（分页拉取、定时刷新、本地快照）"""
+
+    def __init__(
+        self,
+        config,
+        format_reply: Callable[[str], str],
+        open_api_base: str = "https://open.feishu.cn",
+        fallback: Optional[Callable[[], List[Tuple[str, str]]]] = None,
+    ):
+        """
+        Args:
+            config: 全局配置（使用 keyword_table 与飞书应用凭证）
+            format_reply: 回复内容格式化函数
+            open_api_base: 飞书开放平台地址
+            fallback: 未配置多维表格、或同步失败且没有可用规则时的本地规则来源
+        """
+        table_cfg = config.keyword_table
+        self.base_token = table_cfg.base_token
+        self.table_id = table_cfg.table_id
+        self.refresh_interval = table_cfg.refresh_interval
+        self.modified_field = table_cfg.modified_field
+        self.full_sync_every = max(1, table_cfg.full_sync_every)
+        self.page_size = min(table_cfg.page_size, MAX_PAGE_SIZE)
+        self.snapshot_path = Path(table_cfg.snapshot_path) if table_cfg.snapshot_path else None
+
+        self.app_id = os.environ.get("FEISHU_APP_ID") or config.bots["feishu"].app_id
+        self.app_secret = os.environ.get("FEISHU_APP_SECRET") or config.bots["feishu"].app_secret
+        self.open_api_base = open_api_base.rstrip("/")
+        self.format_reply = format_reply
+        self.fallback = fallback
+
+        self.matcher = KeywordMatcher()
+        self._records: Dict[str, Dict] = {}  # record_id -> fields，保持表中顺序
+        self._watermark = 0  # 已同步记录的最大修改时间（毫秒）
+        self._syncs = 0
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 测试时可替换为 httpx.MockTransport
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.base_token and self.table_id)
+
+    @property
+    def records_url(self) -> str:
+        return f"{self.open_api_base}/open-apis/bitable/v1/apps/{self.base_token}/tables/{self.table_id}/records"
+
+    def set_rules(self, rules: Iterable[Tuple[str, str]]):
+        """直接设置匹配规则（未配置多维表格时的本地 Excel 规则）"""
+        self.matcher = KeywordMatcher(rules)
+
+    def _apply_fallback(self):
+        if self.fallback and not len(self.matcher):
+            self.set_rules(self.fallback())
+
+    # ------------------------------------------------------------
+    # 本地快照
+    # ------------------------------------------------------------
+
+    def load_snapshot(self) -> bool:
+        """从本地快照恢复记录与匹配器，快照不存在或不属于当前表时返回 False"""
+        if not self.snapshot_path or not self.configured:
+            return False
+        try:
+            data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return False
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"关键词表快照读取失败: {e}")
+            return False
+        if data.get("version") != SNAPSHOT_VERSION or (data.get("base_token"), data.get("table_id")) != (self.base_token, self.table_id):
+            logger.info("关键词表快照与当前配置不一致，忽略")
+            return False
+
+        self._records = {r["record_id"]: r["fields"] for r in data.get("records", [])}
+        self._watermark = int(data.get("watermark", 0))
+        self._rebuild()
+        age = time.time() - data.get("synced_at", 0)
+        logger.info(f"从快照加载关键词表：记录 {len(self._records)} 条，匹配规则 {len(self.matcher)} 条（{age:.0f}s 前同步）")
+        return True
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "base_token": self.base_token,
+            "table_id": self.table_id,
+            "synced_at": time.time(),
+            "watermark": self._watermark,
+            "records": [{"record_id": rid, "fields": fields} for rid, fields in self._records.items()],
+        }
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"关键词表快照保存失败: {e}")
+
+    # ------------------------------------------------------------
+    # 拉取与刷新
+    # ------------------------------------------------------------
+
+    async def _tenant_token(self, client: httpx.AsyncClient) -> str:
+        """获取 tenant_access_token（提前 60 秒刷新）"""
+        if self._token and time.time() < self._token_expires_at:
+            return self._token
+        resp = await client.post(
+            f"{self.open_api_base}/open-apis/auth/v3/tenant_access_token/internal",
+            json={"app_id": self.app_id, "app_secret": self.app_secret},
+        )
+        data = resp.json()
+        token = data.get("tenant_access_token")
+        if not token:
+            raise RuntimeError(f"获取飞书 token 失败: {data}")
+        self._token = token
+        self._token_expires_at = time.time() + int(data.get("expire", 7200)) - 60
+        return token
+
+    async def fetch_records(self, client: httpx.AsyncClient, since: int = 0) -> List[Dict]:
+        """
+        分页拉取记录
+
+        Args:
+            client: HTTP 客户端
+            since: 只拉取修改时间晚于该值（毫秒）的记录，0 表示全量
+
+        Returns:
+            记录列表 [{"record_id", "fields", "last_modified_time"}]
+        """
+        token = await self._tenant_token(client)
+        body: Dict = {"automatic_fields": True}
+        if since and self.modified_field:
+            body["filter"] = {
+                "conjunction": "and",
+                "conditions": [{
+                    "field_name": self.modified_field,
+                    "operator": "isGreater",
+                    "value": ["ExactDate", str(since)],
+                }],
+            }
+        items: List[Dict] = []
+        page_token = ""
+        while True:
+            params = {"page_size": self.page_size}
+            if page_token:
+                params["page_token"] = page_token
+            resp = await client.post(
+                f"{self.records_url}/search",
+                params=params,
+                json=body,
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            data = resp.json()
+            if data.get("code") != 0:
+                raise RuntimeError(f"获取飞书关键词表失败: {data.get('msg')}")
+            page = data.get("data") or {}
+            items.extend(page.get("items") or [])
+            page_token = page.get("page_token") or ""
+            if not page.get("has_more") or not page_token:
+                return items
+
+    async def refresh(self, full: bool = False) -> bool:
+        """
+        同步一次关键词表
+
+        Args:
+            full: 强制全量拉取（增量同步无法感知删除，按 full_sync_every 定期全量）
+
+        Returns:
+            匹配规则是否有变化
+        """
+        if not self.configured:
+            return False
+        incremental = bool(self.modified_field and self._watermark and not full
+                           and self._syncs % self.full_sync_every != 0)
+        # 使用 httpx 直接调用飞书 API（SDK 版本兼容性问题）；沿用原有的跳过证书校验，兼容代理环境
+        async with httpx.AsyncClient(timeout=10, verify=False, transport=self.transport) as client:
+            with stage_timer("keyword_table_sync"):
+                items = await self.fetch_records(client, since=self._watermark if incremental else 0)
+        self._syncs += 1
+
+        fetched = {item["record_id"]: item.get("fields") or {} for item in items}
+        watermark = max((int(item.get("last_modified_time") or 0) for item in items), default=0)
+        self._watermark = max(self._watermark, watermark)
+        if incremental:
+            records = dict(self._records)
+            records.update(fetched)
+        else:
+            records = fetched
+
+        added = sum(1 for rid in records if rid not in self._records)
+        removed = sum(1 for rid in self._records if rid not in records)
+        updated = sum(1 for rid, fields in records.items() if rid in self._records and self._records[rid] != fields)
+        mode = "增量" if incremental else "全量"
+        if not (added or removed or updated):
+            logger.debug(f"关键词表{mode}同步：拉取 {len(items)} 条，无变化")
+            if not incremental:
+                self._save_snapshot()
+            return False
+
+        self._records = records
+        self._rebuild()
+        self._save_snapshot()
+        inc_counter("keyword_table_reload")
+        logger.info(f"关键词表{mode}同步：新增 {added}、修改 {updated}、删除 {removed}，"
+                    f"共 {len(records)} 条记录，{len(self.matcher)} 条匹配规则")
+        return True
+
+    def _rebuild(self):
+        """在当前线程构建新匹配器后整体替换，消息处理读取到的总是完整的旧匹配器或新匹配器"""
+        self.matcher = KeywordMatcher(rules_from_records(self._records.values(), self.format_reply))
+
+    def refresh_sync(self, full: bool = False) -> bool:
+        """在当前线程同步执行一次刷新（后台线程与手动刷新互斥）"""
+        with self._refresh_lock:
+            return asyncio.run(self.refresh(full))
+
+    def load(self):
+        """立即全量同步一次（阻塞），失败且没有可用规则时使用本地规则"""
+        if not self.configured:
+            logger.warning("未配置关键词多维表格，使用本地关键词规则")
+        else:
+            try:
+                self.refresh_sync(full=True)
+                return
+            except Exception as e:
+                inc_counter("keyword_table_sync_error")
+                logger.error(f"加载飞书关键词失败: {e}")
+        self._apply_fallback()
+
+    # ------------------------------------------------------------
+    # 后台刷新
+    # ------------------------------------------------------------
+
+    def start(self):
+        """启动后台刷新线程（立即同步一次，之后每 refresh_interval 秒同步）"""
+        if not self.configured:
+            self._apply_fallback()
+            return
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="keyword-table-refresh")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_sync()
+            except Exception as e:
+                inc_counter("keyword_table_sync_error")
+                logger.error(f"关键词表同步失败: {e}")
+                self._apply_fallback()
+            if self.refresh_interval <= 0:
+                return
+            self._stop.wait(self.refresh_interval)
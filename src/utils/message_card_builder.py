@@ -537,12 +537,22 @@ def build_faq_answer_card(
     question: str,
     answer: str,
     source_url: str = "",
-    related_docs: List[Dict] = None
+    related_docs: List[Dict] = None,
+    state: str = "final"
 ) -> str:
     """
     构建 FAQ 知识库回答卡片
+
+    Args:
+        question: 用户问题
+        answer: 回答内容（流式生成时为当前已生成的部分）
+        source_url: 来源链接
+        related_docs: 相关文档列表
+        state: 卡片状态 (streaming: 生成中，不展示参考文档和按钮 / final: 最终结果)
     """
     builder = MessageCardBuilder()
+    # 流式回答需要多次 PATCH 更新，必须声明为共享卡片
+    builder.card["config"]["update_multi"] = True
     
     # 标题栏：使用灰色标记为使用问题解答
     builder.set_header("已为您找到相关解答", "usage")
@@ -550,6 +560,11 @@ def build_faq_answer_card(
     # 用户问题摘要
     builder.add_quote(question[:100] + "..." if len(question) > 100 else question, title="您的问题")
     
+    if state == "streaming":
+        builder.add_div(f"**核心解答：**\n{answer or '正在检索文档并生成回答...'}")
+        builder.add_div("⏳ *回答生成中...*")
+        return builder.to_json()
+
     # AI 整理后的核心答案
     builder.add_div(f"**核心解答：**\n{answer}")
     
@@ -0,0 +1,323 @@
+"""
+轻量级指标采集
+提供计数器 / 仪表盘 / 直方图与计时器，按 Prometheus 文本格式导出
+
+使用方式:
+    from src.utils.metrics import stage_timer, inc_counter
+
+    with stage_timer("retrieval"):
+        docs = await kb.search(question)
+
+导出:
+    - FastAPI 服务挂载 /metrics 路由，返回 render_metrics()
+    - 无 HTTP 服务的进程（如飞书长连接）调用 start_metrics_server(port)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from utils.module_aliases import register_aliases
+
+# 默认直方图分桶（秒），覆盖从毫秒级的关键词匹配到数十秒的 LLM 调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 每个标签组合保留的最近样本数（用于压测时计算分位数）
+RECENT_SAMPLES = 4096
+
+METRIC_PREFIX = "kbbot_"
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict) -> Tuple[str, ...]:
+    """按声明顺序提取标签值"""
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """格式化为 {a="x",b="y"} 形式"""
+    parts = []
+    for name, value in zip(labelnames, values):
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str = "", labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    """可增可减的仪表盘"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """直方图（累计分桶 + 最近样本，用于导出与分位数估计）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str = "",
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # {label_key: [bucket_counts, sum, count, recent_samples]}
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=RECENT_SAMPLES)]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时记录耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[2] if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """基于最近样本估算分位数（q 取 0~1）"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series[3]:
+            return None
+        samples = sorted(series[3])
+        index = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+        return samples[index]
+
+    def label_values(self) -> List[Dict[str, str]]:
+        """返回已出现的标签组合"""
+        with self._lock:
+            keys = list(self._series.keys())
+        return [dict(zip(self.labelnames, key)) for key in keys]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, bucket_counts, total, count in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {bucket_count}")
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表（按名称复用同一指标对象）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        full_name = name if name.startswith(METRIC_PREFIX) else METRIC_PREFIX + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = cls(full_name, *args, **kwargs)
+                self._metrics[full_name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str = "", labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str = "",
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets)
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式导出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if metric.help_text:
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# 常用指标
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_seconds",
+    "各处理阶段耗时（秒）",
+    ["stage"]
+)
+EVENTS_TOTAL = REGISTRY.counter(
+    "events_total",
+    "按类型统计的事件数",
+    ["event"]
+)
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "llm_ttft_seconds",
+    "LLM 流式回答首个片段耗时（秒）"
+)
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "llm_tokens_total",
+    "LLM token 用量",
+    ["kind"]
+)
+SUBPROCESS_SECONDS = REGISTRY.histogram(
+    "subprocess_seconds",
+    "lark-cli 子进程调用耗时（秒）",
+    ["command", "status"]
+)
+CRAWLER_FETCH_SECONDS = REGISTRY.histogram(
+    "crawler_fetch_seconds",
+    "文档爬虫页面抓取耗时（秒）",
+    ["status"]
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """记录一次阶段耗时"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def stage_timer(stage: str):
+    """阶段计时上下文"""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def inc_counter(event: str, amount: float = 1):
+    """事件计数"""
+    EVENTS_TOTAL.inc(amount, event=event)
+
+
+def record_llm_usage(usage) -> None:
+    """记录 LLM token 用量（兼容 Anthropic usage 对象，缺失字段忽略）"""
+    if usage is None:
+        return
+    for kind in ("input_tokens", "output_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS_TOTAL.inc(value, kind=kind.replace("_tokens", ""))
+
+
+def render_metrics() -> str:
+    """导出 Prometheus 文本格式"""
+    return REGISTRY.render()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[threading.Thread]:
+    """
+    启动独立的 /metrics HTTP 服务（后台守护线程）
+
+    用于没有 FastAPI 服务的进程，例如飞书长连接入口。
+
+    Args:
+        port: 监听端口（<=0 表示不启动）
+        host: 监听地址
+
+    Returns:
+        服务线程
+    """
+    if not port or port <= 0:
+        return None
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 屏蔽默认访问日志
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return thread
+
+
+register_aliases(__name__)
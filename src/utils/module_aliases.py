@@ -0,0 +1,39 @@
+"""
+模块别名登记
+入口脚本同时把项目根目录与 src 加入 sys.path，同一个文件可能以 src.utils.xxx 与 utils.xxx
+两个名字各导入一次，各得一份模块级状态（注册表、单例、异常类型）。持有进程级状态的模块在末尾调用:
+
+    register_aliases(__name__)
+
+先完成导入的名字即为全进程共用的模块对象，之后以另一个名字导入时直接取到它
+"""
+
+import sys
+from pathlib import Path
+
+
+def register_aliases(name: str):
+    """
+    把模块同时登记为 src.<包>.<模块> 与 <包>.<模块>
+
+    不主动导入父包（父包的 __init__ 可能反过来导入本模块）；父包已导入时，
+    确认父包就是模块所在目录（避免误用同名的第三方包）再设置属性
+
+    Args:
+        name: 模块的 __name__，作为脚本直接运行（__main__）时不登记
+    """
+    if name == "__main__" or name not in sys.modules:
+        return
+    module = sys.modules[name]
+    here = str(Path(module.__file__).resolve().parent)
+    short = name[len("src."):] if name.startswith("src.") else name
+    for alias in (f"src.{short}", short):
+        if alias in sys.modules:
+            continue
+        parent_name, _, child = alias.rpartition(".")
+        parent = sys.modules.get(parent_name)
+        if parent is not None:
+            if here not in [str(Path(p).resolve()) for p in getattr(parent, "__path__", [])]:
+                continue
+            setattr(parent, child, module)
+        sys.modules[alias] = module
@@ -0,0 +1,115 @@
+"""
+关键词回复与富文本格式化
+正则在模块加载时编译；格式化结果与最终的飞书消息体（msg_type + content JSON）按内容缓存，
+关键词命中时直接复用已序列化的消息体
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# A. 合并空格
+SPACES_RE = re.compile(r'[ \t]+')
+# B. 修复单词被意外折断（例如 OpenAPI/ \n Swagger -> OpenAPI/Swagger）
+BROKEN_WORD_RE = re.compile(r'([a-zA-Z0-9/\-_]+)\s*\n\s*([a-zA-Z0-9/\-_]+)')
+# C. 编号标题处理（例如 "1.使用场景 问题描述" -> "1.使用场景\n问题描述"）
+NUMBERED_TITLE_RE = re.compile(r'(\d+\.[\u4e00-\u9fa5]{2,10})\s+([^\n])')
+# 即使没有空格也切分的关键标题
+KEY_TITLES = ["使用场景", "常见问题", "注意事项", "快速开始", "相关链接"]
+KEY_TITLE_RE = re.compile(r'(\d+\.(?:' + '|'.join(KEY_TITLES) + r'))')
+# D. 特定句子开头前换行
+SENTENCE_NUMBER_RE = re.compile(r'([。？?！!])\s*([1-9]\.)')
+LEAD_WORD_RE = re.compile(r'\s+(无论|如果|提示|注意)')
+# E. 标题 ：链接
+TITLED_LINK_RE = re.compile(r'([\u4e00-\u9fa5\(\)（）\w\s\-\.]{2,100}?)\s*(?:☞|：|:)\s*(https?://[^\s\n\u4e00-\u9fa5]+)')
+# F. 孤立的链接前引导语（如「立即参与内测：http...」）
+LINK_LEAD_RE = re.compile(r'(立即参与\w*|点击\w*|查看\w*)\s*(?:：|:)\s*(https?://[^\s\n]+)')
+# G. URL 后面直接跟着下一个标题
+URL_BEFORE_TITLE_RE = re.compile(r'(https?://[^\s\n]+)\s+([\u4e00-\u9fa5\d]{2,})')
+# H. 收尾
+EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+LINE_NUMBER_RE = re.compile(r'\n\s*(\d+\.)')
+
+# 发送时识别链接（含链接的消息以富文本 post 发送）
+URL_RE = re.compile(r'(https?://[^\s<>\[\]]+)')
+
+
+def _replace_titled_link(match) -> str:
+    name = match.group(1).strip().replace('\n', '').replace('\r', '')
+    url = match.group(2).strip()
+    # 使用 ☞ 符号显得更美观且专业
+    return f'\n{name} ☞ {url}\n'
+
+
+class ReplyFormatter:
+    """
+    回复内容格式化器
+
+    format 用于关键词表加载时整理回复排版，render 生成发送用的飞书消息体；
+    两者都按内容缓存，相同回复只处理一次
+    """
+
+    def __init__(self, format_cache_size: int = 8192, render_cache_size: int = 8192):
+        self.format = lru_cache(maxsize=format_cache_size)(self._format)
+        self.render = lru_cache(maxsize=render_cache_size)(self._render)
+
+    @staticmethod
+    def _format(content: str) -> str:
+        """深度格式化回复内容，优化排版和换行"""
+        content = SPACES_RE.sub(' ', content)
+        if '\n' in content:
+            content = BROKEN_WORD_RE.sub(r'\1\2', content)
+        content = NUMBERED_TITLE_RE.sub(r'\n\1\n\2', content)
+        content = KEY_TITLE_RE.sub(r'\n\1\n', content)
+        content = SENTENCE_NUMBER_RE.sub(r'\1\n\2', content)
+        content = LEAD_WORD_RE.sub(r'\n\1', content)
+        # 链接相关的替换开销最大，不含链接时跳过
+        if 'http' in content:
+            content = TITLED_LINK_RE.sub(_replace_titled_link, content)
+            content = LINK_LEAD_RE.sub(r'\n\1 ☞ \2\n', content)
+            content = URL_BEFORE_TITLE_RE.sub(r'\1\n\n\2', content)
+        content = EXTRA_NEWLINES_RE.sub('\n\n', content)
+        content = content.strip()
+        # 确保每行开头的 1. 2. 3. 干净
+        return LINE_NUMBER_RE.sub(r'\n\1', content)
+
+    @staticmethod
+    def to_rich_text(content: str) -> Dict:
+        """将文本转换为飞书富文本（post）格式，链接转为 a 标签"""
+        content_blocks: List[List[Dict]] = []
+        for line in content.split('\n'):
+            line = line.rstrip()
+            if not line:
+                content_blocks.append([{"tag": "text", "text": ""}])
+                continue
+            # split 带捕获组：奇数位是链接，偶数位是链接之间的文本
+            parts = URL_RE.split(line)
+            line_elements = []
+            for i, part in enumerate(parts):
+                if not part:
+                    continue
+                if i % 2:
+                    line_elements.append({"tag": "a", "text": part, "href": part})
+                else:
+                    line_elements.append({"tag": "text", "text": part})
+            if line_elements:
+                content_blocks.append(line_elements)
+        return {"zh_cn": {"content": content_blocks}}
+
+    def _render(self, content: str) -> Tuple[str, str]:
+        """
+        生成飞书消息体
+
+        Returns:
+            (msg_type, content JSON 字符串)；包含链接时为 post 富文本，否则为 text
+        """
+        if URL_RE.search(content):
+            return "post", json.dumps(self.to_rich_text(content), ensure_ascii=False)
+        return "text", json.dumps({"text": content}, ensure_ascii=False)
+
+    def format_and_render(self, content: str) -> str:
+        """格式化关键词回复并预先生成消息体（关键词表加载时调用，命中时直接取缓存）"""
+        formatted = self.format(content)
+        self.render(formatted)
+        return formatted
@@ -0,0 +1,146 @@
+"""
+启动耗时分析
+记录启动各阶段耗时，并可选统计模块导入耗时（按顶层包汇总自身耗时），用于排查冷启动慢的原因
+
+使用方式:
+    from utils.startup_profiler import enable_import_timing, startup_phase, format_startup_report
+
+    enable_import_timing()            # 尽早调用，之后的 import 才会被统计
+    with startup_phase("加载配置"):
+        config = load_config()
+    print(format_startup_report())
+"""
+
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# 进程内计时起点（模块首次导入时）
+_started = time.perf_counter()
+
+_lock = threading.Lock()
+_phases: List[Tuple[str, float, float]] = []  # (阶段名, 相对起点的开始时间, 耗时)
+_marks: List[Tuple[str, float]] = []  # (事件名, 相对起点的时间)
+_import_self_time: Dict[str, float] = {}  # 模块名 -> 自身导入耗时（不含其导入的子模块）
+
+
+def elapsed() -> float:
+    """距计时起点的秒数"""
+    return time.perf_counter() - _started
+
+
+@contextmanager
+def startup_phase(name: str):
+    """记录一个启动阶段的耗时"""
+    begin = elapsed()
+    try:
+        yield
+    finally:
+        with _lock:
+            _phases.append((name, begin, elapsed() - begin))
+
+
+def mark(name: str):
+    """记录一个时间点（如 WebSocket 连接建立）"""
+    with _lock:
+        _marks.append((name, elapsed()))
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """包装原始 loader，统计 exec_module 的自身耗时"""
+
+    # 正在执行的模块栈，每项为 [模块名, 开始时间, 子模块耗时]；导入在持有导入锁时进行，按线程区分即可
+    _stack = threading.local()
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = getattr(self._stack, "frames", None)
+        if stack is None:
+            stack = self._stack.frames = []
+        frame = [module.__name__, time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            stack.pop()
+            total = time.perf_counter() - frame[1]
+            if stack:
+                stack[-1][2] += total
+            with _lock:
+                _import_self_time[frame[0]] = _import_self_time.get(frame[0], 0.0) + total - frame[2]
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """位于 sys.meta_path 最前面，把其余 finder 找到的 loader 包装为 _TimedLoader"""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader)
+            return spec
+        return None
+
+
+_finder: Optional[_TimingFinder] = None
+
+
+def enable_import_timing():
+    """开始统计之后的模块导入耗时（已导入的模块不会再统计）"""
+    global _finder
+    if _finder is None:
+        _finder = _TimingFinder()
+        sys.meta_path.insert(0, _finder)
+
+
+def disable_import_timing():
+    """停止统计导入耗时"""
+    global _finder
+    if _finder is not None:
+        sys.meta_path.remove(_finder)
+        _finder = None
+
+
+def import_times(top: int = 15) -> List[Tuple[str, float]]:
+    """按顶层包汇总的导入耗时，降序"""
+    totals: Dict[str, float] = {}
+    with _lock:
+        for name, seconds in _import_self_time.items():
+            package = name.split(".", 1)[0]
+            totals[package] = totals.get(package, 0.0) + seconds
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def format_startup_report(top_imports: int = 15) -> str:
+    """格式化启动耗时报告（阶段、时间点、导入耗时）"""
+    lines = ["启动耗时分析", f"{'阶段':<24}{'开始':>10}{'耗时':>10}"]
+    with _lock:
+        phases = sorted(_phases, key=lambda p: p[1])
+        marks = list(_marks)
+    for name, begin, seconds in phases:
+        lines.append(f"{name:<24}{begin:>9.3f}s{seconds:>9.3f}s")
+    for name, at in marks:
+        lines.append(f"{'@ ' + name:<24}{at:>9.3f}s")
+
+    imports = import_times(top_imports)
+    if imports:
+        lines.append("")
+        lines.append(f"{'导入耗时（按顶层包）':<24}{'耗时':>10}")
+        for package, seconds in imports:
+            lines.append(f"{package:<24}{seconds:>9.3f}s")
+    return "\n".join(lines)
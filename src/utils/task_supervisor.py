@@ -0,0 +1,181 @@
+"""
+后台任务监管器
+Webhook 收到消息后不直接 create_task，而是提交给监管器：
+
+    - 每个通道（平台）限制同时运行的任务数，超出的进入有界等待队列，队列满时拒绝（由调用方回复「繁忙」）
+    - 持有全部任务引用，避免运行中的任务被垃圾回收；任务异常统一记录
+    - 关闭时停止接收新任务，等待运行中与排队中的任务处理完（超时后取消）
+
+    supervisor = TaskSupervisor(limits={"feishu": 16}, backlogs={"feishu": 100})
+    if not supervisor.submit("feishu", feishu_bot.handle_message, event):
+        ...  # 繁忙，回复用户稍后重试
+    await supervisor.shutdown(timeout=30)
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+except ImportError:
+    from utils.metrics import REGISTRY
+
+SUPERVISOR_TASKS = REGISTRY.gauge(
+    "supervisor_tasks",
+    "监管器中的任务数（state: active/queued）",
+    ["lane", "state"]
+)
+SUPERVISOR_TASKS_TOTAL = REGISTRY.counter(
+    "supervisor_tasks_total",
+    "监管器任务事件数（event: started/queued/rejected/completed/failed/cancelled）",
+    ["lane", "event"]
+)
+SUPERVISOR_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "supervisor_queue_wait_seconds",
+    "任务在等待队列中的时长（秒）",
+    ["lane"]
+)
+
+
+@dataclass
+class Lane:
+    """一个通道的并发上限、等待队列与统计"""
+    name: str
+    limit: int
+    backlog: int
+    active: Set[asyncio.Task] = field(default_factory=set)
+    queue: Deque[Tuple[float, Callable, tuple]] = field(default_factory=deque)
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+
+    def update_gauges(self):
+        SUPERVISOR_TASKS.set(len(self.active), lane=self.name, state="active")
+        SUPERVISOR_TASKS.set(len(self.queue), lane=self.name, state="queued")
+
+
+class TaskSupervisor:
+    """按通道限流的后台任务监管器（只在事件循环线程中使用）"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, backlogs: Optional[Dict[str, int]] = None,
+                 default_limit: int = 8, default_backlog: int = 50):
+        self.limits = dict(limits or {})
+        self.backlogs = dict(backlogs or {})
+        self.default_limit = default_limit
+        self.default_backlog = default_backlog
+        self.lanes: Dict[str, Lane] = {}
+        self.accepting = True
+
+    def _lane(self, name: str) -> Lane:
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = Lane(
+                name=name,
+                limit=max(1, self.limits.get(name, self.default_limit)),
+                backlog=max(0, self.backlogs.get(name, self.default_backlog)),
+            )
+            self.lanes[name] = lane
+        return lane
+
+    def submit(self, lane_name: str, func: Callable, *args) -> bool:
+        """
+        提交任务
+
+        Args:
+            lane_name: 通道名（如平台名）
+            func: 协程函数（排队时不会提前创建协程对象）
+            *args: 调用参数
+
+        Returns:
+            是否接收（并发已满且等待队列已满、或正在关闭时返回 False）
+        """
+        lane = self._lane(lane_name)
+        if not self.accepting:
+            return self._reject(lane, "正在关闭")
+        if len(lane.active) < lane.limit:
+            self._start(lane, func, args)
+        elif len(lane.queue) < lane.backlog:
+            lane.queue.append((time.perf_counter(), func, args))
+            SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="queued")
+        else:
+            return self._reject(lane, f"并发 {lane.limit}、排队 {lane.backlog} 已满")
+        lane.update_gauges()
+        return True
+
+    def _reject(self, lane: Lane, reason: str) -> bool:
+        lane.rejected += 1
+        SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="rejected")
+        logger.warning(f"[{lane.name}] 任务被拒绝: {reason}")
+        return False
+
+    def _start(self, lane: Lane, func: Callable, args: tuple):
+        task = asyncio.create_task(func(*args), name=f"{lane.name}-{getattr(func, '__name__', 'task')}")
+        lane.active.add(task)
+        task.add_done_callback(lambda t: self._on_done(lane, t))
+        SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="started")
+
+    def _on_done(self, lane: Lane, task: asyncio.Task):
+        lane.active.discard(task)
+        if task.cancelled():
+            SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="cancelled")
+        elif task.exception() is not None:
+            lane.failed += 1
+            SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="failed")
+            logger.opt(exception=task.exception()).error(f"[{lane.name}] 任务执行失败: {task.get_name()}")
+        else:
+            lane.completed += 1
+            SUPERVISOR_TASKS_TOTAL.inc(lane=lane.name, event="completed")
+
+        # 有空位后启动排队中的下一个任务（关闭过程中也继续，直到排空）
+        while lane.queue and len(lane.active) < lane.limit:
+            enqueued_at, func, args = lane.queue.popleft()
+            SUPERVISOR_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - enqueued_at, lane=lane.name)
+            self._start(lane, func, args)
+        lane.update_gauges()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各通道运行中 / 排队中 / 已拒绝 / 已完成 / 失败的任务数"""
+        return {
+            name: {
+                "active": len(lane.active),
+                "queued": len(lane.queue),
+                "rejected": lane.rejected,
+                "completed": lane.completed,
+                "failed": lane.failed,
+                "limit": lane.limit,
+                "backlog": lane.backlog,
+            }
+            for name, lane in self.lanes.items()
+        }
+
+    async def shutdown(self, timeout: float = 30.0):
+        """停止接收新任务，等待运行中与排队中的任务完成，超时后取消剩余任务"""
+        self.accepting = False
+        deadline = time.perf_counter() + timeout
+        while True:
+            active = [task for lane in self.lanes.values() for task in lane.active]
+            if not active:
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            logger.info(f"等待 {len(active)} 个运行中的任务完成...")
+            await asyncio.wait(active, timeout=remaining)
+
+        dropped = 0
+        for lane in self.lanes.values():
+            dropped += len(lane.queue)
+            lane.queue.clear()
+            for task in list(lane.active):
+                task.cancel()
+        leftover = [task for lane in self.lanes.values() for task in lane.active]
+        if leftover or dropped:
+            logger.warning(f"关闭超时：取消 {len(leftover)} 个运行中的任务，丢弃 {dropped} 个排队任务")
+            await asyncio.gather(*leftover, return_exceptions=True)
+        for lane in self.lanes.values():
+            lane.update_gauges()
@@ -0,0 +1,183 @@
+"""
+工单向量聚类
+关键词自动生成原本把全部近期工单拼进一个提示词交给 LLM 找相似问题，提示词随工单数线性增长，
+几百条后就超出上下文。改为在本地聚类，只把每个簇的少量代表工单交给 LLM：
+
+    1. 用 text2vec-base-chinese 向量化「标题 + 描述」
+    2. 分块计算余弦相似度（不构造 n × n 矩阵），相似度 >= threshold 的工单互为邻居
+    3. 邻居数（含自身）>= min_cluster_size 的工单是核心点，核心点之间的边求连通分量得到簇
+       （DBSCAN 式密度聚类，单条相似的工单不会把两个热点串成一个簇）
+    4. 非核心点归入相似度最高的核心邻居，没有核心邻居的工单视为噪声
+
+    vectors = embed_texts(load_ticket_embeddings(), [ticket_text(t) for t in tickets])
+    clusters = cluster_embeddings(vectors, threshold=0.8, min_cluster_size=2)
+    samples = representatives(vectors, clusters[0], 8)
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# 分块计算相似度时每块的行数（1024 × 10000 条约 40 MB）
+BLOCK_SIZE = 1024
+# 向量化每批的条数
+EMBED_BATCH_SIZE = 64
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+_embed: Optional[EmbedFn] = None
+_embed_lock = threading.Lock()
+
+
+def load_ticket_embeddings() -> EmbedFn:
+    """
+    进程内共用的工单向量化函数（首次调用时加载 text2vec-base-chinese，与知识库使用同一模型）
+
+    Raises:
+        ImportError: 未安装嵌入模型依赖
+    """
+    global _embed
+    with _embed_lock:
+        if _embed is None:
+            try:
+                from src.rag.knowledge_base import create_embeddings
+            except ImportError:
+                from rag.knowledge_base import create_embeddings
+            _embed = create_embeddings().embed_documents
+        return _embed
+
+
+def ticket_text(ticket: Dict, max_chars: int = 256) -> str:
+    """工单的聚类文本（标题 + 描述）"""
+    parts = []
+    for key in ("title", "description"):
+        value = ticket.get(key)
+        if isinstance(value, list):
+            value = "".join(item.get("text", "") if isinstance(item, dict) else str(item) for item in value)
+        if value:
+            parts.append(str(value))
+    return "\n".join(parts)[:max_chars]
+
+
+def embed_texts(embed: EmbedFn, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """分批向量化并归一化，返回 (n, dim) 的 float32 矩阵"""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embed(texts[start:start + batch_size]))
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _neighbor_edges(vectors: np.ndarray, threshold: float, block_size: int):
+    """
+    分块求相似度 >= threshold 的边（只保留 i < j）
+
+    Returns:
+        (src, dst, score)
+    """
+    n = len(vectors)
+    src, dst, score = [], [], []
+    for start in range(0, n, block_size):
+        block = vectors[start:start + block_size] @ vectors[start:].T
+        rows, cols = np.nonzero(block >= threshold)
+        rows_global = rows + start
+        cols_global = cols + start
+        keep = rows_global < cols_global
+        src.append(rows_global[keep])
+        dst.append(cols_global[keep])
+        score.append(block[rows[keep], cols[keep]])
+    if not src:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return np.concatenate(src), np.concatenate(dst), np.concatenate(score)
+
+
+def _components(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """连通分量（最小标签传播 + 路径压缩），返回每个点所在分量的最小下标"""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[src], labels[dst])
+        updated = labels.copy()
+        np.minimum.at(updated, src, low)
+        np.minimum.at(updated, dst, low)
+        np.minimum.at(updated, labels, updated)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def cluster_embeddings(
+    vectors: np.ndarray,
+    threshold: float = 0.8,
+    min_cluster_size: int = 2,
+    block_size: int = BLOCK_SIZE
+) -> List[np.ndarray]:
+    """
+    按余弦相似度聚类
+
+    Args:
+        vectors: (n, dim) 向量，未归一化时先归一化
+        threshold: 互为邻居的最低余弦相似度
+        min_cluster_size: 核心点的最少邻居数（含自身），也是簇的最小条数
+
+    Returns:
+        簇列表（每个簇是工单下标数组，按条数降序），不含噪声
+    """
+    n = len(vectors)
+    if n < max(1, min_cluster_size):
+        return []
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    src, dst, score = _neighbor_edges(vectors, threshold, block_size)
+
+    degree = np.ones(n, dtype=np.int64)
+    np.add.at(degree, src, 1)
+    np.add.at(degree, dst, 1)
+    core = degree >= min_cluster_size
+
+    both = core[src] & core[dst]
+    labels = _components(n, src[both], dst[both])
+    labels[~core] = -1
+
+    # 非核心点归入相似度最高的核心邻居
+    border_src = np.concatenate([src, dst])
+    border_dst = np.concatenate([dst, src])
+    border_score = np.concatenate([score, score])
+    attach = ~core[border_src] & core[border_dst]
+    if attach.any():
+        order = np.lexsort((-border_score[attach], border_src[attach]))
+        points = border_src[attach][order]
+        first = np.concatenate([[True], points[1:] != points[:-1]])
+        labels[points[first]] = labels[border_dst[attach][order][first]]
+
+    clustered = labels >= 0
+    if not clustered.any():
+        return []
+    ids, counts = np.unique(labels[clustered], return_counts=True)
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    clusters = []
+    for label, count in zip(ids, counts):
+        if count < min_cluster_size:
+            continue
+        start = np.searchsorted(sorted_labels, label)
+        clusters.append(order[start:start + count])
+    clusters.sort(key=len, reverse=True)
+    logger.debug(f"工单聚类: {n} 条, 相似边 {len(src)} 条, 核心点 {int(core.sum())} 个, 簇 {len(clusters)} 个")
+    return clusters
+
+
+def representatives(vectors: np.ndarray, members: np.ndarray, limit: int) -> np.ndarray:
+    """簇内最接近质心的 limit 条工单（交给 LLM 的代表样本）"""
+    members = np.asarray(members)
+    if len(members) <= limit:
+        return members
+    subset = vectors[members]
+    centroid = subset.mean(axis=0)
+    return members[np.argsort(-(subset @ centroid), kind="stable")[:limit]]
@@ -0,0 +1,182 @@
+"""
+企微回调消息加解密
+
+    crypto = WeComCrypto(token, encoding_aes_key, corp_id)
+    crypto.verify_signature(msg_signature, timestamp, nonce, encrypt)
+    crypto.decrypt(encrypt)                 # 单条，失败返回 ""
+    crypto.decrypt_batch([encrypt, ...])    # 批量，失败的条目为 None
+
+密文格式：base64(AES-256-CBC(random(16) + msg_len(4) + msg + receive_id + PKCS7 填充))，
+密钥为 EncodingAESKey 解码后的 32 字节，IV 为密钥前 16 字节，填充按 32 字节对齐。
+
+CBC 解密的每个明文块只依赖本块与前一块密文：P[i] = AES_dec(C[i]) XOR C[i-1]（C[-1] 为 IV），
+因此解密不需要按块串行，也不需要每条消息新建 CBC 对象重新展开密钥：
+初始化时创建一个 ECB 对象（密钥展开只做一次），整段密文一次 ECB 解密后与「IV + 前移一块的密文」整段异或。
+批量解密把多条密文拼接后一次完成，再用 memoryview 切分各条消息，不复制中间结果
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+from typing import List, Optional, Sequence
+
+from Crypto.Cipher import AES
+from Crypto.Util.strxor import strxor
+from loguru import logger
+
+BLOCK_SIZE = 16
+# 企微按 32 字节对齐做 PKCS7 填充
+PAD_BLOCK_SIZE = 32
+
+
+class WeComCryptoError(ValueError):
+    """密文格式、填充或 receive_id 校验失败"""
+
+
+class WeComCrypto:
+    """企微消息加解密（线程安全，初始化后可在多个请求 / 线程间复用）"""
+
+    def __init__(self, token: str, encoding_aes_key: str, corp_id: str = ""):
+        self.token = token
+        self.corp_id = corp_id
+        # EncodingAESKey 是 43 位，需要补 '=' 变成 44 位 base64
+        try:
+            self.aes_key = base64.b64decode(encoding_aes_key + "=", validate=True)
+        except binascii.Error:
+            self.aes_key = b""
+        if len(self.aes_key) != 32:
+            raise ValueError("EncodingAESKey 无效：应为 43 位 base64 字符（解码后 32 字节）")
+        self._iv = self.aes_key[:BLOCK_SIZE]
+        self._corp_bytes = corp_id.encode("utf-8")
+        # ECB 对象不保存链式状态，可重复使用
+        self._ecb = AES.new(self.aes_key, AES.MODE_ECB)
+
+    # ------------------------------------------------------------
+    # 签名
+    # ------------------------------------------------------------
+
+    def signature(self, timestamp: str, nonce: str, encrypt: str = "") -> str:
+        """msg_signature = sha1(sort(token, timestamp, nonce, encrypt) 拼接)"""
+        items = sorted((self.token, timestamp, nonce, encrypt))
+        return hashlib.sha1("".join(items).encode("utf-8")).hexdigest()
+
+    def verify_signature(self, signature: str, timestamp: str, nonce: str, encrypt: str = "") -> bool:
+        """
+        验证签名
+
+        Args:
+            signature: 回调参数 msg_signature
+            timestamp: 回调参数 timestamp
+            nonce: 回调参数 nonce
+            encrypt: 密文（URL 验证时为 echostr，消息回调时为消息体中的 Encrypt）
+        """
+        return hmac.compare_digest(self.signature(timestamp, nonce, encrypt), signature or "")
+
+    # ------------------------------------------------------------
+    # 解密
+    # ------------------------------------------------------------
+
+    def decrypt(self, encrypt_msg: str) -> str:
+        """解密消息，失败返回空字符串"""
+        try:
+            return self.decrypt_raw(self._b64decode(encrypt_msg))
+        except WeComCryptoError as e:
+            logger.error(f"消息解密失败: {e}")
+            return ""
+
+    def decrypt_raw(self, ciphertext: bytes) -> str:
+        """
+        解密已 base64 解码的密文
+
+        Raises:
+            WeComCryptoError: 长度、填充或 receive_id 校验失败
+        """
+        self._check_length(ciphertext)
+        plain = self._cbc_decrypt(ciphertext, self._iv + ciphertext[:-BLOCK_SIZE])
+        return self._unpack(memoryview(plain))
+
+    def decrypt_batch(self, encrypt_msgs: Sequence[str]) -> List[Optional[str]]:
+        """
+        批量解密（如队列中积压的回调消息）
+
+        所有合法密文拼接后一次解密、一次异或；单条格式错误不影响其他消息
+
+        Returns:
+            与输入等长的列表，解密失败的条目为 None
+        """
+        results: List[Optional[str]] = [None] * len(encrypt_msgs)
+        ciphertexts, previous, indexes = [], [], []
+        for index, encrypt_msg in enumerate(encrypt_msgs):
+            try:
+                ciphertext = self._b64decode(encrypt_msg)
+                self._check_length(ciphertext)
+            except WeComCryptoError as e:
+                logger.warning(f"批量解密第 {index} 条失败: {e}")
+                continue
+            ciphertexts.append(ciphertext)
+            previous.append(self._iv)
+            previous.append(ciphertext[:-BLOCK_SIZE])
+            indexes.append(index)
+        if not ciphertexts:
+            return results
+
+        plain = memoryview(self._cbc_decrypt(b"".join(ciphertexts), b"".join(previous)))
+        offset = 0
+        for index, ciphertext in zip(indexes, ciphertexts):
+            end = offset + len(ciphertext)
+            try:
+                results[index] = self._unpack(plain[offset:end])
+            except WeComCryptoError as e:
+                logger.warning(f"批量解密第 {index} 条失败: {e}")
+            offset = end
+        return results
+
+    def _cbc_decrypt(self, ciphertext: bytes, previous: bytes) -> bytes:
+        return strxor(self._ecb.decrypt(ciphertext), previous)
+
+    @staticmethod
+    def _b64decode(encrypt_msg: str) -> bytes:
+        # 非 base64 字符被忽略（与 base64.b64decode 默认行为一致），这类密文会在长度 / 填充校验中被拒绝
+        try:
+            return binascii.a2b_base64(encrypt_msg)
+        except (binascii.Error, ValueError, TypeError) as e:
+            raise WeComCryptoError(f"base64 解码失败: {e}")
+
+    @staticmethod
+    def _check_length(ciphertext: bytes):
+        if len(ciphertext) < PAD_BLOCK_SIZE or len(ciphertext) % BLOCK_SIZE:
+            raise WeComCryptoError(f"密文长度 {len(ciphertext)} 无效（应为 {BLOCK_SIZE} 的整数倍且不小于 {PAD_BLOCK_SIZE}）")
+
+    def _unpack(self, plain: memoryview) -> str:
+        """校验 PKCS7 填充并取出消息：random(16) + msg_len(4) + msg + receive_id"""
+        pad = plain[-1]
+        if not 1 <= pad <= PAD_BLOCK_SIZE or plain[-pad:] != bytes((pad,)) * pad:
+            raise WeComCryptoError("PKCS7 填充无效（EncodingAESKey 可能不匹配）")
+        body = plain[:-pad]
+        if len(body) < 20:
+            raise WeComCryptoError("明文过短")
+        msg_len = int.from_bytes(body[16:20], "big")
+        if 20 + msg_len > len(body):
+            raise WeComCryptoError(f"消息长度 {msg_len} 超出明文范围")
+        receive_id = body[20 + msg_len:]
+        if self._corp_bytes and receive_id != self._corp_bytes:
+            raise WeComCryptoError(f"receive_id 不匹配: {bytes(receive_id)!r}")
+        try:
+            return str(body[20:20 + msg_len], "utf-8")
+        except UnicodeDecodeError as e:
+            raise WeComCryptoError(f"消息不是有效的 UTF-8: {e}")
+
+    # ------------------------------------------------------------
+    # 加密
+    # ------------------------------------------------------------
+
+    def encrypt(self, msg: str) -> str:
+        """加密响应消息（CBC 加密需逐块串行，每条消息新建 CBC 对象）"""
+        msg_bytes = msg.encode("utf-8")
+        content = os.urandom(16) + len(msg_bytes).to_bytes(4, "big") + msg_bytes + self._corp_bytes
+        pad_len = PAD_BLOCK_SIZE - (len(content) % PAD_BLOCK_SIZE)
+        content += bytes((pad_len,)) * pad_len
+        cipher = AES.new(self.aes_key, AES.MODE_CBC, self._iv)
+        return base64.b64encode(cipher.encrypt(content)).decode("ascii")
@@ -0,0 +1,396 @@
+"""
+企微消息发送
+企微机器人、定制版机器人与桥接模块共用一个发送器（进程内单例）：
+
+    - 一个长连接复用的 httpx.AsyncClient，不再每条消息新建连接
+    - 按目标（Webhook 地址 / 会话）限速：滑动窗口内最多 rate_per_minute 条（群机器人 Webhook 限制 20 条/分钟）
+    - 发往同一目标、尚未发出的多条短消息按顺序合并为一条（不超过 merge_max_bytes）
+    - 网络错误、5xx、429 与企微限频（errcode 45009）按指数退避 + 随机抖动重试
+
+发送器在独立线程的事件循环中运行，异步与同步调用方都可以使用：
+
+    sender = get_sender(config)
+    await sender.send_webhook(webhook_url, "收到您的问题")       # 协程中
+    sender.send_webhook_sync(webhook_url, "工单已创建")            # 线程 / 同步代码中
+
+自定义接口（如定制版 API）传入 post(client, content, delivery_id) 协程函数，
+delivery_id 在同一次投递的各次重试之间保持不变，可作为幂等 ID
+"""
+
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future as ConcurrentFuture
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+try:
+    from src.utils.metrics import REGISTRY
+    from src.utils.module_aliases import register_aliases
+except ImportError:
+    from utils.metrics import REGISTRY
+    from utils.module_aliases import register_aliases
+
+# 企微接口限频
+ERRCODE_FREQ_LIMIT = 45009
+MERGE_SEPARATOR = "\n\n"
+# 空闲超过该时长（秒）的目标退出发送协程并释放状态
+IDLE_TARGET_SECONDS = 120.0
+
+WECOM_SEND_TOTAL = REGISTRY.counter(
+    "wecom_send_total",
+    "企微消息投递次数（合并后，result: ok/failed/rejected）",
+    ["channel", "result"]
+)
+WECOM_SEND_MERGED_TOTAL = REGISTRY.counter(
+    "wecom_send_merged_total",
+    "被合并到其他消息中发送的消息数",
+    ["channel"]
+)
+WECOM_SEND_RETRIES_TOTAL = REGISTRY.counter(
+    "wecom_send_retries_total",
+    "企微消息发送重试次数",
+    ["channel"]
+)
+WECOM_SEND_SECONDS = REGISTRY.histogram(
+    "wecom_send_seconds",
+    "消息从提交到投递完成的时长（含合并等待、限速与重试，秒）",
+    ["channel"]
+)
+WECOM_SEND_PENDING = REGISTRY.gauge(
+    "wecom_send_pending",
+    "等待发送的消息数",
+    ["channel"]
+)
+
+PostFunc = Callable[[httpx.AsyncClient, str, str], Awaitable[httpx.Response]]
+
+
+class TransientSendError(Exception):
+    """可重试的发送失败"""
+
+
+@dataclass
+class _Pending:
+    content: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Target:
+    key: str
+    channel: str
+    post: PostFunc
+    rate_per_minute: int
+    queue: Deque[_Pending] = field(default_factory=deque)
+    sent_at: Deque[float] = field(default_factory=deque)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+
+class WeComSender:
+    """企微消息发送器（线程安全；内部事件循环线程首次发送时启动）"""
+
+    def __init__(self, webhook_rate_per_minute: int = 20, apifox_rate_per_minute: int = 0,
+                 merge_window: float = 0.5, merge_max_bytes: int = 2048, max_pending: int = 100,
+                 max_retries: int = 3, retry_base: float = 1.0, timeout: float = 10.0,
+                 max_connections: int = 20, rate_window: float = 60.0):
+        self.webhook_rate_per_minute = webhook_rate_per_minute
+        self.apifox_rate_per_minute = apifox_rate_per_minute
+        self.merge_window = merge_window
+        self.merge_max_bytes = merge_max_bytes
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # 限速窗口（秒），测试时可以缩短
+        self.rate_window = rate_window
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._targets: Dict[str, _Target] = {}
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, sender_config) -> "WeComSender":
+        return cls(**sender_config.model_dump())
+
+    # ------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------
+
+    async def send_webhook(self, webhook_url: str, content: str) -> bool:
+        """通过群机器人 Webhook 发送文本消息，返回是否投递成功"""
+        if not webhook_url:
+            logger.warning("企微 Webhook URL 未配置")
+            return False
+        return await self.send(webhook_url, content, self._post_webhook(webhook_url),
+                               rate_per_minute=self.webhook_rate_per_minute, channel="webhook")
+
+    def send_webhook_sync(self, webhook_url: str, content: str) -> bool:
+        """同步版本（不能在发送器自身的事件循环中调用）"""
+        if not webhook_url:
+            logger.warning("企微 Webhook URL 未配置")
+            return False
+        return self.send_sync(webhook_url, content, self._post_webhook(webhook_url),
+                              rate_per_minute=self.webhook_rate_per_minute, channel="webhook")
+
+    async def send(self, key: str, content: str, post: PostFunc, rate_per_minute: int = 0,
+                   channel: str = "custom") -> bool:
+        """
+        提交一条消息，等待其（可能与其他消息合并后）投递完成
+
+        Args:
+            key: 目标标识，同一目标的消息合并发送并共用限速窗口
+            content: 文本内容
+            post: 实际发送的协程函数 post(client, content, delivery_id)
+            rate_per_minute: 该目标每分钟最多发送的消息数，0 表示不限
+            channel: 指标标签
+
+        Returns:
+            是否投递成功（失败原因已记录日志）
+        """
+        future = self._submit(key, content, post, rate_per_minute, channel)
+        return await asyncio.wrap_future(future)
+
+    def send_sync(self, key: str, content: str, post: PostFunc, rate_per_minute: int = 0,
+                  channel: str = "custom") -> bool:
+        """同步版本的 send"""
+        return self._submit(key, content, post, rate_per_minute, channel).result()
+
+    def stats(self) -> Dict[str, Dict]:
+        """各目标排队数与限速窗口内已发送数"""
+        return {
+            key: {"channel": t.channel, "pending": len(t.queue), "sent_in_window": len(t.sent_at)}
+            for key, t in list(self._targets.items())
+        }
+
+    def close(self, timeout: float = 10.0):
+        """发送完排队中的消息（最多等待 timeout 秒）后关闭连接与事件循环线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(timeout), loop).result(timeout + 5)
+        except Exception as e:
+            logger.warning(f"企微发送器关闭异常: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+    async def aclose(self, timeout: float = 10.0):
+        """在其他事件循环中关闭（不阻塞调用方的事件循环）"""
+        await asyncio.to_thread(self.close, timeout)
+
+    # ------------------------------------------------------------
+    # 内部实现（除 _submit / _ensure_loop 外均运行在发送器事件循环中）
+    # ------------------------------------------------------------
+
+    def _post_webhook(self, webhook_url: str) -> PostFunc:
+        async def post(client: httpx.AsyncClient, content: str, delivery_id: str) -> httpx.Response:
+            return await client.post(webhook_url, json={"msgtype": "text", "text": {"content": content}})
+        return post
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("企微发送器已关闭")
+            if self._loop is None:
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._client = httpx.AsyncClient(
+                        timeout=self.timeout,
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                    )
+                    ready.set()
+                    loop.run_forever()
+                    loop.close()
+
+                self._thread = threading.Thread(target=run, name="wecom-sender", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _submit(self, key: str, content: str, post: PostFunc, rate_per_minute: int,
+                channel: str) -> ConcurrentFuture:
+        loop = self._ensure_loop()
+        result: ConcurrentFuture = ConcurrentFuture()
+
+        def enqueue():
+            target = self._targets.get(key)
+            if target is None:
+                target = _Target(key=key, channel=channel, post=post, rate_per_minute=rate_per_minute)
+                self._targets[key] = target
+            target.post, target.rate_per_minute = post, rate_per_minute
+            if len(target.queue) >= self.max_pending:
+                WECOM_SEND_TOTAL.inc(channel=channel, result="rejected")
+                logger.warning(f"企微发送排队已满（{self.max_pending} 条），丢弃消息: {content[:50]}")
+                result.set_result(False)
+                return
+            pending = _Pending(content=content, future=loop.create_future())
+            pending.future.add_done_callback(
+                lambda f: result.set_result(f.result() if not f.cancelled() else False)
+            )
+            target.queue.append(pending)
+            WECOM_SEND_PENDING.inc(channel=channel)
+            target.wakeup.set()
+            if target.task is None or target.task.done():
+                target.task = loop.create_task(self._run_target(target), name=f"wecom-send-{channel}")
+
+        loop.call_soon_threadsafe(enqueue)
+        return result
+
+    async def _run_target(self, target: _Target):
+        """一个目标的发送协程：等待合并窗口与限速窗口，按顺序合并发送"""
+        while True:
+            if not target.queue:
+                target.wakeup.clear()
+                try:
+                    await asyncio.wait_for(target.wakeup.wait(), IDLE_TARGET_SECONDS)
+                except asyncio.TimeoutError:
+                    if not target.queue:
+                        self._targets.pop(target.key, None)
+                        return
+                continue
+
+            # 合并窗口：第一条消息等待 merge_window 秒，期间到达的消息一起发送
+            linger = target.queue[0].enqueued_at + self.merge_window - time.monotonic()
+            if linger > 0 and not self._closed:
+                await asyncio.sleep(linger)
+            await self._wait_rate(target)
+
+            batch = self._take_batch(target)
+            WECOM_SEND_PENDING.dec(len(batch), channel=target.channel)
+            if len(batch) > 1:
+                WECOM_SEND_MERGED_TOTAL.inc(len(batch) - 1, channel=target.channel)
+            delivered = False
+            try:
+                delivered = await self._deliver(target, MERGE_SEPARATOR.join(p.content for p in batch))
+            finally:
+                # 关闭时被取消的批次按失败返回，避免同步调用方一直等待
+                now = time.monotonic()
+                for pending in batch:
+                    WECOM_SEND_SECONDS.observe(now - pending.enqueued_at, channel=target.channel)
+                    if not pending.future.done():
+                        pending.future.set_result(delivered)
+
+    def _take_batch(self, target: _Target) -> List[_Pending]:
+        batch = [target.queue.popleft()]
+        size = len(batch[0].content.encode("utf-8"))
+        separator = len(MERGE_SEPARATOR.encode("utf-8"))
+        while target.queue:
+            next_size = len(target.queue[0].content.encode("utf-8"))
+            if size + separator + next_size > self.merge_max_bytes:
+                break
+            batch.append(target.queue.popleft())
+            size += separator + next_size
+        return batch
+
+    async def _wait_rate(self, target: _Target):
+        """滑动窗口限速：窗口内已发送 rate_per_minute 条时，等待最早一条滑出窗口"""
+        if target.rate_per_minute <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            while target.sent_at and now - target.sent_at[0] >= self.rate_window:
+                target.sent_at.popleft()
+            if len(target.sent_at) < target.rate_per_minute:
+                target.sent_at.append(now)
+                return
+            await asyncio.sleep(target.sent_at[0] + self.rate_window - now)
+
+    def _retry_delay(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待（指数退避 + 随机抖动）"""
+        return self.retry_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+    async def _deliver(self, target: _Target, content: str) -> bool:
+        delivery_id = uuid.uuid4().hex
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                WECOM_SEND_RETRIES_TOTAL.inc(channel=target.channel)
+                await asyncio.sleep(self._retry_delay(attempt))
+                # 每次重试都计入企微的限频
+                await self._wait_rate(target)
+            try:
+                response = await target.post(self._client, content, delivery_id)
+                self._check_response(response)
+                WECOM_SEND_TOTAL.inc(channel=target.channel, result="ok")
+                return True
+            except (TransientSendError, httpx.TransportError) as e:
+                logger.warning(f"企微消息发送失败（第 {attempt + 1} 次）: {type(e).__name__}: {e}")
+            except Exception as e:
+                logger.error(f"企微消息发送失败: {type(e).__name__}: {e}")
+                break
+        WECOM_SEND_TOTAL.inc(channel=target.channel, result="failed")
+        return False
+
+    @staticmethod
+    def _check_response(response: httpx.Response):
+        """HTTP 状态与企微 errcode 检查；可重试的错误抛出 TransientSendError"""
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientSendError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        try:
+            data = response.json()
+        except ValueError:
+            return
+        errcode = data.get("errcode", 0) if isinstance(data, dict) else 0
+        if errcode == ERRCODE_FREQ_LIMIT:
+            raise TransientSendError(f"企微限频: {data.get('errmsg')}")
+        if errcode:
+            raise RuntimeError(f"errcode={errcode}, errmsg={data.get('errmsg')}")
+
+    async def _shutdown(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        tasks = [t.task for t in self._targets.values() if t.task is not None and not t.task.done()]
+        while any(t.queue for t in self._targets.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for target in self._targets.values():
+            for pending in target.queue:
+                if not pending.future.done():
+                    pending.future.set_result(False)
+            target.queue.clear()
+        await self._client.aclose()
+
+
+_sender: Optional[WeComSender] = None
+_sender_lock = threading.Lock()
+
+
+def get_sender(config=None) -> WeComSender:
+    """进程内共用的发送器（首次调用时按 config.wecom_sender 创建）"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            if config is None:
+                try:
+                    from src.utils.config_loader import load_config
+                except ImportError:
+                    from utils.config_loader import load_config
+                config = load_config()
+            _sender = WeComSender.from_config(config.wecom_sender)
+        return _sender
+
+
+register_aliases(__name__)
@@ -3,10 +3,10 @@ BUG 关键词实时扫描器
 定时扫描飞书群消息中的关键词，自动创建工单
 """
 
+import asyncio
 import subprocess
 import json
-import time
-import schedule
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from loguru import logger
@@ -15,13 +15,28 @@ from pathlib import Path
 # 导入 lark-cli 封装
 try:
     from src.integrations.lark_cli_wrapper import LarkCliWrapper
+    from src.integrations.ticket_dedup import get_ticket_dedup
+    from src.integrations.ticket_sink import get_ticket_sink
     from src.utils.config_loader import load_config
+    from src.utils.job_scheduler import AsyncScheduler, IntervalTrigger
 except ImportError:
     # 设置路径
     import sys
     sys.path.insert(0, str(Path(__file__).parent.parent.parent))
     from src.integrations.lark_cli_wrapper import LarkCliWrapper
+    from src.integrations.ticket_dedup import get_ticket_dedup
+    from src.integrations.ticket_sink import get_ticket_sink
     from src.utils.config_loader import load_config
+    from src.utils.job_scheduler import AsyncScheduler, IntervalTrigger
+
+JOB_NAME = "bug_watcher"
+
+# 补扫的最长时间范围（小时），与已处理消息记录的保留时长一致
+MAX_CATCH_UP_HOURS = 24
+
+
+class MessageSearchError(RuntimeError):
+    """消息搜索失败（lark-cli 报错或返回失败）"""
 
 
 class BugKeywordWatcher:
@@ -50,6 +65,9 @@ class BugKeywordWatcher:
         """
         self.config = load_config(config_path)
         self.lark_cli = LarkCliWrapper(self.config)
+        # 工单经共用的写入器批量写入多维表格，写入前与近期工单比较，重复反馈合并到已有工单
+        self.sink = get_ticket_sink(self.config)
+        self.dedup = get_ticket_dedup(self.config)
 
         # 监控的群 ID（可配置）
         self.watch_chat_ids = [
@@ -115,6 +133,9 @@ class BugKeywordWatcher:
 
         Returns:
             消息列表
+
+        Raises:
+            MessageSearchError: 搜索失败（与「没有匹配的消息」区分，失败的时间段需要补扫）
         """
         try:
             # 使用 LarkCliWrapper 的搜索方法（已处理 Windows 路径问题）
@@ -127,18 +148,16 @@ class BugKeywordWatcher:
                 end_time=end_time_str,
                 limit=20
             )
-
-            if result.get("success"):
-                messages = result.get("messages", [])
-                logger.info(f"搜索 '{keyword}' 找到 {len(messages)} 条消息")
-                return messages
-            else:
-                logger.error(f"搜索失败: {result.get('error')}")
-                return []
-
         except Exception as e:
             logger.error(f"搜索异常: {e}")
-            return []
+            raise MessageSearchError(f"搜索 '{keyword}' 异常: {e}") from e
+
+        if not result.get("success"):
+            logger.error(f"搜索失败: {result.get('error')}")
+            raise MessageSearchError(f"搜索 '{keyword}' 失败: {result.get('error')}")
+        messages = result.get("messages", [])
+        logger.info(f"搜索 '{keyword}' 找到 {len(messages)} 条消息")
+        return messages
 
     def analyze_message(self, message: Dict) -> Dict:
         """
@@ -264,7 +283,7 @@ class BugKeywordWatcher:
 
     def process_found_message(self, message: Dict, analysis: Dict) -> Optional[Dict]:
         """
-        处理发现的消息（创建工单）
+        处理发现的消息（创建工单，阻塞到写入完成）
 
         Args:
             message: 消息数据
@@ -273,6 +292,18 @@ class BugKeywordWatcher:
         Returns:
             创建结果
         """
+        future = self._submit_ticket(message, analysis)
+        if future is None:
+            return None
+        return self._ticket_result(future, analysis)
+
+    def _submit_ticket(self, message: Dict, analysis: Dict) -> Optional[Future]:
+        """
+        准备工单并提交到写入器（不等待写入结果，同一次扫描的工单合并为批量写入）
+
+        Returns:
+            写入结果的 Future，消息已处理或准备失败时返回 None
+        """
         message_id = message.get("message_id")
         if message_id in self.processed_messages:
             logger.debug(f"消息已处理: {message_id}")
@@ -285,7 +316,6 @@ class BugKeywordWatcher:
         try:
             # 提取消息信息
             content = message.get("content", "")
-            sender_id = message.get("sender", {}).get("id", "")
             chat_id = message.get("chat_id", "")
             create_time = message.get("create_time", "")
 
@@ -310,82 +340,143 @@ class BugKeywordWatcher:
 """
             }
 
-            # 创建记录
-            result = self.lark_cli.create_record(
-                table_id=self.lark_cli.bug_table_id,
-                fields=ticket_data
+            sender = message.get("sender", {})
+            sender_name = sender.get("name", sender.get("id", "匿名"))
+            report = f"[{datetime.now().strftime('%m-%d %H:%M')}] 关键词扫描 {sender_name}: {content[:200]}"
+            return self.dedup.submit(
+                self.lark_cli.bug_table_id, ticket_data, text=content, report=report, chat_id=chat_id
             )
 
-            if result.get("success"):
-                logger.info(f"工单创建成功: {result['record_id']} - 关键词: {analysis['keywords']}")
-                return result
-            else:
-                logger.error(f"工单创建失败: {result}")
-                return None
+        except Exception as e:
+            logger.error(f"处理消息异常: {e}")
+            return None
 
+    def _ticket_result(self, future: Future, analysis: Dict) -> Optional[Dict]:
+        """等待工单写入结果"""
+        try:
+            result = future.result()
         except Exception as e:
             logger.error(f"处理消息异常: {e}")
             return None
 
-    def scan_once(self) -> Dict:
+        if result.get("success"):
+            if result.get("pending_sync"):
+                logger.warning(f"工单已保存到本地工单库，等待补写: {result.get('ticket_id')} - 关键词: {analysis['keywords']}")
+            elif result.get("duplicate_of"):
+                logger.info(f"与已有工单重复，已合并: {result['duplicate_of']} (相似度 {result['score']:.2f}) - 关键词: {analysis['keywords']}")
+            else:
+                logger.info(f"工单创建成功: {result['record_id']} - 关键词: {analysis['keywords']}")
+            return result
+        else:
+            logger.error(f"工单创建失败: {result}")
+            return None
+
+    def scan_once(self, since: Optional[datetime] = None) -> Dict:
         """
         执行一次扫描
 
+        Args:
+            since: 扫描起始时间（上次成功扫描的时间，用于停机或失败后补扫），默认最近 scan_interval 分钟
+
         Returns:
             扫描结果统计
+
+        Raises:
+            MessageSearchError: 有关键词搜索失败（其余关键词照常扫描并创建工单）；
+                任务调度器据此记为失败，不更新上次成功时间，下次从原时间补扫
         """
         logger.info("开始扫描...")
 
-        # 时间范围：最近 scan_interval 分钟
+        # 时间范围：最近 scan_interval 分钟，或从上次成功扫描开始（最多补扫 MAX_CATCH_UP_HOURS 小时）
         start_time = datetime.now() - timedelta(minutes=self.scan_interval + 1)
+        if since is not None:
+            earliest = datetime.now() - timedelta(hours=MAX_CATCH_UP_HOURS)
+            start_time = min(start_time, max(since - timedelta(minutes=1), earliest))
 
         stats = {
             "scanned": 0,
             "bugs_found": 0,
             "features_found": 0,
             "tickets_created": 0,
+            "tickets_merged": 0,
             "scan_time": datetime.now().isoformat()
         }
+        submitted = []
+        failed_keywords = []
+
+        def search(keyword: str) -> List[Dict]:
+            try:
+                return self.search_messages(keyword=keyword, start_time=start_time, include_attachment=False)
+            except MessageSearchError:
+                failed_keywords.append(keyword)
+                return []
 
         # 扫描 BUG 关键词
         for keyword in self.BUG_KEYWORDS[:5]:  # 每次扫描前 5 个关键词
-            messages = self.search_messages(
-                keyword=keyword,
-                start_time=start_time,
-                include_attachment=False
-            )
-
-            for message in messages:
+            for message in search(keyword):
                 stats["scanned"] += 1
                 analysis = self.analyze_message(message)
 
                 if analysis["type"] == "bug":
                     stats["bugs_found"] += 1
-                    result = self.process_found_message(message, analysis)
-                    if result:
-                        stats["tickets_created"] += 1
+                    future = self._submit_ticket(message, analysis)
+                    if future is not None:
+                        submitted.append((future, analysis))
 
         # 扫描需求关键词
         for keyword in self.FEATURE_KEYWORDS[:3]:
-            messages = self.search_messages(
-                keyword=keyword,
-                start_time=start_time,
-                include_attachment=False
-            )
-
-            for message in messages:
+            for message in search(keyword):
                 stats["scanned"] += 1
                 analysis = self.analyze_message(message)
 
                 if analysis["type"] == "feature":
                     stats["features_found"] += 1
-                    result = self.process_found_message(message, analysis)
-                    if result:
-                        stats["tickets_created"] += 1
+                    future = self._submit_ticket(message, analysis)
+                    if future is not None:
+                        submitted.append((future, analysis))
+
+        # 本次扫描的工单由写入器合并为批量写入，最后统一等待结果
+        for future, analysis in submitted:
+            result = self._ticket_result(future, analysis)
+            if result and result.get("duplicate_of"):
+                stats["tickets_merged"] += 1
+            elif result:
+                stats["tickets_created"] += 1
+
+        logger.info(f"扫描完成: 扫描 {stats['scanned']} 条, 发现 BUG {stats['bugs_found']} 个, 需求 {stats['features_found']} 个, "
+                    f"创建工单 {stats['tickets_created']} 个, 合并重复反馈 {stats['tickets_merged']} 条")
+
+        if failed_keywords:
+            # 已处理的消息按 message_id 去重，补扫时不会重复创建工单
+            raise MessageSearchError(f"{len(failed_keywords)} 个关键词搜索失败: {', '.join(failed_keywords)}")
+        return stats
 
-        logger.info(f"扫描完成: 扫描 {stats['scanned']} 条, 发现 BUG {stats['bugs_found']} 个, 需求 {stats['features_found']} 个, 创建工单 {stats['tickets_created']} 个")
+    def register(self, scheduler: AsyncScheduler, interval_minutes: Optional[float] = None):
+        """
+        注册到任务调度器（启动时立即扫描一次，之后按间隔扫描；上一次扫描未结束时跳过）
 
-        return stats
+        Args:
+            scheduler: 任务调度器
+            interval_minutes: 扫描间隔（分钟），默认使用 jobs.watcher_interval
+        """
+        jobs = self.config.jobs
+        interval_seconds = interval_minutes * 60 if interval_minutes else jobs.watcher_interval
+        if interval_seconds <= 0:
+            return
+        self.scan_interval = interval_seconds / 60
+
+        def scan():
+            # 从上次成功扫描开始，避免停机或扫描失败期间的消息被漏掉（搜索失败时 scan_once 抛出异常，不算成功）
+            return self.scan_once(since=scheduler.last_success(JOB_NAME))
+
+        scheduler.add_job(
+            JOB_NAME,
+            scan,
+            IntervalTrigger(interval_seconds),
+            timeout=jobs.watcher_timeout,
+            jitter=jobs.jitter,
+            run_on_start=True,
+        )
 
     def run(self, interval_minutes: int = 5):
         """
@@ -394,20 +485,11 @@ class BugKeywordWatcher:
         Args:
             interval_minutes: 扫描间隔（分钟）
         """
-        self.scan_interval = interval_minutes
-
         logger.info(f"启动定时扫描，间隔: {interval_minutes} 分钟")
 
-        # 立即执行一次
-        self.scan_once()
-
-        # 设置定时任务
-        schedule.every(interval_minutes).minutes.do(self.scan_once)
-
-        # 运行循环
-        while True:
-            schedule.run_pending()
-            time.sleep(30)
+        scheduler = AsyncScheduler(self.config.jobs.state_path)
+        self.register(scheduler, interval_minutes)
+        asyncio.run(scheduler.run_forever())
 
 
 def main():
@@ -429,7 +511,11 @@ def main():
 
     if args.once:
         # 单次扫描
-        result = watcher.scan_once()
+        try:
+            result = watcher.scan_once()
+        except MessageSearchError as e:
+            print(f"扫描未完成: {e}")
+            return
         print(json.dumps(result, indent=2))
     else:
         # 定时扫描
@@ -0,0 +1,187 @@
+"""
+关键词自动生成基准：本地聚类 + 每簇一次 LLM 调用 vs 全部工单一个提示词
+
+对 100 / 1,000 / 10,000 条合成工单分别统计：
+    - 本地耗时：向量化、聚类（实测）
+    - LLM 提示词 token、调用次数、估算耗时与费用（按下方参数估算，不实际调用 LLM）
+    - 聚类质量：与合成数据真实主题对比的纯度与召回
+
+默认用字符二元组哈希向量代替 text2vec-base-chinese（不依赖模型文件，阈值相应取 0.7），
+--model 时使用真实嵌入模型（需安装 sentence-transformers，向量化耗时为 CPU 实测）
+
+运行:
+    python tests/bench_keyword_clustering.py
+    python tests/bench_keyword_clustering.py --sizes 100 1000 --model --threshold 0.8
+"""
+
+import argparse
+import math
+import random
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.utils.keyword_generator import build_batch_prompt, build_cluster_prompt
+from src.utils.ticket_clustering import (
+    cluster_embeddings, embed_texts, load_ticket_embeddings, representatives, ticket_text,
+)
+
+MODULES = ["导入", "导出", "登录", "接口调试", "Mock 服务", "文档分享", "团队协作", "自动化测试",
+           "数据库连接", "环境变量", "代码生成", "权限设置"]
+SYMPTOMS = ["报错", "失败", "卡死", "超时", "白屏"]
+DETAILS = ["提示格式不正确", "点击后没有反应", "一直转圈", "页面提示网络错误", "重启客户端也不行",
+           "昨天还是好的", "换了浏览器一样", "同事电脑上正常"]
+
+
+# ------------------------------------------------------------
+# 合成数据
+# ------------------------------------------------------------
+
+def make_tickets(count: int, seed: int = 0, noise_ratio: float = 0.3):
+    """
+    生成合成工单：70% 来自 60 个主题（主题热度服从 Zipf 分布），30% 为互不相关的零散反馈
+
+    Returns:
+        (工单列表, 每条工单的主题编号，零散反馈为 -1)
+    """
+    rng = random.Random(seed)
+    topics = [(m, s) for m in MODULES for s in SYMPTOMS]
+    weights = [1 / (rank + 1) for rank in range(len(topics))]
+    tickets, labels = [], []
+    for n in range(count):
+        if rng.random() < noise_ratio:
+            words = "".join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.randint(8, 20)))
+            tickets.append({"title": words[:8], "description": words, "type": "缺陷"})
+            labels.append(-1)
+            continue
+        topic = rng.choices(range(len(topics)), weights)[0]
+        module, symptom = topics[topic]
+        title = f"{module}{symptom}"
+        description = f"{module}{symptom}，{rng.choice(DETAILS)}"
+        tickets.append({"title": title, "description": description, "type": "缺陷"})
+        labels.append(topic)
+    return tickets, np.array(labels)
+
+
+def hash_embed(texts, dim: int = 256):
+    """字符二元组哈希向量（代替嵌入模型的确定性近似）"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for a, b in zip(text, text[1:]):
+            vectors[row, zlib.crc32((a + b).encode()) % dim] += 1
+    return vectors
+
+
+# ------------------------------------------------------------
+# 估算
+# ------------------------------------------------------------
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token：中文约每字 1 个，其余约每 4 个字符 1 个"""
+    cjk = len(re.findall(r"[一-鿿]", text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def llm_seconds(args, input_tokens: int, output_tokens: int) -> float:
+    return args.ttft + input_tokens / args.prefill_rate + output_tokens / args.decode_rate
+
+
+def llm_cost(args, input_tokens: int, output_tokens: int) -> float:
+    return (input_tokens * args.price_in + output_tokens * args.price_out) / 1e6
+
+
+def quality(labels: np.ndarray, clusters) -> str:
+    """纯度：簇内同属多数主题的比例；召回：被某个簇覆盖的主题工单比例"""
+    if not clusters:
+        return "无簇"
+    pure = sum(np.bincount(labels[c] + 1).max() for c in clusters) / sum(len(c) for c in clusters)
+    covered = np.zeros(len(labels), dtype=bool)
+    for c in clusters:
+        covered[c] = True
+    recall = covered[labels >= 0].mean()
+    return f"纯度 {pure:.1%}，召回 {recall:.1%}"
+
+
+# ------------------------------------------------------------
+# 基准
+# ------------------------------------------------------------
+
+def run(args, count: int, embed):
+    tickets, labels = make_tickets(count)
+    texts = [ticket_text(t) for t in tickets]
+
+    started = time.perf_counter()
+    vectors = embed_texts(embed, texts)
+    embed_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    clusters = cluster_embeddings(vectors, args.threshold, args.min_cluster_size)
+    cluster_seconds = time.perf_counter() - started
+
+    # 重构前：一个提示词，输出上限 2048 token
+    legacy_in = estimate_tokens(build_batch_prompt(tickets))
+    legacy_out = min(2048, args.output_per_cluster * len(clusters))
+    legacy_fits = legacy_in + 2048 <= args.context_window
+
+    # 每簇一次调用，llm_concurrency 路并发
+    selected = clusters[:args.max_clusters]
+    prompts = [
+        build_cluster_prompt([tickets[i] for i in representatives(vectors, c, args.samples)], len(c))
+        for c in selected
+    ]
+    inputs = [estimate_tokens(p) for p in prompts]
+    per_call = [llm_seconds(args, tokens, args.output_per_cluster) for tokens in inputs]
+    lanes = [0.0] * args.concurrency
+    for seconds in per_call:
+        lanes[lanes.index(min(lanes))] += seconds
+    new_in = sum(inputs)
+    new_out = args.output_per_cluster * len(selected)
+
+    print(f"\n{count} 条工单（{quality(labels, clusters)}，{len(clusters)} 个簇，生成 {len(selected)} 个）")
+    print(f"  本地向量化 {embed_seconds * 1000:>10.1f} ms    聚类 {cluster_seconds * 1000:>8.1f} ms")
+    print(f"  {'':<22}{'调用':>6}{'输入 token':>14}{'输出 token':>12}{'估算耗时':>12}{'估算费用':>12}")
+    print(f"  {'单个提示词（重构前）':<18}{1:>8}{legacy_in:>14,}{legacy_out:>12,}"
+          f"{llm_seconds(args, legacy_in, legacy_out):>11.1f}s{llm_cost(args, legacy_in, legacy_out):>11.4f}$"
+          + ("" if legacy_fits else f"  超出 {args.context_window:,} 上下文，无法调用"))
+    print(f"  {'本地聚类 + 每簇调用':<18}{len(selected):>8}{new_in:>14,}{new_out:>12,}"
+          f"{max(lanes, default=0) + embed_seconds + cluster_seconds:>11.1f}s{llm_cost(args, new_in, new_out):>11.4f}$")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="关键词自动生成基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="工单条数")
+    parser.add_argument("--model", action="store_true", help="使用 text2vec-base-chinese 向量化")
+    parser.add_argument("--threshold", type=float, default=None, help="相似度阈值（默认哈希向量 0.7，模型 0.8）")
+    parser.add_argument("--min-cluster-size", type=int, default=2)
+    parser.add_argument("--max-clusters", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=8, help="每簇交给 LLM 的代表工单数")
+    parser.add_argument("--concurrency", type=int, default=2, help="同时进行的 LLM 调用数")
+    parser.add_argument("--context-window", type=int, default=200000)
+    parser.add_argument("--output-per-cluster", type=int, default=150, help="每个热点问题的输出 token")
+    parser.add_argument("--ttft", type=float, default=1.0, help="首 token 延迟（秒）")
+    parser.add_argument("--prefill-rate", type=float, default=5000, help="输入处理速度（token/秒）")
+    parser.add_argument("--decode-rate", type=float, default=50, help="输出速度（token/秒）")
+    parser.add_argument("--price-in", type=float, default=3.0, help="输入价格（美元 / 百万 token）")
+    parser.add_argument("--price-out", type=float, default=15.0, help="输出价格（美元 / 百万 token）")
+    args = parser.parse_args(argv)
+
+    embed = load_ticket_embeddings() if args.model else hash_embed
+    if args.threshold is None:
+        args.threshold = 0.8 if args.model else 0.7
+
+    print(f"向量化: {'text2vec-base-chinese' if args.model else '字符二元组哈希'}，阈值 {args.threshold}，"
+          f"LLM 估算: 首 token {args.ttft}s，输入 {args.prefill_rate:g} token/s，输出 {args.decode_rate:g} token/s，"
+          f"${args.price_in:g} / ${args.price_out:g} 每百万 token")
+    for count in args.sizes:
+        run(args, count, embed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+关键词回复格式化微基准
+
+对比重构前的实现（逐条 re.sub、每次发送重新识别链接并序列化）与 ReplyFormatter：
+    - 加载：格式化 N 行关键词记录并生成匹配规则
+    - 发送：对命中的关键词回复生成飞书消息体 M 次
+同时校验两者输出逐条一致
+
+运行:
+    python tests/bench_reply_formatter.py
+    python tests/bench_reply_formatter.py --rows 5000 --sends 10000 --distinct-replies 300
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.utils.keyword_table import rules_from_records
+from src.utils.reply_formatter import ReplyFormatter
+
+
+# ------------------------------------------------------------
+# 重构前的实现（仅用于对比）
+# ------------------------------------------------------------
+
+def legacy_format(content: str) -> str:
+    content = re.sub(r'[ \t]+', ' ', content)
+    content = re.sub(r'([a-zA-Z0-9/\-_]+)\s*\n\s*([a-zA-Z0-9/\-_]+)', r'\1\2', content)
+    content = re.sub(r'(\d+\.[一-龥]{2,10})\s+([^\n])', r'\n\1\n\2', content)
+    for title in ["使用场景", "常见问题", "注意事项", "快速开始", "相关链接"]:
+        content = re.sub(f'(\\d+\\.{title})', r'\n\1\n', content)
+    content = re.sub(r'([。？?！!])\s*([1-9]\.)', r'\1\n\2', content)
+    content = re.sub(r'\s+(无论|如果|提示|注意)', r'\n\1', content)
+    link_pattern = r'([一-龥\(\)（）\w\s\-\.]{2,100}?)\s*(?:☞|：|:)\s*(https?://[^\s\n一-龥]+)'
+
+    def replace_link(match):
+        name = match.group(1).strip()
+        name = name.replace('\n', '').replace('\r', '')
+        url = match.group(2).strip()
+        return f'\n{name} ☞ {url}\n'
+
+    content = re.sub(link_pattern, replace_link, content)
+    content = re.sub(r'(立即参与\w*|点击\w*|查看\w*)\s*(?:：|:)\s*(https?://[^\s\n]+)', r'\n\1 ☞ \2\n', content)
+    content = re.sub(r'(https?://[^\s\n]+)\s+([一-龥\d]{2,})', r'\1\n\n\2', content)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    content = content.strip()
+    content = re.sub(r'\n\s*(\d+\.)', r'\n\1', content)
+    return content
+
+
+def legacy_rich_text(content: str) -> dict:
+    url_pattern = r'(https?://[^\s<>\[\]]+)'
+    content_blocks = []
+    for line in content.split('\n'):
+        line = line.rstrip()
+        if not line:
+            content_blocks.append([{"tag": "text", "text": ""}])
+            continue
+        parts = re.split(url_pattern, line)
+        line_elements = []
+        for part in parts:
+            if not part:
+                continue
+            if re.match(url_pattern, part):
+                line_elements.append({"tag": "a", "text": part, "href": part})
+            else:
+                line_elements.append({"tag": "text", "text": part})
+        if line_elements:
+            content_blocks.append(line_elements)
+    return {"zh_cn": {"content": content_blocks}}
+
+
+def legacy_render(content: str):
+    if re.findall(r'https?://[^\s<>\[\]]+', content):
+        return "post", json.dumps(legacy_rich_text(content), ensure_ascii=False)
+    return "text", json.dumps({"text": content}, ensure_ascii=False)
+
+
+# ------------------------------------------------------------
+# 合成数据
+# ------------------------------------------------------------
+
+FRAGMENTS = [
+    "1.使用场景 在 Apifox 中导入 OpenAPI/\nSwagger 文件。",
+    "注意事项：导入前请备份项目数据。",
+    "2.常见问题 如果导入失败，请查看日志。",
+    "下载地址：https://apifox.com/download/{n}",
+    "帮助文档：https://docs.apifox.com/{n}",
+    "立即参与内测：https://apifox.com/beta?id={n}",
+    "提示  你可以在  设置 中修改。",
+    "无论使用哪种方式，都需要先登录。",
+    "3.快速开始   相关链接☞https://apifox.com/help/{n}",
+    "如有其他问题请联系客服！",
+]
+
+
+def make_records(rows: int, distinct_replies: int, seed: int = 0):
+    """生成关键词记录（回复内容在 distinct_replies 种之间重复，模拟多条关键词共用同一回复）"""
+    rng = random.Random(seed)
+    replies = []
+    for n in range(distinct_replies):
+        parts = rng.sample(FRAGMENTS, rng.randint(2, 6))
+        replies.append(" ".join(p.format(n=n) for p in parts))
+    records = []
+    for i in range(rows):
+        keywords = "、".join(f"关键词{i}-{j}" for j in range(rng.randint(1, 3)))
+        records.append({"关键词": keywords, "回复内容": replies[i % distinct_replies], "添加状态": "已完成"})
+    return records
+
+
+def bench(label: str, fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<36}{best * 1000:>10.1f} ms")
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="关键词回复格式化微基准")
+    parser.add_argument("--rows", type=int, default=5000, help="关键词记录行数")
+    parser.add_argument("--sends", type=int, default=10000, help="发送回复次数")
+    parser.add_argument("--distinct-replies", type=int, default=300, help="不同回复内容数")
+    args = parser.parse_args(argv)
+
+    records = make_records(args.rows, args.distinct_replies)
+
+    # 输出一致性
+    formatter = ReplyFormatter()
+    legacy_rules = rules_from_records(records, legacy_format)
+    rules = rules_from_records(records, formatter.format_and_render)
+    assert legacy_rules == rules, "格式化结果与重构前不一致"
+    for _, reply in rules[:args.distinct_replies * 2]:
+        assert legacy_render(reply) == formatter.render(reply), "消息体与重构前不一致"
+    print(f"输出一致：{len(rules)} 条匹配规则，{len({r for _, r in rules})} 种回复")
+
+    print(f"\n加载 {args.rows} 行关键词记录")
+    legacy_load = bench("重构前", lambda: rules_from_records(records, legacy_format))
+    cold_load = bench("ReplyFormatter（冷缓存，含预生成消息体）",
+                      lambda: rules_from_records(records, ReplyFormatter().format_and_render))
+    warm = ReplyFormatter()
+    rules_from_records(records, warm.format_and_render)
+    warm_load = bench("ReplyFormatter（刷新时缓存命中）", lambda: rules_from_records(records, warm.format_and_render))
+
+    rng = random.Random(1)
+    hits = [rng.choice(rules)[1] for _ in range(args.sends)]
+    print(f"\n发送 {args.sends} 次关键词回复（生成消息体）")
+    legacy_send = bench("重构前", lambda: [legacy_render(r) for r in hits])
+    send = bench("ReplyFormatter", lambda: [warm.render(r) for r in hits])
+
+    print(f"\n加载提速 {legacy_load / cold_load:.1f}x（刷新 {legacy_load / warm_load:.1f}x），"
+          f"发送提速 {legacy_send / send:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+企微回调解密微基准
+
+对比重构前的实现（每条消息新建 CBC 对象，签名每次排序拼接）与 WeComCrypto：
+    - 逐条解密：缓存 ECB 密钥展开 + 整段异或
+    - 批量解密：多条密文拼接后一次解密、一次异或，memoryview 切分
+    - 验签 + 解密：回调入口的完整开销
+同时校验输出逐条一致
+
+运行:
+    python tests/bench_wecom_crypto.py
+    python tests/bench_wecom_crypto.py --messages 100000 --batch-size 200
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from Crypto.Cipher import AES
+
+from src.utils.wecom_crypto import WeComCrypto
+
+
+# ------------------------------------------------------------
+# 重构前的实现（仅用于对比）
+# ------------------------------------------------------------
+
+def legacy_verify(token: str, signature: str, timestamp: str, nonce: str, encrypt: str) -> bool:
+    items = [token, timestamp, nonce, encrypt]
+    items.sort()
+    joined = "".join(items)
+    return hashlib.sha1(joined.encode()).hexdigest() == signature
+
+
+def legacy_decrypt(aes_key: bytes, encrypt_msg: str) -> str:
+    cipher = AES.new(aes_key, AES.MODE_CBC, aes_key[:16])
+    decrypted = cipher.decrypt(base64.b64decode(encrypt_msg))
+    pad = decrypted[-1]
+    decrypted = decrypted[:-pad]
+    msg_len = int.from_bytes(decrypted[16:20], 'big')
+    return decrypted[20:20 + msg_len].decode('utf-8')
+
+
+# ------------------------------------------------------------
+# 合成数据
+# ------------------------------------------------------------
+
+def make_messages(crypto: WeComCrypto, count: int, seed: int = 0):
+    """生成企微群消息密文（内容长度 20~600 字）"""
+    rng = random.Random(seed)
+    messages = []
+    for n in range(count):
+        content = "导入 OpenAPI 报错，提示格式不正确" * rng.randint(1, 30)
+        raw = json.dumps({"MsgId": str(10 ** 15 + n), "MsgType": "text", "Content": content[:600],
+                          "FromUserName": f"user{n % 500}", "CreateTime": 1700000000 + n}, ensure_ascii=False)
+        messages.append((raw, crypto.encrypt(raw)))
+    return messages
+
+
+def bench(label: str, fn, count: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<32}{best * 1000:>10.1f} ms  {best / count * 1e6:>7.2f} µs/条")
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="企微回调解密微基准")
+    parser.add_argument("--messages", type=int, default=100000, help="消息条数")
+    parser.add_argument("--batch-size", type=int, default=200, help="批量解密每批条数")
+    args = parser.parse_args(argv)
+
+    aes_key = base64.b64encode(bytes(range(32))).decode()[:-1]
+    crypto = WeComCrypto("token", aes_key, "wx5823bf96d3bd56c7")
+    messages = make_messages(crypto, args.messages)
+    encrypted = [e for _, e in messages]
+    expected = [raw for raw, _ in messages]
+    timestamp, nonce = "1700000000", "1372623149"
+    signatures = [crypto.signature(timestamp, nonce, e) for e in encrypted]
+    size = sum(len(e) for e in encrypted) * 3 // 4
+
+    # 输出一致性
+    assert [legacy_decrypt(crypto.aes_key, e) for e in encrypted[:1000]] == expected[:1000]
+    assert [crypto.decrypt(e) for e in encrypted] == expected
+    batched = []
+    for start in range(0, len(encrypted), args.batch_size):
+        batched.extend(crypto.decrypt_batch(encrypted[start:start + args.batch_size]))
+    assert batched == expected
+    print(f"输出一致：{args.messages} 条消息，密文共 {size / 1024 / 1024:.1f} MB")
+
+    def run_batches():
+        for start in range(0, len(encrypted), args.batch_size):
+            crypto.decrypt_batch(encrypted[start:start + args.batch_size])
+
+    print(f"\n解密 {args.messages} 条")
+    legacy = bench("重构前（每条新建 CBC）", lambda: [legacy_decrypt(crypto.aes_key, e) for e in encrypted],
+                   args.messages)
+    single = bench("WeComCrypto.decrypt", lambda: [crypto.decrypt(e) for e in encrypted], args.messages)
+    batch = bench(f"WeComCrypto.decrypt_batch({args.batch_size})", run_batches, args.messages)
+
+    print(f"\n验签 + 解密 {args.messages} 条")
+    legacy_full = bench("重构前", lambda: [
+        legacy_verify("token", s, timestamp, nonce, e) and legacy_decrypt(crypto.aes_key, e)
+        for s, e in zip(signatures, encrypted)
+    ], args.messages)
+    full = bench("WeComCrypto", lambda: [
+        crypto.verify_signature(s, timestamp, nonce, e) and crypto.decrypt(e)
+        for s, e in zip(signatures, encrypted)
+    ], args.messages)
+
+    print(f"\n逐条解密提速 {legacy / single:.1f}x，批量解密提速 {legacy / batch:.1f}x，"
+          f"验签 + 解密提速 {legacy_full / full:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
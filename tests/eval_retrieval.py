@@ -0,0 +1,504 @@
+"""
+检索质量与延迟评测（替代 check_vector_db.py）
+
+基于 tests/data/retrieval_eval_set.jsonl 中人工整理的「问题 → 期望文档」集合，
+对不同检索配置离线评测：
+
+    - recall@k：前 k 个片段中命中任一期望文档的问题比例
+    - MRR：首个命中文档排名倒数的均值（按文档去重后排名）
+    - 查询延迟 p50 / p95（含问题向量化）
+    - 平均上下文字符数（近似每次回答的 prompt 体积）
+    - 片段数、索引体积、构建耗时
+
+可调维度：切分方式（recursive、markdown）/ chunk_size / chunk_overlap / top_k / score_threshold /
+后端（chroma、memory、bm25）/ 混合检索开关。
+嵌入模型与线上一致（knowledge_base.create_embeddings），相关度换算与 KnowledgeBase.search 一致。
+
+运行:
+    python tests/eval_retrieval.py                                   # 默认网格
+    python tests/eval_retrieval.py --current                         # 仅评测 config.yaml 中 rag.retrieval 当前配置
+    python tests/eval_retrieval.py --chunk-sizes 300,500 --top-k 3,5 --thresholds 0,0.3 --hybrid off,on
+    python tests/eval_retrieval.py --backends bm25                   # 不加载嵌入模型的纯词法基线
+    python tests/eval_retrieval.py --output results.csv
+"""
+
+import argparse
+import csv
+import json
+import math
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 设置 UTF-8 编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+import numpy as np
+from loguru import logger
+from langchain_core.documents import Document
+
+from src.rag.markdown_chunker import create_text_splitter
+from src.rag.text_normalizer import TextNormalizer, normalize_and_split
+
+DEFAULT_EVAL_SET = ROOT_DIR / "tests" / "data" / "retrieval_eval_set.jsonl"
+DEFAULT_DOCS_DIR = ROOT_DIR / "data" / "documents" / "apifox"
+
+# 混合检索时每路召回的候选数倍数与 RRF 常数
+HYBRID_CANDIDATE_FACTOR = 4
+RRF_K = 60
+
+
+# ============================================================
+# 数据加载与切分
+# ============================================================
+
+def load_eval_set(path: Path) -> List[Dict]:
+    """加载评测集（每行 {"question": ..., "expected": [文档ID, ...]}）"""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+    return items
+
+
+def doc_id_of(metadata: Dict) -> str:
+    """文档 ID：源文件名（不含扩展名），与评测集中的 expected 对应"""
+    return Path(metadata.get("source", "")).stem
+
+
+def load_documents(docs_dir: Path) -> List[Document]:
+    """加载目录下的 Markdown 文档（与 build_knowledge_base 一致，按文件整体加载）"""
+    documents = []
+    for path in sorted(docs_dir.glob("**/*.md")):
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        if text.strip():
+            documents.append(Document(page_content=text, metadata={"source": str(path)}))
+    return documents
+
+
+def split_documents(
+    documents: List[Document], chunker: str, chunk_size: int, chunk_overlap: int, normalize: bool = False
+) -> List[Document]:
+    """与 KnowledgeBase 相同的归一化与切分方式"""
+    splitter = create_text_splitter(chunker, chunk_size, chunk_overlap)
+    chunks, _ = normalize_and_split(documents, splitter, TextNormalizer() if normalize else None)
+    return chunks
+
+
+# ============================================================
+# 索引后端
+# ============================================================
+
+def distance_to_relevance(distance: float) -> float:
+    """L2 距离换算相关度（与 KnowledgeBase._relevance_score 一致）"""
+    return 1.0 - distance / math.sqrt(2)
+
+
+class MemoryVectorIndex:
+    """内存暴力检索（numpy 点积，向量已归一化）"""
+
+    name = "memory"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def search(self, query_vector: np.ndarray, n: int) -> List[Tuple[int, float]]:
+        cos = self.vectors @ query_vector
+        n = min(n, len(cos))
+        top = np.argpartition(-cos, n - 1)[:n]
+        top = top[np.argsort(-cos[top])]
+        # 与 Chroma 的 L2 距离保持同一相关度口径：d = 2 - 2cos
+        return [(int(i), distance_to_relevance(max(0.0, 2 - 2 * float(cos[i])))) for i in top]
+
+    def size_bytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def close(self):
+        pass
+
+
+class ChromaVectorIndex:
+    """Chroma 持久化索引（与线上 langchain Chroma 使用相同的底层库与默认 L2 距离）"""
+
+    name = "chroma"
+    BATCH_SIZE = 1000
+
+    def __init__(self, vectors: np.ndarray, chunks: List[Document]):
+        import chromadb
+
+        self.path = Path(tempfile.mkdtemp(prefix="eval_chroma_"))
+        self.client = chromadb.PersistentClient(path=str(self.path))
+        self.collection = self.client.create_collection("eval")
+        for start in range(0, len(chunks), self.BATCH_SIZE):
+            batch = chunks[start:start + self.BATCH_SIZE]
+            self.collection.add(
+                ids=[str(i) for i in range(start, start + len(batch))],
+                embeddings=vectors[start:start + len(batch)].tolist(),
+                documents=[c.page_content for c in batch],
+                metadatas=[{"source": c.metadata.get("source", "")} for c in batch],
+            )
+
+    def search(self, query_vector: np.ndarray, n: int) -> List[Tuple[int, float]]:
+        result = self.collection.query(query_embeddings=[query_vector.tolist()], n_results=n)
+        ids = result["ids"][0]
+        distances = result["distances"][0]
+        return [(int(i), distance_to_relevance(d)) for i, d in zip(ids, distances)]
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.path.rglob("*") if p.is_file())
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class BM25Index:
+    """BM25 词法索引（中文按字二元组、英文按单词切分）"""
+
+    name = "bm25"
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_tfs: List[Counter] = [Counter(self.tokenize(t)) for t in texts]
+        self.doc_lens = [sum(tf.values()) for tf in self.doc_tfs]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0.0
+        df: Counter = Counter()
+        for tf in self.doc_tfs:
+            df.update(tf.keys())
+        n = len(self.doc_tfs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+        # 倒排表：term -> [(doc_index, tf)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for i, tf in enumerate(self.doc_tfs):
+            for term, count in tf.items():
+                self.postings.setdefault(term, []).append((i, count))
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        text = text.lower()
+        tokens = re.findall(r"[a-z0-9_]+", text)
+        for run in re.findall(r"[一-鿿]+", text):
+            if len(run) == 1:
+                tokens.append(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        return tokens
+
+    def search(self, query: str, n: int) -> List[Tuple[int, float]]:
+        scores: Dict[int, float] = {}
+        for term in set(self.tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lens[i] / (self.avg_len or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def size_bytes(self) -> int:
+        # 粗略估计：每条倒排记录按 16 字节计
+        return sum(len(p) for p in self.postings.values()) * 16
+
+    def close(self):
+        pass
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[int]:
+    """RRF 融合多路排序结果"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (k + rank + 1)
+    return [idx for idx, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+
+# ============================================================
+# 评测
+# ============================================================
+
+@dataclass
+class EvalResult:
+    """单个检索配置的评测结果"""
+    chunker: str
+    chunk_size: int
+    chunk_overlap: int
+    backend: str
+    hybrid: bool
+    top_k: int
+    score_threshold: float
+    recall_at_k: float
+    mrr: float
+    latency_p50_ms: float
+    latency_p95_ms: float
+    avg_context_chars: float
+    chunks: int
+    index_mb: float
+    build_seconds: float
+    normalized: bool = False
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class RetrievalEvaluator:
+    """按切分配置构建索引，并在其上评测 top_k / 阈值 / 混合检索组合"""
+
+    def __init__(self, eval_set: List[Dict], documents: List[Document], embeddings=None):
+        self.eval_set = eval_set
+        self.documents = documents
+        self.embeddings = embeddings
+        self._query_vectors: Optional[np.ndarray] = None
+        self._query_embed_seconds: List[float] = []
+
+    def _embed_queries(self):
+        """问题向量只计算一次，各配置复用（单条耗时计入查询延迟）"""
+        if self._query_vectors is not None or self.embeddings is None:
+            return
+        vectors = []
+        for item in self.eval_set:
+            start = time.perf_counter()
+            vectors.append(self.embeddings.embed_query(item["question"]))
+            self._query_embed_seconds.append(time.perf_counter() - start)
+        self._query_vectors = np.asarray(vectors, dtype=np.float32)
+
+    def evaluate_chunking(
+        self,
+        chunker: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        backends: Sequence[str],
+        top_ks: Sequence[int],
+        thresholds: Sequence[float],
+        hybrid_modes: Sequence[bool],
+        normalize: bool = False,
+    ) -> List[EvalResult]:
+        split_start = time.perf_counter()
+        chunks = split_documents(self.documents, chunker, chunk_size, chunk_overlap, normalize)
+        split_seconds = time.perf_counter() - split_start
+        texts = [c.page_content for c in chunks]
+        chunk_doc_ids = [doc_id_of(c.metadata) for c in chunks]
+        logger.info(f"chunker={chunker}, chunk_size={chunk_size}, overlap={chunk_overlap}, "
+                    f"normalize={normalize}: {len(chunks)} 个片段")
+
+        vectors = None
+        embed_seconds = 0.0
+        if any(b != "bm25" for b in backends):
+            self._embed_queries()
+            embed_start = time.perf_counter()
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            embed_seconds = time.perf_counter() - embed_start
+
+        bm25_start = time.perf_counter()
+        bm25 = BM25Index(texts) if ("bm25" in backends or any(hybrid_modes)) else None
+        bm25_seconds = time.perf_counter() - bm25_start
+
+        results = []
+        for backend in backends:
+            build_start = time.perf_counter()
+            if backend == "bm25":
+                index = bm25
+                build_seconds = split_seconds + bm25_seconds
+            elif backend == "memory":
+                index = MemoryVectorIndex(vectors)
+                build_seconds = split_seconds + embed_seconds + (time.perf_counter() - build_start)
+            elif backend == "chroma":
+                index = ChromaVectorIndex(vectors, chunks)
+                build_seconds = split_seconds + embed_seconds + (time.perf_counter() - build_start)
+            else:
+                raise ValueError(f"未知后端: {backend}")
+
+            try:
+                for hybrid in hybrid_modes:
+                    if backend == "bm25" and hybrid:
+                        continue
+                    extra_bytes = bm25.size_bytes() if hybrid and backend != "bm25" else 0
+                    # 纯词法后端的分数不是相关度，阈值不适用
+                    backend_thresholds = [0.0] if backend == "bm25" else thresholds
+                    for top_k in top_ks:
+                        for threshold in backend_thresholds:
+                            metrics = self._run_queries(index, bm25, hybrid, top_k, threshold, texts, chunk_doc_ids)
+                            results.append(EvalResult(
+                                chunker=chunker,
+                                chunk_size=chunk_size,
+                                chunk_overlap=chunk_overlap,
+                                backend=backend,
+                                hybrid=hybrid,
+                                top_k=top_k,
+                                score_threshold=threshold,
+                                chunks=len(chunks),
+                                index_mb=(index.size_bytes() + extra_bytes) / (1024 * 1024),
+                                build_seconds=build_seconds + (bm25_seconds if hybrid and backend != "bm25" else 0.0),
+                                normalized=normalize,
+                                **metrics,
+                            ))
+            finally:
+                if index is not bm25:
+                    index.close()
+        return results
+
+    def _retrieve(self, qi: int, index, bm25, hybrid: bool, top_k: int, threshold: float) -> List[int]:
+        question = self.eval_set[qi]["question"]
+        if index.name == "bm25":
+            return [i for i, _ in index.search(question, top_k)]
+
+        candidates = top_k * HYBRID_CANDIDATE_FACTOR if hybrid else top_k
+        vector_hits = [i for i, rel in index.search(self._query_vectors[qi], candidates) if rel >= threshold]
+        if not hybrid:
+            return vector_hits[:top_k]
+        lexical_hits = [i for i, _ in bm25.search(question, candidates)]
+        return reciprocal_rank_fusion([vector_hits, lexical_hits])[:top_k]
+
+    def _run_queries(self, index, bm25, hybrid, top_k, threshold, texts, chunk_doc_ids) -> Dict:
+        hits = 0
+        reciprocal_ranks = []
+        latencies = []
+        context_chars = []
+        for qi, item in enumerate(self.eval_set):
+            expected = set(item["expected"])
+            start = time.perf_counter()
+            retrieved = self._retrieve(qi, index, bm25, hybrid, top_k, threshold)
+            elapsed = time.perf_counter() - start
+            if index.name != "bm25":
+                elapsed += self._query_embed_seconds[qi]
+            latencies.append(elapsed)
+
+            # 按文档去重后计算排名
+            doc_ranking = list(dict.fromkeys(chunk_doc_ids[i] for i in retrieved))
+            rank = next((r for r, d in enumerate(doc_ranking, 1) if d in expected), None)
+            if rank:
+                hits += 1
+                reciprocal_ranks.append(1.0 / rank)
+            else:
+                reciprocal_ranks.append(0.0)
+            context_chars.append(sum(len(texts[i]) for i in retrieved))
+
+        return {
+            "recall_at_k": hits / len(self.eval_set),
+            "mrr": statistics.mean(reciprocal_ranks),
+            "latency_p50_ms": _percentile(latencies, 0.50) * 1000,
+            "latency_p95_ms": _percentile(latencies, 0.95) * 1000,
+            "avg_context_chars": statistics.mean(context_chars),
+        }
+
+
+# ============================================================
+# 输出
+# ============================================================
+
+def print_results(results: List[EvalResult], limit: int):
+    ranked = sorted(results, key=lambda r: (-r.recall_at_k, -r.mrr, r.avg_context_chars, r.latency_p95_ms))
+    header = (f"{'chunker':<9}{'norm':<5}{'chunk':>6}{'ovl':>5} {'backend':<8}{'hyb':<5}{'k':>3}{'thr':>6}"
+              f"{'recall':>8}{'MRR':>7}{'p50ms':>8}{'p95ms':>8}{'ctx':>7}{'chunks':>8}{'MB':>7}{'build_s':>9}")
+    print("\n" + header)
+    print("-" * len(header))
+    for r in ranked[:limit]:
+        print(f"{r.chunker:<9}{('on' if r.normalized else 'off'):<5}{r.chunk_size:>6}{r.chunk_overlap:>5} {r.backend:<8}{('on' if r.hybrid else 'off'):<5}{r.top_k:>3}"
+              f"{r.score_threshold:>6.2f}{r.recall_at_k:>8.3f}{r.mrr:>7.3f}{r.latency_p50_ms:>8.1f}"
+              f"{r.latency_p95_ms:>8.1f}{r.avg_context_chars:>7.0f}{r.chunks:>8}{r.index_mb:>7.2f}{r.build_seconds:>9.1f}")
+    if len(ranked) > limit:
+        print(f"... 共 {len(ranked)} 组配置，仅显示前 {limit} 组（--limit 调整）")
+
+
+def save_results(results: List[EvalResult], output: Path):
+    rows = [asdict(r) for r in results]
+    if output.suffix == ".json":
+        output.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    else:
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"\n结果已保存: {output}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检索质量与延迟评测")
+    parser.add_argument("--eval-set", default=str(DEFAULT_EVAL_SET), help="评测集 JSONL")
+    parser.add_argument("--docs-dir", default=str(DEFAULT_DOCS_DIR), help="文档目录")
+    parser.add_argument("--chunkers", default="recursive,markdown", help="逗号分隔：recursive,markdown")
+    parser.add_argument("--normalize", default="off,on", help="逗号分隔：off,on（是否先做文本归一化）")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[300, 500, 800])
+    parser.add_argument("--chunk-overlaps", type=_int_list, default=[50])
+    parser.add_argument("--top-k", type=_int_list, default=[3, 5])
+    parser.add_argument("--thresholds", type=_float_list, default=[0.0, 0.3, 0.5, 0.7])
+    parser.add_argument("--backends", default="chroma,memory", help="逗号分隔：chroma,memory,bm25")
+    parser.add_argument("--hybrid", default="off,on", help="逗号分隔：off,on")
+    parser.add_argument("--current", action="store_true", help="仅评测 config.yaml 中的当前配置（chroma，无混合检索）")
+    parser.add_argument("--limit", type=int, default=30, help="表格显示的配置数")
+    parser.add_argument("--output", help="保存全部结果（.csv 或 .json）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    hybrid_modes = [m.strip() == "on" for m in args.hybrid.split(",") if m.strip()]
+    chunkers = [c.strip() for c in args.chunkers.split(",") if c.strip()]
+    normalize_modes = [m.strip() == "on" for m in args.normalize.split(",") if m.strip()]
+    chunk_sizes, chunk_overlaps, top_ks, thresholds = args.chunk_sizes, args.chunk_overlaps, args.top_k, args.thresholds
+
+    if args.current:
+        from utils.config_loader import load_config
+        rag = load_config(str(ROOT_DIR / "config" / "config.yaml")).rag
+        chunkers, chunk_sizes, chunk_overlaps = [rag.chunker], [rag.chunk_size], [rag.chunk_overlap]
+        normalize_modes = [rag.normalize]
+        top_ks, thresholds = [rag.top_k], [rag.score_threshold]
+        backends, hybrid_modes = ["chroma"], [False]
+
+    eval_set = load_eval_set(Path(args.eval_set))
+    documents = load_documents(Path(args.docs_dir))
+    print(f"评测集 {len(eval_set)} 个问题，文档 {len(documents)} 篇")
+
+    embeddings = None
+    if any(b != "bm25" for b in backends):
+        from rag.knowledge_base import create_embeddings
+        embeddings = create_embeddings()
+
+    evaluator = RetrievalEvaluator(eval_set, documents, embeddings)
+    results: List[EvalResult] = []
+    for normalize in normalize_modes:
+        for chunker in chunkers:
+            for chunk_size in chunk_sizes:
+                for chunk_overlap in chunk_overlaps:
+                    if chunk_overlap >= chunk_size:
+                        continue
+                    results.extend(evaluator.evaluate_chunking(
+                        chunker, chunk_size, chunk_overlap, backends, top_ks, thresholds, hybrid_modes, normalize
+                    ))
+
+    print_results(results, args.limit)
+    if args.output and results:
+        save_results(results, Path(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,764 @@
+"""
+飞书机器人离线压测（端到端）
+
+使用本地模拟飞书开放平台 + 模拟 LLM（可注入延迟分布）+ 小型知识库，
+以可配置速率向多个群回放合成消息，驱动 FeishuBot.handle_message
+（或 src/bots/main.py 中的 FastAPI Webhook），输出：
+
+    - 各阶段 p50 / p95 / p99（来自 src.utils.metrics）
+    - 端到端耗时分位数与吞吐（条/秒）
+    - 事件循环延迟
+    - 内存增长（进程 RSS，可选 tracemalloc 定位来源）
+
+运行:
+    python tests/load_test_feishu.py --rate 20 --duration 30 --groups 8
+    python tests/load_test_feishu.py --mode webhook --rate 10
+    python tests/load_test_feishu.py --save-report base.json
+    python tests/load_test_feishu.py --baseline base.json --tolerance 0.25   # 回归时退出码为 1
+
+延迟分布写法: const:0.2 / uniform:0.1,0.5 / lognormal:中位数,sigma / exp:均值
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# 设置 UTF-8 编码输出
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from loguru import logger
+
+from src.utils.metrics import LLM_TTFT_SECONDS, REGISTRY, STAGE_SECONDS, stage_timer
+
+E2E_SECONDS = REGISTRY.histogram("loadtest_e2e_seconds", "压测端到端耗时（秒）", ["kind"])
+LOOP_LAG_SECONDS = REGISTRY.histogram("loadtest_loop_lag_seconds", "压测驱动事件循环延迟（秒）")
+
+KEYWORD_TEXT = "下载地址"
+KEYWORD_FILLER_RECORDS = 600
+BOT_APP_ID = "cli_loadtest"
+
+
+# ============================================================
+# 延迟分布
+# ============================================================
+
+class LatencyDist:
+    """可注入的延迟分布（秒）"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("const", "uniform", "lognormal", "exp"):
+            raise ValueError(f"不支持的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "const":
+            return p[0]
+        if self.kind == "uniform":
+            return random.uniform(p[0], p[1])
+        if self.kind == "lognormal":
+            # 参数为中位数与 sigma
+            return random.lognormvariate(math.log(p[0]), p[1] if len(p) > 1 else 0.5)
+        return random.expovariate(1 / p[0])
+
+    def __repr__(self):
+        return self.spec
+
+
+# ============================================================
+# 模拟飞书开放平台
+# ============================================================
+
+class FakeFeishuServer:
+    """
+    本地模拟飞书开放平台（token / 发消息 / 更新卡片 / 表情 / 关键词表）
+
+    在独立进程中运行，避免与被测机器人争抢 GIL 导致模拟延迟失真；
+    调用计数通过 /_loadtest/stats 获取。
+    """
+
+    def __init__(self, latency_spec: str, error_rate: float = 0.0):
+        self.latency_spec = latency_spec
+        self.error_rate = error_rate
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._process: Optional[multiprocessing.Process] = None
+
+    @staticmethod
+    def build_app(latency: LatencyDist, error_rate: float) -> FastAPI:
+        app = FastAPI()
+        state = {"calls": {}, "errors": 0}
+
+        def count(name: str):
+            state["calls"][name] = state["calls"].get(name, 0) + 1
+
+        async def simulate(name: str) -> Optional[Dict]:
+            """注入延迟与错误，返回错误响应或 None"""
+            count(name)
+            await asyncio.sleep(latency.sample())
+            if error_rate and random.random() < error_rate:
+                state["errors"] += 1
+                return {"code": 99991400, "msg": "fake rate limited"}
+            return None
+
+        @app.get("/_loadtest/stats")
+        async def stats():
+            return state
+
+        @app.post("/open-apis/auth/v3/tenant_access_token/internal")
+        async def tenant_token():
+            count("token")
+            return {"code": 0, "msg": "ok", "tenant_access_token": "t-loadtest", "expire": 7200}
+
+        @app.post("/open-apis/auth/v3/app_access_token/internal")
+        async def app_token():
+            count("token")
+            return {"code": 0, "msg": "ok", "app_access_token": "a-loadtest", "tenant_access_token": "t-loadtest", "expire": 7200}
+
+        @app.post("/open-apis/im/v1/messages")
+        async def create_message(request: Request):
+            body = await request.json()
+            error = await simulate("card_send" if body.get("msg_type") == "interactive" else "message_send")
+            return error or {"code": 0, "msg": "success", "data": {"message_id": f"om_{uuid.uuid4().hex}"}}
+
+        @app.patch("/open-apis/im/v1/messages/{message_id}")
+        async def patch_message(message_id: str):
+            error = await simulate("card_patch")
+            return error or {"code": 0, "msg": "success", "data": {}}
+
+        @app.post("/open-apis/im/v1/messages/{message_id}/reactions")
+        async def reaction(message_id: str):
+            error = await simulate("reaction")
+            return error or {"code": 0, "msg": "success", "data": {}}
+
+        @app.post("/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/search")
+        async def keyword_records(app_token: str, table_id: str, page_size: int = 500, page_token: str = ""):
+            count("keyword_records")
+            # 一条有效规则 + 若干填充记录，验证分页拉取
+            items = [{
+                "record_id": "rec_loadtest",
+                "fields": {"关键词": [{"type": "text", "text": KEYWORD_TEXT}],
+                           "回复内容": [{"type": "text", "text": "下载地址：https://apifox.com/download"}],
+                           "添加状态": "已完成"},
+                "last_modified_time": 1700000000000,
+            }] + [{
+                "record_id": f"rec_filler_{i}",
+                "fields": {"关键词": f"填充关键词{i}", "回复内容": "-", "添加状态": "待处理"},
+                "last_modified_time": 1700000000000,
+            } for i in range(KEYWORD_FILLER_RECORDS)]
+            start = int(page_token or 0)
+            page = items[start:start + page_size]
+            has_more = start + page_size < len(items)
+            return {"code": 0, "msg": "success", "data": {
+                "items": page, "has_more": has_more, "total": len(items),
+                "page_token": str(start + page_size) if has_more else "",
+            }}
+
+        return app
+
+    @staticmethod
+    def _serve(port: int, latency_spec: str, error_rate: float):
+        app = FakeFeishuServer.build_app(LatencyDist(latency_spec), error_rate)
+        uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+    def start(self):
+        import httpx
+        self._process = multiprocessing.Process(
+            target=self._serve,
+            args=(self.port, self.latency_spec, self.error_rate),
+            name="fake-feishu",
+            daemon=True
+        )
+        self._process.start()
+        deadline = time.time() + 15
+        while True:
+            try:
+                httpx.get(f"{self.base_url}/_loadtest/stats", timeout=1)
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline or not self._process.is_alive():
+                    raise RuntimeError("模拟飞书服务启动失败")
+                time.sleep(0.1)
+        logger.info(f"模拟飞书服务已启动: {self.base_url}")
+
+    def stats(self) -> Dict:
+        import httpx
+        return httpx.get(f"{self.base_url}/_loadtest/stats", timeout=5).json()
+
+    def stop(self):
+        if self._process and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ============================================================
+# 模拟 LLM（兼容 Anthropic 同步客户端的 messages.create / messages.stream）
+# ============================================================
+
+class _FakeStream:
+    """模拟 messages.stream 上下文"""
+
+    def __init__(self, llm: "FakeLLM", text: str):
+        self.llm = llm
+        self.text = text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        time.sleep(self.llm.ttft.sample())
+        for token in self.llm.tokenize(self.text):
+            yield SimpleNamespace(type="text", text=token)
+            time.sleep(self.llm.token_interval)
+
+    def get_final_message(self):
+        return self.llm.final_message(self.text)
+
+
+class FakeLLM:
+    """模拟 LLM：首字延迟服从注入分布，随后按固定速率输出 token"""
+
+    def __init__(self, ttft: LatencyDist, tokens_per_sec: float = 40.0, answer_tokens: int = 80):
+        self.ttft = ttft
+        self.token_interval = 1 / tokens_per_sec if tokens_per_sec > 0 else 0
+        self.answer_tokens = answer_tokens
+        self.messages = self
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+    def _answer_for(self, messages: List[Dict]) -> str:
+        with self._lock:
+            self.calls += 1
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        if "分类标准" in prompt:
+            return json.dumps({
+                "type": "usage",
+                "confidence": 0.9,
+                "reason": "压测模拟分类",
+                "suggested_answer": "请参考帮助文档：https://docs.apifox.com"
+            }, ensure_ascii=False)
+        return ("根据文档，" + "可以在项目设置中完成该操作。" * 20)[:self.answer_tokens * 2]
+
+    def final_message(self, text: str):
+        usage = SimpleNamespace(input_tokens=600, output_tokens=len(self.tokenize(text)))
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], usage=usage)
+
+    def create(self, messages: List[Dict] = None, **kwargs):
+        text = self._answer_for(messages or [])
+        time.sleep(self.ttft.sample() + self.token_interval * len(self.tokenize(text)))
+        return self.final_message(text)
+
+    def stream(self, messages: List[Dict] = None, **kwargs):
+        return _FakeStream(self, self._answer_for(messages or []))
+
+
+# ============================================================
+# 小型知识库（与 KnowledgeBase 接口一致：search / format_context / ready）
+# ============================================================
+
+class TinyKnowledgeBase:
+    """基于字符二元组重叠的小型知识库，检索耗时真实占用 CPU，另可叠加注入延迟"""
+
+    def __init__(self, docs_dir: Path, max_docs: int, latency: LatencyDist, miss_rate: float = 0.0):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.docs: List = []
+        for path in sorted(docs_dir.glob("*.md"))[:max_docs]:
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            title = text.strip().splitlines()[0].lstrip("# ").strip() if text.strip() else path.stem
+            self.docs.append(SimpleNamespace(
+                page_content=text[:1500],
+                metadata={"title": title, "url": f"https://docs.apifox.com/{path.stem}", "source": str(path)},
+                grams=self._grams(text[:1500])
+            ))
+        if not self.docs:
+            self.docs.append(SimpleNamespace(
+                page_content="Apifox 支持导入 OpenAPI 文档。",
+                metadata={"title": "导入数据", "url": "https://docs.apifox.com"},
+                grams=self._grams("Apifox 支持导入 OpenAPI 文档。")
+            ))
+        self.ready = True
+
+    @staticmethod
+    def _grams(text: str) -> set:
+        text = re.sub(r"\s+", "", text.lower())
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def titles(self) -> List[str]:
+        return [d.metadata["title"] for d in self.docs]
+
+    def _search_sync(self, query: str, k: int) -> List:
+        q = self._grams(query)
+        scored = sorted(self.docs, key=lambda d: len(q & d.grams), reverse=True)
+        return scored[:k]
+
+    async def search(self, query: str, top_k: int = None) -> List:
+        with stage_timer("retrieval"):
+            await asyncio.sleep(self.latency.sample())
+            if self.miss_rate and random.random() < self.miss_rate:
+                return []
+            return await asyncio.to_thread(self._search_sync, query, top_k or 3)
+
+    def format_context(self, docs: List) -> str:
+        if not docs:
+            return "未找到相关文档"
+        return "\n".join(f"### 文档 {i}\n{d.page_content}\n" for i, d in enumerate(docs, 1))
+
+
+# ============================================================
+# 流量生成
+# ============================================================
+
+class TrafficGenerator:
+    """多群合成流量：泊松到达，按比例混合关键词消息与 @机器人 问题"""
+
+    def __init__(self, titles: List[str], groups: int, keyword_ratio: float, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.titles = titles or ["导入数据"]
+        self.chat_ids = [f"oc_loadtest_{i:03d}" for i in range(groups)]
+        self.keyword_ratio = keyword_ratio
+
+    def next_interval(self, rate: float) -> float:
+        return self.rng.expovariate(rate)
+
+    def next_event(self) -> Dict:
+        chat_id = self.rng.choice(self.chat_ids)
+        message_id = f"om_in_{uuid.uuid4().hex}"
+        if self.rng.random() < self.keyword_ratio:
+            kind, text, mentions = "keyword", f"请问{KEYWORD_TEXT}在哪", []
+        else:
+            title = self.rng.choice(self.titles)
+            kind, text, mentions = "question", f"@_user_1 请问{title}怎么用？", [{"id": BOT_APP_ID}]
+        return {
+            "kind": kind,
+            "event": {
+                "chat_id": chat_id,
+                "sender": {"sender_id": {"user_id": f"ou_user_{self.rng.randint(1, 50)}"}},
+                "content": json.dumps({"text": text}, ensure_ascii=False),
+                "message_id": message_id,
+                "message": {"mentions": mentions}
+            }
+        }
+
+
+# ============================================================
+# 压测驱动
+# ============================================================
+
+def build_components(args, fake_llm: FakeLLM, kb):
+    """构建 FeishuBot（或 main.py 中的实例），替换 LLM 与知识库"""
+    from utils.config_loader import load_config
+
+    config = load_config(str(ROOT_DIR / "config" / "config.yaml"))
+    # 配置快照只读，按压测参数生成新快照
+    llm = config.llm.model_copy(update={
+        "stream_answer": not args.no_stream,
+        "stream_patch_interval": args.patch_interval,
+    })
+    config = config.model_copy(update={"llm": llm})
+
+    if args.mode == "webhook":
+        import bots.main as main_app
+        bot = main_app.feishu_bot
+        app = main_app.app
+    else:
+        from bots.feishu_bot import FeishuBot
+        from classifiers.question_classifier import QuestionClassifier
+        from utils.template_manager import TemplateManager
+        bot = FeishuBot(config, kb, QuestionClassifier(config), TemplateManager(config))
+        app = None
+
+    bot.apply_config(bot.config.model_copy(update={"llm": llm}))
+    # 默认关闭 LLM 公平调度，结果与此前的基线可比；--fairness 时按 config.yaml 中的 fairness 配置限速
+    bot.fair_scheduler.apply_config(
+        bot.config.fairness if args.fairness else bot.config.fairness.model_copy(update={"enabled": False})
+    )
+    bot.kb = kb
+    bot.llm_client = fake_llm
+    bot.classifier.client = fake_llm
+    # 思考转发目标群与压测无关，统一指向模拟群
+    bot.BOT_TEST_CHAT_ID = "oc_loadtest_relay"
+    return bot, app
+
+
+class LoadTestRunner:
+    """按速率回放消息并统计端到端耗时"""
+
+    def __init__(self, args, bot, app, traffic: TrafficGenerator):
+        self.args = args
+        self.bot = bot
+        self.app = app
+        self.traffic = traffic
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, str] = {}
+        self._started: Dict[str, float] = {}
+        self._done = threading.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.workers)
+        self._wrap_handle_message()
+
+    def _wrap_handle_message(self):
+        """包装 handle_message 以记录端到端耗时（webhook 模式下由服务端调度，同样可统计）"""
+        original = self.bot.handle_message
+
+        async def tracked(event: Dict):
+            message_id = event.get("message_id", "")
+            try:
+                await original(event)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                self._record_done(message_id)
+
+        self.bot.handle_message = tracked
+
+    def _record_done(self, message_id: str, observe: bool = True):
+        with self._lock:
+            started = self._started.pop(message_id, None)
+            kind = self._kinds.pop(message_id, "unknown")
+            self.completed += 1
+            if self.completed >= self.submitted and self._done_submitting:
+                self._done.set()
+        if started is not None and observe:
+            E2E_SECONDS.observe(time.perf_counter() - started, kind=kind)
+
+    async def _monitor_loop_lag(self, stop: asyncio.Event, interval: float = 0.05):
+        while not stop.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - expected))
+
+    async def _dispatch(self, item: Dict, client):
+        event = item["event"]
+        message_id = event["message_id"]
+        with self._lock:
+            self.submitted += 1
+            self._kinds[message_id] = item["kind"]
+            self._started[message_id] = time.perf_counter()
+
+        if self.args.mode == "ws":
+            # 与 feishu_ws_main 一致：每条消息在线程中 asyncio.run
+            self._executor.submit(asyncio.run, self.bot.handle_message(event))
+        elif self.args.mode == "loop":
+            asyncio.ensure_future(self.bot.handle_message(event))
+        else:
+            payload = {"type": "event", "event": {"type": "message", **event}}
+            resp = await client.post("/webhook/feishu", json=payload)
+            if resp.status_code != 200:
+                with self._lock:
+                    self.failed += 1
+            elif resp.json().get("msg") == "busy":
+                # 超出并发与排队上限被服务端拒绝，不会再有处理完成的回调
+                with self._lock:
+                    self.rejected += 1
+                self._record_done(message_id, observe=False)
+
+    async def run(self) -> float:
+        self._done_submitting = False
+        stop = asyncio.Event()
+        lag_task = asyncio.ensure_future(self._monitor_loop_lag(stop))
+
+        client = None
+        if self.args.mode == "webhook":
+            import httpx
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://loadtest")
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        next_at = started
+        while True:
+            next_at += self.traffic.next_interval(self.args.rate)
+            if next_at >= deadline:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._dispatch(self.traffic.next_event(), client)
+
+        with self._lock:
+            self._done_submitting = True
+            if self.completed >= self.submitted:
+                self._done.set()
+        await asyncio.to_thread(self._done.wait, self.args.drain_timeout)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await lag_task
+        if client:
+            await client.aclose()
+        self._executor.shutdown(wait=False)
+        return elapsed
+
+
+# ============================================================
+# 报告
+# ============================================================
+
+def _quantiles(histogram, **labels) -> Dict:
+    return {
+        "count": histogram.count(**labels),
+        "p50": histogram.quantile(0.50, **labels),
+        "p95": histogram.quantile(0.95, **labels),
+        "p99": histogram.quantile(0.99, **labels),
+    }
+
+
+def build_report(args, runner: LoadTestRunner, elapsed: float, feishu_stats: Dict,
+                 fake_llm: FakeLLM, memory: Dict) -> Dict:
+    stages = {labels["stage"]: _quantiles(STAGE_SECONDS, **labels) for labels in STAGE_SECONDS.label_values()}
+    e2e = {labels["kind"]: _quantiles(E2E_SECONDS, **labels) for labels in E2E_SECONDS.label_values()}
+    return {
+        "params": {k: str(v) for k, v in vars(args).items()},
+        "submitted": runner.submitted,
+        "completed": runner.completed,
+        "failed": runner.failed,
+        "rejected": runner.rejected,
+        "elapsed_seconds": elapsed,
+        "throughput_per_sec": runner.completed / elapsed if elapsed else 0.0,
+        "stages": stages,
+        "e2e": e2e,
+        "llm_ttft": _quantiles(LLM_TTFT_SECONDS),
+        "loop_lag": {**_quantiles(LOOP_LAG_SECONDS), "max": max(LOOP_LAG_SECONDS.quantile(1.0) or 0.0, 0.0)},
+        "feishu_calls": feishu_stats.get("calls", {}),
+        "feishu_errors": feishu_stats.get("errors", 0),
+        "llm_calls": fake_llm.calls,
+        "memory": memory,
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:8.1f}ms"
+
+
+def print_report(report: Dict):
+    print("\n" + "=" * 72)
+    print("压测结果")
+    print("=" * 72)
+    print(f"提交 {report['submitted']} 条，完成 {report['completed']} 条，失败 {report['failed']} 条，"
+          f"拒绝 {report['rejected']} 条，"
+          f"耗时 {report['elapsed_seconds']:.1f}s，吞吐 {report['throughput_per_sec']:.2f} 条/秒")
+
+    print(f"\n{'阶段':<22}{'次数':>8}{'p50':>12}{'p95':>12}{'p99':>12}")
+    rows = [(f"e2e:{k}", v) for k, v in sorted(report["e2e"].items())]
+    rows += sorted(report["stages"].items())
+    rows += [("llm_ttft", report["llm_ttft"]), ("loop_lag", report["loop_lag"])]
+    for name, q in rows:
+        print(f"{name:<22}{q['count']:>8}{_fmt(q['p50']):>12}{_fmt(q['p95']):>12}{_fmt(q['p99']):>12}")
+
+    print(f"\n事件循环最大延迟: {_fmt(report['loop_lag']['max']).strip()}")
+    print(f"模拟飞书调用: {report['feishu_calls']}（注入错误 {report['feishu_errors']} 次）")
+    print(f"模拟 LLM 调用: {report['llm_calls']} 次")
+
+    memory = report["memory"]
+    if memory.get("traced_growth_kb") is not None:
+        print(f"\n内存增长（tracemalloc）: {memory['traced_growth_kb']:.1f} KB，峰值 {memory['traced_peak_kb']:.1f} KB")
+        for line in memory.get("top_growth", []):
+            print(f"  {line}")
+    if memory.get("rss_growth_mb") is not None:
+        print(f"RSS 增长: {memory['rss_growth_mb']:.1f} MB")
+    if memory.get("max_rss_mb"):
+        print(f"进程峰值 RSS: {memory['max_rss_mb']:.1f} MB")
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """与基线对比：阶段/端到端 p95 变慢或吞吐下降超过容忍度视为回归"""
+    regressions = []
+    for section in ("stages", "e2e"):
+        for name, base_q in baseline.get(section, {}).items():
+            current = report[section].get(name)
+            if not current or base_q.get("p95") is None or current.get("p95") is None:
+                continue
+            limit = base_q["p95"] * (1 + tolerance)
+            if current["p95"] > limit and current["p95"] - base_q["p95"] > 0.005:
+                regressions.append(f"{section}.{name} p95 {current['p95']:.3f}s > 基线 {base_q['p95']:.3f}s")
+    base_tp = baseline.get("throughput_per_sec") or 0
+    if base_tp and report["throughput_per_sec"] < base_tp * (1 - tolerance):
+        regressions.append(f"吞吐 {report['throughput_per_sec']:.2f} < 基线 {base_tp:.2f}")
+    return regressions
+
+
+def _current_rss_mb() -> Optional[float]:
+    """当前进程 RSS（仅 Linux 可用）"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="飞书机器人离线端到端压测")
+    parser.add_argument("--mode", choices=["ws", "loop", "webhook"], default="ws",
+                        help="ws: 与长连接入口一致（线程 + asyncio.run）; loop: 单事件循环; webhook: 经 main.py FastAPI")
+    parser.add_argument("--rate", type=float, default=10.0, help="消息速率（条/秒）")
+    parser.add_argument("--duration", type=float, default=20.0, help="发送时长（秒）")
+    parser.add_argument("--groups", type=int, default=8, help="群数量")
+    parser.add_argument("--keyword-ratio", type=float, default=0.3, help="关键词消息占比")
+    parser.add_argument("--workers", type=int, default=64, help="ws 模式线程数")
+    parser.add_argument("--llm-ttft", default="lognormal:0.8,0.4", help="LLM 首字延迟分布")
+    parser.add_argument("--llm-tps", type=float, default=40.0, help="LLM 输出速率（token/秒）")
+    parser.add_argument("--llm-tokens", type=int, default=80, help="回答 token 数")
+    parser.add_argument("--feishu-latency", default="lognormal:0.05,0.5", help="模拟飞书接口延迟分布")
+    parser.add_argument("--feishu-error-rate", type=float, default=0.0, help="模拟飞书接口错误率")
+    parser.add_argument("--kb", choices=["tiny", "real"], default="tiny", help="知识库：tiny 为内置小库，real 为 Chroma（或 rag.service.url 指向的检索服务）")
+    parser.add_argument("--kb-docs", type=int, default=200, help="tiny 知识库文档数")
+    parser.add_argument("--kb-latency", default="const:0.0", help="tiny 知识库额外检索延迟分布")
+    parser.add_argument("--kb-miss-rate", type=float, default=0.1, help="tiny 知识库未命中比例（走分类流程）")
+    parser.add_argument("--no-stream", action="store_true", help="关闭流式回答")
+    parser.add_argument("--fairness", action="store_true", help="开启 LLM 公平调度（按群轮转、按群 / 用户限速）")
+    parser.add_argument("--patch-interval", type=float, default=0.5, help="流式卡片更新间隔（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="发送结束后等待处理完成的时间（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="开启 tracemalloc 统计内存增长来源（开销较大，会放大延迟）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-report", help="将结果保存为 JSON（可作为基线）")
+    parser.add_argument("--baseline", help="基线 JSON，出现回归时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相对基线的容忍度")
+    parser.add_argument("--verbose", action="store_true", help="输出机器人日志")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    feishu = FakeFeishuServer(args.feishu_latency, args.feishu_error_rate)
+    feishu.start()
+
+    # 在构建机器人前指向模拟服务
+    os.environ["FEISHU_OPEN_API_BASE"] = feishu.base_url
+    os.environ.setdefault("FEISHU_APP_ID", BOT_APP_ID)
+    os.environ.setdefault("FEISHU_APP_SECRET", "loadtest-secret")
+    os.environ.setdefault("FEISHU_KEYWORD_BASE_TOKEN", "bas_loadtest")
+    os.environ.setdefault("FEISHU_KEYWORD_TABLE_ID", "tbl_loadtest")
+    # 压测使用模拟关键词表，不写本地快照
+    os.environ.setdefault("FEISHU_KEYWORD_SNAPSHOT", "")
+
+    fake_llm = FakeLLM(LatencyDist(args.llm_ttft), args.llm_tps, args.llm_tokens)
+    if args.kb == "real":
+        from utils.config_loader import load_config
+        from rag.retrieval_client import create_knowledge_base
+        # 设置 RETRIEVAL_SERVICE_URL 时经本机检索服务检索
+        kb = create_knowledge_base(load_config(str(ROOT_DIR / "config" / "config.yaml")))
+        asyncio.run(kb.initialize())
+        titles = TinyKnowledgeBase(ROOT_DIR / "data" / "documents" / "apifox", args.kb_docs, LatencyDist("const:0")).titles()
+    else:
+        kb = TinyKnowledgeBase(ROOT_DIR / "data" / "documents" / "apifox", args.kb_docs,
+                               LatencyDist(args.kb_latency), args.kb_miss_rate)
+        titles = kb.titles()
+
+    bot, app = build_components(args, fake_llm, kb)
+    bot.app_id = BOT_APP_ID
+    traffic = TrafficGenerator(titles, args.groups, args.keyword_ratio, args.seed)
+
+    # 预热：排除 token 获取、首次导入等一次性开销
+    warmup = traffic.next_event()
+    asyncio.run(bot.handle_message(warmup["event"]))
+    STAGE_SECONDS.reset()
+    LLM_TTFT_SECONDS.reset()
+
+    memory: Dict = {}
+    rss_before = _current_rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start(10)
+    before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+
+    runner = LoadTestRunner(args, bot, app, traffic)
+    print(f"开始压测: mode={args.mode}, rate={args.rate}/s, duration={args.duration}s, groups={args.groups}, "
+          f"llm_ttft={args.llm_ttft}, feishu_latency={args.feishu_latency}")
+    elapsed = asyncio.run(runner.run())
+
+    if before is not None:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        stats = after.compare_to(before, "lineno")
+        memory["traced_growth_kb"] = sum(s.size_diff for s in stats) / 1024
+        memory["traced_peak_kb"] = peak / 1024
+        memory["top_growth"] = [str(s) for s in stats[:5]]
+        tracemalloc.stop()
+    rss_after = _current_rss_mb()
+    if rss_before is not None and rss_after is not None:
+        memory["rss_growth_mb"] = rss_after - rss_before
+    memory["max_rss_mb"] = _max_rss_mb()
+
+    report = build_report(args, runner, elapsed, feishu.stats(), fake_llm, memory)
+    feishu.stop()
+    print_report(report)
+
+    if args.save_report:
+        Path(args.save_report).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n结果已保存: {args.save_report}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ 发现性能回归:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\n✅ 未发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
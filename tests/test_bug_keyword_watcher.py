@@ -2,7 +2,9 @@
 测试 BUG 关键词扫描器
 """
 
+import asyncio
 import sys
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -11,7 +13,9 @@ load_dotenv(Path(__file__).parent.parent / '.env')
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.watchers.bug_keyword_watcher import BugKeywordWatcher
+from src.utils.config_loader import load_config
+from src.utils.job_scheduler import AsyncScheduler
+from src.watchers.bug_keyword_watcher import JOB_NAME, BugKeywordWatcher
 from loguru import logger
 
 
@@ -50,11 +54,59 @@ def test_scan_once():
         print(f"扫描失败（可能缺少权限）: {e}")
 
 
+class FakeLarkCli:
+    """模拟 LarkCliWrapper.search_messages，failing 中的关键词搜索失败"""
+
+    def __init__(self):
+        self.failing = set()
+        self.queries = []
+
+    def search_messages(self, query, start_time=None, end_time=None, limit=20):
+        self.queries.append((query, start_time))
+        if query in self.failing:
+            return {"success": False, "error": "lark-cli 超时"}
+        return {"success": True, "messages": []}
+
+
+def test_failed_search_not_recorded_as_success():
+    """测试有关键词搜索失败时本次扫描不算成功，下次从上次成功扫描的时间补扫"""
+    watcher = BugKeywordWatcher.__new__(BugKeywordWatcher)
+    watcher.config = load_config()
+    watcher.lark_cli = FakeLarkCli()
+    watcher.processed_messages = set()
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            scheduler = AsyncScheduler(str(Path(tmp) / "state.json"))
+            watcher.register(scheduler, interval_minutes=5)
+
+            await scheduler.run_now(JOB_NAME)
+            first_success = scheduler.last_success(JOB_NAME)
+            assert first_success is not None
+
+            watcher.lark_cli.failing = {"崩溃"}
+            await scheduler.run_now(JOB_NAME)
+            assert scheduler.status()[JOB_NAME]["last_status"] == "error"
+            assert scheduler.last_success(JOB_NAME) == first_success
+            # 其余关键词照常搜索
+            assert len(watcher.lark_cli.queries) == 16
+
+            # 恢复后从上次成功扫描的时间开始补扫
+            watcher.lark_cli.failing = set()
+            await scheduler.run_now(JOB_NAME)
+            assert scheduler.last_success(JOB_NAME) > first_success
+            since = watcher.lark_cli.queries[-1][1]
+            assert since <= first_success.strftime("%Y-%m-%dT%H:%M:%S+08:00")
+
+    asyncio.run(run())
+
+
 if __name__ == "__main__":
     logger.info("开始测试 BUG 关键词扫描器")
 
     # 测试关键词分析
     test_keywords()
+    test_failed_search_not_recorded_as_success()
 
     # 测试扫描（需要授权）
     test_scan_once()
@@ -0,0 +1,104 @@
+"""
+测试配置注册表（缓存、热加载、订阅通知）
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pydantic import ValidationError
+
+from src.utils.config_loader import ConfigRegistry, get_registry, load_config
+from loguru import logger
+
+BASE_YAML = """
+llm:
+  model: "model-a"
+rag:
+  retrieval:
+    top_k: 5
+bots:
+  feishu:
+    triggers:
+      keywords: ["帮助"]
+"""
+
+
+def _write(path: Path, text: str):
+    path.write_text(text, encoding="utf-8")
+    # 保证修改时间变化（部分文件系统时间精度较低）
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_cached_and_frozen():
+    """测试同一文件只解析一次，快照只读"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "config.yaml"
+        _write(path, BASE_YAML)
+        config = load_config(str(path))
+        assert load_config(str(path)) is config
+        assert get_registry(str(path)) is get_registry(str(Path(tmp) / "." / "config.yaml"))
+        try:
+            config.llm.model = "model-b"
+            assert False, "配置快照应为只读"
+        except ValidationError:
+            pass
+
+
+def test_reload_notifies_subscribers():
+    """测试文件变化后重新加载并按配置项通知订阅者"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "config.yaml"
+        _write(path, BASE_YAML)
+        registry = ConfigRegistry(str(path))
+        old = registry.get()
+
+        llm_updates, rag_updates = [], []
+        registry.subscribe(llm_updates.append, sections=("llm",))
+        unsubscribe = registry.subscribe(rag_updates.append, sections=("rag",))
+
+        # 文件未变化时不重新解析
+        assert registry.reload() == []
+
+        _write(path, BASE_YAML.replace("model-a", "model-b"))
+        changed = registry.reload()
+        print(f"\n变化项: {changed}")
+        assert changed == ["llm"]
+        assert len(llm_updates) == 1 and llm_updates[0].llm.model == "model-b"
+        assert rag_updates == []
+        # 旧快照不受影响
+        assert old.llm.model == "model-a"
+        assert registry.get().llm.model == "model-b"
+
+        unsubscribe()
+        _write(path, BASE_YAML.replace("model-a", "model-b").replace("top_k: 5", "top_k: 8"))
+        assert registry.reload() == ["rag"]
+        assert rag_updates == []
+        assert registry.get().rag.top_k == 8
+
+
+def test_reload_keeps_snapshot_on_error():
+    """测试配置文件写坏时保留旧快照"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "config.yaml"
+        _write(path, BASE_YAML)
+        registry = ConfigRegistry(str(path))
+        config = registry.get()
+
+        _write(path, "llm: [unclosed")
+        assert registry.reload() == []
+        assert registry.get() is config
+
+
+if __name__ == "__main__":
+    logger.info("开始测试配置注册表")
+
+    test_cached_and_frozen()
+    test_reload_notifies_subscribers()
+    test_reload_keeps_snapshot_on_error()
+
+    logger.info("测试完成")
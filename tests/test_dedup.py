@@ -0,0 +1,72 @@
+"""
+测试知识库片段近似去重
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from langchain_core.documents import Document
+from src.rag.dedup import deduplicate_chunks, deduplicate_by_embedding, normalize_for_dedup
+from loguru import logger
+
+BODY = "在 Apifox 中导入 Postman 数据时，先在 Postman 中导出 Collection v2.1 文件，再在项目设置中选择导入数据。" * 3
+
+
+def _chunk(source: str, content: str, url: str = "") -> Document:
+    return Document(page_content=content, metadata={"source": source, "url": url or source})
+
+
+def test_mirror_copies_merged():
+    """测试镜像目录副本合并到主目录片段"""
+    chunks = [
+        _chunk("data/documents/download-apifoxapidog-docs/help-docs/apifox/import.md", BODY + " ", "mirror"),
+        _chunk("data/documents/apifox/import.md", BODY, "https://docs.apifox.com/import"),
+        _chunk("data/documents/apifox/other.md", "Mock 服务支持根据字段名智能生成数据，也可以自定义 Mock 规则。" * 3),
+    ]
+    result, report = deduplicate_chunks(chunks)
+
+    print("\n=== 测试镜像副本合并 ===")
+    print(report.summary())
+    assert report.before == 3 and report.after == 2
+    canonical = result[0]
+    assert canonical.metadata["url"] == "https://docs.apifox.com/import"
+    assert canonical.metadata["aliases"] == "mirror"
+    assert canonical.metadata["alias_count"] == 1
+    assert "aliases" not in result[1].metadata
+
+
+def test_brand_and_markup_normalized():
+    """测试品牌名与 Markdown 标记不影响重复判断"""
+    apidog = BODY.replace("Apifox", "Apidog")
+    assert normalize_for_dedup("## **" + BODY + "**") == normalize_for_dedup(apidog)
+
+    different = "Apifox 的自动化测试支持循环、条件分支与数据驱动，可在 CI 中通过 CLI 运行。" * 3
+    result, report = deduplicate_chunks([_chunk("a.md", BODY), _chunk("b.md", different)])
+    assert report.removed == 0
+
+
+def test_embedding_dedup():
+    """测试按嵌入相似度去重并返回对应向量"""
+    chunks = [_chunk("a.md", "A"), _chunk("b.md", "B"), _chunk("c.md", "C longer")]
+    vectors = np.array([[1.0, 0.0], [0.0, 1.0], [0.999, 0.0447]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    result, kept, report = deduplicate_by_embedding(chunks, vectors, threshold=0.99, block_size=2)
+
+    print("\n=== 测试嵌入去重 ===")
+    print(report.summary())
+    assert [d.metadata["source"] for d in result] == ["b.md", "c.md"]
+    assert np.allclose(kept[0], vectors[1]) and np.allclose(kept[1], vectors[2])
+    assert result[1].metadata["aliases"] == "a.md"
+
+
+if __name__ == "__main__":
+    logger.info("开始测试片段去重")
+
+    test_mirror_copies_merged()
+    test_brand_and_markup_normalized()
+    test_embedding_dedup()
+
+    logger.info("测试完成")
@@ -0,0 +1,113 @@
+"""
+测试持久化消息队列（去重入队、批量消费、退避重试、死信、崩溃恢复）
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.durable_queue import DurableQueue, QueueWorker
+from loguru import logger
+
+
+def test_enqueue_dedup_and_recover():
+    """测试按去重键入队，未确认的消息在重启后重新投递"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "queue.db")
+        queue = DurableQueue(path, name="test")
+        assert queue.enqueue({"MsgId": "m1", "Content": "报错了"}, dedup_key="m1") is True
+        assert queue.enqueue({"MsgId": "m1", "Content": "报错了"}, dedup_key="m1") is False
+        assert queue.enqueue({"MsgId": "m2"}, dedup_key="m2") is True
+
+        items = queue.claim(10)
+        assert [item.payload["MsgId"] for item in items] == ["m1", "m2"]
+        assert queue.claim(10) == []
+        queue.ack([items[0].id])
+        queue.close()
+
+        # 模拟进程崩溃：m2 已取出未确认
+        reopened = DurableQueue(path, name="test")
+        assert reopened.recover() == 1
+        assert [item.payload["MsgId"] for item in reopened.claim(10)] == ["m2"]
+        stats = reopened.stats()
+        assert stats["inflight"] == 1 and stats["pending"] == 0
+        reopened.close()
+
+
+def test_retry_then_dead_letter():
+    """测试失败退避重试，超过最大次数转入死信"""
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = DurableQueue(str(Path(tmp) / "queue.db"), name="test", max_attempts=2, retry_base=0.05)
+        queue.enqueue({"n": 1})
+
+        item = queue.claim(1)[0]
+        queue.fail(item, "lark-cli 超时")
+        # 退避期间不会被取出
+        assert queue.claim(1) == []
+        time.sleep(0.1)
+        item = queue.claim(1)[0]
+        assert item.attempts == 1
+
+        queue.fail(item, "lark-cli 超时")
+        assert queue.stats()["dead"] == 1
+        dead = queue.dead_letters()
+        assert dead[0]["last_error"] == "lark-cli 超时" and dead[0]["attempts"] == 2
+
+        assert queue.requeue_dead() == 1
+        assert queue.claim(1)[0].payload == {"n": 1}
+        queue.close()
+
+
+def test_worker_batches():
+    """测试消费者批量处理：成功的确认，失败的重试"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = DurableQueue(str(Path(tmp) / "queue.db"), name="test", retry_base=0.05)
+            batches = []
+            failed_once = set()
+
+            async def handler(messages):
+                batches.append([m["n"] for m in messages])
+                errors = []
+                for m in messages:
+                    # 第 3 条消息第一次处理失败
+                    if m["n"] == 3 and 3 not in failed_once:
+                        failed_once.add(3)
+                        errors.append("创建工单失败")
+                    else:
+                        errors.append(None)
+                return errors
+
+            worker = QueueWorker(queue, handler, concurrency=1, batch_size=4, poll_interval=0.05)
+            worker.start()
+            started = time.perf_counter()
+            for n in range(10):
+                queue.enqueue({"n": n})
+            worker.notify()
+
+            while queue.stats()["pending"] + queue.stats()["inflight"] > 0 and time.perf_counter() - started < 5:
+                await asyncio.sleep(0.02)
+            await worker.stop()
+
+            print(f"\n批次: {batches}")
+            assert batches[0] == [0, 1, 2, 3]
+            assert max(len(b) for b in batches) <= 4
+            assert sorted(n for b in batches for n in b) == sorted(list(range(10)) + [3])
+            assert queue.stats()["pending"] == 0
+            queue.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    logger.info("开始测试持久化消息队列")
+
+    test_enqueue_dedup_and_recover()
+    test_retry_then_dead_letter()
+    test_worker_batches()
+
+    logger.info("测试完成")
@@ -0,0 +1,170 @@
+"""
+测试 LLM 公平调度（按群轮转、按用户限速、后台通道让行、等待超时、跨线程使用）
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.fair_scheduler import (
+    FairScheduler, FairSchedulerTimeout, PRIORITY_BACKGROUND,
+)
+from loguru import logger
+
+
+def _unlimited(**kwargs) -> FairScheduler:
+    """不限速的调度器（只测并发与轮转）"""
+    params = dict(chat_rate_per_minute=0, user_rate_per_minute=0, max_wait=5)
+    params.update(kwargs)
+    return FairScheduler(**params)
+
+
+def test_round_robin_across_chats():
+    """测试一个群连续提问不会占满名额：名额在群之间轮转"""
+    async def run():
+        scheduler = _unlimited(concurrency=1)
+        order = []
+
+        async def ask(chat_id, n):
+            async with scheduler.slot(chat_id, f"{chat_id}-u{n}"):
+                order.append(chat_id)
+                await asyncio.sleep(0.01)
+
+        # 群 A 先提交 4 条，群 B、C 各 1 条
+        tasks = [asyncio.create_task(ask("A", n)) for n in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(ask("B", 0)), asyncio.create_task(ask("C", 0))]
+        await asyncio.gather(*tasks)
+
+        print(f"\n执行顺序: {order}")
+        assert order[:4] == ["A", "B", "C", "A"]
+        assert order.count("A") == 4
+
+    asyncio.run(run())
+
+
+def test_user_rate_limit():
+    """测试同一用户超出突发容量后等待令牌，其他用户不受影响"""
+    async def run():
+        # 每秒 1 个令牌（60/分钟），突发 2
+        scheduler = FairScheduler(concurrency=8, chat_rate_per_minute=0,
+                                  user_rate_per_minute=60, user_burst=2, max_wait=5)
+        granted = {}
+        started = time.monotonic()
+
+        async def ask(user_id, n):
+            async with scheduler.slot("A", user_id):
+                granted[(user_id, n)] = time.monotonic() - started
+
+        await asyncio.gather(*(ask("spammer", n) for n in range(3)), ask("other", 0))
+
+        print(f"\n获得名额时间: {granted}")
+        assert granted[("spammer", 0)] < 0.1 and granted[("spammer", 1)] < 0.1
+        assert granted[("other", 0)] < 0.1
+        # 第 3 条等待令牌恢复（约 1 秒）
+        assert 0.6 < granted[("spammer", 2)] < 2
+
+    asyncio.run(run())
+
+
+def test_background_lane_yields():
+    """测试后台任务有独立并发上限，且排队时让位于提问"""
+    async def run():
+        scheduler = _unlimited(concurrency=2, background_concurrency=1)
+        release = asyncio.Event()
+        order = []
+
+        async def job(n):
+            async with scheduler.slot("keyword_generator", priority=PRIORITY_BACKGROUND):
+                order.append(f"bg{n}")
+                await release.wait()
+
+        async def ask(chat_id):
+            async with scheduler.slot(chat_id, "u"):
+                order.append(chat_id)
+                await release.wait()
+
+        tasks = [asyncio.create_task(job(n)) for n in range(3)]
+        await asyncio.sleep(0.01)
+        # 后台通道上限为 1，另一个名额留给提问
+        assert scheduler.stats()["background"]["active"] == 1
+        tasks += [asyncio.create_task(ask("A")), asyncio.create_task(ask("B"))]
+        await asyncio.sleep(0.01)
+        assert order == ["bg0", "A"]
+
+        release.set()
+        await asyncio.gather(*tasks)
+        # 名额空出后，排队中的提问先于后台任务
+        assert order.index("B") < order.index("bg1")
+
+    asyncio.run(run())
+
+
+def test_wait_timeout():
+    """测试等待超过 max_wait 抛出 FairSchedulerTimeout，且不占用名额"""
+    async def run():
+        scheduler = _unlimited(concurrency=1, max_wait=0.1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("A", "u1"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        try:
+            async with scheduler.slot("B", "u2"):
+                raise AssertionError("不应获得名额")
+        except FairSchedulerTimeout:
+            pass
+        assert scheduler.stats()["interactive"]["waiting"] == {}
+
+        release.set()
+        await holder
+        async with scheduler.slot("B", "u2"):
+            assert scheduler.stats()["interactive"]["active"] == 1
+
+    asyncio.run(run())
+
+
+def test_cross_thread():
+    """测试长连接入口的用法：每条消息在独立线程的事件循环中申请名额，并发不超过上限"""
+    scheduler = _unlimited(concurrency=2)
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "done": 0}
+
+    async def ask(n):
+        async with scheduler.slot(f"chat{n % 3}", f"u{n}"):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+                state["done"] += 1
+
+    threads = [threading.Thread(target=lambda n=n: asyncio.run(ask(n))) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    print(f"\n{state}")
+    assert state["done"] == 8
+    assert state["peak"] <= 2
+
+
+if __name__ == "__main__":
+    logger.info("开始测试 LLM 公平调度")
+
+    test_round_robin_across_chats()
+    test_user_rate_limit()
+    test_background_lane_yields()
+    test_wait_timeout()
+    test_cross_thread()
+
+    logger.info("测试完成")
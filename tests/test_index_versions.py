@@ -0,0 +1,100 @@
+"""
+测试向量索引版本管理（蓝绿构建）
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag import index_versions
+from src.rag.index_versions import IndexVersions
+from loguru import logger
+
+
+def test_activate_and_rollback():
+    """测试原子切换与回滚"""
+    with tempfile.TemporaryDirectory() as tmp:
+        versions = IndexVersions(tmp)
+        assert versions.current_path() is None
+
+        first = versions.new_version()
+        versions.activate(first.name)
+        second = versions.new_version()
+        versions.activate(second.name)
+
+        print("\n=== 测试版本切换 ===")
+        for v in versions.list_versions():
+            print(v["name"], v.get("status"))
+        assert versions.current_path() == second
+        assert versions.read_manifest(first.name)["status"] == "retired"
+
+        # 回滚
+        versions.activate(first.name)
+        assert versions.current_name() == first.name
+        assert versions.read_manifest(second.name)["status"] == "retired"
+
+
+def test_legacy_layout():
+    """测试兼容旧版单目录布局"""
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "chroma.sqlite3").write_bytes(b"")
+        assert IndexVersions(tmp).current_path() == Path(tmp)
+
+
+def test_gc_grace_period():
+    """测试旧版本在宽限期后清理，并保留回滚版本"""
+    with tempfile.TemporaryDirectory() as tmp:
+        versions = IndexVersions(tmp)
+        names = []
+        for _ in range(4):
+            path = versions.new_version()
+            versions.activate(path.name)
+            names.append(path.name)
+        failed = versions.new_version()
+        versions.write_manifest(failed.name, status="failed")
+
+        # 宽限期内不删除
+        assert versions.gc(keep=1, grace_seconds=3600) == []
+
+        removed = versions.gc(keep=1, grace_seconds=0)
+        print("\n=== 测试旧版本清理 ===")
+        print(f"删除: {removed}")
+        assert sorted(removed) == sorted(names[:2] + [failed.name])
+        remaining = [v["name"] for v in versions.list_versions()]
+        assert remaining == names[2:]
+        assert versions.current_name() == names[3]
+
+
+def test_gc_failure_retried():
+    """测试删除失败的版本不计入返回值，下次清理时重试"""
+    with tempfile.TemporaryDirectory() as tmp:
+        versions = IndexVersions(tmp)
+        failed = versions.new_version()
+        versions.write_manifest(failed.name, status="failed")
+
+        rmtree = index_versions.shutil.rmtree
+
+        def broken(path):
+            raise PermissionError(f"文件被占用: {path}")
+
+        index_versions.shutil.rmtree = broken
+        try:
+            assert versions.gc(grace_seconds=0) == []
+        finally:
+            index_versions.shutil.rmtree = rmtree
+        assert failed.exists()
+        assert versions.gc(grace_seconds=0) == [failed.name]
+        assert not failed.exists()
+
+
+if __name__ == "__main__":
+    logger.info("开始测试索引版本管理")
+
+    test_activate_and_rollback()
+    test_legacy_layout()
+    test_gc_grace_period()
+    test_gc_failure_retried()
+
+    logger.info("测试完成")
@@ -0,0 +1,112 @@
+"""
+测试异步任务调度器（cron 触发、防重叠、超时、停机补跑）
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.job_scheduler import AsyncScheduler, CronTrigger, IntervalTrigger
+from loguru import logger
+
+
+def test_cron_next_fire():
+    """测试 cron 下次触发时间"""
+    base = datetime(2026, 3, 14, 1, 59, 30)  # 周六
+    assert CronTrigger("0 2 * * *").next_fire(base) == datetime(2026, 3, 14, 2, 0)
+    assert CronTrigger("0 2 * * *").next_fire(datetime(2026, 3, 14, 2, 0)) == datetime(2026, 3, 15, 2, 0)
+    assert CronTrigger("*/15 * * * *").next_fire(base) == datetime(2026, 3, 14, 2, 0)
+    # 周一到周五 9:30
+    assert CronTrigger("30 9 * * 1-5").next_fire(base) == datetime(2026, 3, 16, 9, 30)
+    # 周日写作 7
+    assert CronTrigger("0 0 * * 7").next_fire(base) == datetime(2026, 3, 15, 0, 0)
+    # 日与周同时受限时满足任一即可
+    assert CronTrigger("0 8 1 * 1").next_fire(base) == datetime(2026, 3, 16, 8, 0)
+    assert CronTrigger("0 0 29 2 *").next_fire(base) == datetime(2028, 2, 29, 0, 0)
+    for bad in ("0 2 * *", "60 * * * *", "*/0 * * * *"):
+        try:
+            CronTrigger(bad)
+            assert False, f"应拒绝非法表达式: {bad}"
+        except ValueError:
+            pass
+
+
+def test_no_overlap_and_timeout():
+    """测试上一次未结束时跳过触发、超时记录状态"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            scheduler = AsyncScheduler(str(Path(tmp) / "state.json"))
+            calls = []
+
+            def slow():
+                # 同步任务在线程池中运行，不阻塞事件循环
+                calls.append(time.perf_counter())
+                time.sleep(0.25)
+
+            async def hang():
+                await asyncio.sleep(10)
+
+            scheduler.add_job("slow", slow, IntervalTrigger(0.05), run_on_start=True)
+            scheduler.add_job("hang", hang, IntervalTrigger(60), timeout=0.1, run_on_start=True)
+            scheduler.start()
+            await asyncio.sleep(0.4)
+            await scheduler.stop(grace=1)
+
+            status = scheduler.status()
+            print(f"\n{json.dumps(status, ensure_ascii=False, indent=2)}")
+            # 0.4 秒内每 0.05 秒触发一次，但同一时刻只运行一个实例
+            assert 1 <= len(calls) <= 2
+            assert status["slow"]["last_status"] == "ok"
+            assert status["hang"]["last_status"] == "timeout"
+            assert scheduler.last_success("hang") is None
+
+            saved = json.loads((Path(tmp) / "state.json").read_text(encoding="utf-8"))
+            assert saved["slow"]["last_success"] == status["slow"]["last_success"]
+
+    asyncio.run(run())
+
+
+def test_catch_up_missed_run():
+    """测试重启后补跑停机期间错过的运行（只补一次），未错过时不运行"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = Path(tmp) / "state.json"
+            long_ago = (datetime.now() - timedelta(days=3)).isoformat()
+            recent = datetime.now().isoformat()
+            state_path.write_text(json.dumps({
+                "daily": {"last_run": long_ago, "last_success": long_ago},
+                "fresh": {"last_run": recent, "last_success": recent},
+            }), encoding="utf-8")
+
+            scheduler = AsyncScheduler(str(state_path))
+            runs = []
+
+            async def job(name):
+                runs.append(name)
+
+            scheduler.add_job("daily", lambda: job("daily"), CronTrigger("0 2 * * *"))
+            scheduler.add_job("fresh", lambda: job("fresh"), IntervalTrigger(3600))
+            scheduler.start()
+            await asyncio.sleep(0.1)
+            await scheduler.stop()
+
+            assert runs == ["daily"]
+            assert scheduler.last_success("daily") > datetime.now() - timedelta(minutes=1)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    logger.info("开始测试任务调度器")
+
+    test_cron_next_fire()
+    test_no_overlap_and_timeout()
+    test_catch_up_missed_run()
+
+    logger.info("测试完成")
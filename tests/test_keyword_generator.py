@@ -0,0 +1,198 @@
+"""
+测试关键词自动生成的工单拉取（按创建时间服务端过滤、字段投影、多表拉取、增量缓存），
+以及与机器人共用 LLM 调度器时提问优先
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.config_loader import load_config
+from src.utils.fair_scheduler import FairScheduler
+from src.utils.job_scheduler import AsyncScheduler
+from src.utils.keyword_generator import DAY_MS, JOB_NAME, KeywordGenerator
+from loguru import logger
+
+
+class FakeBitable:
+    """模拟多维表格 fields 与 records/search 接口"""
+
+    def __init__(self, tables):
+        self.tables = tables  # table_id -> (字段 [(名称, 类型)], 记录 [(record_id, fields, created_time)])
+        self.searches = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/tenant_access_token/internal"):
+            return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-test", "expire": 7200})
+        table_id = path.split("/tables/")[1].split("/")[0]
+        fields, records = self.tables[table_id]
+        if path.endswith("/fields"):
+            return httpx.Response(200, json={"code": 0, "data": {
+                "items": [{"field_name": name, "type": kind} for name, kind in fields], "has_more": False
+            }})
+
+        body = json.loads(request.content)
+        self.searches.append((table_id, body))
+        since = 0
+        if body.get("filter"):
+            since = int(body["filter"]["conditions"][0]["value"][1])
+        names = body.get("field_names")
+        items = [
+            {"record_id": rid, "created_time": created,
+             "fields": {k: v for k, v in record.items() if names is None or k in names}}
+            for rid, record, created in records if created > since
+        ]
+        page_size = int(request.url.params["page_size"])
+        start = int(request.url.params.get("page_token") or 0)
+        has_more = start + page_size < len(items)
+        return httpx.Response(200, json={"code": 0, "data": {
+            "items": items[start:start + page_size],
+            "has_more": has_more,
+            "page_token": str(start + page_size) if has_more else "",
+        }})
+
+
+def _generator(fake: FakeBitable, cache_path: str) -> KeywordGenerator:
+    generator = KeywordGenerator(load_config(), embed=lambda texts: [[1.0] for _ in texts])
+    generator.open_api_base = "https://feishu.test"
+    generator.transport = httpx.MockTransport(fake.handler)
+    generator.ticket_app_token = "bas"
+    generator.ticket_table_ids = ["tbl_bug", "tbl_feature"]
+    generator.history_days = 7
+    generator.cache_path = Path(cache_path)
+    return generator
+
+
+def test_filtered_and_incremental_fetch():
+    """测试有创建时间字段的表在服务端过滤、只请求用到的字段，之后的拉取只取缓存游标之后的工单"""
+    now = int(time.time() * 1000)
+    bug_records = [
+        (f"bug{n}", {"标题": [{"type": "text", "text": f"导入报错{n}"}], "问题描述": "提示格式不正确",
+                     "处理人": "张三"}, now - days * DAY_MS)
+        for n, days in enumerate((1, 3, 10, 30))
+    ]
+    feature_records = [
+        (f"feat{n}", {"标题": f"导出 PDF {n}", "问题现状": "不支持"}, now - days * DAY_MS)
+        for n, days in enumerate((2, 20, 40))
+    ]
+    fake = FakeBitable({
+        "tbl_bug": ([("标题", 1), ("问题描述", 1), ("处理人", 11), ("创建时间", 1001)], bug_records),
+        "tbl_feature": ([("标题", 1), ("问题现状", 1)], feature_records),
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = _generator(fake, f"{tmp}/cache.json")
+
+        tickets = asyncio.run(generator.fetch_recent_tickets())
+        print(f"\n首次拉取: {generator.last_fetch_stats}")
+        assert [t["id"] for t in tickets] == ["bug1", "feat0", "bug0"]
+        assert tickets[-1]["title"] == "导入报错0" and tickets[-1]["description"] == "提示格式不正确"
+        assert tickets[1]["description"] == "不支持" and tickets[1]["table_id"] == "tbl_feature"
+        bug_search = next(body for table, body in fake.searches if table == "tbl_bug")
+        assert bug_search["field_names"] == ["标题", "问题描述"]
+        assert bug_search["filter"]["conditions"][0]["field_name"] == "创建时间"
+        stats = generator.last_fetch_stats["tables"]
+        assert stats["tbl_bug"]["transferred"] == 2 and stats["tbl_feature"]["transferred"] == 3
+        assert generator.last_fetch_stats["kept"] == 3
+
+        # 新工单：增量拉取缓存游标之后的工单（按天比较多取一天）
+        bug_records.append(("bug9", {"标题": "登录超时", "问题描述": "一直转圈"}, now - DAY_MS // 10))
+        generator = _generator(fake, f"{tmp}/cache.json")
+        tickets = asyncio.run(generator.fetch_recent_tickets())
+        print(f"增量拉取: {generator.last_fetch_stats}")
+        assert [t["id"] for t in tickets] == ["bug1", "feat0", "bug0", "bug9"]
+        stats = generator.last_fetch_stats["tables"]
+        assert stats["tbl_bug"] == {"transferred": 2, "kept": 2, "cached": 2, "mode": "增量"}
+
+        # 较短的时间窗口、不使用缓存
+        tickets = asyncio.run(generator.fetch_recent_tickets(days=2, incremental=False))
+        assert [t["id"] for t in tickets] == ["bug0", "bug9"]
+        assert generator.last_fetch_stats["tables"]["tbl_bug"]["mode"] == "按创建时间过滤"
+
+
+def test_failed_table_uses_cache():
+    """测试某个表拉取失败时不影响其他表，并沿用该表缓存中的工单"""
+    now = int(time.time() * 1000)
+    fake = FakeBitable({
+        "tbl_bug": ([("标题", 1), ("创建时间", 1001)], [("bug0", {"标题": "白屏"}, now - DAY_MS)]),
+        "tbl_feature": ([("标题", 1)], [("feat0", {"标题": "深色模式"}, now - DAY_MS)]),
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = _generator(fake, f"{tmp}/cache.json")
+        assert len(asyncio.run(generator.fetch_recent_tickets())) == 2
+
+        handler = fake.handler
+
+        def broken(request):
+            if "tbl_bug" in request.url.path and request.url.path.endswith("/search"):
+                return httpx.Response(200, json={"code": 1254000, "msg": "WrongRequestBody"})
+            return handler(request)
+
+        generator = _generator(fake, f"{tmp}/cache.json")
+        generator.transport = httpx.MockTransport(broken)
+        tickets = asyncio.run(generator.fetch_recent_tickets())
+        assert sorted(t["id"] for t in tickets) == ["bug0", "feat0"]
+        assert "tbl_bug" not in generator.last_fetch_stats["tables"]
+
+
+class FakeMessages:
+    """模拟 Anthropic messages.create，记录调用顺序"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def create(self, **kwargs):
+        time.sleep(0.05)
+        self.calls.append("background")
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text="{}")])
+
+
+def test_background_yields_to_interactive():
+    """测试关键词生成与提问共用调度器：名额被占满时，后到的提问先于排队中的关键词生成"""
+    calls = []
+    shared = FairScheduler(concurrency=1, background_concurrency=1, chat_rate_per_minute=600, chat_burst=10,
+                           user_rate_per_minute=600, user_burst=10, max_wait=5)
+    generator = KeywordGenerator(load_config(), fair_scheduler=shared)
+    generator.llm_client = SimpleNamespace(messages=FakeMessages(calls))
+
+    async def ask(chat_id, hold):
+        async with shared.slot(chat_id, "user"):
+            await asyncio.sleep(hold)
+            calls.append(chat_id)
+
+    async def run():
+        first = asyncio.ensure_future(ask("oc_1", 0.1))
+        await asyncio.sleep(0.01)
+        background = asyncio.ensure_future(generator._ask_llm("prompt", max_tokens=10))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(ask("oc_2", 0))
+        await asyncio.sleep(0.01)
+        assert shared.stats()["background"]["waiting"] == {"keyword_generator": 1}
+        await asyncio.gather(first, background, second)
+
+    asyncio.run(run())
+    assert calls == ["oc_1", "oc_2", "background"]
+
+    # 作为定时任务注册（jobs.keyword_generator_cron）
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = AsyncScheduler(f"{tmp}/state.json")
+        generator.register(scheduler)
+        assert scheduler.jobs[JOB_NAME].func == generator.execute
+
+
+if __name__ == "__main__":
+    logger.info("开始测试工单拉取")
+
+    test_filtered_and_incremental_fetch()
+    test_failed_table_uses_cache()
+    test_background_yields_to_interactive()
+
+    logger.info("测试完成")
@@ -0,0 +1,147 @@
+"""
+测试关键词回复表（分页拉取、增量同步、快照、匹配器）
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.config_loader import KeywordTableConfig
+from src.utils.keyword_table import KeywordMatcher, KeywordTable, field_text
+from loguru import logger
+
+
+class FakeBitable:
+    """模拟多维表格 records/search 接口"""
+
+    def __init__(self, records):
+        self.records = records  # [(record_id, fields, last_modified_time)]
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/tenant_access_token/internal"):
+            return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-test", "expire": 7200})
+        body = json.loads(request.content or b"{}")
+        self.requests.append(body)
+        items = [{"record_id": rid, "fields": fields, "last_modified_time": mtime}
+                 for rid, fields, mtime in self.records]
+        since = 0
+        if body.get("filter"):
+            since = int(body["filter"]["conditions"][0]["value"][1])
+        items = [item for item in items if item["last_modified_time"] > since]
+        page_size = int(request.url.params["page_size"])
+        start = int(request.url.params.get("page_token") or 0)
+        has_more = start + page_size < len(items)
+        return httpx.Response(200, json={"code": 0, "data": {
+            "items": items[start:start + page_size],
+            "has_more": has_more,
+            "page_token": str(start + page_size) if has_more else "",
+        }})
+
+
+def _record(i, keyword, status="已完成", mtime=1000):
+    return (f"rec{i}", {"关键词": [{"type": "text", "text": keyword}], "回复内容": f"回复{i}", "添加状态": status}, mtime)
+
+
+def _table(fake: FakeBitable, snapshot_path: str = "", **overrides) -> KeywordTable:
+    config = SimpleNamespace(
+        keyword_table=KeywordTableConfig(
+            base_token="bas", table_id="tbl", page_size=2, snapshot_path=snapshot_path, **overrides
+        ),
+        bots={"feishu": SimpleNamespace(app_id="cli_test", app_secret="secret")},
+    )
+    table = KeywordTable(config, format_reply=lambda text: text, open_api_base="https://feishu.test")
+    table.transport = httpx.MockTransport(fake.handler)
+    return table
+
+
+def test_matcher_order():
+    """测试匹配器按规则顺序返回第一个命中的关键词"""
+    matcher = KeywordMatcher([("下载", "A"), ("下载地址", "B"), ("官网", "C"), ("", "空关键词忽略")])
+    assert matcher.match("请问下载地址在哪") == "A"
+    assert matcher.match("APIFOX 官网") == "C"
+    assert matcher.match("无关问题") == ""
+    assert len(matcher) == 3
+    assert field_text([{"type": "text", "text": "a"}, {"type": "text", "text": "b"}]) == "ab"
+
+
+def test_paginated_full_sync():
+    """测试分页拉取全部记录（超过单页上限的记录不再丢失）"""
+    fake = FakeBitable([_record(i, f"关键词{i}") for i in range(5)] + [_record(9, "未完成", status="待处理")])
+    table = _table(fake)
+    assert table.refresh_sync() is True
+    print(f"\n请求次数: {len(fake.requests)}, 规则: {table.matcher.rules}")
+    assert len(fake.requests) == 3
+    assert len(table.matcher) == 5
+    assert table.matcher.match("关键词4 怎么用") == "回复4"
+    # 内容未变化时不重建匹配器
+    matcher = table.matcher
+    assert table.refresh_sync() is False
+    assert table.matcher is matcher
+
+
+def test_incremental_sync_and_deletion():
+    """测试按修改时间增量同步，定期全量同步感知删除"""
+    fake = FakeBitable([_record(1, "导入"), _record(2, "导出")])
+    table = _table(fake, modified_field="最后更新时间", full_sync_every=2)
+    table.refresh_sync()
+
+    fake.records = [_record(1, "导入数据", mtime=2000), _record(2, "导出")]
+    assert table.refresh_sync() is True
+    assert fake.requests[-1]["filter"]["conditions"][0]["value"] == ["ExactDate", "1000"]
+    assert table.matcher.match("怎么导入") == ""
+    assert table.matcher.match("怎么导入数据") == "回复1"
+
+    # 增量同步感知不到删除，每 2 次同步做一次全量
+    fake.records = [_record(1, "导入数据", mtime=2000)]
+    assert table.refresh_sync() is True
+    assert "filter" not in fake.requests[-1]
+    assert table.matcher.match("导出") == ""
+
+
+def test_snapshot_warm_start():
+    """测试本地快照恢复"""
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = str(Path(tmp) / "keywords.json")
+        fake = FakeBitable([_record(1, "下载")])
+        table = _table(fake, snapshot_path=snapshot)
+        table.refresh_sync()
+
+        warm = _table(FakeBitable([]), snapshot_path=snapshot)
+        assert warm.load_snapshot() is True
+        assert warm.matcher.match("下载") == "回复1"
+
+        # 快照属于其他表时忽略
+        other = _table(FakeBitable([]), snapshot_path=snapshot)
+        other.table_id = "tbl_other"
+        assert other.load_snapshot() is False
+
+
+def test_fallback_on_failure():
+    """测试同步失败且没有可用规则时使用本地规则"""
+    def broken(request):
+        return httpx.Response(200, json={"code": 99991663, "msg": "invalid token"})
+
+    table = _table(FakeBitable([]))
+    table.transport = httpx.MockTransport(broken)
+    table.fallback = lambda: [("excel", "本地回复")]
+    table.load()
+    assert table.matcher.match("excel 关键词") == "本地回复"
+
+
+if __name__ == "__main__":
+    logger.info("开始测试关键词回复表")
+
+    test_matcher_order()
+    test_paginated_full_sync()
+    test_incremental_sync_and_deletion()
+    test_snapshot_warm_start()
+    test_fallback_on_failure()
+
+    logger.info("测试完成")
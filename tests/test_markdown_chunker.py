@@ -0,0 +1,132 @@
+"""
+测试 Markdown 结构感知切分
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+from src.rag.markdown_chunker import MarkdownChunker, create_text_splitter
+from loguru import logger
+
+SAMPLE = """# 导入 Postman
+
+**来源**: https://docs.apifox.com/import-postman
+
+---
+
+## 概念对照
+
+Postman 的 Collection 对应 Apifox 中的项目。
+
+## 导入步骤
+
+1. 在 Postman 中导出 Collection。
+2. 在 Apifox 中选择导入。
+
+```bash
+# 这一行在代码块中，不是标题
+echo ok
+```
+
+## 常见问题
+
+""" + "导入失败时请检查文件格式。" * 60
+
+
+def test_sections_and_metadata():
+    """测试按标题切分与元数据"""
+    chunker = MarkdownChunker(chunk_size=200, chunk_overlap=20)
+    chunks = chunker.split_text(SAMPLE, {"source": "data/documents/apifox/import-postman.md"})
+
+    print("\n=== 测试章节切分 ===")
+    for chunk in chunks:
+        print(f"{chunk.metadata['chunk_id']} | {chunk.metadata['title_path']} | {len(chunk.page_content)} 字符")
+
+    # 小章节合并，过长章节细分
+    assert chunks[0].metadata["title_path"] == "导入 Postman > 概念对照"
+    assert "导入步骤" in chunks[0].page_content
+    assert any(c.metadata["title_path"] == "导入 Postman > 常见问题" for c in chunks)
+    # 代码块中的 # 不作为标题
+    assert all(c.metadata["title_path"] != "导入 Postman > 这一行在代码块中，不是标题" for c in chunks)
+    # 来源行不进入正文
+    assert all("**来源**" not in c.page_content for c in chunks)
+
+    meta = chunks[0].metadata
+    assert meta["title"] == "导入 Postman"
+    assert meta["url"] == "https://docs.apifox.com/import-postman"
+    assert meta["product"] == "apifox"
+    # 标题路径补充在片段开头
+    assert chunks[0].page_content.startswith("导入 Postman\n\n## 概念对照")
+
+
+def test_url_inference():
+    """测试无来源行时按文件名推断地址与产品"""
+    chunker = MarkdownChunker()
+    chunks = chunker.split_text("# Account Settings\n\nManage your profile.", {
+        "source": "data/documents/apidog/account-settings-640795m0.md"
+    })
+
+    print("\n=== 测试地址推断 ===")
+    print(chunks[0].metadata)
+    assert chunks[0].metadata["url"] == "https://docs.apidog.com/account-settings-640795m0"
+    assert chunks[0].metadata["product"] == "apidog"
+
+
+def test_deterministic_ids():
+    """测试同一输入的 chunk_id 稳定"""
+    docs = [Document(page_content=SAMPLE, metadata={"source": "import-postman.md"})]
+    first = [c.metadata["chunk_id"] for c in create_text_splitter("markdown", 200, 20).split_documents(docs)]
+    second = [c.metadata["chunk_id"] for c in create_text_splitter("markdown", 200, 20).split_documents(docs)]
+
+    print("\n=== 测试 chunk_id 稳定性 ===")
+    print(first)
+    assert first == second
+    assert len(set(first)) == len(first)
+
+
+def test_chunk_budget():
+    """测试相邻章节装箱：标题路径前缀计入长度，片段数不多于按字符递归切分"""
+    docs = [Document(page_content=SAMPLE, metadata={"source": "import-postman.md"})]
+    chunks = create_text_splitter("markdown", 200, 20).split_documents(docs)
+    recursive = create_text_splitter("recursive", 200, 20).split_documents(docs)
+
+    print("\n=== 测试片段长度 ===")
+    print(f"markdown: {[len(c.page_content) for c in chunks]}")
+    print(f"recursive: {[len(c.page_content) for c in recursive]}")
+    assert all(len(c.page_content) <= 200 for c in chunks)
+    assert len(chunks) <= len(recursive)
+    # 代码块不被拆开
+    assert any("```bash\n# 这一行在代码块中，不是标题\necho ok\n```" in c.page_content for c in chunks)
+
+
+def test_ids_stable_across_edits():
+    """测试 chunk_id 不随内容变化，同名文件按产品区分"""
+    chunker = MarkdownChunker(chunk_size=200, chunk_overlap=20)
+    source = "data/documents/apifox/import-postman.md"
+    before = chunker.split_text(SAMPLE, {"source": source})
+    after = chunker.split_text(SAMPLE.replace("对应 Apifox 中的项目", "对应 Apifox 中的团队项目"), {"source": source})
+    # 两个产品目录下的同名文件
+    apifox = chunker.split_text("# Access Token\n\nCreate a token.", {"source": "data/documents/apifox/api-access-token.md"})
+    apidog = chunker.split_text("# Access Token\n\nCreate a token.", {"source": "data/documents/apidog/api-access-token.md"})
+
+    print("\n=== 测试修改后的 chunk_id ===")
+    print([c.metadata["chunk_id"] for c in after])
+    assert before[0].page_content != after[0].page_content
+    assert [c.metadata["chunk_id"] for c in before] == [c.metadata["chunk_id"] for c in after]
+    assert before[0].metadata["chunk_id"] == "apifox/import-postman-000"
+    assert apifox[0].metadata["chunk_id"] != apidog[0].metadata["chunk_id"]
+
+
+if __name__ == "__main__":
+    logger.info("开始测试 Markdown 切分")
+
+    test_sections_and_metadata()
+    test_url_inference()
+    test_deterministic_ids()
+    test_chunk_budget()
+    test_ids_stable_across_edits()
+
+    logger.info("测试完成")
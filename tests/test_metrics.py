@@ -0,0 +1,98 @@
+"""
+测试指标采集与 /metrics 导出
+"""
+
+import socket
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.metrics import (
+    REGISTRY,
+    STAGE_SECONDS,
+    MetricsRegistry,
+    inc_counter,
+    observe_stage,
+    render_metrics,
+    stage_timer,
+    start_metrics_server,
+)
+from loguru import logger
+
+
+def test_stage_histogram():
+    """测试阶段耗时直方图与分位数"""
+    STAGE_SECONDS.reset()
+    for ms in range(1, 101):
+        observe_stage("retrieval", ms / 1000)
+
+    with stage_timer("keyword_match"):
+        time.sleep(0.01)
+
+    print("\n=== 测试阶段耗时 ===")
+    p50 = STAGE_SECONDS.quantile(0.5, stage="retrieval")
+    p99 = STAGE_SECONDS.quantile(0.99, stage="retrieval")
+    print(f"retrieval p50={p50:.3f}s p99={p99:.3f}s")
+    assert STAGE_SECONDS.count(stage="retrieval") == 100
+    assert 0.045 <= p50 <= 0.055
+    assert STAGE_SECONDS.count(stage="keyword_match") == 1
+
+
+def test_render():
+    """测试 Prometheus 文本格式（使用独立的注册表，不依赖其他测试的观测值）"""
+    registry = MetricsRegistry()
+    stages = registry.histogram("stage_seconds", "各处理阶段耗时（秒）", ["stage"])
+    events = registry.counter("events_total", "按类型统计的事件数", ["event"])
+    for ms in range(1, 101):
+        stages.observe(ms / 1000, stage="retrieval")
+    events.inc(event="im.message.receive_v1")
+    text = registry.render()
+
+    print("\n=== 测试导出格式 ===")
+    print(text[:300])
+    assert "# TYPE kbbot_stage_seconds histogram" in text
+    assert 'kbbot_stage_seconds_bucket{stage="retrieval",le="+Inf"} 100' in text
+    assert 'kbbot_stage_seconds_count{stage="retrieval"} 100' in text
+    assert 'kbbot_events_total{event="im.message.receive_v1"} 1' in text
+    # 同名指标复用同一对象
+    assert registry.histogram("stage_seconds") is stages
+    assert REGISTRY.histogram("stage_seconds") is STAGE_SECONDS
+
+    # 全局注册表导出全部预定义指标
+    inc_counter("im.message.receive_v1")
+    text = render_metrics()
+    assert "# TYPE kbbot_stage_seconds histogram" in text
+    assert 'kbbot_events_total{event="im.message.receive_v1"}' in text
+
+
+def _free_port() -> int:
+    """由系统分配一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_server():
+    """测试独立 /metrics 服务"""
+    port = _free_port()
+    start_metrics_server(port, host="127.0.0.1")
+    time.sleep(0.2)
+
+    print("\n=== 测试 /metrics 服务 ===")
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+        body = resp.read().decode("utf-8")
+    print(f"响应长度: {len(body)}")
+    assert "kbbot_stage_seconds" in body
+
+
+if __name__ == "__main__":
+    logger.info("开始测试指标采集")
+
+    test_stage_histogram()
+    test_render()
+    test_metrics_server()
+
+    logger.info("测试完成")
@@ -0,0 +1,65 @@
+"""
+测试关键词回复格式化与消息体缓存
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.reply_formatter import ReplyFormatter
+from loguru import logger
+
+# (原始回复, 格式化结果)，结果与重构前逐条 re.sub 的实现一致
+CASES = [
+    (
+        "1.使用场景 在 Apifox 中导入 OpenAPI/\nSwagger 文件。注意事项：导入前请备份。2.常见问题 如果导入失败，请查看日志",
+        "1.使用场景\n\n在 Apifox 中导入 OpenAPI/Swagger 文件。注意事项：导入前请备份。\n2.常见问题\n如果导入失败，请查看日志",
+    ),
+    (
+        "下载地址：https://apifox.com/download 帮助文档：https://docs.apifox.com 立即参与内测：https://apifox.com/beta",
+        "下载地址 ☞ https://apifox.com/download\n\n帮助文档 ☞ https://docs.apifox.com\n\n立即参与内测 ☞ https://apifox.com/beta",
+    ),
+    (
+        "提示  你可以在设置中修改。如果仍有问题请联系客服！1.快速开始   相关链接☞https://apifox.com/help",
+        "提示 你可以在设置中修改。如果仍有问题请联系客服！\n1.快速开始相关链接 ☞ https://apifox.com/help",
+    ),
+]
+
+
+def test_format():
+    """测试格式化结果"""
+    formatter = ReplyFormatter()
+    for raw, expected in CASES:
+        assert formatter.format(raw) == expected
+
+
+def test_render():
+    """测试消息体：含链接为 post 富文本，否则为 text；结果按内容缓存"""
+    formatter = ReplyFormatter()
+    msg_type, content = formatter.render("纯文本回复，没有链接")
+    assert msg_type == "text"
+    assert json.loads(content) == {"text": "纯文本回复，没有链接"}
+
+    reply = formatter.format_and_render(CASES[1][0])
+    msg_type, content = formatter.render(reply)
+    print(f"\n{content}")
+    assert msg_type == "post"
+    blocks = json.loads(content)["zh_cn"]["content"]
+    assert blocks[0] == [
+        {"tag": "text", "text": "下载地址 ☞ "},
+        {"tag": "a", "text": "https://apifox.com/download", "href": "https://apifox.com/download"},
+    ]
+    assert blocks[1] == [{"tag": "text", "text": ""}]
+    # 加载时已生成，发送时命中缓存
+    assert formatter.render.cache_info().hits >= 1
+
+
+if __name__ == "__main__":
+    logger.info("开始测试回复格式化")
+
+    test_format()
+    test_render()
+
+    logger.info("测试完成")
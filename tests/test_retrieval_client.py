@@ -0,0 +1,106 @@
+"""
+测试检索服务客户端（Unix Socket 上的最小服务端）
+"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import uvicorn
+from fastapi import FastAPI
+from src.rag.retrieval_client import RemoteKnowledgeBase, create_knowledge_base, parse_service_url
+from loguru import logger
+
+
+def _config(url: str):
+    return SimpleNamespace(rag=SimpleNamespace(
+        top_k=3,
+        service=SimpleNamespace(url=url, timeout=5.0),
+    ))
+
+
+def _start_server(uds: str) -> uvicorn.Server:
+    app = FastAPI()
+    requests = []
+
+    @app.post("/search")
+    async def search(body: dict):
+        requests.append(body)
+        return {"results": [
+            [{"page_content": f"{q} 的答案", "metadata": {"url": "https://docs.apifox.com/x", "relevance": 0.8}}]
+            for q in body["queries"]
+        ]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"status": "ok", "total_documents": 1, "index_version": "v1"}
+
+    server = uvicorn.Server(uvicorn.Config(app, uds=uds, log_level="warning"))
+    server.requests = requests
+    threading.Thread(target=server.run, daemon=True).start()
+    for _ in range(100):
+        if server.started:
+            break
+        time.sleep(0.05)
+    return server
+
+
+def test_parse_service_url():
+    """测试服务地址解析"""
+    assert parse_service_url("unix:///tmp/kb.sock") == ("/tmp/kb.sock", "http://retrieval")
+    assert parse_service_url("http://127.0.0.1:8765/") == (None, "http://127.0.0.1:8765")
+
+
+def test_remote_search_over_uds():
+    """测试通过 Unix Socket 检索"""
+    with tempfile.TemporaryDirectory() as tmp:
+        uds = str(Path(tmp) / "retrieval.sock")
+        server = _start_server(uds)
+        try:
+            kb = create_knowledge_base(_config(f"unix://{uds}"))
+            assert isinstance(kb, RemoteKnowledgeBase)
+
+            async def run():
+                await kb.initialize()
+                docs = await kb.search("如何导入数据")
+                batch = await kb.search_batch(["问题一", "问题二"], top_k=5)
+                await kb.close()
+                return docs, batch
+
+            docs, batch = asyncio.run(run())
+
+            print("\n=== 测试远程检索 ===")
+            print(docs)
+            assert kb.ready
+            assert docs[0].page_content == "如何导入数据 的答案"
+            assert docs[0].metadata["relevance"] == 0.8
+            assert [d[0].page_content for d in batch] == ["问题一 的答案", "问题二 的答案"]
+            assert server.requests[0]["top_k"] == 3 and server.requests[1]["top_k"] == 5
+            assert "### 文档 1" in kb.format_context(docs)
+        finally:
+            server.should_exit = True
+
+
+def test_service_unavailable():
+    """测试服务不可用时检索返回空结果"""
+    kb = RemoteKnowledgeBase(_config("unix:///nonexistent/retrieval.sock"))
+    docs = asyncio.run(kb.search("问题"))
+    assert docs == []
+    assert not kb.ready
+    assert kb.get_stats()["status"] == "unavailable"
+
+
+if __name__ == "__main__":
+    logger.info("开始测试检索服务客户端")
+
+    test_parse_service_url()
+    test_remote_search_over_uds()
+    test_service_unavailable()
+
+    logger.info("测试完成")
@@ -0,0 +1,66 @@
+"""
+测试启动耗时分析
+"""
+
+import importlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.startup_profiler import (
+    disable_import_timing,
+    enable_import_timing,
+    format_startup_report,
+    import_times,
+    mark,
+    startup_phase,
+)
+from loguru import logger
+
+
+def test_import_self_time():
+    """测试导入耗时按自身耗时统计（不重复计入子模块）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        package = Path(tmp) / "slow_pkg_for_profiler"
+        package.mkdir()
+        (package / "__init__.py").write_text("import time\ntime.sleep(0.05)\nfrom . import child\n")
+        (package / "child.py").write_text("import time\ntime.sleep(0.1)\n")
+        (Path(tmp) / "outer_pkg_for_profiler.py").write_text("import slow_pkg_for_profiler\n")
+
+        sys.path.insert(0, tmp)
+        enable_import_timing()
+        try:
+            importlib.import_module("outer_pkg_for_profiler")
+        finally:
+            disable_import_timing()
+            sys.path.remove(tmp)
+
+    times = dict(import_times(top=50))
+    print("\n=== 导入耗时 ===")
+    print(times)
+    # 包自身 0.05s + 子模块 0.1s 计入同一顶层包；导入它的外层模块几乎不耗时
+    assert 0.15 <= times["slow_pkg_for_profiler"] < 0.3
+    assert times["outer_pkg_for_profiler"] < 0.05
+
+
+def test_report():
+    """测试阶段与时间点出现在报告中"""
+    with startup_phase("测试阶段"):
+        time.sleep(0.01)
+    mark("测试时间点")
+    report = format_startup_report()
+    print(report)
+    assert "测试阶段" in report
+    assert "@ 测试时间点" in report
+
+
+if __name__ == "__main__":
+    logger.info("开始测试启动耗时分析")
+
+    test_import_self_time()
+    test_report()
+
+    logger.info("测试完成")
@@ -0,0 +1,79 @@
+"""
+测试后台任务监管器（并发上限、有界排队、拒绝、关闭时排空）
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.task_supervisor import TaskSupervisor
+from loguru import logger
+
+
+def test_limit_queue_and_reject():
+    """测试超出并发的任务排队，排队满后拒绝，空出名额后按顺序启动"""
+    async def run():
+        supervisor = TaskSupervisor(limits={"feishu": 2}, backlogs={"feishu": 2})
+        release = asyncio.Event()
+        running, finished = [], []
+
+        async def handle(n):
+            running.append(n)
+            await release.wait()
+            finished.append(n)
+
+        accepted = [supervisor.submit("feishu", handle, n) for n in range(5)]
+        assert accepted == [True, True, True, True, False]
+        await asyncio.sleep(0)
+        assert running == [0, 1]
+        stats = supervisor.stats()["feishu"]
+        assert (stats["active"], stats["queued"], stats["rejected"]) == (2, 2, 1)
+
+        # 其他通道不受影响
+        assert supervisor.submit("wecom", handle, 100) is True
+
+        release.set()
+        await supervisor.shutdown(timeout=1)
+        print(f"\n{supervisor.stats()}")
+        assert sorted(finished) == [0, 1, 2, 3, 100]
+        # 排队任务按提交顺序启动
+        assert [n for n in running if n < 100] == [0, 1, 2, 3]
+        assert supervisor.stats()["feishu"]["completed"] == 4
+
+    asyncio.run(run())
+
+
+def test_failures_and_shutdown_timeout():
+    """测试任务异常计数；关闭后拒绝新任务，超时后取消剩余任务"""
+    async def run():
+        supervisor = TaskSupervisor(default_limit=1, default_backlog=5)
+
+        async def broken():
+            raise RuntimeError("LLM 调用失败")
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        supervisor.submit("wecom", broken)
+        supervisor.submit("wecom", hang)
+        supervisor.submit("wecom", hang)
+        await asyncio.sleep(0.01)
+        assert supervisor.stats()["wecom"]["failed"] == 1
+
+        await supervisor.shutdown(timeout=0.1)
+        stats = supervisor.stats()["wecom"]
+        assert stats["active"] == 0 and stats["queued"] == 0
+        assert supervisor.submit("wecom", hang) is False
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    logger.info("开始测试后台任务监管器")
+
+    test_limit_queue_and_reject()
+    test_failures_and_shutdown_timeout()
+
+    logger.info("测试完成")
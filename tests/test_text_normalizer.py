@@ -0,0 +1,90 @@
+"""
+测试文档文本归一化
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+from src.rag.markdown_chunker import MarkdownChunker
+from src.rag.text_normalizer import TextNormalizer, normalize_and_split
+from loguru import logger
+
+SAMPLE = """# 接口之间如何传递数据
+
+在 `A 接口` 的后置操作中提取变量：
+
+<Background>
+
+![image.png](https://api.apifox.com/api/v1/projects/5097254/resources/488325/image-preview)
+
+</Background>
+
+:::tip[]
+提取的变量可以在 B 接口中直接引用。
+:::
+
+<Steps>
+  <Step title="提取数据">
+    配置 JSONPath 表达式 `$.data.id`。
+  </Step>
+</Steps>
+
+<table><td colspan="1" rowspan="1"><p>✅</p></td></table>
+
+```js
+<Background>代码块中的内容保持不变</Background>
+```
+
+## 相关文档
+
+- [航空公司](https://docs.apifox.com/5589658m0.md)
+- [动物](https://docs.apifox.com/5589662m0.md)
+- [颜色](https://docs.apifox.com/5589666m0.md)
+- [商业](https://docs.apifox.com/5589669m0.md)
+- [公司](https://docs.apifox.com/5589672m0.md)
+"""
+
+
+def test_strip_markup():
+    """测试去掉组件标签、图片与提示块标记"""
+    text = TextNormalizer().normalize(SAMPLE)
+
+    print("\n=== 测试标记清理 ===")
+    print(text)
+    assert "image-preview" not in text
+    assert ":::" not in text
+    assert "<Steps>" not in text and "<Step" not in text
+    assert "**提取数据**" in text
+    assert "配置 JSONPath 表达式" in text
+    assert "<td>✅</td>" in text
+    # 代码块原样保留
+    assert "<Background>代码块中的内容保持不变</Background>" in text
+    # 链接列表折叠为链接文字
+    assert "相关文档：航空公司、动物、颜色、商业、公司" in text
+    assert "5589658m0" not in text
+
+
+def test_drop_low_information_chunks():
+    """测试过滤只剩标题的片段"""
+    docs = [Document(page_content="# 标题\n\n## 空章节\n\n<Background>\n![](a.png)\n</Background>\n\n## 正文\n\n" + "有效内容" * 10,
+                     metadata={"source": "data/documents/apifox/demo.md"})]
+    chunker = MarkdownChunker(chunk_size=40, chunk_overlap=0)
+    chunks, report = normalize_and_split(docs, chunker, TextNormalizer(), with_baseline=True)
+
+    print("\n=== 测试低信息片段过滤 ===")
+    print(report.summary())
+    assert all("有效内容" in c.page_content for c in chunks)
+    assert report.chunks_after == len(chunks)
+    assert report.tokens_after < report.tokens_before
+
+
+if __name__ == "__main__":
+    logger.info("开始测试文本归一化")
+
+    test_strip_markup()
+    test_drop_low_information_chunks()
+
+    logger.info("测试完成")
@@ -0,0 +1,71 @@
+"""
+测试工单向量聚类（分块计算、噪声过滤、非核心点不串联簇、代表样本）
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.ticket_clustering import cluster_embeddings, representatives, ticket_text
+from loguru import logger
+
+
+def _blob(rng, center, count, noise=0.02):
+    return center + rng.normal(scale=noise, size=(count, len(center)))
+
+
+def test_clusters_across_blocks():
+    """测试跨分块的簇完整、不足 min_cluster_size 的簇与噪声被过滤、按条数降序"""
+    rng = np.random.default_rng(0)
+    centers = np.eye(32)
+    vectors = np.vstack([
+        _blob(rng, centers[0], 30),
+        _blob(rng, centers[1], 10),
+        _blob(rng, centers[2], 1),
+        _blob(rng, centers[3], 2),
+    ])
+    order = rng.permutation(len(vectors))
+    shuffled = vectors[order]
+
+    clusters = cluster_embeddings(shuffled, threshold=0.9, min_cluster_size=3, block_size=8)
+    print(f"\n簇大小: {[len(c) for c in clusters]}")
+    assert [len(c) for c in clusters] == [30, 10]
+    assert sorted(order[clusters[0]]) == list(range(30))
+    assert sorted(order[clusters[1]]) == list(range(30, 40))
+
+    assert [len(c) for c in cluster_embeddings(shuffled, threshold=0.9, min_cluster_size=2)] == [30, 10, 2]
+    assert cluster_embeddings(shuffled[:1], threshold=0.9, min_cluster_size=2) == []
+
+
+def test_border_points_do_not_chain():
+    """测试只由非核心点连接的两组工单不会合并（单链接聚类会连成一个簇）"""
+    angles = [0, 1, 2, 3, 13.5, 24, 34.5, 44.5, 45.5, 46.5, 47.5]
+    radians = np.radians(angles)
+    vectors = np.stack([np.cos(radians), np.sin(radians)], axis=1)
+
+    clusters = cluster_embeddings(vectors, threshold=np.cos(np.radians(10.6)), min_cluster_size=4)
+    assert [sorted(c.tolist()) for c in clusters] == [[0, 1, 2, 3, 4], [6, 7, 8, 9, 10]]
+
+
+def test_representatives_and_text():
+    """测试代表样本取最接近质心的工单，以及富文本字段的聚类文本"""
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.95, 0.05]])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert sorted(representatives(vectors, np.array([0, 1, 2, 3]), 2).tolist()) == [1, 3]
+    assert len(representatives(vectors, np.array([0, 2]), 8)) == 2
+
+    ticket = {"title": [{"text": "导入"}, {"text": "报错"}], "description": "提示格式不正确"}
+    assert ticket_text(ticket) == "导入报错\n提示格式不正确"
+
+
+if __name__ == "__main__":
+    logger.info("开始测试工单向量聚类")
+
+    test_clusters_across_blocks()
+    test_border_points_do_not_chain()
+    test_representatives_and_text()
+
+    logger.info("测试完成")
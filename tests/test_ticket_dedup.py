@@ -0,0 +1,191 @@
+"""
+测试重复工单检测（向量索引的插入 / 扩容 / 过期、重复反馈合并为一次更新、失败重试、写入中的工单、建立索引）
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.integrations.ticket_dedup import RollingVectorIndex, TicketDeduplicator
+from loguru import logger
+
+
+def fake_embed(texts):
+    """按字符计数的向量（相同文字的反馈相似度高）"""
+    vectors = []
+    for text in texts:
+        vector = np.zeros(64, dtype=np.float32)
+        for char in text:
+            vector[ord(char) % 64] += 1
+        vectors.append(vector)
+    return vectors
+
+
+class FakeWriter:
+    """模拟 LarkCliWrapper.update_record"""
+
+    app_token = "base_test"
+
+    def __init__(self):
+        self.updates = []
+
+    def update_record(self, table_id, record_id, fields, base_token=None):
+        self.updates.append((record_id, fields))
+        return {"success": True, "record_id": record_id}
+
+
+class FakeSink:
+    """模拟 TicketSink.submit：写入结果由测试手动完成"""
+
+    def __init__(self):
+        self.writer = FakeWriter()
+        self.submitted = []
+        self.lock = threading.Lock()
+
+    def submit(self, table_id, fields, base_token=None, chat_id=""):
+        future = Future()
+        with self.lock:
+            self.submitted.append((fields, future))
+        return future
+
+    def complete(self, index, record_id):
+        self.submitted[index][1].set_result({"success": True, "record_id": record_id} if record_id else
+                                            {"success": True, "record_id": None, "pending_sync": True})
+
+
+def _dedup(sink, **kwargs):
+    params = dict(threshold=0.9, window_hours=1, attach_delay=0.1)
+    params.update(kwargs)
+    return TicketDeduplicator(sink, embed=fake_embed, **params)
+
+
+def test_index_grow_and_expire():
+    """测试索引扩容后检索结果不变、过期条目不参与检索且被压缩"""
+    index = RollingVectorIndex(ttl=100, initial_capacity=2)
+    now = time.time()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(10, 8))
+    for n, vector in enumerate(vectors):
+        index.add(n, vector, timestamp=now - 150 if n < 6 else now)
+
+    assert index._capacity == 16
+    key, score = index.search(vectors[8], now=now)
+    assert key == 8 and abs(score - 1.0) < 1e-5
+    # 过期条目超过一半时已被压缩
+    assert index._size == 4 and len(index) == 4
+    assert index.search(vectors[2], now=now)[0] != 2
+
+    index.discard(8)
+    assert index.search(vectors[8], now=now)[0] != 8
+    assert index.expire(now, force=True) == 1 and len(index) == 3
+
+
+def test_attach_coalesced():
+    """测试重复反馈合并到已有工单，同一工单的多条反馈只更新一次"""
+    sink = FakeSink()
+    dedup = _dedup(sink)
+    first = dedup.submit("tbl_bug", {"标题": "导入报错", "补充信息": "原始消息: 导入报错"},
+                         text="导入 Excel 报错，提示格式错误", report="r0")
+    sink.complete(0, "rec_1")
+    assert first.result(timeout=1)["record_id"] == "rec_1"
+
+    results = [
+        dedup.submit("tbl_bug", {"标题": "x"}, text="导入 Excel 报错，提示格式错误", report=f"r{n}").result(timeout=1)
+        for n in (1, 2)
+    ]
+    other = dedup.submit("tbl_bug", {"标题": "白屏"}, text="打开首页一直白屏", report="r3")
+    assert all(r["duplicate_of"] == "rec_1" and r["score"] > 0.99 for r in results)
+    assert len(sink.submitted) == 2 and not other.done()
+
+    time.sleep(0.3)
+    print(f"\n更新: {sink.writer.updates}")
+    assert sink.writer.updates == [("rec_1", {"补充信息": "原始消息: 导入报错\nr1\nr2"})]
+    assert dedup.stats()["attached"] == 2 and dedup.stats()["created"] == 2
+    dedup.close()
+
+
+def test_duplicate_of_pending_ticket():
+    """测试工单写入完成前的重复反馈等待记录 ID；写入未得到记录 ID 时重新检测"""
+    sink = FakeSink()
+    dedup = _dedup(sink, attach_delay=10)
+    text = "保存失败，点击保存没有反应"
+    first = dedup.submit("tbl_bug", {"标题": "a"}, text=text, report="r0")
+    waiting = [dedup.submit("tbl_bug", {"标题": f"b{n}"}, text=text, report=f"r{n}") for n in (1, 2)]
+    assert len(sink.submitted) == 1 and not any(f.done() for f in waiting)
+
+    # 第一条保存到本地工单库：第一条等待者成为新工单，第二条合并到它
+    sink.complete(0, None)
+    assert first.result(timeout=1)["pending_sync"]
+    assert len(sink.submitted) == 2 and sink.submitted[1][0]["标题"] == "b1"
+    sink.complete(1, "rec_2")
+    assert waiting[0].result(timeout=1)["record_id"] == "rec_2"
+    assert waiting[1].result(timeout=1)["duplicate_of"] == "rec_2"
+
+    dedup.close()
+    assert sink.writer.updates == [("rec_2", {"补充信息": "r2"})]
+
+
+def test_retry_merges_into_pending_entry():
+    """测试更新失败重试时，更新期间到达的新反馈与失败的反馈合并为一次更新"""
+    sink = FakeSink()
+    dedup = _dedup(sink, attach_delay=10)
+    text = "导出 PDF 失败，一直转圈"
+    dedup.submit("tbl_bug", {"标题": "a"}, text=text, report="r0")
+    sink.complete(0, "rec_1")
+    dedup.submit("tbl_bug", {"标题": "b"}, text=text, report="r1").result(timeout=1)
+
+    def failing_update(table_id, record_id, fields, base_token=None):
+        # 更新请求进行中又收到一条重复反馈
+        dedup.submit("tbl_bug", {"标题": "c"}, text=text, report="r2").result(timeout=1)
+        return {"success": False, "error": "timeout"}
+
+    sink.writer.update_record = failing_update
+    assert dedup.flush_attachments() == 0
+    assert len(dedup._attach_pending) == 1
+
+    sink.writer.update_record = FakeWriter.update_record.__get__(sink.writer)
+    assert dedup.flush_attachments() == 1
+    assert sink.writer.updates == [("rec_1", {"补充信息": "r1\nr2"})]
+    dedup.close()
+
+
+def test_hydrate_and_passthrough():
+    """测试用已有工单建立索引（跳过时间窗口外的工单），以及没有嵌入模型时直接创建"""
+    sink = FakeSink()
+    dedup = _dedup(sink)
+    now = time.time()
+    tickets = [
+        {"id": "rec_old", "table_id": "tbl_bug", "title": "导出失败", "description": "导出 PDF 失败",
+         "created_at": now - 7200, "supplement": ""},
+        {"id": "rec_new", "table_id": "tbl_bug", "title": [{"text": "登录超时"}], "description": "登录一直转圈超时",
+         "created_at": now - 60, "supplement": "已有反馈"},
+    ]
+    assert dedup.hydrate(tickets) == 1
+    result = dedup.submit("tbl_bug", {}, text="登录超时\n登录一直转圈超时", report="r1").result(timeout=1)
+    assert result["duplicate_of"] == "rec_new"
+    dedup.submit("tbl_bug", {}, text="导出失败\n导出 PDF 失败", report="r2")
+    assert len(sink.submitted) == 1
+    dedup.close()
+    assert sink.writer.updates == [("rec_new", {"补充信息": "已有反馈\nr1"})]
+
+    plain = TicketDeduplicator(sink, embed=None)
+    plain.submit("tbl_bug", {}, text="登录超时\n登录一直转圈超时", report="r3")
+    assert len(sink.submitted) == 2 and plain.stats()["passthrough"] == 1
+
+
+if __name__ == "__main__":
+    logger.info("开始测试重复工单检测")
+
+    test_index_grow_and_expire()
+    test_attach_coalesced()
+    test_duplicate_of_pending_ticket()
+    test_retry_merges_into_pending_entry()
+    test_hydrate_and_passthrough()
+
+    logger.info("测试完成")
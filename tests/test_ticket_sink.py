@@ -0,0 +1,155 @@
+"""
+测试工单批量写入（按条数 / 时间窗口合并、结果按顺序回填、按表分组、失败保存到本地工单库、恢复后自动补写）
+"""
+
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.integrations.ticket_sink import TicketSink
+from src.integrations.ticket_store import TicketStore
+from loguru import logger
+
+
+class FakeWriter:
+    """模拟 LarkCliWrapper.batch_create_records：记录每次调用，可切换为失败"""
+
+    app_token = "base_test"
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+        self.lock = threading.Lock()
+
+    def batch_create_records(self, table_id, records, base_token=None, client_token=None):
+        with self.lock:
+            self.calls.append((table_id, [r["标题"] for r in records], client_token))
+            if self.failing:
+                return {"success": False, "error": "服务不可用"}
+            start = sum(len(titles) for _, titles, _ in self.calls[:-1])
+        return {"success": True, "record_ids": [f"rec{start + n}" for n in range(len(records))]}
+
+
+def _sink(writer, tmp, **kwargs) -> TicketSink:
+    params = dict(flush_interval=0.2, max_batch=50, sync_interval=0)
+    params.update(kwargs)
+    return TicketSink(writer, TicketStore(f"{tmp}/tickets.db"), **params)
+
+
+def _wait_synced(sink, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while sink.stats()["local_backlog"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def test_batch_by_size_and_window():
+    """测试达到 max_batch 立即写入、不足时等待时间窗口，结果按提交顺序回填"""
+    tmp = tempfile.mkdtemp()
+    writer = FakeWriter()
+    sink = _sink(writer, tmp, flush_interval=0.3, max_batch=4)
+    try:
+        started = time.monotonic()
+        futures = [sink.submit("tbl_bug", {"标题": f"t{n}"}) for n in range(6)]
+        first = [f.result(timeout=5) for f in futures[:4]]
+        assert time.monotonic() - started < 0.2
+        rest = [f.result(timeout=5) for f in futures[4:]]
+        assert time.monotonic() - started >= 0.25
+
+        print(f"\n调用: {writer.calls}")
+        assert [titles for _, titles, _ in writer.calls] == [["t0", "t1", "t2", "t3"], ["t4", "t5"]]
+        assert [r["record_id"] for r in first + rest] == [f"rec{n}" for n in range(6)]
+        assert first[0]["url"] == "https://feishu.cn/base/base_test/tbl_bug?record=rec0"
+    finally:
+        sink.close()
+        shutil.rmtree(tmp)
+
+
+def test_group_by_table():
+    """测试同一窗口内不同表的工单各写入一次"""
+    tmp = tempfile.mkdtemp()
+    writer = FakeWriter()
+    sink = _sink(writer, tmp)
+    try:
+        results = []
+        threads = [
+            threading.Thread(target=lambda n=n: results.append(
+                sink.create_record("tbl_bug" if n % 2 else "tbl_feature", {"标题": f"t{n}"})))
+            for n in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert len(results) == 6 and all(r["success"] for r in results)
+        assert sorted(table for table, _, _ in writer.calls) == ["tbl_bug", "tbl_feature"]
+        assert sink.stats()["batches"] == 2
+    finally:
+        sink.close()
+        shutil.rmtree(tmp)
+
+
+def test_fallback_and_replay():
+    """测试写入失败时保存到本地工单库，接口恢复后自动补写（使用原 client_token）"""
+    tmp = tempfile.mkdtemp()
+    writer = FakeWriter()
+    sink = _sink(writer, tmp, flush_interval=0.05)
+    try:
+        writer.failing = True
+        futures = [sink.submit("tbl_bug", {"标题": f"t{n}", "类型": "缺陷"}, chat_id="oc_1") for n in range(3)]
+        results = [f.result(timeout=5) for f in futures]
+        assert all(r["success"] and r["pending_sync"] and r["record_id"] is None for r in results)
+        assert sink.stats()["local_backlog"] == 3
+        assert len(sink.store.list(ticket_type="bug", chat_id="oc_1", status="pending")) == 3
+        failed_token = writer.calls[0][2]
+
+        # 接口恢复：下一次写入成功后自动补写
+        writer.failing = False
+        assert sink.create_record("tbl_bug", {"标题": "t3"})["record_id"]
+        _wait_synced(sink)
+
+        print(f"\n调用: {writer.calls}")
+        assert sink.stats()["local_backlog"] == 0
+        assert writer.calls[-1] == ("tbl_bug", ["t0", "t1", "t2"], failed_token)
+        synced = sink.store.get(results[0]["ticket_id"])
+        assert synced["status"] == "synced" and synced["record_id"]
+    finally:
+        sink.close()
+        shutil.rmtree(tmp)
+
+
+def test_replay_on_startup():
+    """测试启动时补写上次运行遗留的本地工单"""
+    tmp = tempfile.mkdtemp()
+    writer = FakeWriter()
+    writer.failing = True
+    sink = _sink(writer, tmp, flush_interval=0.05)
+    sink.create_record("tbl_bug", {"标题": "遗留"})
+    sink.close()
+    sink.store.close()
+
+    writer.failing = False
+    sink = _sink(writer, tmp)
+    try:
+        _wait_synced(sink)
+        assert sink.stats()["local_backlog"] == 0
+        assert writer.calls[-1][1] == ["遗留"]
+    finally:
+        sink.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    logger.info("开始测试工单批量写入")
+
+    test_batch_by_size_and_window()
+    test_group_by_table()
+    test_fallback_and_replay()
+    test_replay_on_startup()
+
+    logger.info("测试完成")
@@ -0,0 +1,203 @@
+"""
+测试本地工单库（索引查询、按原批次与 client_token 补写、失败批次不阻塞、崩溃恢复、重新补写、导出 / 导入）
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.integrations.ticket_store import TicketStore, TicketSyncWorker
+from loguru import logger
+
+
+class FakeWriter:
+    """模拟 LarkCliWrapper.batch_create_records"""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def batch_create_records(self, table_id, records, base_token=None, client_token=None):
+        self.calls.append((table_id, [r["标题"] for r in records], client_token))
+        if self.failing:
+            return {"success": False, "error": "服务不可用"}
+        return {"success": True, "record_ids": [f"rec_{r['标题']}" for r in records]}
+
+
+def _add(store, title, ticket_type="bug", table_id="tbl_bug", **kwargs):
+    return store.add(ticket_type, {"标题": title}, table_id=table_id, base_token="base", **kwargs)
+
+
+def test_list_filters():
+    """测试按类型、状态、群与时间筛选"""
+    tmp = tempfile.mkdtemp()
+    store = TicketStore(f"{tmp}/tickets.db")
+    try:
+        now = time.time()
+        _add(store, "a", chat_id="oc_1", created_at=now - 7200)
+        _add(store, "b", chat_id="oc_2", created_at=now - 60)
+        _add(store, "c", ticket_type="feature", table_id="tbl_feature", chat_id="oc_1", created_at=now - 30)
+
+        assert [t["fields"]["标题"] for t in store.list()] == ["c", "b", "a"]
+        assert [t["fields"]["标题"] for t in store.list(ticket_type="bug")] == ["b", "a"]
+        assert [t["fields"]["标题"] for t in store.list(chat_id="oc_1")] == ["c", "a"]
+        assert [t["fields"]["标题"] for t in store.list(since=now - 3600)] == ["c", "b"]
+        assert [t["fields"]["标题"] for t in store.list(ticket_type="bug", until=now - 3600)] == ["a"]
+        assert store.stats() == {"pending": 3, "syncing": 0, "synced": 0, "failed": 0}
+    finally:
+        store.close()
+        shutil.rmtree(tmp)
+
+
+def test_sync_batches_with_client_token():
+    """测试补写按表分批、失败的批次以相同成员与 client_token 重试"""
+    tmp = tempfile.mkdtemp()
+    store = TicketStore(f"{tmp}/tickets.db")
+    writer = FakeWriter()
+    worker = TicketSyncWorker(store, writer, interval=0, batch_size=2)
+    try:
+        for title in ("a", "b", "c"):
+            _add(store, title)
+        _add(store, "f", ticket_type="feature", table_id="tbl_feature")
+
+        writer.failing = True
+        assert worker.sync_once() == {"synced": 0, "failed": 3}
+        failed_call = writer.calls[0]
+        assert failed_call[1] == ["a", "b"] and writer.calls[1][0] == "tbl_feature"
+
+        # 新工单不会加入失败的批次
+        _add(store, "d")
+        writer.failing = False
+        assert worker.sync_once() == {"synced": 5, "failed": 0}
+        print(f"\n调用: {writer.calls[1:]}")
+        assert writer.calls[2] == failed_call
+        assert [(table, titles) for table, titles, _ in writer.calls[3:]] == [
+            ("tbl_bug", ["c", "d"]), ("tbl_feature", ["f"])
+        ]
+        assert store.list(status="synced", limit=1)[0]["record_id"].startswith("rec_")
+        assert store.stats()["pending"] == 0
+    finally:
+        store.close()
+        shutil.rmtree(tmp)
+
+
+class RejectingWriter(FakeWriter):
+    """第一批（表 tbl_bug）始终被拒绝，如字段值不合法或表已删除"""
+
+    def batch_create_records(self, table_id, records, base_token=None, client_token=None):
+        if table_id == "tbl_bug" and records[0]["标题"] == "a":
+            self.calls.append((table_id, [r["标题"] for r in records], client_token))
+            return {"success": False, "error": "FieldConvFail"}
+        return super().batch_create_records(table_id, records, base_token, client_token)
+
+
+def test_failing_batch_does_not_block():
+    """测试始终失败的批次不阻塞其他表与之后的工单，达到最多次数后标记为 failed，可重新补写"""
+    tmp = tempfile.mkdtemp()
+    store = TicketStore(f"{tmp}/tickets.db")
+    writer = RejectingWriter()
+    worker = TicketSyncWorker(store, writer, interval=0, batch_size=2, max_attempts=3)
+    try:
+        _add(store, "a")
+        _add(store, "b")
+        _add(store, "f", ticket_type="feature", table_id="tbl_feature")
+
+        # 同一个表之后的工单本轮跳过，其他表照常补写
+        assert worker.sync_once() == {"synced": 1, "failed": 2}
+        assert store.stats()["pending"] == 2
+
+        for _ in range(2):
+            worker.sync_once()
+        assert store.stats() == {"pending": 0, "syncing": 0, "synced": 1, "failed": 2}
+        assert store.list(status="failed")[0]["last_error"] == "FieldConvFail"
+
+        # 放弃的批次不再重试，同一个表的新工单可以补写
+        _add(store, "c")
+        calls = len(writer.calls)
+        assert worker.sync_once() == {"synced": 1, "failed": 0}
+        assert writer.calls[calls:] == [("tbl_bug", ["c"], writer.calls[-1][2])]
+
+        # resync --failed：按原批次（同一 client_token）重试
+        token = writer.calls[0][2]
+        assert store.retry_failed() == 2
+        worker.sync_once()
+        assert writer.calls[-1] == ("tbl_bug", ["a", "b"], token)
+        assert store.stats()["pending"] == 2
+    finally:
+        store.close()
+        shutil.rmtree(tmp)
+
+
+def test_recover_and_reset():
+    """测试补写中断后重启恢复（保留 client_token），以及指定工单重新补写（新 client_token）"""
+    tmp = tempfile.mkdtemp()
+    path = f"{tmp}/tickets.db"
+    store = TicketStore(path)
+    ticket_id = _add(store, "a")
+    batch = store.claim(10)
+    store.close()
+
+    # 进程在补写过程中退出
+    store = TicketStore(path)
+    writer = FakeWriter()
+    worker = TicketSyncWorker(store, writer, interval=0)
+    try:
+        assert store.recover() == 1
+        worker.sync_once()
+        assert writer.calls[-1][2] == batch.client_token
+        assert store.get(ticket_id)["status"] == "synced"
+
+        assert store.reset([ticket_id]) == 1
+        worker.sync_once()
+        assert writer.calls[-1][2] != batch.client_token
+        assert store.get(ticket_id)["status"] == "synced"
+    finally:
+        store.close()
+        shutil.rmtree(tmp)
+
+
+def test_export_and_import():
+    """测试导出为每条工单一个文件（同一秒创建的工单不冲突），以及导入旧版降级文件"""
+    tmp = tempfile.mkdtemp()
+    store = TicketStore(f"{tmp}/tickets.db")
+    try:
+        now = time.time()
+        _add(store, "a", created_at=now)
+        _add(store, "b", created_at=now)
+        paths = store.export(f"{tmp}/export")
+        assert len(paths) == 2 and len({p.name for p in paths}) == 2
+
+        # 旧版 save_ticket_to_local 保存的文件
+        legacy_dir = Path(tmp) / "legacy"
+        legacy_dir.mkdir()
+        with open(legacy_dir / "feature_20261001_120000.json", "w", encoding="utf-8") as f:
+            json.dump({"type": "feature", "created_at": "2026-10-01T12:00:00",
+                       "data": {"title": "导出 PDF"}}, f, ensure_ascii=False)
+
+        def build(ticket_type, data):
+            return "tbl_feature", "base", {"标题": data["title"], "类型": "需求"}
+
+        assert store.import_files(str(legacy_dir), build) == 1
+        assert store.import_files(str(legacy_dir), build) == 0
+        imported = store.list(ticket_type="feature")[0]
+        assert imported["table_id"] == "tbl_feature" and imported["fields"]["标题"] == "导出 PDF"
+    finally:
+        store.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    logger.info("开始测试本地工单库")
+
+    test_list_filters()
+    test_sync_batches_with_client_token()
+    test_failing_batch_does_not_block()
+    test_recover_and_reset()
+    test_export_and_import()
+
+    logger.info("测试完成")
@@ -0,0 +1,102 @@
+"""
+测试企微消息加解密（往返、签名、PKCS7 / receive_id 校验、批量解密）
+"""
+
+import base64
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Crypto.Cipher import AES
+
+from src.utils.wecom_crypto import WeComCrypto, WeComCryptoError
+from loguru import logger
+
+AES_KEY = base64.b64encode(bytes(range(32))).decode()[:-1]
+TOKEN = "QDG6eK"
+CORP_ID = "wx5823bf96d3bd56c7"
+
+
+def _legacy_decrypt(aes_key: bytes, encrypt_msg: str) -> str:
+    """原实现：每条消息新建 CBC 对象"""
+    decrypted = AES.new(aes_key, AES.MODE_CBC, aes_key[:16]).decrypt(base64.b64decode(encrypt_msg))
+    decrypted = decrypted[:-decrypted[-1]]
+    msg_len = int.from_bytes(decrypted[16:20], 'big')
+    return decrypted[20:20 + msg_len].decode('utf-8')
+
+
+def test_roundtrip_and_legacy_compat():
+    """测试加密后可解密，且与原实现解密结果一致"""
+    crypto = WeComCrypto(TOKEN, AES_KEY, CORP_ID)
+    for msg in ["", "a", "报错了：导入 OpenAPI 失败" * 20, '{"MsgId": "1234567890123456"}']:
+        encrypted = crypto.encrypt(msg)
+        assert crypto.decrypt(encrypted) == msg
+        assert _legacy_decrypt(crypto.aes_key, encrypted) == msg
+
+
+def test_signature():
+    """测试签名包含密文，且常量时间比较"""
+    crypto = WeComCrypto(TOKEN, AES_KEY, CORP_ID)
+    encrypted = crypto.encrypt("echo")
+    signature = crypto.signature("1409659813", "1372623149", encrypted)
+    assert crypto.verify_signature(signature, "1409659813", "1372623149", encrypted)
+    assert not crypto.verify_signature(signature, "1409659813", "1372623149", encrypted[:-4] + "AAA=")
+    assert not crypto.verify_signature(signature, "1409659814", "1372623149", encrypted)
+    assert not crypto.verify_signature("", "1409659813", "1372623149", encrypted)
+
+
+def test_rejects_bad_padding_and_corp_id():
+    """测试填充无效、receive_id 不匹配、长度错误的密文被拒绝"""
+    crypto = WeComCrypto(TOKEN, AES_KEY, CORP_ID)
+
+    # 另一个企业加密的消息
+    other = WeComCrypto(TOKEN, AES_KEY, "wx_other_corp").encrypt("hello")
+    assert crypto.decrypt(other) == ""
+    # 未配置 corp_id 时不校验 receive_id
+    assert WeComCrypto(TOKEN, AES_KEY).decrypt(other) == "hello"
+
+    # 用错误的密钥解密，填充校验失败
+    wrong_key = base64.b64encode(os.urandom(32)).decode()[:-1]
+    try:
+        WeComCrypto(TOKEN, wrong_key, CORP_ID).decrypt_raw(base64.b64decode(crypto.encrypt("hello")))
+        raise AssertionError("应校验失败")
+    except WeComCryptoError:
+        pass
+
+    assert crypto.decrypt("not base64!!") == ""
+    assert crypto.decrypt(base64.b64encode(b"x" * 33).decode()) == ""
+
+    try:
+        WeComCrypto(TOKEN, "too-short", CORP_ID)
+        raise AssertionError("应拒绝无效的 EncodingAESKey")
+    except ValueError:
+        pass
+
+
+def test_decrypt_batch():
+    """测试批量解密与逐条解密一致，坏条目为 None 且不影响其他条目"""
+    crypto = WeComCrypto(TOKEN, AES_KEY, CORP_ID)
+    messages = [f'{{"MsgId": "{n}", "Content": "{"问题" * (n % 7)}"}}' for n in range(50)]
+    encrypted = [crypto.encrypt(m) for m in messages]
+    encrypted[3] = "broken"
+    encrypted[10] = WeComCrypto(TOKEN, AES_KEY, "wx_other_corp").encrypt("x")
+
+    results = crypto.decrypt_batch(encrypted)
+    assert results[3] is None and results[10] is None
+    for n, result in enumerate(results):
+        if n not in (3, 10):
+            assert result == messages[n]
+    assert crypto.decrypt_batch([]) == []
+
+
+if __name__ == "__main__":
+    logger.info("开始测试企微消息加解密")
+
+    test_roundtrip_and_legacy_compat()
+    test_signature()
+    test_rejects_bad_padding_and_corp_id()
+    test_decrypt_batch()
+
+    logger.info("测试完成")
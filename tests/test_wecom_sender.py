@@ -0,0 +1,160 @@
+"""
+测试企微消息发送器（连接复用、合并发送、按目标限速、抖动重试、同步调用），使用本地模拟 Webhook
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.wecom_sender import WeComSender
+from loguru import logger
+
+
+class StubWebhook:
+    """本地模拟的群机器人 Webhook：记录收到的消息与客户端端口，可按顺序返回预设响应"""
+
+    def __init__(self):
+        self.requests = []
+        self.ports = set()
+        self.responses = []  # (HTTP 状态码, errcode)，用完后返回成功
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((time.monotonic(), self.path, body["text"]["content"]))
+                stub.ports.add(self.client_address[1])
+                status, errcode = stub.responses.pop(0) if stub.responses else (200, 0)
+                payload = json.dumps({"errcode": errcode, "errmsg": "ok" if not errcode else "error"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_merge_and_connection_reuse():
+    """测试合并窗口内的多条消息按顺序合并为一条，多次发送复用同一连接"""
+    stub = StubWebhook()
+    sender = WeComSender(merge_window=0.2)
+    try:
+        async def run():
+            results = await asyncio.gather(*(sender.send_webhook(f"{stub.url}/a", f"消息{n}") for n in range(5)))
+            assert results == [True] * 5
+            assert await sender.send_webhook(f"{stub.url}/a", "第二批")
+
+        asyncio.run(run())
+        contents = [content for _, _, content in stub.requests]
+        print(f"\n收到: {contents}")
+        assert contents == ["\n\n".join(f"消息{n}" for n in range(5)), "第二批"]
+        assert len(stub.ports) == 1
+    finally:
+        sender.close()
+        stub.close()
+
+
+def test_rate_limit_per_target():
+    """测试每个目标在限速窗口内最多发送 rate 条，不同目标互不影响"""
+    stub = StubWebhook()
+    # 窗口缩短为 0.5 秒；单条上限 10 字节，使每条消息单独发送
+    sender = WeComSender(webhook_rate_per_minute=2, rate_window=0.5, merge_window=0, merge_max_bytes=10)
+    try:
+        async def run():
+            await asyncio.gather(
+                *(sender.send_webhook(f"{stub.url}/a", f"a{n}" * 4) for n in range(4)),
+                sender.send_webhook(f"{stub.url}/b", "b0"),
+            )
+
+        started = time.monotonic()
+        asyncio.run(run())
+        sent_a = [at - started for at, path, _ in stub.requests if path == "/a"]
+        sent_b = [at - started for at, path, _ in stub.requests if path == "/b"]
+        print(f"\n/a 发送时间: {sent_a}, /b: {sent_b}")
+        assert len(sent_a) == 4
+        # 第 3、4 条等到第一个窗口结束后发送
+        assert sent_a[1] < 0.3 and sent_a[2] >= 0.45
+        assert sent_b[0] < 0.3
+    finally:
+        sender.close()
+        stub.close()
+
+
+def test_retry_transient_errors():
+    """测试 5xx 与企微限频重试后成功，其他 errcode 不重试"""
+    stub = StubWebhook()
+    sender = WeComSender(merge_window=0, retry_base=0.02, max_retries=3)
+    try:
+        stub.responses = [(500, 0), (200, 45009)]
+        assert sender.send_webhook_sync(f"{stub.url}/a", "重试") is True
+        assert len(stub.requests) == 3
+
+        stub.responses = [(200, 93000)]
+        assert sender.send_webhook_sync(f"{stub.url}/a", "无效的 Webhook") is False
+        assert len(stub.requests) == 4
+
+        stub.responses = [(503, 0)] * 4
+        assert sender.send_webhook_sync(f"{stub.url}/a", "一直失败") is False
+        assert len(stub.requests) == 8
+    finally:
+        sender.close()
+        stub.close()
+
+
+def test_custom_post_and_sync_callers():
+    """测试自定义发送函数（重试间 delivery_id 不变）与多线程同步调用"""
+    stub = StubWebhook()
+    sender = WeComSender(merge_window=0.1, retry_base=0.02)
+    delivery_ids = []
+
+    async def post(client, content, delivery_id):
+        delivery_ids.append(delivery_id)
+        return await client.post(f"{stub.url}/custom", json={"text": {"content": content}})
+
+    try:
+        stub.responses = [(502, 0)]
+        results = []
+        threads = [
+            threading.Thread(target=lambda n=n: results.append(sender.send_sync("robot:chat", f"m{n}", post)))
+            for n in range(3)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert results == [True] * 3
+        assert len(set(delivery_ids)) == 1 and len(delivery_ids) == 2
+        assert sorted(stub.requests[-1][2].split("\n\n")) == ["m0", "m1", "m2"]
+    finally:
+        sender.close()
+        stub.close()
+
+
+if __name__ == "__main__":
+    logger.info("开始测试企微消息发送器")
+
+    test_merge_and_connection_reuse()
+    test_rate_limit_per_target()
+    test_retry_transient_errors()
+    test_custom_post_and_sync_callers()
+
+    logger.info("测试完成")